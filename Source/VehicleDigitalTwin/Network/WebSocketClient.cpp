@@ -2,6 +2,43 @@
 #include "WebSocketsModule.h"
 #include "IWebSocket.h"
 
+// Binary wire layout, mirrors backend/wire_protocol.py (all little-endian)
+namespace DigitalTwinWire
+{
+	constexpr uint8 MsgFrame = 0x01;
+	constexpr uint8 WireVersion = 1;
+	constexpr int32 HeaderSize = 3; // type, version, stream id length
+	constexpr int32 BodySize = 96;
+	constexpr int32 Missing = MIN_int32; // Missing FLOAT channel
+
+	static_assert(PLATFORM_LITTLE_ENDIAN, "Binary telemetry decoding assumes a little-endian platform");
+
+	/** Sequential little-endian reads from a message buffer. */
+	struct FReader
+	{
+		const uint8* Ptr;
+
+		template <typename T>
+		T Read()
+		{
+			T Value;
+			FMemory::Memcpy(&Value, Ptr, sizeof(T));
+			Ptr += sizeof(T);
+			return Value;
+		}
+
+		/** Fixed-point channel: stored as value * Scale. Leaves Out untouched if missing. */
+		void ReadScaled(float& Out, float Scale)
+		{
+			const int32 Stored = Read<int32>();
+			if (Stored != Missing)
+			{
+				Out = Stored / Scale;
+			}
+		}
+	};
+}
+
 UWebSocketClient::UWebSocketClient()
 {
 }
@@ -52,13 +89,47 @@ void UWebSocketClient::Connect(const FString& ServerUrl)
 	{
 		if (UWebSocketClient* StrongThis = WeakThis.Get())
 		{
-			if (StrongThis->OnTelemetryReceived.IsBound())
+			// Control replies always start with the "type" key; telemetry frames never have one.
+			// A prefix check routes them without parsing the JSON twice.
+			if (Message.StartsWith(TEXT("{\"type\"")))
+			{
+				if (StrongThis->OnServerMessage.IsBound())
+				{
+					StrongThis->OnServerMessage.Broadcast(Message);
+				}
+			}
+			else if (StrongThis->OnTelemetryReceived.IsBound())
 			{
 				StrongThis->OnTelemetryReceived.Broadcast(Message);
 			}
 		}
 	});
 
+	WebSocket->OnBinaryMessage().AddLambda([WeakThis](const void* Data, SIZE_T Size, bool bIsLastFragment)
+	{
+		if (UWebSocketClient* StrongThis = WeakThis.Get())
+		{
+			StrongThis->BinaryBuffer.Append(static_cast<const uint8*>(Data), Size);
+			if (!bIsLastFragment)
+			{
+				return;
+			}
+
+			if (DecodeBinaryFrame(StrongThis->BinaryBuffer.GetData(), StrongThis->BinaryBuffer.Num(), StrongThis->LastFrame))
+			{
+				if (StrongThis->OnTelemetryFrame.IsBound())
+				{
+					StrongThis->OnTelemetryFrame.Broadcast(StrongThis->LastFrame);
+				}
+			}
+			else
+			{
+				UE_LOG(LogTemp, Warning, TEXT("Dropped undecodable binary message (%d bytes)"), StrongThis->BinaryBuffer.Num());
+			}
+			StrongThis->BinaryBuffer.Reset();
+		}
+	});
+
 	WebSocket->Connect();
 }
 
@@ -77,3 +148,71 @@ void UWebSocketClient::Close()
 		WebSocket->Close();
 	}
 }
+
+void UWebSocketClient::RequestSessionList()
+{
+	Send(TEXT("{\"command\": \"list_sessions\"}"));
+}
+
+void UWebSocketClient::SelectSession(int32 SessionId, float OffsetSeconds)
+{
+	Send(FString::Printf(TEXT("{\"command\": \"select_session\", \"session_id\": %d, \"offset\": %.3f}"), SessionId, OffsetSeconds));
+}
+
+void UWebSocketClient::SeekPlayback(float OffsetSeconds)
+{
+	Send(FString::Printf(TEXT("{\"command\": \"seek\", \"offset\": %.3f}"), OffsetSeconds));
+}
+
+void UWebSocketClient::RequestEncoding(bool bBinary)
+{
+	Send(FString::Printf(TEXT("{\"command\": \"hello\", \"encoding\": \"%s\"}"), bBinary ? TEXT("binary") : TEXT("json")));
+}
+
+bool UWebSocketClient::DecodeBinaryFrame(const uint8* Data, int32 Size, FDigitalTwinTelemetryFrame& OutFrame)
+{
+	using namespace DigitalTwinWire;
+
+	if (Size < HeaderSize || Data[0] != MsgFrame || Data[1] != WireVersion)
+	{
+		return false;
+	}
+	const int32 StreamLen = Data[2];
+	if (Size < HeaderSize + StreamLen + BodySize)
+	{
+		return false;
+	}
+
+	const FUTF8ToTCHAR StreamName(reinterpret_cast<const ANSICHAR*>(Data + HeaderSize), StreamLen);
+	OutFrame.Stream = FString(StreamName.Length(), StreamName.Get());
+
+	// Field order = frame_schema.CHANNELS
+	FReader Reader{Data + HeaderSize + StreamLen};
+	OutFrame.Timestamp = Reader.Read<double>();
+	Reader.ReadScaled(OutFrame.SpeedKmh, 100.0f);
+	Reader.ReadScaled(OutFrame.RPM, 1.0f);
+	OutFrame.Gear = Reader.Read<int16>();
+	Reader.ReadScaled(OutFrame.Throttle, 100.0f);
+	Reader.ReadScaled(OutFrame.Brake, 100.0f);
+	Reader.ReadScaled(OutFrame.Steering, 100.0f);
+	Reader.ReadScaled(OutFrame.EngineTemp, 10.0f);
+	OutFrame.bIsAnomaly = Reader.Read<uint8>() != 0;
+
+	OutFrame.Tires.SetNum(4);
+	for (FDigitalTwinTireFrame& Tire : OutFrame.Tires)
+	{
+		const int8 Compound = Reader.Read<int8>();
+		if (Compound >= 0)
+		{
+			Tire.Compound = Compound;
+		}
+		Reader.ReadScaled(Tire.Temp, 10.0f);
+		Reader.ReadScaled(Tire.Wear, 10.0f);
+		Reader.ReadScaled(Tire.Grip, 100.0f);
+	}
+
+	OutFrame.bDRSActive = Reader.Read<uint8>() != 0;
+	Reader.ReadScaled(OutFrame.Drag, 1.0f);
+	Reader.ReadScaled(OutFrame.Downforce, 1.0f);
+	return true;
+}
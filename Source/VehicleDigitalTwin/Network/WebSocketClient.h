@@ -5,7 +5,80 @@
 #include "IWebSocket.h"
 #include "WebSocketClient.generated.h"
 
+/** One tire of a binary telemetry frame. */
+USTRUCT(BlueprintType)
+struct FDigitalTwinTireFrame
+{
+	GENERATED_BODY()
+
+	/** Compound code: 0 SOFT, 1 MEDIUM, 2 HARD (the server's TireModel.COMPOUNDS), -1 when missing. */
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	int32 Compound = -1;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Temp = 0.0f;
+
+	/** Wear in percent (0-100). */
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Wear = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Grip = 0.0f;
+};
+
+/** A telemetry frame decoded from the binary wire encoding (backend/wire_protocol.py). */
+USTRUCT(BlueprintType)
+struct FDigitalTwinTelemetryFrame
+{
+	GENERATED_BODY()
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	FString Stream;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	double Timestamp = 0.0;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float SpeedKmh = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float RPM = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	int32 Gear = 0;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Throttle = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Brake = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Steering = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float EngineTemp = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	bool bIsAnomaly = false;
+
+	/** FL, FR, RL, RR */
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	TArray<FDigitalTwinTireFrame> Tires;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	bool bDRSActive = false;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Drag = 0.0f;
+
+	UPROPERTY(BlueprintReadOnly, Category = "Telemetry")
+	float Downforce = 0.0f;
+};
+
 DECLARE_DYNAMIC_MULTICAST_DELEGATE_OneParam(FOnTelemetryReceived, const FString&, JsonData);
+DECLARE_DYNAMIC_MULTICAST_DELEGATE_OneParam(FOnTelemetryFrame, const FDigitalTwinTelemetryFrame&, Frame);
+DECLARE_DYNAMIC_MULTICAST_DELEGATE_OneParam(FOnServerMessage, const FString&, JsonData);
 DECLARE_DYNAMIC_MULTICAST_DELEGATE(FOnConnected);
 DECLARE_DYNAMIC_MULTICAST_DELEGATE(FOnConnectionError);
 
@@ -30,9 +103,47 @@ public:
 	UFUNCTION(BlueprintCallable, Category = "Networking")
 	void Close();
 
+	// --- Session Playback Commands ---
+
+	/** Asks the server for the recorded sessions (reply arrives on OnServerMessage as {"type": "sessions"}). */
+	UFUNCTION(BlueprintCallable, Category = "Networking|Playback")
+	void RequestSessionList();
+
+	/** Switches to playback of a recorded session, starting OffsetSeconds into it. */
+	UFUNCTION(BlueprintCallable, Category = "Networking|Playback")
+	void SelectSession(int32 SessionId, float OffsetSeconds = 0.0f);
+
+	/** Jumps the current playback to OffsetSeconds from the start of the session. */
+	UFUNCTION(BlueprintCallable, Category = "Networking|Playback")
+	void SeekPlayback(float OffsetSeconds);
+
+	// --- Wire Encoding ---
+
+	/**
+	 * Negotiates the telemetry encoding for this connection (JSON is the default).
+	 * Binary frames arrive on OnTelemetryFrame, already decoded; JSON frames on OnTelemetryReceived.
+	 */
+	UFUNCTION(BlueprintCallable, Category = "Networking")
+	void RequestEncoding(bool bBinary);
+
+	/**
+	 * Decodes one binary telemetry message. Fields the server marked missing keep their value in OutFrame.
+	 * Returns false if the message is truncated or of an unknown type/version.
+	 */
+	static bool DecodeBinaryFrame(const uint8* Data, int32 Size, FDigitalTwinTelemetryFrame& OutFrame);
+
+	/** JSON telemetry frames (text messages). */
 	UPROPERTY(BlueprintAssignable, Category = "Networking")
 	FOnTelemetryReceived OnTelemetryReceived;
 
+	/** Binary telemetry frames, decoded without any string parsing. */
+	UPROPERTY(BlueprintAssignable, Category = "Networking")
+	FOnTelemetryFrame OnTelemetryFrame;
+
+	/** Control replies from the server (messages carrying a "type" field, e.g. session lists). */
+	UPROPERTY(BlueprintAssignable, Category = "Networking")
+	FOnServerMessage OnServerMessage;
+
 	UPROPERTY(BlueprintAssignable, Category = "Networking")
 	FOnConnected OnConnected;
 
@@ -41,4 +152,10 @@ public:
 
 private:
 	TSharedPtr<IWebSocket> WebSocket;
+
+	// Binary message being reassembled from fragments
+	TArray<uint8> BinaryBuffer;
+
+	// Last decoded binary frame (missing fields carry over from it)
+	FDigitalTwinTelemetryFrame LastFrame;
 };
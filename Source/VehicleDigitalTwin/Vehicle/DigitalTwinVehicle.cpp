@@ -1,5 +1,4 @@
 #include "DigitalTwinVehicle.h"
-#include "../Network/WebSocketClient.h"
 #include "../UI/VehicleHUD.h"
 #include "Json.h"
 #include "JsonUtilities.h"
@@ -18,6 +17,8 @@ void ADigitalTwinVehicle::BeginPlay()
 	WebSocketClient->OnConnected.AddDynamic(this, &ADigitalTwinVehicle::OnConnected);
 	WebSocketClient->OnConnectionError.AddDynamic(this, &ADigitalTwinVehicle::OnConnectionError);
 	WebSocketClient->OnTelemetryReceived.AddDynamic(this, &ADigitalTwinVehicle::OnTelemetryReceived);
+	WebSocketClient->OnTelemetryFrame.AddDynamic(this, &ADigitalTwinVehicle::OnTelemetryFrame);
+	WebSocketClient->OnServerMessage.AddDynamic(this, &ADigitalTwinVehicle::OnServerMessage);
 
 	// Connect to localhost by default
 	WebSocketClient->Connect("ws://localhost:8765");
@@ -80,6 +81,11 @@ void ADigitalTwinVehicle::OnConnected()
 	{
 		GEngine->AddOnScreenDebugMessage(-1, 10.0f, FColor::Green, TEXT("SUCCESS: Connected to Python Telemetry Server!"));
 	}
+
+	if (bUseBinaryTelemetry && WebSocketClient)
+	{
+		WebSocketClient->RequestEncoding(true);
+	}
 }
 
 void ADigitalTwinVehicle::OnConnectionError()
@@ -123,9 +129,6 @@ void ADigitalTwinVehicle::OnTelemetryReceived(const FString& JsonData)
 					TireTemperatures.Add(Temp);
 				}
 			}
-			
-			// Trigger Visual Update
-			UpdateTireVisuals(TireTemperatures);
 		}
 
 		// Parse Aero Data
@@ -133,69 +136,101 @@ void ADigitalTwinVehicle::OnTelemetryReceived(const FString& JsonData)
 		if (JsonObject->TryGetObjectField(TEXT("aero"), AeroObj))
 		{
 			bDRSActive = (*AeroObj)->GetBoolField(TEXT("drs"));
-			UpdateAeroVisuals(bDRSActive);
 		}
 
-		if (HUDWidget)
-		{
-			HUDWidget->UpdateTelemetryData(CurrentSpeed, CurrentRPM, CurrentGear, CurrentThrottle, CurrentBrake, CurrentEngineTemp, bIsAnomaly);
-		}
+		ApplyTelemetry(bIsAnomaly);
+	}
+}
 
-		// --- DIGITAL TWIN PHYSICS CONTROL ---
-		// We use a control loop to make the vehicle match the telemetry speed.
-		// This preserves physics (suspension, wheel rotation) while tracking the data.
-		
-		// --- DIGITAL TWIN PHYSICS CONTROL (FORCE BASED) ---
-		// We apply a physical force to push the car to the target speed.
-		// This bypasses the Engine/Transmission simulation (which can stall or be in wrong gear),
-		// but still respects gravity and collisions for smooth movement.
+void ADigitalTwinVehicle::OnTelemetryFrame(const FDigitalTwinTelemetryFrame& Frame)
+{
+	// Binary frame: already decoded into fixed fields, no string parsing
+	CurrentSpeed = Frame.SpeedKmh;
+	CurrentRPM = Frame.RPM;
+	CurrentGear = Frame.Gear;
+	CurrentThrottle = Frame.Throttle;
+	CurrentBrake = Frame.Brake;
+	CurrentSteering = Frame.Steering;
+	CurrentEngineTemp = Frame.EngineTemp;
+
+	TireTemperatures.SetNum(Frame.Tires.Num());
+	for (int32 i = 0; i < Frame.Tires.Num(); ++i)
+	{
+		TireTemperatures[i] = Frame.Tires[i].Temp;
+	}
+	bDRSActive = Frame.bDRSActive;
+
+	ApplyTelemetry(Frame.bIsAnomaly);
+}
 
-		if (GetVehicleMovementComponent())
+void ADigitalTwinVehicle::ApplyTelemetry(bool bIsAnomaly)
+{
+	// Trigger Visual Updates
+	if (TireTemperatures.Num() > 0)
+	{
+		UpdateTireVisuals(TireTemperatures);
+	}
+	UpdateAeroVisuals(bDRSActive);
+
+	if (HUDWidget)
+	{
+		HUDWidget->UpdateTelemetryData(CurrentSpeed, CurrentRPM, CurrentGear, CurrentThrottle, CurrentBrake, CurrentEngineTemp, bIsAnomaly);
+	}
+
+	// --- DIGITAL TWIN PHYSICS CONTROL ---
+	// We use a control loop to make the vehicle match the telemetry speed.
+	// This preserves physics (suspension, wheel rotation) while tracking the data.
+	
+	// --- DIGITAL TWIN PHYSICS CONTROL (FORCE BASED) ---
+	// We apply a physical force to push the car to the target speed.
+	// This bypasses the Engine/Transmission simulation (which can stall or be in wrong gear),
+	// but still respects gravity and collisions for smooth movement.
+
+	if (GetVehicleMovementComponent())
+	{
+		// Ensure brakes are off unless we want to stop
+		GetVehicleMovementComponent()->SetHandbrakeInput(false);
+		GetVehicleMovementComponent()->SetBrakeInput(0.0f);
+		
+		// Force Internal Gear (Fix for HUD showing 'N' if bound to component)
+		GetVehicleMovementComponent()->SetTargetGear(CurrentGear, true);
+		
+		// Visuals: Set Steering just for the animation of wheels
+		GetVehicleMovementComponent()->SetSteeringInput(CurrentSteering);
+		
+		// --- KINEMATIC CONTROL (The "Digital Twin" Way) ---
+		// We force the vehicle to move at the exact speed from the telemetry.
+		// This ignores engine power, friction, and gear ratios in Unreal,
+		// ensuring the visual matches the data 1:1.
+		
+		if (UPrimitiveComponent* VehicleMesh = GetMesh())
 		{
-			// Ensure brakes are off unless we want to stop
-			GetVehicleMovementComponent()->SetHandbrakeInput(false);
-			GetVehicleMovementComponent()->SetBrakeInput(0.0f);
-			
-			// Force Internal Gear (Fix for HUD showing 'N' if bound to component)
-			GetVehicleMovementComponent()->SetTargetGear(CurrentGear, true);
+			// Convert km/h to cm/s (Unreal Units)
+			float TargetSpeedCmS = CurrentSpeed * 100000.0f / 3600.0f; 
 			
-			// Visuals: Set Steering just for the animation of wheels
-			GetVehicleMovementComponent()->SetSteeringInput(CurrentSteering);
+			// Get current forward direction
+			FVector ForwardDir = GetActorForwardVector();
 			
-			// --- KINEMATIC CONTROL (The "Digital Twin" Way) ---
-			// We force the vehicle to move at the exact speed from the telemetry.
-			// This ignores engine power, friction, and gear ratios in Unreal,
-			// ensuring the visual matches the data 1:1.
+			// Calculate Target Velocity Vector
+			// We preserve the current Z velocity (gravity/falling) to keep it grounded
+			FVector CurrentVelocity = VehicleMesh->GetPhysicsLinearVelocity();
+			FVector TargetVelocity = ForwardDir * TargetSpeedCmS;
+			TargetVelocity.Z = CurrentVelocity.Z; 
 			
-			if (UPrimitiveComponent* VehicleMesh = GetMesh())
+			// Apply Velocity Directly
+			VehicleMesh->SetPhysicsLinearVelocity(TargetVelocity);
+
+			// Debug
+			if (GEngine)
 			{
-				// Convert km/h to cm/s (Unreal Units)
-				float TargetSpeedCmS = CurrentSpeed * 100000.0f / 3600.0f; 
-				
-				// Get current forward direction
-				FVector ForwardDir = GetActorForwardVector();
-				
-				// Calculate Target Velocity Vector
-				// We preserve the current Z velocity (gravity/falling) to keep it grounded
-				FVector CurrentVelocity = VehicleMesh->GetPhysicsLinearVelocity();
-				FVector TargetVelocity = ForwardDir * TargetSpeedCmS;
-				TargetVelocity.Z = CurrentVelocity.Z; 
-				
-				// Apply Velocity Directly
-				VehicleMesh->SetPhysicsLinearVelocity(TargetVelocity);
-
-				// Debug
-				if (GEngine)
-				{
-					GEngine->AddOnScreenDebugMessage(5, 0.0f, FColor::Magenta, 
-						FString::Printf(TEXT("KINEMATIC: Target Speed: %.1f km/h"), CurrentSpeed));
-				}
+				GEngine->AddOnScreenDebugMessage(5, 0.0f, FColor::Magenta, 
+					FString::Printf(TEXT("KINEMATIC: Target Speed: %.1f km/h"), CurrentSpeed));
 			}
 		}
-		else
-		{
-			UE_LOG(LogTemp, Error, TEXT("VehicleMovementComponent is NULL!"));
-		}
+	}
+	else
+	{
+		UE_LOG(LogTemp, Error, TEXT("VehicleMovementComponent is NULL!"));
 	}
 }
 
@@ -207,3 +242,40 @@ void ADigitalTwinVehicle::SetPlaybackMode(bool bEnablePlayback)
 		WebSocketClient->Send(Command);
 	}
 }
+
+void ADigitalTwinVehicle::RequestSessionList()
+{
+	if (WebSocketClient)
+	{
+		WebSocketClient->RequestSessionList();
+	}
+}
+
+void ADigitalTwinVehicle::SelectPlaybackSession(int32 SessionId, float OffsetSeconds)
+{
+	if (WebSocketClient)
+	{
+		WebSocketClient->SelectSession(SessionId, OffsetSeconds);
+	}
+}
+
+void ADigitalTwinVehicle::SeekPlayback(float OffsetSeconds)
+{
+	if (WebSocketClient)
+	{
+		WebSocketClient->SeekPlayback(OffsetSeconds);
+	}
+}
+
+void ADigitalTwinVehicle::OnServerMessage(const FString& JsonData)
+{
+	TSharedPtr<FJsonObject> JsonObject;
+	TSharedRef<TJsonReader<>> Reader = TJsonReaderFactory<>::Create(JsonData);
+
+	if (FJsonSerializer::Deserialize(Reader, JsonObject))
+	{
+		const FString MessageType = JsonObject->GetStringField(TEXT("type"));
+		UE_LOG(LogTemp, Log, TEXT("Server message: %s"), *MessageType);
+		ReceiveServerMessage(MessageType, JsonData);
+	}
+}
@@ -2,10 +2,9 @@
 
 #include "CoreMinimal.h"
 #include "../VehicleDigitalTwinPawn.h"
+#include "../Network/WebSocketClient.h"
 #include "DigitalTwinVehicle.generated.h"
 
-class UWebSocketClient;
-
 /**
  * Vehicle pawn that is controlled by digital twin telemetry.
  */
@@ -27,6 +26,9 @@ public:
 	UFUNCTION()
 	void OnTelemetryReceived(const FString& JsonData);
 
+	UFUNCTION()
+	void OnTelemetryFrame(const FDigitalTwinTelemetryFrame& Frame);
+
 	UFUNCTION()
 	void OnConnected();
 
@@ -36,10 +38,29 @@ public:
 	UFUNCTION(BlueprintCallable, Category = "DigitalTwin")
 	void SetPlaybackMode(bool bEnablePlayback);
 
+	UFUNCTION(BlueprintCallable, Category = "DigitalTwin")
+	void RequestSessionList();
+
+	UFUNCTION(BlueprintCallable, Category = "DigitalTwin")
+	void SelectPlaybackSession(int32 SessionId, float OffsetSeconds = 0.0f);
+
+	UFUNCTION(BlueprintCallable, Category = "DigitalTwin")
+	void SeekPlayback(float OffsetSeconds);
+
+	UFUNCTION()
+	void OnServerMessage(const FString& JsonData);
+
 private:
+	// Applies the current telemetry values to visuals, HUD and vehicle movement
+	void ApplyTelemetry(bool bIsAnomaly);
+
 	UPROPERTY()
 	UWebSocketClient* WebSocketClient;
 
+	// Ask the server for binary frames on connect (no JSON parsing on the game thread)
+	UPROPERTY(EditAnywhere, Category = "DigitalTwin")
+	bool bUseBinaryTelemetry = true;
+
 	// Telemetry data
 	float CurrentSpeed;
 	float CurrentRPM;
@@ -66,6 +87,10 @@ protected:
 	UFUNCTION(BlueprintImplementableEvent, Category = "DigitalTwin")
 	void UpdateAeroVisuals(bool bIsDRSOpen);
 
+	// Event for server control replies (session list, session selected, errors)
+	UFUNCTION(BlueprintImplementableEvent, Category = "DigitalTwin")
+	void ReceiveServerMessage(const FString& MessageType, const FString& JsonData);
+
 private:
 
 	UPROPERTY(EditAnywhere, Category = "UI")
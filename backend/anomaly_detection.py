@@ -0,0 +1,264 @@
+"""
+Streaming anomaly detection over live telemetry.
+
+Every detector is O(1) per sample with a fixed amount of state, so a stream
+costs the same at minute one and hour ten. Detectors read the flat channel
+values of a frame (FrameBuffer.values / frame_schema.flatten_frame) and time
+constants are in seconds of frame time, so results don't depend on the
+publish rate.
+
+Rules:
+    engine_temp_spike   EWMA z-score of the engine temperature's rate of change
+                        (smooth heating/cooling scores low, a jump scores high)
+    tire_temp_rate      Smoothed tire temperature rate of change above a limit (C/s)
+    tire_wear_outlier   One tire wearing much faster than the median of the four
+
+Alerts are rate limited per (rule, channel) and published on the "alerts"
+stream (see streams.AlertStream):
+
+    {"type": "alert", "stream": "car_0", "rule": "engine_temp_spike", "channel": "engine_temp",
+     "timestamp": ..., "value": 135.0, "score": 42.7, "threshold": 8.0}
+"""
+
+import math
+import time
+from frame_schema import CHANNEL_INDEX, CHANNEL_NAMES, TIRE_POSITIONS, FrameBuffer, flatten_frame
+
+# --- Defaults ---
+# Engine temperature: z-score of d(temp)/dt against its own EWMA mean / variance
+ENGINE_TEMP_TAU = 5.0       # s, EWMA time constant
+ENGINE_TEMP_Z = 8.0         # Alert above |z|
+ENGINE_TEMP_MIN_STD = 1.0   # C/s, floor for the standard deviation (rounding noise)
+# Tire temperature rate of change, smoothed (0.1 C rounding alone is 6 C/s between 60 Hz frames)
+TIRE_TEMP_TAU = 0.25        # s
+TIRE_TEMP_MAX_RATE = 10.0   # C/s
+# Wear rate per tire (% per second), compared across the four tires
+WEAR_TAU = 10.0             # s
+WEAR_RATIO = 3.0            # Alert when a tire wears this many times faster than the median
+WEAR_MIN_RATE = 0.005       # %/s, ignore ratios while everything barely wears
+# Detectors stay quiet until they have seen this much of a stream
+WARMUP = 2.0                # s (wear: 3 * WEAR_TAU)
+# Minimum time between two alerts of the same rule on the same channel
+ALERT_COOLDOWN = 2.0        # s
+
+ENGINE_TEMP = CHANNEL_INDEX["engine_temp"]
+TIRE_TEMPS = tuple(CHANNEL_INDEX[f"tire_{pos}_temp"] for pos in TIRE_POSITIONS)
+TIRE_WEARS = tuple(CHANNEL_INDEX[f"tire_{pos}_wear"] for pos in TIRE_POSITIONS)
+
+_NO_ALERTS = ()
+
+def _blend(dt, tau):
+    # EWMA weight of a new sample after dt seconds (exact for irregular sampling)
+    return -math.expm1(-dt / tau)
+
+class EwmaZScore:
+    """
+    Exponentially weighted mean and variance of a signal; z-score of each new sample.
+    Outliers (|z| above the threshold) are not folded into the statistics.
+    """
+    __slots__ = ("tau", "threshold", "min_std", "mean", "var", "primed")
+
+    def __init__(self, tau, threshold, min_std):
+        self.tau = tau
+        self.threshold = threshold
+        self.min_std = min_std
+        self.mean = 0.0
+        self.var = 0.0
+        self.primed = False
+
+    def update(self, x, dt):
+        """
+        Returns the z-score of x against the statistics so far (0.0 for the first sample).
+        """
+        if not self.primed:
+            self.mean = x
+            self.primed = True
+            return 0.0
+        std = math.sqrt(self.var)
+        if std < self.min_std:
+            std = self.min_std
+        deviation = x - self.mean
+        z = deviation / std
+        if -self.threshold <= z <= self.threshold:
+            a = _blend(dt, self.tau)
+            self.mean += a * deviation
+            self.var = (1.0 - a) * (self.var + a * deviation * deviation)
+        return z
+
+class RateOfChange:
+    """
+    EWMA-smoothed derivative of a signal (units per second).
+    """
+    __slots__ = ("tau", "last", "rate")
+
+    def __init__(self, tau):
+        self.tau = tau
+        self.last = None
+        self.rate = 0.0
+
+    def update(self, x, dt):
+        last = self.last
+        self.last = x
+        if last is not None and dt > 0.0:
+            self.rate += _blend(dt, self.tau) * ((x - last) / dt - self.rate)
+        return self.rate
+
+class StreamDetector:
+    """
+    Detector state for one stream (one car, one session).
+    """
+    __slots__ = ("stream_id", "engine_temp_threshold", "tire_temp_max_rate", "wear_ratio", "wear_min_rate",
+                 "warmup", "wear_warmup", "cooldown",
+                 "_engine_temp", "_engine_rate", "_tire_temps", "_tire_wears", "_wear_rates",
+                 "_start", "_last_time", "_last_alert")
+
+    def __init__(self, stream_id, engine_temp_z=ENGINE_TEMP_Z, tire_temp_max_rate=TIRE_TEMP_MAX_RATE,
+                 wear_ratio=WEAR_RATIO, wear_min_rate=WEAR_MIN_RATE, warmup=WARMUP, cooldown=ALERT_COOLDOWN):
+        self.stream_id = stream_id
+        self.engine_temp_threshold = engine_temp_z
+        self.tire_temp_max_rate = tire_temp_max_rate
+        self.wear_ratio = wear_ratio
+        self.wear_min_rate = wear_min_rate
+        self.warmup = warmup
+        self.wear_warmup = max(warmup, 3.0 * WEAR_TAU)
+        self.cooldown = cooldown
+
+        self._engine_temp = None # Last engine temperature (the z-score looks at the raw rate)
+        self._engine_rate = EwmaZScore(ENGINE_TEMP_TAU, engine_temp_z, ENGINE_TEMP_MIN_STD)
+        self._tire_temps = [RateOfChange(TIRE_TEMP_TAU) for _ in TIRE_TEMPS]
+        self._tire_wears = [RateOfChange(WEAR_TAU) for _ in TIRE_WEARS]
+        self._wear_rates = [0.0] * len(TIRE_WEARS)
+        self._start = None
+        self._last_time = None
+        self._last_alert = {} # (rule, channel index) -> timestamp
+
+    def process(self, values):
+        """
+        Feed one frame (flat channel values). Returns a (usually empty) sequence of alert dicts.
+        """
+        timestamp = values[0]
+        if self._last_time is None:
+            self._start = self._last_time = timestamp
+            dt = 0.0
+        else:
+            dt = timestamp - self._last_time
+            if dt <= 0.0:
+                return _NO_ALERTS # Duplicate or out-of-order frame
+            self._last_time = timestamp
+        elapsed = timestamp - self._start
+        alerts = _NO_ALERTS
+
+        # --- 1. Engine temperature spikes ---
+        engine_temp = values[ENGINE_TEMP]
+        if engine_temp is not None:
+            last = self._engine_temp
+            self._engine_temp = engine_temp
+            if last is not None and dt > 0.0:
+                z = self._engine_rate.update((engine_temp - last) / dt, dt)
+                if elapsed >= self.warmup and (z > self.engine_temp_threshold or z < -self.engine_temp_threshold):
+                    alerts = self._alert(alerts, "engine_temp_spike", ENGINE_TEMP, timestamp, engine_temp,
+                                         z, self.engine_temp_threshold)
+
+        # --- 2. Tire temperature rate of change ---
+        limit = self.tire_temp_max_rate
+        for tracker, index in zip(self._tire_temps, TIRE_TEMPS):
+            temp = values[index]
+            if temp is None:
+                continue
+            rate = tracker.update(temp, dt)
+            if (rate > limit or rate < -limit) and elapsed >= self.warmup:
+                alerts = self._alert(alerts, "tire_temp_rate", index, timestamp, temp, rate, limit)
+
+        # --- 3. Wear rate outliers across the four tires ---
+        rates = self._wear_rates
+        for i, index in enumerate(TIRE_WEARS):
+            wear = values[index]
+            if wear is not None:
+                rates[i] = self._tire_wears[i].update(wear, dt)
+        if elapsed >= self.wear_warmup:
+            ordered = sorted(rates)
+            median = (ordered[1] + ordered[2]) * 0.5
+            fastest = ordered[3]
+            if fastest > self.wear_min_rate and fastest > self.wear_ratio * median:
+                index = TIRE_WEARS[rates.index(fastest)]
+                alerts = self._alert(alerts, "tire_wear_outlier", index, timestamp, values[index],
+                                     fastest / median if median > 0.0 else math.inf, self.wear_ratio)
+        return alerts
+
+    def _alert(self, alerts, rule, index, timestamp, value, score, threshold):
+        key = (rule, index)
+        last = self._last_alert.get(key)
+        if last is not None and timestamp - last < self.cooldown:
+            return alerts
+        self._last_alert[key] = timestamp
+        alert = {
+            "type": "alert",
+            "stream": self.stream_id,
+            "rule": rule,
+            "channel": CHANNEL_NAMES[index],
+            "timestamp": timestamp,
+            "value": value,
+            "score": round(score, 2),
+            "threshold": threshold
+        }
+        if alerts is _NO_ALERTS:
+            return [alert]
+        alerts.append(alert)
+        return alerts
+
+class AnomalyMonitor:
+    """
+    One StreamDetector per stream, restarted whenever the stream's session changes (reset).
+    """
+
+    def __init__(self, **detector_options):
+        """
+        Args:
+            detector_options: StreamDetector thresholds (engine_temp_z, tire_temp_max_rate,
+                              wear_ratio, wear_min_rate, warmup, cooldown)
+        """
+        self.detector_options = detector_options
+        self._detectors = {} # stream_id -> (session_id, StreamDetector)
+        self.frames_processed = 0
+        self.alerts_raised = 0
+        self.alerts_by_rule = {}
+        self._process_time = 0.0
+        self._process_time_max = 0.0
+
+    def process(self, stream, frame):
+        """
+        Run the detectors on a stream's new frame (FrameBuffer or frame dict).
+        Returns a (usually empty) sequence of alert dicts.
+        """
+        started = time.perf_counter()
+        entry = self._detectors.get(stream.stream_id)
+        if entry is None or entry[0] != stream.session_id:
+            entry = self._detectors[stream.stream_id] = (stream.session_id,
+                                                         StreamDetector(stream.stream_id, **self.detector_options))
+        values = frame.values if isinstance(frame, FrameBuffer) else flatten_frame(frame)
+        alerts = entry[1].process(values)
+
+        elapsed = time.perf_counter() - started
+        self._process_time += elapsed
+        if elapsed > self._process_time_max:
+            self._process_time_max = elapsed
+        self.frames_processed += 1
+        if alerts:
+            self.alerts_raised += len(alerts)
+            for alert in alerts:
+                self.alerts_by_rule[alert["rule"]] = self.alerts_by_rule.get(alert["rule"], 0) + 1
+        return alerts
+
+    def remove(self, stream_id):
+        self._detectors.pop(stream_id, None)
+
+    def stats(self):
+        frames = self.frames_processed
+        return {
+            "streams": len(self._detectors),
+            "frames_processed": frames,
+            "alerts_raised": self.alerts_raised,
+            "alerts_by_rule": dict(self.alerts_by_rule),
+            "process_avg_us": round(self._process_time / frames * 1e6, 2) if frames else 0.0,
+            "process_max_us": round(self._process_time_max * 1e6, 2)
+        }
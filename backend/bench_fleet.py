@@ -0,0 +1,55 @@
+"""
+Cars-per-second scaling of the scalar TireModel loop vs the vectorized TireFleet.
+
+Usage:
+    python bench_fleet.py
+    python bench_fleet.py --cars 1 10 100 1000 10000 --steps 600
+"""
+
+import argparse
+import time
+import numpy as np
+from physics_engine import TireModel
+from fleet_engine import TireFleet
+
+def bench_scalar(n_cars, steps, dt):
+    tires = [[TireModel("SOFT") for _ in range(4)] for _ in range(n_cars)]
+    start = time.perf_counter()
+    for _ in range(steps):
+        for car in tires:
+            for tire in car:
+                tire.update(dt, 250.0, 0.05, 4000.0)
+    return time.perf_counter() - start
+
+def bench_fleet(n_cars, steps, dt):
+    fleet = TireFleet(n_cars, "SOFT")
+    speed = np.full(n_cars, 250.0)
+    slip = np.full((n_cars, 4), 0.05)
+    load = np.full((n_cars, 4), 4000.0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        fleet.update(dt, speed, slip, load)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="TireModel vs TireFleet throughput")
+    parser.add_argument("--cars", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--scalar-limit", type=int, default=1000,
+                        help="Skip the scalar loop above this many cars (it is slow)")
+    args = parser.parse_args()
+    dt = 1 / 60
+
+    print(f"{'cars':>8} | {'scalar car-steps/s':>20} | {'fleet car-steps/s':>20} | {'speedup':>8}")
+    for n_cars in args.cars:
+        fleet_time = bench_fleet(n_cars, args.steps, dt)
+        fleet_rate = n_cars * args.steps / fleet_time
+        if n_cars <= args.scalar_limit:
+            scalar_time = bench_scalar(n_cars, args.steps, dt)
+            scalar_rate = n_cars * args.steps / scalar_time
+            print(f"{n_cars:>8} | {scalar_rate:>20,.0f} | {fleet_rate:>20,.0f} | {fleet_rate / scalar_rate:>7.1f}x")
+        else:
+            print(f"{n_cars:>8} | {'-':>20} | {fleet_rate:>20,.0f} | {'-':>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Per-frame cost of building and encoding telemetry frames: the nested frame dict
+(snapshot()) vs the reusable FrameBuffer (snapshot_into()).
+
+Each frame goes through what the server does with it: a copy for the logger
+queue, quantized values for binary / delta clients and, with --json, a JSON
+payload. Reports time per frame (one 60 Hz physics step included), gen-0 GC
+collections while frames sit in a queue, and the memory each queued frame
+holds (tracemalloc).
+
+Usage:
+    python bench_frames.py
+    python bench_frames.py --frames 20000 --json
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from telemetry_generator import TelemetryGenerator
+from frame_schema import FrameBuffer, quantize_frame
+from wire_protocol import encode_frame, encode_values
+
+def run_dict(generator, frames, with_json, keep):
+    for _ in range(frames):
+        generator.step(1 / 60)
+        frame = generator.snapshot()
+        keep.append(frame)
+        quantize_frame(frame)             # Delta encoder input
+        encode_frame(frame, "car_0")      # Binary clients
+        if with_json:
+            json.dumps(dict(frame, stream="car_0"))
+
+def run_buffer(generator, frames, with_json, keep):
+    buffer = FrameBuffer()
+    for _ in range(frames):
+        generator.step(1 / 60)
+        generator.snapshot_into(buffer)
+        keep.append(buffer.snapshot())
+        values = buffer.quantized()
+        encode_values(values, "car_0")
+        if with_json:
+            frame = buffer.to_frame()
+            frame["stream"] = "car_0"
+            json.dumps(frame)
+
+MODES = {"dict": run_dict, "buffer": run_buffer}
+
+def gen0_collections():
+    return gc.get_stats()[0]["collections"]
+
+def bench(mode, frames, with_json):
+    run = MODES[mode]
+
+    # Time (frames are dropped right away)
+    generator = TelemetryGenerator(seed=0, clock=lambda: 0.0)
+    start = time.perf_counter()
+    run(generator, frames, with_json, _Sink())
+    elapsed = time.perf_counter() - start
+
+    # GC pressure while frames sit in a queue (as in the logger's, until a flush)
+    generator = TelemetryGenerator(seed=0, clock=lambda: 0.0)
+    kept = []
+    collections = gen0_collections()
+    run(generator, frames, with_json, kept)
+    collections = gen0_collections() - collections
+    del kept
+
+    # Memory held by each queued frame
+    generator = TelemetryGenerator(seed=0, clock=lambda: 0.0)
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run(generator, frames, with_json, kept)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return {
+        "us_per_frame": elapsed / frames * 1e6,
+        "gen0_per_10k": collections * 10000 / frames,
+        "bytes_per_queued_frame": held / frames
+    }
+
+class _Sink:
+    def append(self, item):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame dict vs FrameBuffer: time, GC pressure and memory per frame")
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--json", action="store_true", help="Also build a JSON payload per frame")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} | {'us/frame':>9} | {'gen0 GCs/10k frames':>20} | {'bytes/queued frame':>19}")
+    for mode in MODES:
+        result = bench(mode, args.frames, args.json)
+        print(f"{mode:>8} | {result['us_per_frame']:>9.1f} | {result['gen0_per_10k']:>20.1f} | "
+              f"{result['bytes_per_queued_frame']:>19,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+"""
+WebSocket load test: many concurrent clients against a local server.py.
+
+For each client count, the harness starts server.py on its own port in a
+scratch directory, so telemetry.db and a dev server on 8765 are untouched. It
+connects the clients over `--ramp` seconds, lets them settle for `--warmup`
+seconds, then measures for `--duration` seconds:
+
+- end-to-end frame latency: receive time minus the frame's `timestamp` (the
+  simulation time of its tick, which follows the wall clock), p50/p90/p99/max
+- delivered frames per second per client, and the drop rate: frames missing
+  from each client's sequence (timestamp gaps longer than one publish
+  interval), whether a send queue dropped them or the server fell behind
+- server CPU (% of one core, server plus worker processes) and resident
+  memory, read from /proc (Linux only), with the server's own view from the
+  metrics / scheduler_stats / client_stats commands: tick work, overruns,
+  send queue drops
+
+Clients run in `--processes` client processes, each an asyncio loop. Their
+CPU use is reported too: a client process that saturates its core inflates
+the latencies it measures. On a machine with few cores the server and the
+clients compete, so only compare runs from the same machine.
+
+Usage:
+    python bench_load.py --clients 10 100 1000 --duration 10 --output load.json
+    python bench_load.py --clients 50 --encoding binary --cars 4 --spread --server-args="--workers 2"
+    python bench_load.py --url ws://localhost:8765 --clients 20   # a running server (no CPU/memory unless --server-pid)
+    python bench_results.py baseline_load.json load.json
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import multiprocessing
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import shutil
+import time
+import websockets
+from metrics import Histogram
+from wire_protocol import JSON, ENCODINGS, MSG_DELTA, decode_message
+from bench_results import write_results
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+# Port of the servers the harness starts (not the default 8765, so a dev server can keep running)
+BENCH_PORT = 8799
+PUBLISH_HZ = 60
+# Clients per client process unless --processes is given
+CLIENTS_PER_PROCESS = 250
+# Seconds to wait for a started server to accept connections, and for it to exit on SIGINT
+STARTUP_TIMEOUT = 30.0
+SHUTDOWN_TIMEOUT = 15.0
+# Seconds clients stay connected after the window, so the server can still be asked about them
+LINGER = 2.0
+
+class ServerProcess:
+    """
+    server.py in a scratch directory (its telemetry.db goes there), stopped with SIGINT.
+    """
+
+    def __init__(self, port, cars, publish_hz, extra_args=()):
+        self.port = port
+        self.directory = tempfile.mkdtemp(prefix="bench_load_")
+        self.log_path = os.path.join(self.directory, "server.log")
+        self.command = [sys.executable, SERVER, "--port", str(port), "--cars", str(cars),
+                        "--publish-hz", str(publish_hz), *extra_args]
+        self.process = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def start(self):
+        with open(self.log_path, "w") as log:
+            self.process = subprocess.Popen(self.command, cwd=self.directory, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server.py exited with code {self.process.returncode}:\n{self.log_tail()}")
+            try:
+                with socket.create_connection(("localhost", self.port), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError(f"server.py did not listen on port {self.port} within {STARTUP_TIMEOUT:g} s")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT) # Lets it flush the database and stop its workers
+            try:
+                self.process.wait(SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def log_tail(self, lines=20):
+        try:
+            with open(self.log_path) as f:
+                return "".join(f.readlines()[-lines:])
+        except OSError:
+            return ""
+
+def process_tree_usage(pid):
+    """
+    CPU seconds (user + system) and resident memory of a process and its descendants, from /proc.
+
+    Returns:
+        {"cpu_s", "rss_mb", "peak_rss_mb" (of the process itself)}, or None without /proc
+    """
+    try:
+        children = {}
+        stats = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split() # comm may contain spaces
+            except OSError:
+                continue # Exited meanwhile
+            stats[int(entry)] = fields
+            children.setdefault(int(fields[1]), []).append(int(entry))
+    except OSError:
+        return None
+    if pid not in stats:
+        return None
+
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = 0.0
+    rss = 0
+    peak = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, ()))
+        fields = stats[current]
+        cpu += (int(fields[11]) + int(fields[12])) / ticks # utime, stime
+        memory = _status_kb(current, ("VmRSS", "VmHWM"))
+        rss += memory.get("VmRSS", 0)
+        if current == pid:
+            peak = memory.get("VmHWM", 0)
+    return {"cpu_s": cpu, "rss_mb": round(rss / 1024.0, 1), "peak_rss_mb": round(peak / 1024.0, 1)}
+
+def _status_kb(pid, keys):
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    values[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return values
+
+def raise_file_limit():
+    """
+    Raise the open-file soft limit to the hard limit (inherited by the server): 1000 clients are 1000 sockets.
+    """
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def frame_timestamp(message):
+    """
+    (stream, timestamp) of a telemetry frame in any encoding, or None for control replies and alerts.
+    """
+    if isinstance(message, str):
+        if message.startswith('{"type"'):
+            return None
+        frame = json.loads(message)
+        timestamp = frame["changes"].get("timestamp") if "changes" in frame else frame.get("timestamp")
+        return frame.get("stream"), timestamp
+    msg_type, stream, _, payload = decode_message(message)
+    if msg_type == MSG_DELTA:
+        return stream, dict(payload).get(0) # Channel 0 is the timestamp
+    return stream, payload[0]
+
+class ClientStats:
+    """
+    Totals of the clients of one client process.
+    """
+
+    def __init__(self):
+        self.latency = Histogram("latency", 1000.0, "ms")
+        self.received = 0
+        self.missing = 0
+        self.connected = 0
+        self.failed = 0
+        self.disconnected = 0
+        self.fps = [] # Frames per second of each client over the window
+        self.cpu_s = 0.0
+
+    def to_dict(self):
+        return {
+            "latency_counts": self.latency.counts,
+            "latency_count": self.latency.count,
+            "latency_total": self.latency.total,
+            "latency_max": self.latency.max,
+            "received": self.received,
+            "missing": self.missing,
+            "connected": self.connected,
+            "failed": self.failed,
+            "disconnected": self.disconnected,
+            "fps": self.fps,
+            "cpu_s": self.cpu_s
+        }
+
+async def run_client(url, index, count, options, window, stats):
+    start_at, measure_from, measure_until = window
+    await asyncio.sleep(max(0.0, start_at + options["ramp"] * index / count - time.time()))
+    publish_hz = options["publish_hz"]
+    received = 0
+    connected = False
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=30) as websocket:
+            connected = True
+            stats.connected += 1
+            if options["encoding"] != JSON or options["delta"]:
+                await websocket.send(json.dumps({"command": "hello", "encoding": options["encoding"],
+                                                 "delta": options["delta"]}))
+            stream_id = f"car_{index % options['cars']}" if options["spread"] else "car_0"
+            if stream_id != "car_0":
+                await websocket.send(json.dumps({"command": "subscribe", "stream": stream_id}))
+                await websocket.send(json.dumps({"command": "unsubscribe", "stream": "car_0"}))
+
+            async def receive():
+                nonlocal received
+                previous = None
+                async for message in websocket:
+                    now = time.time()
+                    if now >= measure_until:
+                        if now >= measure_until + LINGER:
+                            return
+                        continue
+                    frame = frame_timestamp(message)
+                    if frame is None or frame[0] != stream_id or frame[1] is None:
+                        continue
+                    timestamp = frame[1]
+                    last, previous = previous, timestamp
+                    if now < measure_from:
+                        continue
+                    received += 1
+                    stats.received += 1
+                    stats.latency.record(max(0.0, now - timestamp))
+                    if last is not None:
+                        gap = round((timestamp - last) * publish_hz) - 1
+                        if gap > 0:
+                            stats.missing += gap
+                stats.disconnected += 1 # The server closed the connection
+
+            # A server that stops sending must not hang the run
+            await asyncio.wait_for(receive(), max(0.0, measure_until - time.time()) + LINGER + 5.0)
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        if connected:
+            stats.disconnected += 1 # Closed by the server, or stalled past the end of the window
+        else:
+            stats.failed += 1
+    stats.fps.append(received / (measure_until - measure_from))
+
+async def run_clients(url, indexes, count, options, window):
+    stats = ClientStats()
+
+    async def sample_cpu():
+        await asyncio.sleep(max(0.0, window[1] - time.time()))
+        before = time.process_time()
+        await asyncio.sleep(max(0.0, window[2] - time.time()))
+        stats.cpu_s = time.process_time() - before
+
+    await asyncio.gather(sample_cpu(), *(run_client(url, i, count, options, window, stats) for i in indexes))
+    return stats
+
+def client_process(url, indexes, count, options, window):
+    """
+    Entry point of a client process: run its clients, return their totals as a dict.
+    """
+    return asyncio.run(run_clients(url, indexes, count, options, window)).to_dict()
+
+class ControlConnection:
+    """
+    The harness's own connection: server commands, with its telemetry drained in the background.
+
+    It connects before the benchmark clients and stays on car_0 (timestamp only), so car_0 is reset
+    while the server is idle and no benchmark client is ever its first viewer (which resets it).
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.replies = asyncio.Queue()
+        self._reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(cls, url):
+        connection = cls(await websockets.connect(url, max_size=None, open_timeout=30))
+        await connection.request({"command": "subscribe", "stream": "car_0", "channels": ["timestamp"]}, "subscribed")
+        return connection
+
+    async def _read(self):
+        try:
+            async for message in self.websocket:
+                if isinstance(message, str) and message.startswith('{"type"'):
+                    self.replies.put_nowait(json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def request(self, command, reply_type):
+        await self.websocket.send(json.dumps(command))
+        while True:
+            reply = await asyncio.wait_for(self.replies.get(), 10.0)
+            if reply["type"] in (reply_type, "error"):
+                return reply
+
+    async def close(self):
+        await self.websocket.close()
+        await self._reader
+
+async def observe_server(control, window, server_pid):
+    """
+    Server-side view of the measurement window, from the control connection and /proc.
+    """
+    _, measure_from, measure_until = window
+    await asyncio.sleep(max(0.0, measure_from - time.time()))
+    usage_before = process_tree_usage(server_pid) if server_pid else None
+    started = time.monotonic()
+    scheduler_before = (await control.request({"command": "scheduler_stats"}, "scheduler_stats")).get("stats")
+    await control.request({"command": "metrics", "reset": True}, "metrics")
+
+    await asyncio.sleep(max(0.0, measure_until - time.time()))
+    usage_after = process_tree_usage(server_pid) if server_pid else None
+    elapsed = time.monotonic() - started
+    metrics = (await control.request({"command": "metrics"}, "metrics")).get("metrics")
+    scheduler = (await control.request({"command": "scheduler_stats"}, "scheduler_stats")).get("stats")
+    clients = (await control.request({"command": "client_stats"}, "client_stats")).get("clients") or []
+
+    server = {
+        "cpu_percent": None,
+        "rss_mb": None,
+        "peak_rss_mb": None,
+        "clients_seen": len(clients) - 1, # Not counting the control connection
+        "queue_drops": sum(c["frames_dropped"] for c in clients),
+        "queue_depth_max": max((c["queue_depth"] for c in clients), default=0),
+        "lag_max_ms": max((c["lag_max_ms"] for c in clients), default=0.0),
+    }
+    if usage_before and usage_after:
+        server["cpu_percent"] = round((usage_after["cpu_s"] - usage_before["cpu_s"]) / elapsed * 100.0, 1)
+        server["rss_mb"] = usage_after["rss_mb"]
+        server["peak_rss_mb"] = usage_after["peak_rss_mb"]
+    if scheduler_before and scheduler:
+        server["achieved_hz"] = scheduler["achieved_hz"]
+        server["overruns"] = scheduler["overruns"] - scheduler_before["overruns"]
+        server["ticks_dropped"] = scheduler["ticks_dropped"] - scheduler_before["ticks_dropped"]
+    if metrics:
+        histograms = metrics["histograms"]
+        server["histograms"] = {name: histograms[name] for name in ("tick_work", "serialize", "send")
+                                if name in histograms}
+    return server
+
+def merge(parts, window_s, expected_fps):
+    latency = Histogram("latency", 1000.0, "ms")
+    fps = []
+    totals = {"received": 0, "missing": 0, "connected": 0, "failed": 0, "disconnected": 0, "cpu_s": 0.0}
+    for part in parts:
+        latency.counts = [a + b for a, b in zip(latency.counts, part["latency_counts"])]
+        latency.count += part["latency_count"]
+        latency.total += part["latency_total"]
+        latency.max = max(latency.max, part["latency_max"])
+        fps.extend(part["fps"])
+        for key in totals:
+            totals[key] += part[key]
+    summary = latency.snapshot()
+    del summary["total"], summary["unit"]
+    expected = totals["received"] + totals["missing"]
+    return {
+        "connected": totals["connected"],
+        "failed": totals["failed"],
+        "disconnected": totals["disconnected"],
+        "latency_ms": summary,
+        "expected_fps": expected_fps,
+        "delivered_fps": {
+            "mean": round(sum(fps) / len(fps), 2) if fps else 0.0,
+            "min": round(min(fps), 2) if fps else 0.0
+        },
+        "frames_received": totals["received"],
+        "frames_missing": totals["missing"],
+        "drop_rate": round(totals["missing"] / expected, 5) if expected else 0.0,
+        # Busiest client process would be fairer, but the sum shows whether clients needed more cores
+        "client_cpu_percent": round(totals["cpu_s"] / window_s * 100.0, 1)
+    }
+
+def run_level(clients, args, url, server_pid):
+    """
+    One client count: connect, warm up, measure. Returns the result dict.
+    """
+    processes = args.processes or max(1, math.ceil(clients / CLIENTS_PER_PROCESS))
+    processes = min(processes, clients)
+    # Client processes take a moment to start (spawn): the clock starts after that
+    start_at = time.time() + 1.0 + 0.5 * processes
+    window = (start_at, start_at + args.ramp + args.warmup, start_at + args.ramp + args.warmup + args.duration)
+    options = {
+        "encoding": args.encoding,
+        "delta": args.delta,
+        "spread": args.spread,
+        "cars": args.cars,
+        "publish_hz": args.publish_hz,
+        "ramp": args.ramp
+    }
+    shards = [list(range(p, clients, processes)) for p in range(processes)]
+
+    async def run():
+        control = await ControlConnection.connect(url)
+        try:
+            loop = asyncio.get_running_loop()
+            with concurrent.futures.ProcessPoolExecutor(processes,
+                                                        mp_context=multiprocessing.get_context("spawn")) as pool:
+                parts = [loop.run_in_executor(pool, client_process, url, shard, clients, options, window)
+                         for shard in shards]
+                server = await observe_server(control, window, server_pid)
+                return await asyncio.gather(*parts), server
+        finally:
+            await control.close()
+
+    parts, server = asyncio.run(run())
+
+    result = {"name": f"clients={clients}", "clients": clients, "processes": processes}
+    result.update(merge(parts, args.duration, args.publish_hz))
+    result["server"] = server
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket load test against server.py (JSON output)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100], help="Client counts to run, in order")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds measured per client count")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds between the last connection and measuring")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which the clients connect")
+    parser.add_argument("--processes", type=int, default=None,
+                        help=f"Client processes (default: one per {CLIENTS_PER_PROCESS} clients)")
+    parser.add_argument("--encoding", default=JSON, choices=list(ENCODINGS), help="Frame encoding the clients ask for")
+    parser.add_argument("--delta", action=argparse.BooleanOptionalAction, default=False,
+                        help="Clients ask for keyframe/delta frames")
+    parser.add_argument("--cars", type=int, default=1, help="Cars the server simulates")
+    parser.add_argument("--spread", action=argparse.BooleanOptionalAction, default=False,
+                        help="Client i watches car_(i mod cars) instead of every client watching car_0")
+    parser.add_argument("--publish-hz", type=int, default=PUBLISH_HZ, help="Server publish rate")
+    parser.add_argument("--server-args", default="", help="Extra server.py arguments, e.g. \"--workers 2\"")
+    parser.add_argument("--port", type=int, default=BENCH_PORT, help="Port of the servers the harness starts")
+    parser.add_argument("--url", default=None, help="Load an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="With --url: server pid, for CPU and memory")
+    parser.add_argument("--output", default="-", help="JSON output path ('-': stdout)")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    results = []
+    for clients in args.clients:
+        server = None
+        if args.url is None:
+            server = ServerProcess(args.port, args.cars, args.publish_hz, shlex.split(args.server_args))
+            server.start()
+        try:
+            url = args.url or f"ws://localhost:{args.port}"
+            result = run_level(clients, args, url, server.pid if server is not None else args.server_pid)
+        finally:
+            if server is not None:
+                server.stop()
+        results.append(result)
+        latency = result["latency_ms"]
+        cpu = result["server"]["cpu_percent"]
+        print(f"clients={clients}: latency p50 {latency['p50']} / p99 {latency['p99']} / max {latency['max']} ms, "
+              f"{result['delivered_fps']['mean']} fps, drops {result['drop_rate']:.2%}, "
+              f"server CPU {cpu if cpu is not None else '-'}% RSS {result['server']['rss_mb'] or '-'} MB, "
+              f"client CPU {result['client_cpu_percent']}%, failed {result['failed']}", file=sys.stderr)
+
+    config = {key: getattr(args, key) for key in ("duration", "warmup", "ramp", "encoding", "delta", "cars", "spread",
+                                                  "publish_hz", "server_args", "url")}
+    write_results(args.output, "load", config, results)
+
+if __name__ == "__main__":
+    main()
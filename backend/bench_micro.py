@@ -0,0 +1,184 @@
+"""
+Microbenchmarks of the per-frame hot path, as JSON for regression tracking:
+
+- TireModel.update (analytic grip curve, and the grip table)
+- TelemetryGenerator.get_next_frame (nested dict), and the server's
+  next_frame_into(FrameBuffer) path
+- TelemetryGenerator.checkpoint, what forking a forecast costs the live car
+- TelemetryLogger.log per storage engine, sustained: each repeat logs its
+  frames with the BLOCK overflow policy and flushes, so the cost per frame
+  includes the writer thread's batch inserts (and rollups)
+- Ingest.handle per frame, for JSON and binary batches of INGEST_BATCH
+  frames, written through a columnar logger the same way
+
+Each case runs `--repeat` times `number` calls; ns_per_call is the fastest
+repeat (the least disturbed by the rest of the machine), ns_median the median.
+
+Usage:
+    python bench_micro.py > micro.json
+    python bench_micro.py --repeat 9 --output micro.json
+    python bench_results.py baseline_micro.json micro.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from physics_engine import TireModel
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger, STORAGE_ENGINES
+from frame_schema import FrameBuffer, quantize_values, unflatten_frame
+from streams import StreamHub
+from ingest import Ingest
+from wire_protocol import encode_batch
+from bench_results import write_results
+
+PHYSICS_DT = 1 / 240
+FRAME_DT = 1 / 60
+INGEST_BATCH = 500
+
+def measure(run, number, repeat):
+    """
+    Time `repeat` runs of run(number) (which makes `number` calls).
+
+    Returns:
+        {"ns_per_call", "ns_median", "calls_per_s", "number", "repeat"}
+    """
+    run(max(1, number // 10)) # Warm up (caches, lazily built tables)
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(number)
+        per_call.append((time.perf_counter() - start) / number * 1e9)
+    best = min(per_call)
+    return {
+        "ns_per_call": round(best, 1),
+        "ns_median": round(statistics.median(per_call), 1),
+        "calls_per_s": round(1e9 / best),
+        "number": number,
+        "repeat": repeat
+    }
+
+def tire_update(grip_table):
+    tire = TireModel("SOFT", grip_table=grip_table)
+    update = tire.update
+
+    def run(number):
+        for _ in range(number):
+            update(PHYSICS_DT, 250.0, 0.05, 4000.0)
+    return run
+
+def next_frame():
+    generator = TelemetryGenerator(seed=0, clock=lambda: 0.0)
+
+    def run(number):
+        for _ in range(number):
+            generator.get_next_frame(FRAME_DT)
+    return run
+
+def next_frame_into():
+    generator = TelemetryGenerator(seed=0, clock=lambda: 0.0)
+    buffer = FrameBuffer()
+
+    def run(number):
+        for _ in range(number):
+            generator.next_frame_into(buffer, FRAME_DT)
+    return run
+
+def checkpoint():
+    generator = TelemetryGenerator(seed=0, clock=lambda: 0.0)
+    generator.step(10.0)
+
+    def run(number):
+        for _ in range(number):
+            generator.checkpoint()
+    return run
+
+def logger_log(db_logger, frames):
+    def run(number):
+        log = db_logger.log
+        for i in range(number):
+            log(frames[i % len(frames)])
+        db_logger.flush()
+    return run
+
+def ingest_batches(db_logger, frames, encoding):
+    """
+    number: frames, pushed as batches of INGEST_BATCH (the recording restarts when the frames run out).
+    """
+    ingest = Ingest(StreamHub(db_logger))
+    batches = []
+    for start in range(0, len(frames) - INGEST_BATCH + 1, INGEST_BATCH):
+        rows = frames[start:start + INGEST_BATCH]
+        if encoding == "binary":
+            batches.append(encode_batch([quantize_values(values) for values in rows], "bench"))
+        else:
+            batches.append(json.dumps({"vehicle": "bench", "frames": [unflatten_frame(values) for values in rows]}))
+
+    def run(number):
+        handle = ingest.handle
+        for i in range(max(1, number // INGEST_BATCH)):
+            if i % len(batches) == 0 and ingest.hub.get("bench") is not None:
+                ingest.hub.get("bench").reset() # New session: the same timestamps are accepted again
+            handle(batches[i % len(batches)])
+        db_logger.flush()
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path microbenchmarks (JSON output)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (the fastest is reported)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the calls per run (0.1 for a quick check)")
+    parser.add_argument("--engines", nargs="+", default=list(STORAGE_ENGINES), choices=list(STORAGE_ENGINES),
+                        help="Storage engines to time TelemetryLogger.log with")
+    parser.add_argument("--output", default="-", help="JSON output path ('-': stdout)")
+    args = parser.parse_args()
+
+    def calls(n):
+        return max(1, int(n * args.scale))
+
+    cases = [
+        ("TireModel.update", tire_update(False), calls(200000)),
+        ("TireModel.update[grip_table]", tire_update(True), calls(200000)),
+        ("TelemetryGenerator.get_next_frame", next_frame(), calls(20000)),
+        ("TelemetryGenerator.next_frame_into", next_frame_into(), calls(20000)),
+        ("TelemetryGenerator.checkpoint", checkpoint(), calls(20000)),
+    ]
+
+    # Recorded frames as the server logs them (FrameBuffer.snapshot() tuples)
+    generator = TelemetryGenerator(seed=0, clock=lambda: 1000.0)
+    frames = [generator.next_frame_into(FrameBuffer(), FRAME_DT).snapshot() for _ in range(600)]
+    tmp_dir = tempfile.mkdtemp()
+    loggers = []
+    try:
+        for engine in args.engines:
+            db_logger = TelemetryLogger(os.path.join(tmp_dir, f"{engine}.db"), engine=engine,
+                                        overflow_policy=TelemetryLogger.BLOCK)
+            loggers.append(db_logger)
+            cases.append((f"TelemetryLogger.log[{engine}]", logger_log(db_logger, frames), calls(20000)))
+        db_logger = TelemetryLogger(os.path.join(tmp_dir, "ingest.db"), engine="columnar",
+                                    overflow_policy=TelemetryLogger.BLOCK)
+        loggers.append(db_logger)
+        for encoding in ("json", "binary"):
+            cases.append((f"Ingest.handle[{encoding}]", ingest_batches(db_logger, frames, encoding), calls(20000)))
+
+        results = []
+        for name, run, number in cases:
+            result = {"name": name}
+            result.update(measure(run, number, args.repeat))
+            results.append(result)
+            print(f"{name:>40} | {result['ns_per_call']:>10,.0f} ns/call | {result['calls_per_s']:>12,} calls/s",
+                  file=sys.stderr)
+    finally:
+        for db_logger in loggers:
+            db_logger.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    write_results(args.output, "micro", {"repeat": args.repeat, "scale": args.scale, "engines": args.engines},
+                  results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Machine-readable benchmark results, and regression checks between two runs.
+
+bench_load.py and bench_micro.py write one JSON document per run:
+
+    {"benchmark": "load" | "micro", "environment": {python, platform, cpus, git, ...},
+     "config": {...}, "results": [{"name": ..., <metrics>}, ...]}
+
+Comparing a run with a baseline matches results by name and flags every
+tracked metric that got worse by more than the tolerance (relative to the
+baseline, with a small absolute floor so 0.0 -> 0.1 ms is not "infinitely
+worse"):
+
+    python bench_results.py baseline.json current.json --tolerance 0.2
+
+The exit status is 1 if anything regressed, so a CI job can gate on it.
+Only compare runs from the same machine: the numbers are absolute.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+LOWER = "lower"   # Smaller is better (latency, cost)
+HIGHER = "higher" # Larger is better (throughput)
+
+# Tracked metric (dotted path into a result) -> (better direction, absolute change always tolerated)
+TRACKED = {
+    "latency_ms.p50": (LOWER, 1.0),
+    "latency_ms.p90": (LOWER, 1.0),
+    "latency_ms.p99": (LOWER, 2.0),
+    "delivered_fps.mean": (HIGHER, 0.5),
+    "drop_rate": (LOWER, 0.005),
+    "server.cpu_percent": (LOWER, 2.0),
+    "server.rss_mb": (LOWER, 5.0),
+    "ns_per_call": (LOWER, 0.0),
+}
+
+DEFAULT_TOLERANCE = 0.15
+
+def environment():
+    """
+    Where the numbers were taken: interpreter, OS, CPU count and source revision.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True,
+                                  text=True, timeout=5).stdout.strip() or None
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                                    capture_output=True, text=True, timeout=5).stdout.strip())
+    except (OSError, subprocess.SubprocessError):
+        revision, dirty = None, None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "git": revision,
+        "dirty": dirty,
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    }
+
+def write_results(output, benchmark, config, results):
+    """
+    Write a run as JSON to a path, or to stdout for "-".
+
+    Returns:
+        The document written
+    """
+    document = {"benchmark": benchmark, "environment": environment(), "config": config, "results": results}
+    text = json.dumps(document, indent=2)
+    if output == "-":
+        print(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    return document
+
+def _lookup(result, path):
+    value = result
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Tracked metrics of every result present in both runs.
+
+    Args:
+        baseline, current: Documents written by write_results()
+        tolerance: Relative change allowed in the worse direction (0.15 = 15%)
+    Returns:
+        [{"name", "metric", "baseline", "current", "change", "regressed"}], change relative to the baseline
+    """
+    if baseline.get("benchmark") != current.get("benchmark"):
+        raise ValueError(f"Cannot compare a {baseline.get('benchmark')} run with a {current.get('benchmark')} run")
+    previous = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None:
+            continue
+        for metric, (direction, floor) in TRACKED.items():
+            old, new = _lookup(before, metric), _lookup(result, metric)
+            if old is None or new is None:
+                continue
+            worse = new - old if direction == LOWER else old - new
+            rows.append({
+                "name": result["name"],
+                "metric": metric,
+                "baseline": old,
+                "current": new,
+                "change": round((new - old) / old, 4) if old else None,
+                "regressed": worse > max(tolerance * abs(old), floor)
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a benchmark run with a baseline")
+    parser.add_argument("baseline", help="JSON written by bench_load.py / bench_micro.py")
+    parser.add_argument("current", help="JSON of the run to check")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative change allowed in the worse direction")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.tolerance)
+
+    print(f"{'result':>36} | {'metric':>18} | {'baseline':>12} | {'current':>12} | {'change':>8}")
+    for row in rows:
+        change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "-"
+        flag = "  REGRESSED" if row["regressed"] else ""
+        print(f"{row['name']:>36} | {row['metric']:>18} | {row['baseline']:>12,.3f} | {row['current']:>12,.3f} | "
+              f"{change:>8}{flag}")
+    regressed = [row for row in rows if row["regressed"]]
+    print(f"{len(regressed)} of {len(rows)} metrics regressed (tolerance {args.tolerance:.0%})")
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from websockets.exceptions import ConnectionClosed
+from streams import filter_channels
+from wire_protocol import BINARY, encode_values, encode_coded
+from frame_schema import FrameBuffer, quantize_frame, dequantize_values
+from delta_codec import DeltaEncoder, KEYFRAME, KEYFRAME_INTERVAL, changes_to_json
+
+logger = logging.getLogger("TelemetryBroadcaster")
+
+# Overflow policies for a client's send queue
+DROP_OLDEST = "drop_oldest" # Discard the oldest queued frame
+COALESCE = "coalesce"       # Keep only the newest frame per stream
+DISCONNECT = "disconnect"   # Close the connection of a client that can't keep up
+
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Control messages (replies, events) queued for one client before it is disconnected:
+# they are never dropped, so a client that stops reading can't make them pile up forever
+MAX_CONTROL_QUEUE = 1000
+
+class ClientOutbox:
+    """
+    Bounded send queue for one client, drained by its own sender task.
+
+    publish() never awaits, so a slow or stalled client only fills (and then
+    trims) its own queue; the tick loop and every other client carry on.
+    Control replies go through a separate queue that is never dropped and is
+    always sent before pending frames; a client with max_control of them
+    still unsent is disconnected.
+
+    For delta clients, key_seqs tracks the keyframe each stream's deltas are
+    currently relative to. Overflow drops queued deltas before keyframes; if
+    a keyframe has to go, it is forgotten so the broadcaster sends the
+    current keyframe again with the next delta.
+    """
+
+    def __init__(self, websocket, max_queue=120, policy=DROP_OLDEST, send_timer=None, max_control=MAX_CONTROL_QUEUE):
+        """
+        Args:
+            websocket: Connection the sender task writes to
+            max_queue: Frames queued before the overflow policy applies
+            policy: DROP_OLDEST, COALESCE or DISCONNECT
+            send_timer: Optional metrics Histogram of the time each send takes
+            max_control: Control messages queued before the client is disconnected
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {policy}. Valid: {list(OVERFLOW_POLICIES)}")
+        self.websocket = websocket
+        self.max_queue = max(1, int(max_queue))
+        self.policy = policy
+        self.max_control = max(1, int(max_control))
+        self.closed = False
+
+        # Frames: (stream_id, message, enqueue_time, is_keyframe).
+        # Coalesce keeps one entry per stream (plus one pending keyframe per stream).
+        self._frames = {} if policy == COALESCE else deque()
+        self.key_seqs = {} # stream_id -> keyframe sequence queued for this client
+        self._control = deque()
+        self._ready = asyncio.Event()
+        self._task = None
+
+        # Stats
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_coalesced = 0
+        self.lag_last = 0.0 # Seconds between enqueue and send of the last frame
+        self.lag_max = 0.0
+        self.lag_avg = 0.0  # EWMA
+        self._send_timer = send_timer
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    @property
+    def queue_depth(self):
+        return len(self._frames) + len(self._control)
+
+    def enqueue_frame(self, stream_id, message, keyframe=False):
+        """
+        Queue an encoded frame. Applies the overflow policy instead of blocking.
+        """
+        if self.closed:
+            return False
+        now = time.monotonic()
+
+        if self.policy == COALESCE:
+            slot = stream_id
+            if keyframe:
+                # A pending delta is relative to the previous keyframe: superseded
+                if self._frames.pop(stream_id, None) is not None:
+                    self.frames_coalesced += 1
+                slot = (stream_id, KEYFRAME)
+            pending = self._frames.get(slot)
+            if pending is not None:
+                # Replace the stale frame in place (keeps its turn in the queue)
+                self._frames[slot] = (stream_id, message, pending[2], keyframe)
+                self.frames_coalesced += 1
+            else:
+                self._frames[slot] = (stream_id, message, now, keyframe)
+        else:
+            if len(self._frames) >= self.max_queue:
+                if self.policy == DISCONNECT:
+                    logger.warning(f"Disconnecting slow client {self.websocket.remote_address} "
+                                   f"({len(self._frames)} frames queued)")
+                    self.close(disconnect=True)
+                    return False
+                self._drop_oldest()
+            self._frames.append((stream_id, message, now, keyframe))
+
+        self._ready.set()
+        return True
+
+    def _drop_oldest(self):
+        # Keyframes are what the queued deltas decode against: drop the oldest other frame
+        for index, entry in enumerate(self._frames):
+            if not entry[3]:
+                del self._frames[index]
+                break
+        else:
+            # Only keyframes left: drop one and resend it with the stream's next delta
+            entry = self._frames.popleft()
+            self.key_seqs.pop(entry[0], None)
+        self.frames_dropped += 1
+
+    def enqueue_control(self, message):
+        if self.closed:
+            return False
+        if len(self._control) >= self.max_control:
+            logger.warning(f"Disconnecting stalled client {self.websocket.remote_address} "
+                           f"({len(self._control)} control messages queued)")
+            self.close(disconnect=True)
+            return False
+        self._control.append(message)
+        self._ready.set()
+        return True
+
+    def _pop(self):
+        if self._control:
+            return self._control.popleft(), None
+        if not self._frames:
+            return None, None
+        if self.policy == COALESCE:
+            slot = next(iter(self._frames))
+            _, message, enqueued, _ = self._frames.pop(slot)
+        else:
+            _, message, enqueued, _ = self._frames.popleft()
+        return message, enqueued
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                message, enqueued = self._pop()
+                if message is None:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                if self._send_timer is not None:
+                    began = time.perf_counter()
+                    await self.websocket.send(message)
+                    self._send_timer.record(time.perf_counter() - began)
+                else:
+                    await self.websocket.send(message)
+                if enqueued is not None:
+                    lag = time.monotonic() - enqueued
+                    self.frames_sent += 1
+                    self.lag_last = lag
+                    self.lag_max = max(self.lag_max, lag)
+                    self.lag_avg += (lag - self.lag_avg) * 0.1
+        except ConnectionClosed:
+            pass
+        finally:
+            self.closed = True
+
+    def close(self, disconnect=False):
+        self.closed = True
+        self._frames.clear()
+        self._control.clear()
+        self._ready.set() # Wake the sender so it exits
+        if disconnect:
+            asyncio.ensure_future(self.websocket.close(code=1008, reason="send queue overflow"))
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "frames_coalesced": self.frames_coalesced,
+            "lag_last_ms": round(self.lag_last * 1000.0, 2),
+            "lag_avg_ms": round(self.lag_avg * 1000.0, 2),
+            "lag_max_ms": round(self.lag_max * 1000.0, 2),
+            "policy": self.policy,
+            "closed": self.closed
+        }
+
+class Broadcaster:
+    """
+    Fans frames out to subscribers.
+
+    Each frame is encoded once per distinct (encoding, channel selection) and
+    the same payload object is queued for every subscriber sharing it.
+    Sending happens concurrently in each client's own ClientOutbox task.
+
+    Clients that negotiated delta mode share one DeltaEncoder per stream and
+    get keyframes / deltas (always every channel) instead of full frames. A
+    client whose last keyframe for the stream isn't the current one (late
+    joiner, dropped keyframe) gets the current keyframe first.
+    """
+
+    def __init__(self, max_queue=120, policy=DROP_OLDEST, keyframe_interval=KEYFRAME_INTERVAL, metrics=None):
+        """
+        Args:
+            max_queue, policy: Every client's ClientOutbox bound and overflow policy
+            keyframe_interval: Frames between delta keyframes
+            metrics: Optional Metrics registry (serialize / send timers)
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {policy}. Valid: {list(OVERFLOW_POLICIES)}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.keyframe_interval = keyframe_interval
+        self.frames_published = 0
+        self.payloads_encoded = 0
+        self.events_published = 0
+        self._encoders = {}  # stream_id -> DeltaEncoder
+        self._keyframes = {} # stream_id -> (key_seq, {encoding: keyframe payload})
+        self._serialize_timer = metrics.timer("serialize") if metrics is not None else None
+        self._send_timer = metrics.timer("send") if metrics is not None else None
+
+    def open_outbox(self, websocket):
+        return ClientOutbox(websocket, self.max_queue, self.policy, self._send_timer).start()
+
+    def publish(self, stream, frame):
+        """
+        Encode `frame` for each encoding / channel selection among the stream's subscribers and queue it.
+
+        Args:
+            frame: Frame dict, or a FrameBuffer (binary and delta payloads are
+                   then encoded from its values, without building a dict)
+        """
+        if not stream.subscribers:
+            return
+        timer = self._serialize_timer
+        began = time.perf_counter() if timer is not None else 0.0
+        stream_id = stream.stream_id
+        buffer = frame if isinstance(frame, FrameBuffer) else None
+        values = None     # Quantized values, shared by the binary and delta encoders
+        json_frame = None # Nested dict with the stream id, only built for JSON clients
+        payloads = {}
+        coded = None
+        for client in list(stream.subscribers):
+            if client.encoding == BINARY or client.delta:
+                if values is None:
+                    values = buffer.quantized() if buffer is not None else quantize_frame(frame)
+            if client.delta:
+                if coded is None:
+                    coded = self._encode_delta(stream_id, values)
+                self._publish_delta(client, stream_id, coded, payloads)
+                continue
+            if client.encoding == BINARY:
+                # Fixed layout: binary frames always carry every channel
+                key = BINARY
+            else:
+                key = client.subscriptions.get(stream_id)
+            payload = payloads.get(key)
+            if payload is None:
+                if key == BINARY:
+                    payload = encode_values(values, stream_id)
+                else:
+                    if json_frame is None:
+                        json_frame = buffer.to_frame() if buffer is not None else dict(frame)
+                        json_frame["stream"] = stream_id
+                    payload = json.dumps(filter_channels(json_frame, key))
+                payloads[key] = payload
+            client.outbox.enqueue_frame(stream_id, payload)
+
+        self.frames_published += 1
+        self.payloads_encoded += len(payloads)
+        if timer is not None:
+            timer.record(time.perf_counter() - began)
+
+    def publish_event(self, stream, event):
+        """
+        Send an event dict (e.g. an anomaly alert) to every subscriber of `stream`, as JSON text.
+        Events go through the control queue: rare, and never dropped by the frame overflow policy.
+        """
+        if not stream.subscribers:
+            return
+        payload = json.dumps(event)
+        for client in list(stream.subscribers):
+            client.outbox.enqueue_control(payload)
+        self.events_published += 1
+
+    def forget(self, stream_id, clients=()):
+        """
+        Drop the delta state of a removed stream: its encoder, cached keyframe
+        payloads and the keyframe its last subscribers saw (a stream later
+        created with the same id starts over from a keyframe).
+        """
+        self._encoders.pop(stream_id, None)
+        self._keyframes.pop(stream_id, None)
+        for client in clients:
+            client.outbox.key_seqs.pop(stream_id, None)
+
+    def _encode_delta(self, stream_id, values):
+        encoder = self._encoders.get(stream_id)
+        if encoder is None:
+            encoder = self._encoders[stream_id] = DeltaEncoder(self.keyframe_interval)
+        kind, key_seq, payload = encoder.encode(values)
+        if kind == KEYFRAME:
+            self._keyframes[stream_id] = (key_seq, {})
+        return kind, key_seq, payload
+
+    def _keyframe_payload(self, stream_id, encoding):
+        key_seq, payloads = self._keyframes[stream_id]
+        payload = payloads.get(encoding)
+        if payload is None:
+            values = self._encoders[stream_id].keyframe
+            if encoding == BINARY:
+                payload = encode_coded(KEYFRAME, key_seq, values, stream_id)
+            else:
+                frame = dequantize_values(values)
+                frame.update(stream=stream_id, keyframe=key_seq)
+                payload = json.dumps(frame)
+            payloads[encoding] = payload
+            self.payloads_encoded += 1
+        return payload
+
+    def _publish_delta(self, client, stream_id, coded, payloads):
+        kind, key_seq, changes = coded
+        outbox = client.outbox
+        if outbox.key_seqs.get(stream_id) != key_seq:
+            # New keyframe, late joiner or a dropped keyframe: (re)send the current one
+            if outbox.enqueue_frame(stream_id, self._keyframe_payload(stream_id, client.encoding), keyframe=True):
+                outbox.key_seqs[stream_id] = key_seq
+        if kind == KEYFRAME:
+            return
+
+        key = ("delta", client.encoding)
+        payload = payloads.get(key)
+        if payload is None:
+            if client.encoding == BINARY:
+                payload = encode_coded(kind, key_seq, changes, stream_id)
+            else:
+                payload = json.dumps({
+                    "stream": stream_id,
+                    "delta": key_seq,
+                    "changes": changes_to_json(changes)
+                })
+            payloads[key] = payload
+        outbox.enqueue_frame(stream_id, payload)
@@ -0,0 +1,82 @@
+"""
+Keyframe / delta coding of telemetry frames.
+
+Frames are compared in their quantized form (frame_schema.quantize_frame), so
+a value that only moved below its reported precision counts as unchanged.
+Every `keyframe_interval` frames a full keyframe is emitted; the frames in
+between carry only the channels that differ from that keyframe.
+
+Deltas are relative to the last keyframe, not to the previous frame: a
+receiver that missed frames (dropped by a send queue, or joined late) only
+needs the latest keyframe to decode whatever comes next.
+"""
+
+from frame_schema import CHANNELS, dequantize
+
+KEYFRAME = "keyframe"
+DELTA = "delta"
+
+# Default: one keyframe per second at 60 Hz
+KEYFRAME_INTERVAL = 60
+
+class DeltaEncoder:
+    """
+    Stateful encoder for one stream of quantized frames.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.key_seq = 0       # Sequence number of the current keyframe (wraps at 16 bits)
+        self.keyframe = None   # Quantized values of the current keyframe
+        self._since_key = 0
+
+    def encode(self, values):
+        """
+        Args:
+            values: Quantized channel values (CHANNELS order)
+        Returns:
+            (KEYFRAME, key_seq, values) or (DELTA, key_seq, [(channel_index, value), ...])
+        """
+        if self.keyframe is None or self._since_key >= self.keyframe_interval:
+            return self.force_keyframe(values)
+        self._since_key += 1
+        keyframe = self.keyframe
+        changes = [(i, v) for i, v in enumerate(values) if v != keyframe[i]]
+        return DELTA, self.key_seq, changes
+
+    def force_keyframe(self, values):
+        self.keyframe = list(values)
+        self.key_seq = (self.key_seq + 1) & 0xFFFF
+        self._since_key = 1
+        return KEYFRAME, self.key_seq, self.keyframe
+
+class DeltaDecoder:
+    """
+    Rebuilds quantized frames from DeltaEncoder output.
+    """
+
+    def __init__(self):
+        self.key_seq = None
+        self.keyframe = None
+
+    def decode(self, kind, key_seq, payload):
+        """
+        Returns the quantized values, or None for a delta whose keyframe was
+        never received (decoding resumes at the next keyframe).
+        """
+        if kind == KEYFRAME:
+            self.key_seq = key_seq
+            self.keyframe = list(payload)
+            return list(payload)
+        if key_seq != self.key_seq or self.keyframe is None:
+            return None
+        values = list(self.keyframe)
+        for i, value in payload:
+            values[i] = value
+        return values
+
+def changes_to_json(changes):
+    """
+    Delta changes -> {channel name: value} with plain (dequantized) values.
+    """
+    return {CHANNELS[i].name: dequantize(CHANNELS[i], v) for i, v in changes}
@@ -0,0 +1,151 @@
+import numpy as np
+from physics_engine import TireModel, AeroModel
+
+class TireFleet:
+    """
+    Vectorized TireModel for N cars x 4 tires (structure of arrays).
+
+    Temperature, wear and grip live in (N, 4) arrays and a single update()
+    advances every tire of every car. The equations are the same as
+    TireModel.update() (EULER integrator) / TireModel._calculate_grip(), term for term.
+
+    Shapes: per-tire inputs are (N, 4), per-car inputs are (N,), scalars broadcast.
+    """
+
+    def __init__(self, n_cars, compound="MEDIUM"):
+        """
+        Args:
+            n_cars: Number of cars
+            compound: Compound name for every tire, or an (N,) / (N, 4) array of names
+        """
+        self.n_cars = int(n_cars)
+        shape = (self.n_cars, 4)
+
+        names = np.broadcast_to(self._as_per_tire(np.asarray(compound, dtype=object)), shape)
+        for name in set(names.ravel()):
+            if name not in TireModel.COMPOUNDS:
+                raise ValueError(f"Invalid compound: {name}. Valid: {list(TireModel.COMPOUNDS.keys())}")
+        self.compound_names = names.copy()
+
+        # Compound parameters, gathered per tire
+        def param(key):
+            return np.vectorize(lambda n: TireModel.COMPOUNDS[n][key], otypes=[np.float64])(names)
+
+        self.base_grip = param("base_grip")
+        self.wear_rate = param("wear_rate")
+        self.optimal_temp_min = param("optimal_temp_min")
+        self.optimal_temp_max = param("optimal_temp_max")
+        self.heat_coeff = param("heat_coeff")
+
+        # Physics constants (shared with the scalar model)
+        reference = TireModel()
+        self.ambient_temp = reference.ambient_temp
+        self.specific_heat = reference.specific_heat
+        self.tire_mass = reference.tire_mass
+        self.surface_area = reference.surface_area
+        self.convection_coeff = reference.convection_coeff
+
+        # State
+        self.temperature = np.full(shape, reference.temperature)
+        self.wear = np.zeros(shape)
+        self.grip = self.base_grip.copy()
+
+    @staticmethod
+    def _as_per_tire(values):
+        # Per-car (N,) arrays become (N, 1) so they broadcast across the 4 tires
+        return values[:, None] if values.ndim == 1 else values
+
+    def update(self, dt, speed_kmh, slip_ratio, load_n):
+        """
+        Update every tire for one time step.
+
+        Args:
+            dt: Time step (seconds)
+            speed_kmh: Vehicle speed (km/h), scalar or (N,)
+            slip_ratio: Tire slip (0.0 to 1.0), scalar, (N,) or (N, 4)
+            load_n: Vertical load (Newtons), scalar, (N,) or (N, 4)
+        """
+        if dt <= 0:
+            return
+
+        speed_ms = self._as_per_tire(np.asarray(speed_kmh, dtype=np.float64)) / 3.6
+        slip = self._as_per_tire(np.asarray(slip_ratio, dtype=np.float64))
+        load = self._as_per_tire(np.asarray(load_n, dtype=np.float64))
+
+        # --- 1. THERMODYNAMICS ---
+        friction_heat = 0.005 * load * (speed_ms * slip) * self.heat_coeff
+        flex_heat = 2.0 * speed_ms * self.heat_coeff
+        total_heat_gen = friction_heat + flex_heat
+
+        h_dynamic = self.convection_coeff + (2.0 * speed_ms)
+        cooling_rate = h_dynamic * self.surface_area * (self.temperature - self.ambient_temp)
+
+        net_energy = (total_heat_gen - cooling_rate) * dt
+        self.temperature += net_energy / (self.tire_mass * self.specific_heat)
+        np.maximum(self.temperature, self.ambient_temp, out=self.temperature)
+
+        # --- 2. WEAR MODEL ---
+        temp_wear_factor = 1.0 + np.maximum(0.0, (self.temperature - 100.0) * 0.02)
+        wear_step = self.wear_rate * slip * (load / 4000.0) * temp_wear_factor * dt
+        rolling_wear = self.wear_rate * 0.1 * (speed_ms / 100.0) * dt
+
+        self.wear += wear_step + rolling_wear
+        np.minimum(self.wear, 1.0, out=self.wear)
+
+        # --- 3. GRIP CALCULATION ---
+        self._calculate_grip()
+
+    def _calculate_grip(self):
+        opt_min = self.optimal_temp_min
+        opt_max = self.optimal_temp_max
+        temp = self.temperature
+
+        # Cold: linear ramp 0.6 -> 1.0, Overheat: 1% per degree down to 0.5, else 1.0
+        cold = 0.6 + 0.4 * np.maximum(0.0, (temp - 25.0) / (opt_min - 25.0))
+        hot = np.maximum(0.5, 1.0 - (temp - opt_max) * 0.01)
+        temp_factor = np.where(temp < opt_min, cold, np.where(temp > opt_max, hot, 1.0))
+
+        wear_factor = 1.0 - (self.wear * 0.7)
+        self.grip = self.base_grip * temp_factor * wear_factor
+
+    def get_status(self, car):
+        """
+        Tire status dicts for one car, same format as TireModel.get_status().
+        """
+        return [
+            {
+                "compound": self.compound_names[car, i],
+                "temp": round(float(self.temperature[car, i]), 1),
+                "wear": round(float(self.wear[car, i]) * 100, 1),
+                "grip": round(float(self.grip[car, i]), 2)
+            }
+            for i in range(4)
+        ]
+
+class AeroFleet:
+    """
+    Vectorized AeroModel force calculation for N cars.
+    """
+
+    def __init__(self, n_cars):
+        reference = AeroModel()
+        self.n_cars = int(n_cars)
+        self.air_density = reference.air_density
+        self.frontal_area = reference.frontal_area
+        self.cd_base = reference.cd_base
+        self.cd_drs_open = reference.cd_drs_open
+        self.cl_base = reference.cl_base
+        self.cl_drs_open = reference.cl_drs_open
+        self.drs_active = np.zeros(self.n_cars, dtype=bool)
+
+    def calculate_forces(self, speed_kmh):
+        """
+        Drag and downforce for every car at its current DRS state.
+        Returns: (DragForce_N, Downforce_N) as (N,) arrays
+        """
+        speed_ms = np.asarray(speed_kmh, dtype=np.float64) / 3.6
+        cd = np.where(self.drs_active, self.cd_drs_open, self.cd_base)
+        cl = np.where(self.drs_active, self.cl_drs_open, self.cl_base)
+
+        q = 0.5 * self.air_density * self.frontal_area * (speed_ms ** 2)
+        return q * cd, q * cl
@@ -0,0 +1,389 @@
+"""
+What-if forecasts forked from a live car's current simulation state.
+
+A forecast takes a Checkpoint of a live car (telemetry_generator) and forks
+it into branches, each with its own changes: parameter_sweep parameter names
+("compound" fits fresh tires of that compound, "tire.wear_rate",
+"aero.cd_drs_open", "max_power", ...), applied at the fork or after a number
+of laps, so "pit for hards now" and "pit for hards in 5 laps" are two
+branches of one request.
+
+Every branch runs ahead of the live car, much faster than real time, on a
+pool of low-priority worker processes: the live stream keeps its tick rate
+while forecasts run. Branches advance in chunks of CHUNK_SECONDS simulated
+seconds, and each chunk goes out as soon as it is done as one event, to the
+client that started the forecast:
+
+    {"type": "forecast", "forecast": "forecast_1", "stream": "car_0", "branch": "pit_now",
+     "status": "running" | "done" | "failed", "progress": 0.1, "frames": [frame, ...]}
+
+Frames are ordinary telemetry frames, sampled every SAMPLE_INTERVAL simulated
+seconds, with timestamps continuing the live car's clock from the fork (they
+are in the future). The "done" event also carries the branch summary (lap
+times, wear, grip); a cancelled forecast ends with one "cancelled" event.
+
+All branches start from the same RNG state (common random numbers, as in
+parameter_sweep), so their differences come from their changes, not from the
+dice. A "baseline" branch without changes is added to every forecast (unless
+disabled): compare branches against it rather than against the live car,
+which steps at the server's physics rate and keeps drawing random events.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from frame_schema import FrameBuffer
+from parameter_sweep import apply_params, LAP_LENGTH_M, SIM_DT, MAX_STINT_SECONDS
+from streams import filter_channels
+from telemetry_generator import TelemetryGenerator
+
+logger = logging.getLogger("Forecast")
+
+# Worker processes running branches, and how much they yield the CPU to the server and sim workers
+FORECAST_WORKERS = 2
+FORECAST_NICE = 10
+
+# Request defaults and limits: simulated seconds ahead, between forecast frames, per chunk (one event each)
+HORIZON_SECONDS = 300.0
+MAX_HORIZON_SECONDS = MAX_STINT_SECONDS
+SAMPLE_INTERVAL = 1.0
+CHUNK_SECONDS = 30.0
+MAX_BRANCHES = 8
+# Forecasts running at once (server-wide)
+MAX_ACTIVE = 4
+
+BASELINE = "baseline"
+
+# Branch status in forecast events (CANCELLED is per forecast)
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Simulated-time comparisons (sample and horizon times accumulate float steps)
+TIME_TOLERANCE = 1e-9
+
+class Branch:
+    """
+    One what-if run: a checkpoint, the changes to make, and what was seen so far.
+    Goes to a worker process and back for every chunk (a few KB pickled).
+    """
+
+    def __init__(self, name, checkpoint, params=None, in_laps=0.0, lap_length=LAP_LENGTH_M,
+                 sample_interval=SAMPLE_INTERVAL):
+        """
+        Args:
+            name: Branch name (unique within its forecast)
+            checkpoint: State to fork from (telemetry_generator.Checkpoint)
+            params: {parameter: value} changes (parameter_sweep.apply_params() names)
+            in_laps: Laps driven from the fork before the changes are made (0: at the fork)
+            lap_length: Lap length (meters)
+            sample_interval: Simulated seconds between forecast frames (the first one is this long after the fork)
+        """
+        self.name = name
+        self.checkpoint = checkpoint
+        self.params = dict(params or {})
+        self.lap_length = lap_length
+        self.fork_time = checkpoint.sim_time
+        self.fork_distance = checkpoint.state["distance"]
+        self.change_distance = self.fork_distance + in_laps * lap_length
+        self.changed_after = None # Simulated seconds from the fork to the changes
+        self.next_lap = self.fork_distance + lap_length
+        self.lap_start = self.fork_time
+        self.lap_times = []
+        self.peak_tire_temp = max(tire.temperature for tire in checkpoint.tires)
+        self.min_grip = min(tire.grip for tire in checkpoint.tires)
+        self.sample_interval = sample_interval
+        self.next_sample = self.fork_time + sample_interval
+
+    @property
+    def elapsed(self):
+        """
+        Simulated seconds run since the fork.
+        """
+        return self.checkpoint.sim_time - self.fork_time
+
+    def advance(self, seconds, dt=SIM_DT):
+        """
+        Run `seconds` more simulated seconds in fixed steps of dt.
+        Returns the forecast frames sampled on the way (frame dicts).
+        """
+        generator = TelemetryGenerator.from_checkpoint(self.checkpoint)
+        buffer = FrameBuffer()
+        frames = []
+        for _ in range(max(1, round(seconds / dt))):
+            generator.step(dt)
+            if self.changed_after is None and self.params and generator.distance >= self.change_distance:
+                apply_params(generator, self.params)
+                self.changed_after = round(generator.sim_time - self.fork_time, 3)
+            while generator.distance >= self.next_lap:
+                self.lap_times.append(round(generator.sim_time - self.lap_start, 3))
+                self.lap_start = generator.sim_time
+                self.next_lap += self.lap_length
+            for tire in generator.tires:
+                if tire.temperature > self.peak_tire_temp:
+                    self.peak_tire_temp = tire.temperature
+                if tire.grip < self.min_grip:
+                    self.min_grip = tire.grip
+            if generator.sim_time >= self.next_sample - TIME_TOLERANCE:
+                frames.append(generator.snapshot_into(buffer).to_frame())
+                self.next_sample += self.sample_interval
+        self.checkpoint = generator.checkpoint()
+        return frames
+
+    def summary(self):
+        """
+        Outcome of the branch so far:
+            laps             Laps completed since the fork (laps start at the fork position)
+            lap_times        Their times (seconds)
+            avg_lap_time     Mean lap time (None before the first lap)
+            distance_m       Meters driven since the fork
+            avg_speed_kmh    Mean speed since the fork
+            final_wear       Most worn tire now (%)
+            peak_tire_temp   Hottest any tire got (C)
+            min_grip         Lowest grip of any tire
+            changed_after    Seconds from the fork to the changes (None: not made yet / no changes)
+        """
+        elapsed = self.elapsed
+        distance = self.checkpoint.state["distance"] - self.fork_distance
+        return {
+            "laps": len(self.lap_times),
+            "lap_times": self.lap_times,
+            "avg_lap_time": round(sum(self.lap_times) / len(self.lap_times), 3) if self.lap_times else None,
+            "distance_m": round(distance, 1),
+            "avg_speed_kmh": round(distance / elapsed * 3.6, 2) if elapsed else 0.0,
+            "final_wear": round(max(tire.wear for tire in self.checkpoint.tires) * 100, 2),
+            "peak_tire_temp": round(self.peak_tire_temp, 1),
+            "min_grip": round(self.min_grip, 3),
+            "changed_after": self.changed_after
+        }
+
+def run_chunk(branch, seconds, dt):
+    """
+    Advance a branch by one chunk. Top-level so it can run in a worker process.
+    Returns (branch, frames): the branch comes back as a copy from a worker process.
+    """
+    frames = branch.advance(seconds, dt)
+    return branch, frames
+
+def _init_worker():
+    # Background work: the server and the sim workers get the CPU first
+    if hasattr(os, "nice"):
+        os.nice(FORECAST_NICE)
+    # Ctrl+C reaches the whole process group: the server shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+class Forecaster:
+    """
+    Forks forecasts from the hub's live cars and runs their branches in the background.
+    """
+
+    def __init__(self, hub, publish=None, workers=FORECAST_WORKERS, metrics=None, max_active=MAX_ACTIVE):
+        """
+        Args:
+            hub: StreamHub holding the live cars
+            publish: Called with every event dict of forecasts started without their own publish
+            workers: Worker processes running branches, started on the first forecast
+                     (0: threads of this process, which compete with the tick loop for the GIL)
+            metrics: Optional Metrics registry (forecast_chunk timer)
+            max_active: Forecasts running at once
+        """
+        self.hub = hub
+        self.publish = publish
+        self.workers = workers
+        self.max_active = max_active
+        self.active = {} # forecast id -> asyncio.Task
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0 # Branches
+        self.sim_seconds = 0.0  # Simulated seconds run by all branches
+        self.chunk_seconds = 0.0 # Wall seconds from submitting chunks to their results
+        self._ids = itertools.count(1)
+        self._pool = None
+        self._timer = metrics.timer("forecast_chunk") if metrics is not None else None
+
+    def _executor(self):
+        if self.workers <= 0:
+            return None # The loop's default thread pool
+        if self._pool is None:
+            # spawn: the server has threads (logger writer)
+            self._pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker)
+        return self._pool
+
+    async def start(self, stream_id, branches=(), horizon=HORIZON_SECONDS, dt=SIM_DT, sample_interval=SAMPLE_INTERVAL,
+                    lap_length=LAP_LENGTH_M, baseline=True, channels=None, publish=None):
+        """
+        Fork a forecast from a live car's current state and start running it.
+
+        Args:
+            stream_id: Live car to fork (in-process or worker-process simulated; not ingested vehicles)
+            branches: List of {"name", "params": {parameter: value}, "in_laps"} (all optional but params)
+            horizon: Simulated seconds each branch runs ahead
+            dt: Physics step of the branches (seconds)
+            sample_interval: Simulated seconds between forecast frames
+            lap_length: Lap length (meters) for in_laps and the lap times
+            baseline: Add a BASELINE branch without changes
+            channels: Top-level frame keys to keep in forecast frames (None: all)
+            publish: Called with this forecast's events (None: the Forecaster's publish)
+        Returns:
+            {"forecast", "stream", "fork_timestamp", "horizon", "branches"}
+        Raises:
+            ValueError: Unknown or unforkable stream, invalid branches or settings, too many forecasts running
+            TimeoutError: A worker-process car's state could not be fetched
+        """
+        horizon, dt, sample_interval, lap_length = float(horizon), float(dt), float(sample_interval), float(lap_length)
+        if not 0.0 < horizon <= MAX_HORIZON_SECONDS:
+            raise ValueError(f"Invalid horizon: {horizon}. Valid: (0, {MAX_HORIZON_SECONDS:g}] seconds")
+        if not 0.0 < dt <= min(sample_interval, 1.0) or not math.isfinite(sample_interval):
+            raise ValueError(f"Invalid dt / sample_interval: {dt}, {sample_interval}. Valid: 0 < dt <= sample_interval, dt <= 1")
+        if not lap_length > 0.0:
+            raise ValueError("lap_length must be positive")
+        if not isinstance(branches, (list, tuple)) or len(branches) + bool(baseline) > MAX_BRANCHES:
+            raise ValueError(f"branches must be a list (at most {MAX_BRANCHES} branches, baseline included)")
+        if len(self.active) >= self.max_active:
+            raise ValueError(f"Too many forecasts running (max {self.max_active}): cancel one first")
+        stream = self.hub.get(stream_id)
+        if stream is None or stream.kind != "live" or not hasattr(stream, "checkpoint"):
+            raise ValueError(f"Not a simulated live car: {stream_id}")
+        specs = self._parse_branches(branches, baseline)
+
+        checkpoint = await stream.checkpoint()
+        if checkpoint is None:
+            raise ValueError(f"Not a simulated live car: {stream_id}")
+        forked = []
+        for name, params, in_laps in specs:
+            # Fail fast on bad parameter names / values instead of in a worker
+            try:
+                generator = TelemetryGenerator.from_checkpoint(checkpoint)
+                apply_params(generator, params)
+                generator.step(dt)
+            except (TypeError, ValueError, KeyError) as e:
+                raise ValueError(f"Branch {name}: {e}")
+            forked.append(Branch(name, checkpoint, params, in_laps, lap_length, sample_interval))
+
+        forecast_id = f"forecast_{next(self._ids)}"
+        info = {
+            "forecast": forecast_id,
+            "stream": stream_id,
+            "fork_timestamp": checkpoint.timestamp,
+            "horizon": horizon,
+            "branches": [branch.name for branch in forked]
+        }
+        channels = tuple(channels) if channels else None
+        publish = publish or self.publish
+        self.active[forecast_id] = asyncio.create_task(self._run(info, forked, horizon, dt, channels, publish))
+        self.started += 1
+        logger.info(f"Forecast {forecast_id} forked from {stream_id} at {checkpoint.sim_time:.1f} s: "
+                    f"{len(forked)} branches, {horizon:g} s ahead")
+        return info
+
+    @staticmethod
+    def _parse_branches(branches, baseline):
+        """
+        Branch requests -> [(name, params, in_laps)], baseline first.
+        """
+        specs = [(BASELINE, {}, 0.0)] if baseline else []
+        for i, branch in enumerate(branches):
+            if not isinstance(branch, dict) or not isinstance(branch.get("params", {}), dict):
+                raise ValueError(f"Branch {i}: expected {{\"name\", \"params\": {{...}}, \"in_laps\"}}")
+            name = str(branch.get("name") or f"branch_{i + 1}")
+            in_laps = float(branch.get("in_laps", 0.0))
+            if not 0.0 <= in_laps < math.inf:
+                raise ValueError(f"Branch {name}: in_laps must be >= 0")
+            params = branch.get("params", {})
+            for key, value in params.items():
+                # apply_params() only checks the names: a string would fail later, in a worker
+                if key != "compound" and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                    raise ValueError(f"Branch {name}: {key} must be a number")
+            specs.append((name, params, in_laps))
+        names = [name for name, _, _ in specs]
+        if not names:
+            raise ValueError("No branches to run")
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate branch names: {names}")
+        return specs
+
+    async def _run(self, info, branches, horizon, dt, channels, publish):
+        forecast_id = info["forecast"]
+        try:
+            await asyncio.gather(*(self._run_branch(info, branch, horizon, dt, channels, publish)
+                                   for branch in branches))
+            self.completed += 1
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            publish({"type": "forecast", "forecast": forecast_id, "stream": info["stream"], "branch": None,
+                          "status": CANCELLED})
+            raise
+        finally:
+            self.active.pop(forecast_id, None)
+
+    async def _run_branch(self, info, branch, horizon, dt, channels, publish):
+        loop = asyncio.get_running_loop()
+        event = {"type": "forecast", "forecast": info["forecast"], "stream": info["stream"], "branch": branch.name}
+        while True:
+            seconds = min(CHUNK_SECONDS, horizon - branch.elapsed)
+            began = time.perf_counter()
+            try:
+                branch, frames = await loop.run_in_executor(self._executor(), run_chunk, branch, seconds, dt)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._pool = None # A worker died: the next chunk starts a new pool
+                logger.warning(f"Forecast {info['forecast']} branch {branch.name} failed: {e}")
+                self.failed += 1
+                publish(dict(event, status=FAILED, message=str(e)))
+                return
+            elapsed = time.perf_counter() - began
+            self.sim_seconds += seconds
+            self.chunk_seconds += elapsed
+            if self._timer is not None:
+                self._timer.record(elapsed)
+
+            done = branch.elapsed >= horizon - TIME_TOLERANCE
+            update = dict(event, status=DONE if done else RUNNING, progress=round(min(1.0, branch.elapsed / horizon), 3),
+                          frames=[filter_channels(frame, channels) for frame in frames])
+            if done:
+                update["summary"] = branch.summary()
+            publish(update)
+            if done:
+                return
+
+    def cancel(self, forecast_id):
+        """
+        Stop a running forecast (its workers finish their current chunk, which is dropped).
+        Returns False if no such forecast is running.
+        """
+        task = self.active.get(forecast_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def stats(self):
+        return {
+            "active": sorted(self.active),
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "branches_failed": self.failed,
+            "workers": self.workers,
+            "sim_seconds": round(self.sim_seconds, 1),
+            # Simulated seconds per wall second of a branch chunk (queueing included)
+            "speedup": round(self.sim_seconds / self.chunk_seconds, 1) if self.chunk_seconds else None
+        }
+
+    def close(self):
+        for task in self.active.values():
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
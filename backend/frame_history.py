@@ -0,0 +1,269 @@
+"""
+Recent frames of every live stream, in memory.
+
+Each stream keeps a bounded ring of its last frames as quantized integers
+(frame_schema.quantize_values: one int32 per channel, timestamps as float64),
+about 116 bytes per frame. The ring serves, without touching SQLite:
+
+- rewind: snapshot() freezes the last N seconds into a HistorySnapshot,
+  which PlaybackStream replays like a recorded session (speed, pause, seek)
+- backfill: columns() gives a late joiner the recent past of a stream as
+  per-channel arrays, so its charts fill immediately
+- windowed stats: stats() over the last N seconds
+
+A stream's history restarts when its session changes (car reset), like its
+anomaly detectors.
+"""
+
+import struct
+
+import numpy as np
+
+from frame_schema import (CHANNELS, CHANNEL_INDEX, COMPOUND_NAMES, TIME, FLOAT, BOOL, COMPOUND, FrameBuffer,
+                          quantize_values, dequantize_values, flatten_frame, get_channel)
+from session_archive import ArchivePlaybackReader
+
+# Seconds of history kept per stream (at the publish rate)
+HISTORY_SECONDS = 300.0
+# Points per channel in a backfill burst (evenly decimated)
+BACKFILL_MAX_POINTS = 600
+
+# Quantized values are stored as int32; the smallest one stands for None
+NULL = np.iinfo(np.int32).min
+_ROW = struct.Struct(f"<{len(CHANNELS) - 1}i")
+
+class StreamHistory:
+    """
+    Ring of the last `capacity` frames of one stream.
+    """
+
+    def __init__(self, capacity, session_id=None):
+        self.capacity = max(1, int(capacity))
+        self.session_id = session_id
+        self.timestamps = np.zeros(self.capacity)
+        self.data = np.zeros((self.capacity, len(CHANNELS) - 1), dtype=np.int32)
+        self._rows = memoryview(self.data).cast("B") # Rows are packed straight into the array
+        self.count = 0 # Frames held (at most capacity)
+        self._next = 0 # Row the next frame goes to
+        self._quantized = [None] * len(CHANNELS)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self, session_id=None):
+        self.session_id = session_id
+        self.count = 0
+        self._next = 0
+
+    def append(self, values):
+        """
+        Add a frame (channel values in CHANNELS order, e.g. FrameBuffer.values).
+        """
+        quantized = quantize_values(values, self._quantized)
+        if None in quantized:
+            quantized = [NULL if value is None else value for value in quantized]
+        row = self._next
+        self.timestamps[row] = quantized[0]
+        _ROW.pack_into(self._rows, row * _ROW.size, *quantized[1:])
+        self._next = (row + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _order(self, seconds=None):
+        """
+        Row indices of the last `seconds`, oldest first.
+        """
+        # [_next, capacity) then [0, _next) once the ring has wrapped
+        first = self._next if self.count == self.capacity else 0
+        order = (np.arange(self.count) + first) % self.capacity
+        if seconds is not None and self.count:
+            timestamps = self.timestamps[order]
+            order = order[np.searchsorted(timestamps, timestamps[-1] - seconds, side="left"):]
+        return order
+
+    def window(self, seconds=None):
+        """
+        Frames of the last `seconds` (of recorded time, up to the newest frame), oldest first.
+
+        Returns:
+            (timestamps (n,), quantized values (n, len(CHANNELS) - 1)): copies
+        """
+        order = self._order(seconds)
+        return self.timestamps[order], self.data[order]
+
+    def snapshot(self, seconds=None):
+        """
+        Freeze the last `seconds` into a HistorySnapshot (for replay).
+        """
+        timestamps, data = self.window(seconds)
+        return HistorySnapshot(self.session_id, timestamps, data)
+
+    def columns(self, channels, seconds=None, max_points=BACKFILL_MAX_POINTS):
+        """
+        Recent values of some channels as plain lists (None for missing), evenly decimated to max_points.
+
+        Returns:
+            {"timestamp": [...], "channels": {name: [...]}}
+        """
+        order = self._order(seconds)
+        if max_points and len(order) > max_points:
+            order = order[np.linspace(0, len(order) - 1, max_points).round().astype(np.intp)]
+        data = self.data[order]
+        return {
+            "timestamp": self.timestamps[order].tolist(),
+            "channels": {name: _to_values(name, data) for name in channels}
+        }
+
+    def stats(self, channels, seconds=None):
+        """
+        Per-channel min / max / mean / last over the last `seconds`.
+
+        Returns:
+            {"start", "end", "frames", "channels": {name: {"min", "max", "mean", "last", "samples"}}}
+        """
+        order = self._order(seconds)
+        timestamps = self.timestamps[order]
+        result = {
+            "start": float(timestamps[0]) if len(timestamps) else None,
+            "end": float(timestamps[-1]) if len(timestamps) else None,
+            "frames": len(timestamps),
+            "channels": {}
+        }
+        for name in channels:
+            channel = get_channel(name)
+            if channel.kind in (TIME, COMPOUND):
+                raise ValueError(f"No stats for channel: {name}")
+            column = self.data[order, CHANNEL_INDEX[name] - 1] # Only this channel's values are gathered
+            valid = column[column != NULL].astype(np.float64) / channel.scale
+            if not len(valid):
+                result["channels"][name] = {"min": None, "max": None, "mean": None, "last": None, "samples": 0}
+                continue
+            result["channels"][name] = {
+                "min": float(valid.min()),
+                "max": float(valid.max()),
+                "mean": round(float(valid.mean()), channel.decimals + 2 if channel.kind == FLOAT else 4),
+                "last": float(valid[-1]),
+                "samples": len(valid)
+            }
+        return result
+
+def _to_values(name, data):
+    channel = get_channel(name)
+    if channel.kind == TIME:
+        raise ValueError("timestamp is always included")
+    column = data[:, CHANNEL_INDEX[name] - 1].tolist()
+    if channel.kind == FLOAT:
+        scale = channel.scale
+        return [None if value == NULL else value / scale for value in column]
+    if channel.kind == BOOL:
+        return [None if value == NULL else bool(value) for value in column]
+    if channel.kind == COMPOUND:
+        return [COMPOUND_NAMES[value] if 0 <= value < len(COMPOUND_NAMES) else None for value in column]
+    return [None if value == NULL else value for value in column]
+
+class HistorySnapshot:
+    """
+    Frozen recent frames of a stream, replayable by PlaybackStream in place of
+    the TelemetryLogger (same get_session / iter_playback / frame_reader calls).
+    """
+
+    def __init__(self, session_id, timestamps, data):
+        self.session_id = session_id
+        self.timestamps = timestamps
+        self.data = data
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def get_session(self, session_id):
+        if session_id != self.session_id:
+            return None
+        empty = not len(self.timestamps)
+        return {
+            "id": self.session_id,
+            "start_time": None if empty else float(self.timestamps[0]),
+            "end_time": None if empty else float(self.timestamps[-1]),
+            "frame_count": len(self.timestamps)
+        }
+
+    def latest_session_id(self, include_active=False, flush=True):
+        return self.session_id
+
+    def index_at(self, timestamp):
+        return int(np.searchsorted(self.timestamps, timestamp, side="left"))
+
+    def frames_from(self, index, count):
+        """
+        Frame dicts index..index+count-1.
+        """
+        frames = []
+        for i in range(index, min(index + count, len(self.timestamps))):
+            values = self.data[i].tolist()
+            for j, value in enumerate(values):
+                if value == NULL:
+                    values[j] = None
+            frame = dequantize_values([None] + values)
+            frame["timestamp"] = float(self.timestamps[i])
+            frames.append(frame)
+        return frames
+
+    def iter_playback(self, session_id=None, offset=0.0, chunk_size=600, prefetch=None, flush=True):
+        start = float(self.timestamps[0]) + max(0.0, offset) if len(self.timestamps) else None
+        return ArchivePlaybackReader(self, start, chunk_size)
+
+    def read_frame(self, session_id, timestamp):
+        """
+        First frame at or after `timestamp`, or None past the end.
+        """
+        frames = self.frames_from(self.index_at(timestamp), 1)
+        return frames[0] if frames else None
+
+    def frame_reader(self, session_id, flush=True):
+        return lambda timestamp: self.read_frame(session_id, timestamp)
+
+class FrameHistory:
+    """
+    StreamHistory of every live stream, fed with each published frame.
+    """
+
+    def __init__(self, seconds=HISTORY_SECONDS, rate=60):
+        """
+        Args:
+            seconds: History kept per stream
+            rate: Frames per second the streams publish (sizes the rings)
+        """
+        self.seconds = seconds
+        self.capacity = max(1, int(round(seconds * rate)))
+        self._streams = {} # stream_id -> StreamHistory
+
+    def record(self, stream, frame):
+        """
+        Add a stream's frame (FrameBuffer or frame dict). A new session restarts the stream's history.
+        """
+        history = self._streams.get(stream.stream_id)
+        if history is None:
+            history = self._streams[stream.stream_id] = StreamHistory(self.capacity, stream.session_id)
+        elif history.session_id != stream.session_id:
+            history.clear(stream.session_id)
+        history.append(frame.values if isinstance(frame, FrameBuffer) else flatten_frame(frame))
+
+    def get(self, stream_id, session_id=None):
+        """
+        A stream's history (None if it has recorded nothing). Given the stream's current
+        session_id, a history left over from an earlier session is cleared first.
+        """
+        history = self._streams.get(stream_id)
+        if history is not None and session_id is not None and history.session_id != session_id:
+            history.clear(session_id)
+        return history
+
+    def remove(self, stream_id):
+        self._streams.pop(stream_id, None)
+
+    def stats(self):
+        return {
+            "seconds": self.seconds,
+            "capacity": self.capacity,
+            "streams": {stream_id: len(history) for stream_id, history in self._streams.items()},
+            "bytes": sum(h.timestamps.nbytes + h.data.nbytes for h in self._streams.values())
+        }
@@ -0,0 +1,280 @@
+"""
+Flat channel layout of a telemetry frame.
+
+get_next_frame() produces a nested dict (a `tires` list and an `aero` dict).
+Storage engines and encoders work on the flat form instead: one value per
+channel, always in CHANNELS order. The `decimals` of a channel is the
+precision the generator rounds it to, so values can be stored as scaled
+integers without losing anything.
+"""
+
+from physics_engine import TireModel
+
+# Tire order in the frame's `tires` list
+TIRE_POSITIONS = ("fl", "fr", "rl", "rr")
+
+# Compound names <-> small integer codes
+COMPOUND_NAMES = tuple(TireModel.COMPOUNDS.keys())
+COMPOUND_CODES = {name: code for code, name in enumerate(COMPOUND_NAMES)}
+
+# Channel kinds
+TIME = "time"         # Raw float (seconds since epoch)
+FLOAT = "float"       # Float rounded to `decimals`
+INT = "int"
+BOOL = "bool"
+COMPOUND = "compound" # Tire compound name, stored as its code
+
+class Channel:
+    __slots__ = ("name", "kind", "decimals", "scale")
+
+    def __init__(self, name, kind, decimals=None):
+        self.name = name
+        self.kind = kind
+        self.decimals = decimals
+        # Fixed-point scale for FLOAT channels (value * scale is an integer)
+        self.scale = 10 ** decimals if kind == FLOAT else 1
+
+    def __repr__(self):
+        return f"Channel({self.name!r}, {self.kind!r}, {self.decimals!r})"
+
+def _build_channels():
+    channels = [
+        Channel("timestamp", TIME),
+        Channel("speed_kmh", FLOAT, 2),
+        Channel("rpm", FLOAT, 0),
+        Channel("gear", INT),
+        Channel("throttle", FLOAT, 2),
+        Channel("brake", FLOAT, 2),
+        Channel("steering", FLOAT, 2),
+        Channel("engine_temp", FLOAT, 1),
+        Channel("is_anomaly", BOOL),
+    ]
+    for pos in TIRE_POSITIONS:
+        channels += [
+            Channel(f"tire_{pos}_compound", COMPOUND),
+            Channel(f"tire_{pos}_temp", FLOAT, 1),
+            Channel(f"tire_{pos}_wear", FLOAT, 1),
+            Channel(f"tire_{pos}_grip", FLOAT, 2),
+        ]
+    channels += [
+        Channel("aero_drs", BOOL),
+        Channel("aero_drag", FLOAT, 0),
+        Channel("aero_downforce", FLOAT, 0),
+    ]
+    return tuple(channels)
+
+CHANNELS = _build_channels()
+CHANNEL_NAMES = tuple(c.name for c in CHANNELS)
+CHANNEL_INDEX = {c.name: i for i, c in enumerate(CHANNELS)}
+
+# Offsets of the nested groups inside the flat layout
+TIRE_BASE = CHANNEL_INDEX["tire_fl_compound"]
+AERO_BASE = CHANNEL_INDEX["aero_drs"]
+
+# Keys of a tire status dict, in the order of the per-tire channels
+TIRE_FIELDS = ("compound", "temp", "wear", "grip")
+AERO_FIELDS = ("drs", "drag", "downforce")
+
+def get_channel(name):
+    try:
+        return CHANNELS[CHANNEL_INDEX[name]]
+    except KeyError:
+        raise ValueError(f"Invalid channel: {name}. Valid: {list(CHANNEL_NAMES)}")
+
+def flatten_frame(frame):
+    """
+    Nested frame dict -> list of channel values (CHANNELS order).
+    Missing fields become None.
+    """
+    values = [
+        frame.get("timestamp"),
+        frame.get("speed_kmh"),
+        frame.get("rpm"),
+        frame.get("gear"),
+        frame.get("throttle"),
+        frame.get("brake"),
+        frame.get("steering"),
+        frame.get("engine_temp"),
+        frame.get("is_anomaly"),
+    ]
+    tires = frame.get("tires") or ()
+    for i in range(len(TIRE_POSITIONS)):
+        tire = tires[i] if i < len(tires) else {}
+        values += [tire.get("compound"), tire.get("temp"), tire.get("wear"), tire.get("grip")]
+    aero = frame.get("aero") or {}
+    values += [aero.get("drs"), aero.get("drag"), aero.get("downforce")]
+    return values
+
+def unflatten_frame(values):
+    """
+    List of channel values (CHANNELS order) -> nested frame dict, the same
+    shape TelemetryGenerator.get_next_frame() returns.
+    """
+    tires = []
+    for i in range(len(TIRE_POSITIONS)):
+        base = TIRE_BASE + i * len(TIRE_FIELDS)
+        tires.append({
+            "compound": values[base],
+            "temp": values[base + 1],
+            "wear": values[base + 2],
+            "grip": values[base + 3],
+        })
+    return {
+        "timestamp": values[0],
+        "speed_kmh": values[1],
+        "rpm": values[2],
+        "gear": values[3],
+        "throttle": values[4],
+        "brake": values[5],
+        "steering": values[6],
+        "engine_temp": values[7],
+        "is_anomaly": values[8],
+        "tires": tires,
+        "aero": {
+            "drs": values[AERO_BASE],
+            "drag": values[AERO_BASE + 1],
+            "downforce": values[AERO_BASE + 2],
+        }
+    }
+
+def quantize(channel, value):
+    """
+    Channel value -> integer (or float for TIME) storage form. None stays None.
+    """
+    if value is None:
+        return None
+    kind = channel.kind
+    if kind == FLOAT:
+        return int(round(value * channel.scale))
+    if kind == BOOL or kind == INT:
+        return int(value)
+    if kind == COMPOUND:
+        return COMPOUND_CODES.get(value, -1)
+    return value
+
+def dequantize(channel, stored):
+    """
+    Inverse of quantize().
+    """
+    if stored is None:
+        return None
+    kind = channel.kind
+    if kind == FLOAT:
+        return stored / channel.scale
+    if kind == BOOL:
+        return bool(stored)
+    if kind == COMPOUND:
+        return COMPOUND_NAMES[stored] if 0 <= stored < len(COMPOUND_NAMES) else None
+    return stored
+
+# Channel indexes by kind, for the whole-frame (de)quantizers below
+_FLOAT_SCALES = tuple((i, c.scale) for i, c in enumerate(CHANNELS) if c.kind == FLOAT)
+_INT_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == INT or c.kind == BOOL)
+_BOOL_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == BOOL)
+_COMPOUND_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == COMPOUND)
+
+def quantize_frame(frame):
+    """
+    Nested frame dict -> list of quantized channel values (CHANNELS order).
+    Same result as quantize() per channel, unrolled by kind for speed.
+    Two frames that quantize equal are equal at the precision the generator reports.
+    """
+    return quantize_values(flatten_frame(frame))
+
+def quantize_values(values, out=None):
+    """
+    Channel values (CHANNELS order) -> quantized values, into `out` if given (else a new list).
+    """
+    if out is None:
+        out = list(values)
+    else:
+        out[:] = values
+    for i, scale in _FLOAT_SCALES:
+        value = out[i]
+        if value is not None:
+            out[i] = round(value * scale)
+    for i in _INT_INDEXES:
+        value = out[i]
+        if value is not None:
+            out[i] = int(value)
+    for i in _COMPOUND_INDEXES:
+        value = out[i]
+        if value is not None:
+            out[i] = COMPOUND_CODES.get(value, -1)
+    return out
+
+def dequantize_values(values):
+    """
+    Inverse of quantize_frame().
+    """
+    values = list(values)
+    for i, scale in _FLOAT_SCALES:
+        stored = values[i]
+        if stored is not None:
+            values[i] = stored / scale
+    for i in _BOOL_INDEXES:
+        stored = values[i]
+        if stored is not None:
+            values[i] = bool(stored)
+    for i in _COMPOUND_INDEXES:
+        stored = values[i]
+        if stored is not None:
+            values[i] = COMPOUND_NAMES[stored] if 0 <= stored < len(COMPOUND_NAMES) else None
+    return unflatten_frame(values)
+
+def aggregate_frames(frames):
+    """
+    Consecutive frame dicts -> one frame summarizing them (fast-forward playback).
+    FLOAT channels are averaged (at their precision), BOOL channels are true if
+    they were in any frame, everything else (timestamp, gear, compounds) comes
+    from the last frame.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    rows = [flatten_frame(frame) for frame in frames]
+    values = list(rows[-1])
+    for i, scale in _FLOAT_SCALES:
+        samples = [row[i] for row in rows if row[i] is not None]
+        if samples:
+            values[i] = round(sum(samples) / len(samples) * scale) / scale
+    for i in _BOOL_INDEXES:
+        if values[i] is not None:
+            values[i] = any(row[i] for row in rows)
+    return unflatten_frame(values)
+
+class FrameBuffer:
+    """
+    One frame as flat channel values (CHANNELS order), reused from frame to frame.
+
+    TelemetryGenerator.snapshot_into() overwrites `values` in place, so building
+    a frame allocates no containers. Encoders read the values directly; to_frame()
+    builds the nested dict only for consumers that need one (JSON clients).
+    Anything kept past the next frame must take snapshot(), not the buffer.
+    """
+    __slots__ = ("values", "quantized_values")
+
+    def __init__(self):
+        self.values = [None] * len(CHANNELS)
+        self.quantized_values = [None] * len(CHANNELS)
+
+    @property
+    def timestamp(self):
+        return self.values[0]
+
+    def snapshot(self):
+        """
+        Immutable copy of the current values (e.g. for TelemetryLogger.log()).
+        """
+        return tuple(self.values)
+
+    def quantized(self):
+        """
+        Quantized values, written into a list owned by the buffer (valid until the next call).
+        """
+        return quantize_values(self.values, self.quantized_values)
+
+    def to_frame(self):
+        """
+        Nested frame dict (the get_next_frame() shape), freshly allocated.
+        """
+        return unflatten_frame(self.values)
@@ -0,0 +1,563 @@
+"""
+External telemetry ingest: real cars and data loggers push frames into the
+server, which records and publishes them like simulated cars.
+
+Producers send batches of frames, per vehicle:
+
+- over WebSocket, on the INGEST_PATH of the server's port, as JSON text
+  {"vehicle": "truck_7", "seq": 42, "frames": [frame, ...]} or as binary
+  MSG_BATCH messages (wire_protocol; the stream id is the vehicle id).
+  Every batch is answered in order with {"type": "ack", "vehicle", "accepted",
+  "rejected", "errors": {reason: count}, "queue"} (plus "seq" if given), or
+  {"type": "error", "message"} if the whole batch was refused.
+- over UDP (server --ingest-udp-port), one batch per datagram, same formats.
+  No acks; frames are dropped while the server is saturated.
+
+A frame is the nested dict get_next_frame() returns, or a flat dict of
+frame_schema channel names. Only the timestamp is required; missing channels
+are recorded as missing. Frames are normalized to the generator's precision
+and rejected if a channel is implausible (LIMITS), of the wrong type, or not
+newer than the vehicle's previous frame (batches may be out of order, they
+are sorted first).
+
+Each vehicle is a live stream (IngestStream) named after it, created by its
+first batch: every accepted frame is logged in bulk and the newest one is
+published on the next tick, so viewers, anomaly detection and the in-memory
+history see it exactly like a simulated car.
+
+Backpressure: once the logger's write queue reaches HIGH_WATER, the server
+tells WebSocket producers {"type": "backpressure", "paused": true} and stops
+reading their sockets (TCP pushes back) until the queue is down to LOW_WATER,
+then sends "paused": false. UDP producers get a rate-limited backpressure
+datagram with a retry hint instead.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import re
+import struct
+import time
+from collections import Counter
+from operator import itemgetter
+
+import numpy as np
+import websockets
+
+from frame_schema import (CHANNELS, CHANNEL_NAMES, TIRE_POSITIONS, COMPOUND_NAMES, COMPOUND_CODES, FLOAT, BOOL,
+                          COMPOUND, FrameBuffer, flatten_frame)
+from wire_protocol import BODY, MISSING, describe_layout, batch_body
+
+logger = logging.getLogger("TelemetryIngest")
+
+# WebSocket path producers connect to (viewers use any other path)
+INGEST_PATH = "/ingest"
+
+# Frames per batch, vehicles per server
+MAX_BATCH = 1000
+MAX_VEHICLES = 1000
+
+VEHICLE_ID = re.compile(r"[A-Za-z0-9_.:-]{1,64}")
+# Stream ids the server hands out itself (one playback stream per viewer)
+RESERVED_PREFIXES = ("playback_",)
+
+# Logger write queue fill (fraction of max_queue) that pauses producers, and resumes them.
+# HIGH_WATER leaves room for a full batch on top of it with the default queue size.
+HIGH_WATER = 0.75
+LOW_WATER = 0.5
+# How often a paused producer checks the queue again, and hint/limit for UDP notices (seconds)
+BACKPRESSURE_POLL = 0.01
+UDP_NOTICE_INTERVAL = 0.1
+UDP_NOTICE_MAX_ADDRESSES = 1024
+
+# Plausible range per channel: bounds of real cars, not of the simulation. A value outside rejects the frame.
+LIMITS = {
+    "speed_kmh": (0.0, 500.0),
+    "rpm": (0.0, 25000.0),
+    "gear": (-1, 10),
+    "throttle": (0.0, 1.0),
+    "brake": (0.0, 1.0),
+    "steering": (-1.0, 1.0),
+    "engine_temp": (-50.0, 400.0),
+    "aero_drag": (0.0, 100000.0),
+    "aero_downforce": (-100000.0, 100000.0),
+}
+for _pos in TIRE_POSITIONS:
+    LIMITS[f"tire_{_pos}_temp"] = (-50.0, 400.0)
+    LIMITS[f"tire_{_pos}_wear"] = (0.0, 100.0)
+    LIMITS[f"tire_{_pos}_grip"] = (0.0, 5.0)
+
+# (name, kind, decimals, low, high) of every channel but the timestamp
+_CHECKS = tuple((c.name, c.kind, c.decimals) + LIMITS.get(c.name, (None, None)) for c in CHANNELS[1:])
+
+# Binary batch body as a numpy record (same layout as wire_protocol.BODY)
+_BODY_DTYPE = np.dtype([(field["name"], "<" + field["format"]) for field in describe_layout()])
+assert _BODY_DTYPE.itemsize == BODY.size
+# Compound code -> name; code -1 (missing) picks the trailing None
+_COMPOUND_LOOKUP = np.array(COMPOUND_NAMES + (None,), dtype=object)
+
+STALE = "timestamp: not after the previous frame"
+
+# Python types a JSON value may have, per channel kind (None: missing)
+_NONE = type(None)
+_NUMERIC_TYPES = frozenset((int, float, _NONE))
+_BOOL_TYPES = frozenset((bool, int, float, _NONE))
+
+def frame_values(frame):
+    """
+    Nested frame dict (get_next_frame() shape) or flat dict of channel names -> channel values.
+    """
+    if "tires" in frame or "aero" in frame:
+        return flatten_frame(frame)
+    return [frame.get(name) for name in CHANNEL_NAMES]
+
+def _json_column(values, allowed):
+    """
+    One channel's JSON values -> (float array, mask of missing values or None, mask of wrong types or None).
+    """
+    types = set(map(type, values))
+    wrong = None
+    if not types <= allowed:
+        wrong = np.fromiter((type(v) not in allowed for v in values), bool, len(values))
+        values = [None if w else v for v, w in zip(values, wrong.tolist())]
+        types = allowed
+    missing = np.fromiter((v is None for v in values), bool, len(values)) if _NONE in types else None
+    try:
+        column = np.array(values, dtype=float)
+    except OverflowError:
+        # An integer beyond float range: infinite, so the range checks reject it
+        column = np.array([_as_float(v) for v in values], dtype=float)
+    return column, missing, wrong
+
+def _as_float(value):
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except OverflowError:
+        return math.inf if value > 0 else -math.inf
+
+def parse_frames(frames, rejected):
+    """
+    Frame dicts -> normalized value tuples. Invalid frames are counted in `rejected` (reason -> count).
+    """
+    rows = []
+    for frame in frames:
+        try:
+            rows.append(frame_values(frame))
+        except (AttributeError, TypeError, LookupError): # e.g. "tires" not a list of tire objects
+            rejected["malformed frame"] += 1
+    if not rows:
+        return []
+    channels = list(zip(*rows))
+    columns = [_json_column(channels[0], _NUMERIC_TYPES)]
+    for (_, kind, _, _, _), values in zip(_CHECKS, channels[1:]):
+        if kind == COMPOUND:
+            # Name -> code; -1 missing, -2 unknown (rejected by the range check)
+            codes = [COMPOUND_CODES.get(v, -2) if type(v) is str else -1 if v is None else -2 for v in values]
+            codes = np.array(codes, dtype=float)
+            columns.append((codes, codes == -1, None))
+        else:
+            columns.append(_json_column(values, _BOOL_TYPES if kind == BOOL else _NUMERIC_TYPES))
+    return _validate(columns, len(rows), rejected)
+
+def parse_batch(body, count, rejected):
+    """
+    Packed wire bodies (wire_protocol.batch_body()) -> normalized value tuples.
+    Invalid frames are counted in `rejected` (reason -> count).
+    """
+    frames = np.frombuffer(body, _BODY_DTYPE, count)
+    columns = [(frames["timestamp"], None, None)]
+    for (name, kind, _, _, _), channel in zip(_CHECKS, CHANNELS[1:]):
+        raw = frames[name]
+        if kind == FLOAT:
+            columns.append((raw / channel.scale, raw == MISSING, None))
+        elif kind == COMPOUND:
+            columns.append((raw.astype(float), raw == -1, None))
+        else:
+            columns.append((raw.astype(float), None, None))
+    return _validate(columns, count, rejected)
+
+def _validate(columns, count, rejected):
+    """
+    Check a batch one channel at a time and build its rows.
+
+    Args:
+        columns: Per channel (CHANNELS order): (float values, missing mask or None, wrong type mask or None)
+        count: Frames in the batch
+        rejected: Counter of rejection reasons, updated
+    Returns:
+        Value tuples of the valid frames, FLOAT channels rounded to their precision
+    """
+    bad = np.zeros(count, dtype=bool)
+    everywhere = np.ones(count, dtype=bool)
+
+    def reject(invalid, reason):
+        new = invalid & ~bad
+        n = int(np.count_nonzero(new))
+        if n:
+            rejected[reason] += n
+            bad[new] = True
+
+    timestamps = columns[0][0] # Missing or of the wrong type: NaN
+    reject(~((timestamps > 0.0) & (timestamps < math.inf)), "timestamp: missing or invalid")
+    out = [timestamps.tolist()]
+    with np.errstate(invalid="ignore"):
+        for (name, kind, _, low, high), (values, missing, wrong), channel in zip(_CHECKS, columns[1:], CHANNELS[1:]):
+            present = ~missing if missing is not None else everywhere
+            if kind == BOOL:
+                if wrong is not None:
+                    reject(wrong, f"{name}: not a boolean")
+                reject(present & (values != 0.0) & (values != 1.0), f"{name}: not a boolean")
+                column = (values != 0.0).tolist()
+            elif kind == COMPOUND:
+                invalid = present & ~((values >= 0) & (values < len(COMPOUND_NAMES)) & (values == np.floor(values)))
+                reject(invalid, f"{name}: unknown compound")
+                codes = np.where(invalid | ~present, -1, values).astype(np.intp)
+                out.append(_COMPOUND_LOOKUP[codes].tolist()) # Missing: None already
+                continue
+            else:
+                if wrong is not None:
+                    reject(wrong, f"{name}: not a number")
+                reject(present & ~((values >= low) & (values <= high)), f"{name}: out of range") # NaN too
+                if kind == FLOAT:
+                    column = (np.rint(values * channel.scale) / channel.scale).tolist()
+                else:
+                    reject(present & (values != np.floor(values)), f"{name}: not an integer")
+                    column = np.where(bad | ~present, 0, values).astype(np.int64).tolist()
+            if missing is not None and missing.any():
+                for i in np.flatnonzero(missing).tolist():
+                    column[i] = None
+            out.append(column)
+    rows = list(zip(*out))
+    if bad.any():
+        rows = [row for row, invalid in zip(rows, bad.tolist()) if not invalid]
+    return rows
+
+def in_order(rows, last_timestamp, rejected):
+    """
+    Sort normalized rows by timestamp and drop the ones not after their predecessor
+    (duplicates, or older than `last_timestamp`, the vehicle's newest frame so far).
+    """
+    previous = -math.inf if last_timestamp is None else last_timestamp
+    ordered = all(b[0] > a[0] for a, b in zip(rows, rows[1:]))
+    if ordered and (not rows or rows[0][0] > previous):
+        return rows
+    if not ordered:
+        rows = sorted(rows, key=itemgetter(0))
+    accepted = []
+    for row in rows:
+        if row[0] > previous:
+            accepted.append(row)
+            previous = row[0]
+    if len(accepted) < len(rows):
+        rejected[STALE] += len(rows) - len(accepted)
+    return accepted
+
+class IngestStream:
+    """
+    A vehicle pushing its own telemetry (the simulated counterpart is streams.LiveStream).
+
+    push() logs every accepted frame at once; next_frame() publishes the newest
+    frame pushed since the previous tick (viewers get the publish rate, the
+    database gets every frame).
+    """
+    kind = "live"
+
+    def __init__(self, stream_id, db_logger):
+        self.stream_id = stream_id
+        self.db_logger = db_logger
+        self.session_id = db_logger.open_session(stream_id)
+        self.subscribers = set()
+        self.buffer = FrameBuffer()
+        self.latest = None
+        self.last_timestamp = None # Newest frame accepted in this session
+        self.frames_received = 0
+        self._newest = None        # Newest frame not published yet
+
+    def push(self, rows):
+        """
+        Record normalized frames (in timestamp order, all newer than last_timestamp).
+        """
+        self.db_logger.log_many(rows, self.session_id)
+        self._newest = rows[-1]
+        self.last_timestamp = rows[-1][0]
+        self.frames_received += len(rows)
+
+    async def next_frame(self, steps=None, physics_dt=None):
+        """
+        Args:
+            steps, physics_dt: Ignored (the producer keeps its own clock)
+        Returns:
+            The stream's FrameBuffer holding the newest frame, or None if nothing arrived since the last call
+        """
+        newest = self._newest
+        if newest is None:
+            return None
+        self._newest = None
+        self.buffer.values[:] = newest
+        self.latest = self.buffer
+        return self.buffer
+
+    def reset(self):
+        """
+        Record from here on into a fresh session (the producer's clock may restart too).
+        """
+        self.db_logger.close_session(self.session_id)
+        self.session_id = self.db_logger.open_session(self.stream_id)
+        self.last_timestamp = None
+        self._newest = None
+        logger.info(f"Stream {self.stream_id} RESET (session {self.session_id})")
+
+    def close(self):
+        self.db_logger.close_session(self.session_id)
+
+    def describe(self):
+        return {
+            "id": self.stream_id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "subscribers": len(self.subscribers),
+            "source": "ingest",
+            "frames": self.frames_received
+        }
+
+class Ingest:
+    """
+    Validates producer batches, feeds them to their vehicles' streams and
+    signals backpressure from the logger's write queue.
+    """
+
+    def __init__(self, hub, metrics=None, max_batch=MAX_BATCH, max_vehicles=MAX_VEHICLES, high_water=HIGH_WATER,
+                 low_water=LOW_WATER):
+        """
+        Args:
+            hub: StreamHub the vehicles' streams are added to (its db_logger records them)
+            metrics: Optional Metrics registry (ingest_batch timer)
+            max_batch: Frames accepted per batch
+            max_vehicles: Ingest streams the hub may hold
+            high_water, low_water: Write queue fill (fraction of the logger's max_queue) pausing / resuming producers
+        """
+        if not 0.0 < low_water <= high_water <= 1.0:
+            raise ValueError(f"Invalid watermarks: {low_water}, {high_water}. Valid: 0 < low <= high <= 1")
+        self.hub = hub
+        self.db_logger = hub.db_logger
+        self.max_batch = max_batch
+        self.max_vehicles = max_vehicles
+        self.high_water = int(self.db_logger.max_queue * high_water)
+        self.low_water = int(self.db_logger.max_queue * low_water)
+        self.paused = False
+        self.pauses = 0
+        self.producers = 0 # Connected WebSocket producers
+        self.batches = 0
+        self.batches_refused = 0
+        self.frames_accepted = 0
+        self.frames_rejected = 0
+        self.rejected = Counter() # Reason -> frames
+        self.datagrams_dropped = 0
+        self._process_time = 0.0
+        self._timer = metrics.timer("ingest_batch") if metrics is not None else None
+
+    def stream(self, vehicle_id):
+        """
+        The vehicle's IngestStream, created on first use.
+
+        Raises:
+            ValueError: Invalid vehicle id, taken by another kind of stream, or too many vehicles
+        """
+        stream = self.hub.get(vehicle_id) if isinstance(vehicle_id, str) else None
+        if isinstance(stream, IngestStream):
+            return stream
+        if not isinstance(vehicle_id, str) or not VEHICLE_ID.fullmatch(vehicle_id) or \
+                vehicle_id.startswith(RESERVED_PREFIXES):
+            raise ValueError(f"Invalid vehicle id: {vehicle_id!r}. Valid: 1-64 of [A-Za-z0-9_.:-]")
+        if stream is not None:
+            raise ValueError(f"Stream already exists: {vehicle_id}")
+        if self.vehicles() >= self.max_vehicles:
+            raise ValueError(f"Too many vehicles (max {self.max_vehicles})")
+        stream = self.hub.add(IngestStream(vehicle_id, self.db_logger))
+        logger.info(f"Ingest stream {vehicle_id} started (session {stream.session_id})")
+        return stream
+
+    def vehicles(self):
+        return sum(1 for stream in self.hub.streams.values() if isinstance(stream, IngestStream))
+
+    def push_frames(self, vehicle_id, frames):
+        """
+        One batch of frame dicts.
+
+        Returns:
+            {"vehicle", "accepted", "rejected", "errors": {reason: count}}
+        Raises:
+            ValueError: The whole batch was refused (bad vehicle id, not a list, too many frames)
+        """
+        if not isinstance(frames, list):
+            raise ValueError("frames must be a list of frame objects")
+        self._check_size(len(frames))
+        started = time.perf_counter()
+        stream = self.stream(vehicle_id)
+        rejected = Counter()
+        return self._accept(stream, parse_frames(frames, rejected), rejected, started)
+
+    def push_batch(self, message):
+        """
+        One binary MSG_BATCH message (wire_protocol.encode_batch()). Same result as push_frames().
+        """
+        started = time.perf_counter()
+        try:
+            vehicle_id, count, body = batch_body(message)
+        except struct.error as e:
+            raise ValueError(f"Truncated batch message: {e}")
+        self._check_size(count)
+        stream = self.stream(vehicle_id)
+        rejected = Counter()
+        return self._accept(stream, parse_batch(body, count, rejected), rejected, started)
+
+    def _check_size(self, count):
+        if count > self.max_batch:
+            raise ValueError(f"Batch too large: {count} frames (max {self.max_batch})")
+
+    def _accept(self, stream, rows, rejected, started):
+        rows = in_order(rows, stream.last_timestamp, rejected)
+        if rows:
+            stream.push(rows)
+        refused = sum(rejected.values())
+        self.batches += 1
+        self.frames_accepted += len(rows)
+        self.frames_rejected += refused
+        self.rejected.update(rejected)
+        elapsed = time.perf_counter() - started
+        self._process_time += elapsed
+        if self._timer is not None:
+            self._timer.record(elapsed)
+        return {"vehicle": stream.stream_id, "accepted": len(rows), "rejected": refused, "errors": dict(rejected)}
+
+    def handle(self, message):
+        """
+        One producer message: JSON text (or bytes starting with "{") or a binary batch.
+
+        Returns:
+            The reply: {"type": "ack", ...push_frames() result, "queue"} or {"type": "error", "message"}
+            ("seq" of a JSON batch is echoed in both)
+        """
+        seq = None
+        try:
+            if isinstance(message, str) or message[:1] == b"{":
+                data = json.loads(message)
+                if not isinstance(data, dict):
+                    raise ValueError("Expected a JSON object")
+                seq = data.get("seq")
+                result = self.push_frames(data.get("vehicle"), data.get("frames"))
+            else:
+                result = self.push_batch(message)
+        except ValueError as e: # Includes JSON and UTF-8 decode errors
+            self.batches_refused += 1
+            reply = {"type": "error", "message": str(e)}
+        else:
+            reply = {"type": "ack"}
+            reply.update(result)
+            reply["queue"] = self.db_logger.queue_depth
+        if seq is not None:
+            reply["seq"] = seq
+        return reply
+
+    def saturated(self):
+        """
+        Whether producers should hold off: true from HIGH_WATER pending writes until back down to LOW_WATER.
+        """
+        depth = self.db_logger.queue_depth
+        if self.paused:
+            if depth <= self.low_water:
+                self.paused = False
+                logger.debug("Ingest resumed (write queue %d)", depth)
+        elif depth >= self.high_water:
+            self.paused = True
+            self.pauses += 1
+            logger.debug("Ingest paused: write queue at %d of %d", depth, self.db_logger.max_queue)
+        return self.paused
+
+    async def wait_for_room(self):
+        while self.saturated():
+            await asyncio.sleep(BACKPRESSURE_POLL)
+
+    async def serve_websocket(self, websocket):
+        """
+        Connection handler of a WebSocket producer (INGEST_PATH).
+        """
+        logger.info(f"Ingest producer connected: {websocket.remote_address}")
+        self.producers += 1
+        try:
+            async for message in websocket:
+                if self.saturated():
+                    # Not reading the socket meanwhile: the producer's sends block once the buffers fill
+                    await websocket.send(json.dumps(self.backpressure(True)))
+                    await self.wait_for_room()
+                    await websocket.send(json.dumps(self.backpressure(False)))
+                await websocket.send(json.dumps(self.handle(message)))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.producers -= 1
+            logger.info("Ingest producer disconnected")
+
+    def backpressure(self, paused):
+        """
+        Backpressure notice for producers.
+        """
+        return {"type": "backpressure", "paused": paused, "queue": self.db_logger.queue_depth}
+
+    def stats(self):
+        frames = self.frames_accepted + self.frames_rejected
+        return {
+            "vehicles": self.vehicles(),
+            "producers": self.producers,
+            "batches": self.batches,
+            "batches_refused": self.batches_refused,
+            "frames_accepted": self.frames_accepted,
+            "frames_rejected": self.frames_rejected,
+            "rejected_by_reason": dict(self.rejected),
+            "datagrams_dropped": self.datagrams_dropped,
+            "paused": self.paused,
+            "pauses": self.pauses,
+            "queue": self.db_logger.queue_depth,
+            "process_us_per_frame": round(self._process_time / frames * 1e6, 2) if frames else 0.0
+        }
+
+class IngestDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    UDP producers: one batch per datagram, dropped while the ingest is saturated.
+    """
+
+    def __init__(self, ingest):
+        self.ingest = ingest
+        self.transport = None
+        self._notified = {} # Address -> time of its last backpressure notice
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        ingest = self.ingest
+        if ingest.saturated():
+            ingest.datagrams_dropped += 1
+            now = time.monotonic()
+            if now - self._notified.get(addr, -math.inf) >= UDP_NOTICE_INTERVAL:
+                if len(self._notified) >= UDP_NOTICE_MAX_ADDRESSES:
+                    self._notified.clear()
+                self._notified[addr] = now
+                notice = ingest.backpressure(True)
+                notice["retry_ms"] = round(UDP_NOTICE_INTERVAL * 1000)
+                self.transport.sendto(json.dumps(notice).encode(), addr)
+            return
+        reply = ingest.handle(data)
+        if reply["type"] == "error":
+            logger.debug("Ingest datagram from %s refused: %s", addr, reply["message"])
+
+async def serve_udp(ingest, host, port):
+    """
+    Listen for UDP producers. Returns the transport (close() it to stop).
+    """
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: IngestDatagramProtocol(ingest), local_addr=(host, port))
+    return transport
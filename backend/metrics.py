@@ -0,0 +1,293 @@
+"""
+Hot-path instrumentation: log-bucketed histograms and a sampling profiler.
+
+Components take an optional Metrics registry and look up their histograms
+once, at construction; recording a sample is then a few arithmetic
+operations and a list increment (no locks, no allocation). Each histogram
+has a single writer (the event loop, or the logger's writer thread), so a
+concurrent snapshot or reset can at worst miss a sample in flight.
+
+Histogram buckets are log-linear: every power of two is split into
+SUB_BUCKETS equal slices, so a percentile is off by at most 1/SUB_BUCKETS
+of its value (~6%) whatever the range.
+"""
+
+import asyncio
+import collections
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+# Slices per power of two, and the exponent range covered (about 1e-9 .. 4e9)
+SUB_BUCKETS = 8
+MIN_EXP = -30
+MAX_EXP = 32
+BUCKET_COUNT = (MAX_EXP - MIN_EXP) * SUB_BUCKETS + 1 # + bucket 0 for values <= 0
+
+PERCENTILES = (50, 90, 99)
+
+# Sampling profiler defaults
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_DEPTH = 64
+
+class Histogram:
+    """
+    Distribution of one measurement (a duration in seconds, or a count).
+
+    Args:
+        name: Metric name
+        scale: Factor applied to values in snapshots (1000 reports seconds as ms)
+        unit: Unit of the reported values (None for plain counts)
+    """
+    __slots__ = ("name", "scale", "unit", "counts", "count", "total", "max")
+
+    def __init__(self, name, scale=1.0, unit=None):
+        self.name = name
+        self.scale = scale
+        self.unit = unit
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value, frexp=math.frexp):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value > 0:
+            mantissa, exponent = frexp(value) # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+            index = (exponent - MIN_EXP) * SUB_BUCKETS + int(mantissa * (2 * SUB_BUCKETS)) - SUB_BUCKETS + 1
+            if index < 1:
+                index = 1
+            elif index >= BUCKET_COUNT:
+                index = BUCKET_COUNT - 1
+        else:
+            index = 0
+        self.counts[index] += 1
+
+    @staticmethod
+    def bucket_upper(index):
+        """
+        Upper bound of a bucket (0 for bucket 0).
+        """
+        if index == 0:
+            return 0.0
+        exponent, sub = divmod(index - 1, SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * SUB_BUCKETS), exponent + MIN_EXP)
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket holding the q-th percentile (capped at the maximum).
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.bucket_upper(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        scale = self.scale
+        summary = {
+            "count": self.count,
+            "mean": round(self.total / self.count * scale, 4) if self.count else 0.0,
+        }
+        for q in PERCENTILES:
+            summary[f"p{q}"] = round(self.percentile(q) * scale, 4)
+        summary["max"] = round(self.max * scale, 4)
+        summary["total"] = round(self.total * scale, 3)
+        if self.unit:
+            summary["unit"] = self.unit
+        return summary
+
+class Metrics:
+    """
+    Registry of named histograms, shared by the server's components.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._histograms = {}
+        self._since = clock()
+
+    def timer(self, name):
+        """
+        Histogram of durations, recorded in seconds and reported in ms.
+        """
+        return self._get(name, 1000.0, "ms")
+
+    def histogram(self, name):
+        """
+        Histogram of plain values (queue depths, batch sizes).
+        """
+        return self._get(name, 1.0, None)
+
+    def _get(self, name, scale, unit):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(name, scale, unit)
+        return histogram
+
+    def snapshot(self, reset=False):
+        """
+        Returns:
+            {"window_s": seconds covered, "histograms": {name: summary}}
+        """
+        now = self.clock()
+        result = {
+            "window_s": round(now - self._since, 3),
+            "histograms": {name: h.snapshot() for name, h in sorted(self._histograms.items())}
+        }
+        if reset:
+            self.reset()
+        return result
+
+    def reset(self):
+        for histogram in self._histograms.values():
+            histogram.reset()
+        self._since = self.clock()
+
+class SamplingProfiler:
+    """
+    Statistical profiler for one thread (the event loop), switched on and off at runtime.
+
+    While running, a daemon thread wakes every `interval` seconds and records the
+    target thread's current Python stack. The target thread is never traced, so it
+    runs at full speed; the cost is the sampler taking the GIL briefly per sample.
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL, max_depth=PROFILE_MAX_DEPTH):
+        """
+        Args:
+            thread_id: Thread to sample (default: the thread creating the profiler)
+            interval: Seconds between samples
+            max_depth: Innermost frames kept per stack
+        """
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock() # Guards stacks / samples (sampler thread vs report() and clear())
+        self.clear()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def clear(self):
+        with self._lock:
+            self.samples = 0
+            self.stacks = collections.Counter() # (outermost, ..., innermost) function labels -> samples
+        self.started_at = time.monotonic() if self.running else None
+        self.duration = 0.0
+
+    def start(self, interval=None):
+        """
+        Start sampling (no-op if already running). Samples accumulate across start/stop until clear().
+        """
+        if interval is not None:
+            self.interval = max(0.0005, float(interval))
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration += time.monotonic() - self.started_at
+        self.started_at = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            with self._lock:
+                self.stacks[tuple(stack)] += 1
+                self.samples += 1
+
+    @staticmethod
+    def _label(code):
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def report(self, top=20):
+        """
+        Returns:
+            {"running", "samples", "interval_ms", "duration_s",
+             "functions": [{"function", "self", "total"}] by samples where the function was innermost / anywhere on the stack,
+             "stacks": [{"stack": "outer;...;inner", "samples"}] (folded stacks, for flame graphs)}
+        """
+        with self._lock:
+            stacks = collections.Counter(self.stacks)
+            samples = self.samples
+        self_samples = collections.Counter()
+        total_samples = collections.Counter()
+        for stack, n in stacks.items():
+            self_samples[stack[-1]] += n
+            for label in set(stack):
+                total_samples[label] += n
+        duration = self.duration
+        if self.started_at is not None:
+            duration += time.monotonic() - self.started_at
+        return {
+            "running": self.running,
+            "samples": samples,
+            "interval_ms": round(self.interval * 1000.0, 3),
+            "duration_s": round(duration, 3),
+            "functions": [{"function": label, "self": n, "total": total_samples[label]}
+                          for label, n in self_samples.most_common(top)],
+            "stacks": [{"stack": ";".join(stack), "samples": n} for stack, n in stacks.most_common(top)]
+        }
+
+async def serve_http(routes, host="127.0.0.1", port=9100):
+    """
+    Minimal local HTTP/1.0 endpoint: GET <path> -> JSON of routes[path]() (no query strings, no keep-alive).
+
+    Args:
+        routes: {path: callable returning a JSON-serializable value}
+    Returns:
+        The asyncio.Server (close() it to stop)
+    """
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass # Headers are ignored
+            parts = request.decode("latin-1").split()
+            route = routes.get(parts[1].split("?")[0]) if len(parts) >= 2 and parts[0] == "GET" else None
+            if route is None:
+                status, body = "404 Not Found", json.dumps({"error": "not found", "paths": sorted(routes)})
+            else:
+                status, body = "200 OK", json.dumps(route())
+            payload = body.encode()
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
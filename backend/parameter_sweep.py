@@ -0,0 +1,246 @@
+"""
+Parameter sweeps over TelemetryGenerator.
+
+Each configuration (a dict of parameter -> value) runs an independent,
+seeded stint on a ProcessPoolExecutor, and the summary metrics come back as
+a ranked table. Every configuration uses the same seed (common random
+numbers), so differences between rows come from the parameters, not from
+the dice.
+
+Parameter names:
+    compound                    Tire compound on all four tires
+    max_power, mass, tire_friction, shift_up_rpm, shift_down_rpm, ...
+                                Any numeric TelemetryGenerator attribute
+    aero.cd_base, aero.cl_drs_open, ...
+                                AeroModel attributes
+    tire.wear_rate, tire.heat_coeff, ...
+                                Compound parameter overrides (TireModel.COMPOUNDS keys)
+
+    python parameter_sweep.py --grid compound=SOFT,MEDIUM,HARD --grid max_power=700000,750000,800000
+    python parameter_sweep.py --random aero.cd_drs_open=0.6:0.8 --random tire.wear_rate=0.0005:0.002 --samples 64
+"""
+
+import argparse
+import itertools
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from telemetry_generator import TelemetryGenerator
+from physics_engine import TireModel
+
+# Stint defaults: 5 laps of a 5 km track, physics at 60 Hz
+LAP_LENGTH_M = 5000.0
+STINT_LAPS = 5
+SIM_DT = 1.0 / 60.0
+MAX_STINT_SECONDS = 3600.0
+
+# Metrics that rank better when larger
+HIGHER_IS_BETTER = {"avg_speed_kmh", "min_grip"}
+
+def apply_params(generator, params):
+    """
+    Set sweep parameters on a freshly reset generator.
+    "compound" goes first, whatever the dict order: it replaces the tires, which would drop tire.* overrides.
+    """
+    for name, value in sorted(params.items(), key=lambda item: item[0] != "compound"):
+        if name == "compound":
+            generator.tires = [TireModel(value, generator.integrator) for _ in range(4)]
+        elif name.startswith("tire."):
+            key = name[len("tire."):]
+            for tire in generator.tires:
+                if key not in tire.params:
+                    raise ValueError(f"Unknown tire parameter: {key}. Valid: {list(tire.params.keys())}")
+                # Copy: params is the shared TireModel.COMPOUNDS entry
+                tire.params = dict(tire.params, **{key: value})
+                tire._calculate_grip()
+        elif name.startswith("aero."):
+            key = name[len("aero."):]
+            if not isinstance(getattr(generator.aero, key, None), (int, float)):
+                raise ValueError(f"Unknown aero parameter: {key}")
+            setattr(generator.aero, key, value)
+        else:
+            if not isinstance(getattr(generator, name, None), (int, float)) or isinstance(getattr(generator, name), bool):
+                raise ValueError(f"Unknown generator parameter: {name}")
+            setattr(generator, name, value)
+
+def simulate_stint(params, seed=0, laps=STINT_LAPS, lap_length=LAP_LENGTH_M, dt=SIM_DT,
+                   max_seconds=MAX_STINT_SECONDS, integrator=TireModel.EULER):
+    """
+    Run one stint and summarize it. Top-level so it can run in a worker process.
+    dt is the physics step as given (not substepped); pair coarse steps with the EXACT integrator.
+
+    Returns:
+        dict of metrics:
+            stint_time       Seconds to complete `laps` laps (inf if not completed)
+            avg_lap_time     stint_time / laps
+            avg_speed_kmh    Mean speed over the stint
+            peak_tire_temp   Hottest any tire got (C)
+            final_wear       Most worn tire at the end of the stint (%)
+            min_grip         Lowest grip of any tire after the first lap
+    """
+    generator = TelemetryGenerator(seed=seed, clock=lambda: 0.0, integrator=integrator, max_step=dt)
+    apply_params(generator, params)
+
+    target = laps * lap_length
+    max_steps = int(max_seconds / dt)
+    peak_temp = max(t.temperature for t in generator.tires)
+    min_grip = math.inf
+    steps = 0
+    while generator.distance < target and steps < max_steps:
+        generator.step(dt)
+        steps += 1
+        for tire in generator.tires:
+            if tire.temperature > peak_temp:
+                peak_temp = tire.temperature
+            if generator.distance > lap_length and tire.grip < min_grip:
+                min_grip = tire.grip
+
+    elapsed = steps * dt
+    completed = generator.distance >= target
+    return {
+        "stint_time": round(elapsed, 3) if completed else math.inf,
+        "avg_lap_time": round(elapsed / laps, 3) if completed else math.inf,
+        "avg_speed_kmh": round(generator.distance / elapsed * 3.6, 2) if elapsed else 0.0,
+        "peak_tire_temp": round(peak_temp, 1),
+        "final_wear": round(max(t.wear for t in generator.tires) * 100, 2),
+        "min_grip": round(min_grip, 3) if min_grip != math.inf else None
+    }
+
+def _run_config(task):
+    params, kwargs = task
+    return simulate_stint(params, **kwargs)
+
+def grid_space(grid):
+    """
+    {name: [values]} -> every combination, as a list of parameter dicts.
+    """
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+def random_space(space, samples, seed=0):
+    """
+    {name: (low, high) or [choices]} -> `samples` random parameter dicts.
+    Ranges are sampled uniformly, lists uniformly by element.
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(samples):
+        config = {}
+        for name, spec in space.items():
+            if isinstance(spec, tuple):
+                config[name] = rng.uniform(*spec)
+            else:
+                config[name] = rng.choice(spec)
+        configs.append(config)
+    return configs
+
+def run_sweep(configs, rank_by="stint_time", workers=None, seed=0, **stint_kwargs):
+    """
+    Simulate every configuration in parallel and rank the results.
+
+    Args:
+        configs: List of parameter dicts (see grid_space / random_space)
+        rank_by: Metric to sort by (best first)
+        workers: Worker processes (None: one per core, 1: run in this process)
+        seed: Seed shared by every run
+        stint_kwargs: Passed to simulate_stint (laps, lap_length, dt, max_seconds, integrator)
+    Returns:
+        List of rows {"rank", "params", **metrics}, best first.
+    """
+    # Fail fast on bad parameter names instead of in every worker
+    for config in configs:
+        apply_params(TelemetryGenerator(seed=0, clock=lambda: 0.0), config)
+
+    tasks = [(config, dict(stint_kwargs, seed=seed)) for config in configs]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        results = [_run_config(task) for task in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_config, tasks, chunksize=chunksize))
+
+    rows = [dict(metrics, params=config) for config, metrics in zip(configs, results)]
+    descending = rank_by in HIGHER_IS_BETTER
+
+    def sort_key(row):
+        value = row.get(rank_by)
+        if value is None:
+            return math.inf
+        return -value if descending else value
+
+    rows.sort(key=sort_key)
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return rows
+
+def format_table(rows, limit=None):
+    """
+    Ranked rows -> fixed-width text table.
+    """
+    if not rows:
+        return "(no results)"
+    param_names = list(rows[0]["params"])
+    metric_names = [k for k in rows[0] if k not in ("rank", "params")]
+    header = ["rank"] + param_names + metric_names
+    lines = []
+    for row in rows[:limit]:
+        cells = [row["rank"]] + [row["params"][n] for n in param_names] + [row[n] for n in metric_names]
+        lines.append([f"{c:.4g}" if isinstance(c, float) else str(c) for c in cells])
+    widths = [max(len(h), *(len(line[i]) for line in lines)) for i, h in enumerate(header)]
+    out = ["  ".join(h.rjust(w) for h, w in zip(header, widths))]
+    out += ["  ".join(c.rjust(w) for c, w in zip(line, widths)) for line in lines]
+    return "\n".join(out)
+
+def _parse_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep over the vehicle simulation")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="Grid axis (repeatable)")
+    parser.add_argument("--random", action="append", default=[], metavar="NAME=LOW:HIGH|V1,V2",
+                        help="Random search dimension (repeatable)")
+    parser.add_argument("--samples", type=int, default=32, help="Random search samples")
+    parser.add_argument("--laps", type=int, default=STINT_LAPS)
+    parser.add_argument("--lap-length", type=float, default=LAP_LENGTH_M)
+    parser.add_argument("--dt", type=float, default=SIM_DT, help="Physics step (seconds)")
+    parser.add_argument("--integrator", default=TireModel.EULER, choices=TireModel.INTEGRATORS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rank-by", default="stint_time")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.grid:
+        grid = {}
+        for axis in args.grid:
+            name, values = axis.split("=", 1)
+            grid[name] = [_parse_value(v) for v in values.split(",")]
+        configs = grid_space(grid)
+    elif args.random:
+        space = {}
+        for dim in args.random:
+            name, spec = dim.split("=", 1)
+            if ":" in spec:
+                low, high = spec.split(":")
+                space[name] = (float(low), float(high))
+            else:
+                space[name] = [_parse_value(v) for v in spec.split(",")]
+        configs = random_space(space, args.samples, args.seed)
+    else:
+        configs = grid_space({"compound": list(TireModel.COMPOUNDS)})
+
+    began = time.perf_counter()
+    rows = run_sweep(configs, rank_by=args.rank_by, workers=args.workers, seed=args.seed,
+                     laps=args.laps, lap_length=args.lap_length, dt=args.dt, integrator=args.integrator)
+    print(format_table(rows, args.top))
+    print(f"\n{len(configs)} runs in {time.perf_counter() - began:.1f} s")
+
+if __name__ == "__main__":
+    main()
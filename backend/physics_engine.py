@@ -1,5 +1,109 @@
 import math
 
+class GripTable:
+    """
+    Grip surface over a regular (temperature, wear) grid, bilinearly interpolated.
+
+    Built from the analytic curve (TireModel.build_grip_table) or from measured
+    data (TireModel.register_grip_map). Inputs outside the grid are clamped to
+    its edges.
+    """
+
+    def __init__(self, temps, wears, grip):
+        """
+        Args:
+            temps: Evenly spaced, increasing temperatures (C), at least 2
+            wears: Evenly spaced, increasing wear fractions (0.0 - 1.0), at least 2
+            grip: grip[i][j] at temps[i], wears[j]
+        """
+        self.temp_min, self.temp_step = self._axis(temps, "temps")
+        self.wear_min, self.wear_step = self._axis(wears, "wears")
+        self.n_temps = len(temps)
+        self.n_wears = len(wears)
+        self.temp_max = temps[-1]
+        self.wear_max = wears[-1]
+        if len(grip) != self.n_temps or any(len(row) != self.n_wears for row in grip):
+            raise ValueError(f"grip must be {self.n_temps} rows of {self.n_wears} values")
+        self.values = [[float(v) for v in row] for row in grip]
+        self.lookup = self._build_lookup()
+
+    @staticmethod
+    def _axis(points, name):
+        if len(points) < 2:
+            raise ValueError(f"{name} needs at least 2 points")
+        step = (points[-1] - points[0]) / (len(points) - 1)
+        if step <= 0 or any(abs(p - (points[0] + i * step)) > 1e-9 * max(1.0, abs(p)) for i, p in enumerate(points)):
+            raise ValueError(f"{name} must be evenly spaced and increasing")
+        return points[0], step
+
+    @classmethod
+    def from_function(cls, grip_fn, temp_range=(0.0, 200.0), temp_step=0.5, wear_points=11):
+        """
+        Sample grip_fn(temperature, wear) on a regular grid.
+        """
+        n_temps = int(round((temp_range[1] - temp_range[0]) / temp_step)) + 1
+        temps = [temp_range[0] + i * temp_step for i in range(n_temps)]
+        wears = [j / (wear_points - 1) for j in range(wear_points)]
+        return cls(temps, wears, [[grip_fn(t, w) for w in wears] for t in temps])
+
+    def _build_lookup(self):
+        """
+        lookup(temperature, wear) -> grip, as a closure over locals (this runs once
+        per tire update, and attribute reads would cost more than the arithmetic).
+        Each cell stores bilinear coefficients: g = a + bx*fx + (by + bxy*fx)*fy.
+        """
+        values = self.values
+        n_wear_cells = self.n_wears - 1
+        cells = []
+        for i in range(self.n_temps - 1):
+            for j in range(n_wear_cells):
+                g00, g01 = values[i][j], values[i][j + 1]
+                g10, g11 = values[i + 1][j], values[i + 1][j + 1]
+                cells.append((g00, g10 - g00, g01 - g00, g11 - g10 - g01 + g00))
+        cells = tuple(cells)
+
+        temp_min, inv_temp_step = self.temp_min, 1.0 / self.temp_step
+        wear_min, inv_wear_step = self.wear_min, 1.0 / self.wear_step
+        x_max, y_max = float(self.n_temps - 1), float(n_wear_cells)
+        i_max, j_max = self.n_temps - 2, n_wear_cells - 1
+
+        def lookup(temperature, wear):
+            # Grid coordinates, clamped to the edges
+            x = (temperature - temp_min) * inv_temp_step
+            if x < 0.0:
+                x = 0.0
+            elif x > x_max:
+                x = x_max
+            y = (wear - wear_min) * inv_wear_step
+            if y < 0.0:
+                y = 0.0
+            elif y > y_max:
+                y = y_max
+            i = int(x)
+            if i > i_max: # Upper edge: last cell, fraction 1.0
+                i = i_max
+            j = int(y)
+            if j > j_max:
+                j = j_max
+            fx = x - i
+            fy = y - j
+            a, bx, by, bxy = cells[i * n_wear_cells + j]
+            return a + bx * fx + (by + bxy * fx) * fy
+
+        return lookup
+
+    def max_error(self, grip_fn, temp_range=None, samples=4001):
+        """
+        Largest |lookup - grip_fn| over a dense sweep of the grid (and its clamped margins).
+        """
+        t_low, t_high = temp_range or (self.temp_min - 10.0, self.temp_max + 10.0)
+        worst = 0.0
+        for k in range(samples):
+            t = t_low + (t_high - t_low) * k / (samples - 1)
+            for w in (0.0, 0.13, 0.5, 0.77, 1.0):
+                worst = max(worst, abs(self.lookup(t, w) - grip_fn(t, w)))
+        return worst
+
 class TireModel:
     """
     Advanced Tire Physics Model simulating Thermodynamics and Wear.
@@ -30,12 +134,34 @@ class TireModel:
         }
     }
 
-    def __init__(self, compound="MEDIUM"):
+    # Integrators for temperature and wear
+    EULER = "euler" # Explicit Euler (reference behaviour, needs small steps)
+    EXACT = "exact" # Closed-form solution for inputs held over the step, accurate at any dt
+    INTEGRATORS = (EULER, EXACT)
+
+    # Wear speeds up above this temperature (C)
+    WEAR_TEMP_THRESHOLD = 100.0
+
+    # Shared grip tables, one per compound (built on first use or registered)
+    _grip_tables = {}
+
+    # Fixed attribute set: no per-instance __dict__ (thousands of tires in batch runs)
+    __slots__ = ("compound_name", "integrator", "params", "grip_table", "_grip_lookup",
+                 "temperature", "wear", "grip",
+                 "ambient_temp", "specific_heat", "tire_mass", "surface_area", "convection_coeff")
+
+    def __init__(self, compound="MEDIUM", integrator=EULER, grip_table=False):
         if compound not in self.COMPOUNDS:
             raise ValueError(f"Invalid compound: {compound}. Valid: {list(self.COMPOUNDS.keys())}")
+        if integrator not in self.INTEGRATORS:
+            raise ValueError(f"Invalid integrator: {integrator}. Valid: {list(self.INTEGRATORS)}")
         
         self.compound_name = compound
+        self.integrator = integrator
         self.params = self.COMPOUNDS[compound]
+        # Shared lookup table instead of the analytic curve (ignores later edits to self.params)
+        self.grip_table = self.get_grip_table(compound) if grip_table else None
+        self._grip_lookup = self.grip_table.lookup if grip_table else None
         
         # State
         self.temperature = 25.0 # Ambient start (Celsius)
@@ -78,49 +204,82 @@ class TireModel:
         h_dynamic = self.convection_coeff + (2.0 * speed_ms)
         cooling_rate = h_dynamic * self.surface_area * (self.temperature - self.ambient_temp)
         
-        # Net Temp Change: dQ = m * c * dT  ->  dT = dQ / (m * c)
-        net_energy = (total_heat_gen - cooling_rate) * dt
-        temp_change = net_energy / (self.tire_mass * self.specific_heat)
-        
-        self.temperature += temp_change
-        
-        # Clamp to realistic bounds (e.g., won't go below ambient or above burning)
-        self.temperature = max(self.ambient_temp, self.temperature)
-        
-        # --- 2. WEAR MODEL ---
-        # Wear depends on Load, Slip, and Temperature (hotter = softer = more wear)
-        temp_wear_factor = 1.0 + max(0, (self.temperature - 100.0) * 0.02) # Increases above 100C
-        wear_step = self.params["wear_rate"] * slip_ratio * (load_n / 4000.0) * temp_wear_factor * dt
-        
-        # Base wear just from rolling
-        rolling_wear = self.params["wear_rate"] * 0.1 * (speed_ms / 100.0) * dt
-        
-        self.wear += (wear_step + rolling_wear)
-        self.wear = min(1.0, self.wear) # Cap at 100% wear
+        if self.integrator == self.EXACT:
+            self._integrate_exact(dt, speed_ms, slip_ratio, load_n, total_heat_gen, h_dynamic)
+        else:
+            # Net Temp Change: dQ = m * c * dT  ->  dT = dQ / (m * c)
+            net_energy = (total_heat_gen - cooling_rate) * dt
+            temp_change = net_energy / (self.tire_mass * self.specific_heat)
+            
+            self.temperature += temp_change
+            
+            # Clamp to realistic bounds (e.g., won't go below ambient or above burning)
+            self.temperature = max(self.ambient_temp, self.temperature)
+            
+            # --- 2. WEAR MODEL ---
+            # Wear depends on Load, Slip, and Temperature (hotter = softer = more wear)
+            temp_wear_factor = 1.0 + max(0, (self.temperature - self.WEAR_TEMP_THRESHOLD) * 0.02) # Increases above 100C
+            wear_step = self.params["wear_rate"] * slip_ratio * (load_n / 4000.0) * temp_wear_factor * dt
+            
+            # Base wear just from rolling
+            rolling_wear = self.params["wear_rate"] * 0.1 * (speed_ms / 100.0) * dt
+            
+            self.wear += (wear_step + rolling_wear)
+            self.wear = min(1.0, self.wear) # Cap at 100% wear
         
         # --- 3. GRIP CALCULATION ---
         self._calculate_grip()
 
+    def _integrate_exact(self, dt, speed_ms, slip_ratio, load_n, heat_gen, h_dynamic):
+        """
+        Closed-form temperature and wear over dt, with the step's inputs held constant.
+
+        m*c * dT/dt = Q - h*A*(T - T_amb) is linear, so T relaxes exponentially
+        towards T_eq = T_amb + Q/(h*A) with rate h*A/(m*c). The wear rate is
+        linear in max(0, T - 100), which integrates in closed form along that
+        curve. Unlike Euler, this cannot overshoot or go unstable at large dt.
+        """
+        rate = h_dynamic * self.surface_area / (self.tire_mass * self.specific_heat)
+        t0 = self.temperature
+        t_eq = self.ambient_temp + heat_gen / (h_dynamic * self.surface_area)
+        self.temperature = max(self.ambient_temp, t_eq + (t0 - t_eq) * math.exp(-rate * dt))
+
+        overheat = _area_above(t0, t_eq, rate, dt, self.WEAR_TEMP_THRESHOLD) # Integral of (T - 100)+ in C*s
+        wear_step = self.params["wear_rate"] * slip_ratio * (load_n / 4000.0) * (dt + 0.02 * overheat)
+        rolling_wear = self.params["wear_rate"] * 0.1 * (speed_ms / 100.0) * dt
+
+        self.wear = min(1.0, self.wear + wear_step + rolling_wear)
+
     def _calculate_grip(self):
         """
         Calculate current grip based on Temperature and Wear.
         """
+        if self.grip_table is not None:
+            self.grip = self._grip_lookup(self.temperature, self.wear)
+        else:
+            self.grip = self.analytic_grip(self.params, self.temperature, self.wear)
+
+    @staticmethod
+    def analytic_grip(params, temperature, wear):
+        """
+        Grip from the compound's temperature window and wear (the reference curve).
+        """
         # Temperature Curve (Gaussian-ish)
-        opt_min = self.params["optimal_temp_min"]
-        opt_max = self.params["optimal_temp_max"]
+        opt_min = params["optimal_temp_min"]
+        opt_max = params["optimal_temp_max"]
         
         temp_factor = 1.0
         
-        if self.temperature < opt_min:
+        if temperature < opt_min:
             # Cold: Linear ramp from 0.6 to 1.0
             # 25C -> 0.6, OptMin -> 1.0
-            t_norm = (self.temperature - 25.0) / (opt_min - 25.0)
+            t_norm = (temperature - 25.0) / (opt_min - 25.0)
             temp_factor = 0.6 + (0.4 * max(0.0, t_norm))
             
-        elif self.temperature > opt_max:
+        elif temperature > opt_max:
             # Overheat: Drop off
             # OptMax -> 1.0, 150C -> 0.7
-            overheat = self.temperature - opt_max
+            overheat = temperature - opt_max
             temp_factor = max(0.5, 1.0 - (overheat * 0.01))
             
         else:
@@ -129,9 +288,80 @@ class TireModel:
             
         # Wear Factor (Linear drop off)
         # 0% wear -> 1.0, 100% wear -> 0.3
-        wear_factor = 1.0 - (self.wear * 0.7)
+        wear_factor = 1.0 - (wear * 0.7)
         
-        self.grip = self.params["base_grip"] * temp_factor * wear_factor
+        return params["base_grip"] * temp_factor * wear_factor
+
+    @classmethod
+    def build_grip_table(cls, compound, temp_step=0.5):
+        """
+        Sample the analytic curve of a COMPOUNDS entry into a GripTable (0 - 200 C).
+        Accuracy: see grip_table_error_bound().
+        """
+        params = cls.COMPOUNDS[compound]
+        return GripTable.from_function(lambda t, w: cls.analytic_grip(params, t, w), temp_step=temp_step)
+
+    @classmethod
+    def grip_table_error_bound(cls, compound, temp_step=0.5):
+        """
+        Worst-case |table - analytic| for build_grip_table(compound, temp_step).
+
+        The curve is linear in wear and piecewise linear in temperature, so the
+        only interpolation error is in the cells holding a kink of the
+        temperature window: at most (slope change) * temp_step / 4, times the
+        largest wear/base-grip multiplier (base_grip). Outside 0 - 200 C the
+        curve is flat, so clamping to the grid edge is exact.
+        """
+        params = cls.COMPOUNDS[compound]
+        cold_slope = 0.4 / (params["optimal_temp_min"] - 25.0)
+        hot_slope = 0.01
+        return params["base_grip"] * max(cold_slope, hot_slope) * temp_step / 4.0
+
+    @classmethod
+    def get_grip_table(cls, compound):
+        """
+        The shared GripTable for a compound (measured map if registered, else the analytic curve).
+        """
+        table = cls._grip_tables.get(compound)
+        if table is None:
+            if compound not in cls.COMPOUNDS:
+                raise ValueError(f"Invalid compound: {compound}. Valid: {list(cls.COMPOUNDS.keys())}")
+            table = cls._grip_tables[compound] = cls.build_grip_table(compound)
+        return table
+
+    @classmethod
+    def register_grip_map(cls, compound, temps, wears, grip):
+        """
+        Use a measured grip map for a compound (tires created afterwards with grip_table=True).
+
+        Args:
+            compound: COMPOUNDS key
+            temps: Evenly spaced temperatures (C)
+            wears: Evenly spaced wear fractions (0.0 - 1.0)
+            grip: grip[i][j] measured at temps[i], wears[j] (absolute grip, base grip included)
+        Returns:
+            The registered GripTable
+        """
+        if compound not in cls.COMPOUNDS:
+            raise ValueError(f"Invalid compound: {compound}. Valid: {list(cls.COMPOUNDS.keys())}")
+        table = cls._grip_tables[compound] = GripTable(temps, wears, grip)
+        return table
+
+    @classmethod
+    def reset_grip_maps(cls):
+        """
+        Drop registered maps and cached tables (rebuilt from COMPOUNDS on next use).
+        """
+        cls._grip_tables.clear()
+
+    def copy(self):
+        """
+        Independent copy of the tire's state (params and the grip table are shared, not copied).
+        """
+        tire = TireModel.__new__(TireModel)
+        for name in self.__slots__:
+            setattr(tire, name, getattr(self, name))
+        return tire
 
     def get_status(self):
         return {
@@ -141,10 +371,33 @@ class TireModel:
             "grip": round(self.grip, 2)
         }
 
+def _area_above(t0, t_eq, rate, dt, threshold):
+    """
+    Integral over [0, dt] of max(0, T(t) - threshold) for T(t) = t_eq + (t0 - t_eq) * exp(-rate * t).
+    """
+    a = t0 - t_eq
+
+    def area(start, end):
+        # (t_eq - threshold) * (end - start) + a/rate * (exp(-rate*start) - exp(-rate*end))
+        return (t_eq - threshold) * (end - start) - a / rate * math.exp(-rate * start) * math.expm1(-rate * (end - start))
+
+    if t0 >= threshold and t_eq >= threshold:
+        return area(0.0, dt)
+    if t0 <= threshold and t_eq <= threshold:
+        return 0.0
+    # T is monotonic, so it crosses the threshold exactly once
+    crossing = -math.log((threshold - t_eq) / a) / rate
+    if t0 > threshold: # Cooling through the threshold
+        return area(0.0, min(dt, crossing))
+    return area(crossing, dt) if crossing < dt else 0.0 # Heating through it
+
 class AeroModel:
     """
     Aerodynamics Model simulating Drag and Downforce with DRS.
     """
+    __slots__ = ("air_density", "frontal_area", "cd_base", "cd_drs_open", "cl_base", "cl_drs_open",
+                 "drs_active", "drs_available")
+
     def __init__(self):
         # Constants
         self.air_density = 1.225 # kg/m^3
@@ -176,6 +429,15 @@ class AeroModel:
         if speed_kmh < 10.0:
             self.drs_active = False
 
+    def copy(self):
+        """
+        Independent copy (coefficients and DRS state).
+        """
+        aero = AeroModel.__new__(AeroModel)
+        for name in self.__slots__:
+            setattr(aero, name, getattr(self, name))
+        return aero
+
     def toggle_drs(self):
         """
         Driver attempts to toggle DRS.
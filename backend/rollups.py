@@ -0,0 +1,155 @@
+"""
+Multi-resolution rollups of recorded telemetry.
+
+Every numeric frame_schema channel (not the timestamp, not compounds) is
+summarized per time bucket at several resolutions (tiers): min, max, sum and
+sample count per channel, plus the number of frames in the bucket. Sums and
+counts make buckets mergeable, so a bucket can be built up one batch at a
+time and coarser views can be derived from finer ones.
+
+Buckets are aligned to multiples of the tier width in absolute time, and a
+bucket's stats are stored as one float64 blob of shape (4, len(ROLLUP_CHANNELS)):
+
+    row MIN / MAX / SUM / COUNT, column = ROLLUP_CHANNELS index
+
+Missing values (None) are skipped: a channel's min/max is NaN if it had no
+samples in the bucket.
+"""
+
+import math
+
+import numpy as np
+
+from frame_schema import CHANNELS, CHANNEL_INDEX, TIME, COMPOUND, flatten_frame
+
+# Bucket widths (seconds), finest first; each a multiple of the previous one
+ROLLUP_TIERS = (1.0, 10.0, 60.0)
+
+ROLLUP_CHANNELS = tuple(c for c in CHANNELS if c.kind not in (TIME, COMPOUND))
+ROLLUP_INDEX = {c.name: i for i, c in enumerate(ROLLUP_CHANNELS)}
+
+# Rows of a bucket's stats array
+MIN, MAX, SUM, COUNT = range(4)
+STATS_SHAPE = (4, len(ROLLUP_CHANNELS))
+
+_ROLLUP_INDEXES = [CHANNEL_INDEX[c.name] for c in ROLLUP_CHANNELS]
+
+def frames_to_arrays(frames):
+    """
+    Frames (tuples of channel values or frame dicts) -> (timestamps (n,), values (n, C)).
+    None becomes NaN.
+    """
+    if not frames:
+        return np.empty(0), np.empty((0, len(ROLLUP_CHANNELS)))
+    table = np.array([frame if type(frame) is tuple else flatten_frame(frame) for frame in frames], dtype=object)
+    return table[:, 0].astype(np.float64), table[:, _ROLLUP_INDEXES].astype(np.float64)
+
+def bucket_stats(timestamps, values, width):
+    """
+    Summarize samples per bucket of `width` seconds.
+
+    Returns:
+        (bucket starts (k,), frames per bucket (k,), stats (k, 4, C)), buckets ascending
+    """
+    buckets = np.floor(timestamps / width) * width
+    if len(buckets) > 1 and np.any(buckets[1:] < buckets[:-1]):
+        order = np.argsort(buckets, kind="stable")
+        buckets, values = buckets[order], values[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    valid = ~np.isnan(values)
+
+    stats = np.empty((len(starts),) + STATS_SHAPE)
+    stats[:, MIN] = np.fmin.reduceat(values, starts, axis=0)
+    stats[:, MAX] = np.fmax.reduceat(values, starts, axis=0)
+    stats[:, SUM] = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    stats[:, COUNT] = np.add.reduceat(valid, starts, axis=0)
+    frames = np.diff(np.r_[starts, len(buckets)])
+    return buckets[starts], frames, stats
+
+def merge_stats(a, b):
+    """
+    Combine the stats of two sets of samples (arrays of shape (..., 4, C)).
+    """
+    merged = np.empty(np.broadcast_shapes(a.shape, b.shape))
+    merged[..., MIN, :] = np.fmin(a[..., MIN, :], b[..., MIN, :])
+    merged[..., MAX, :] = np.fmax(a[..., MAX, :], b[..., MAX, :])
+    merged[..., SUM:, :] = a[..., SUM:, :] + b[..., SUM:, :]
+    return merged
+
+def coarsen(buckets, frames, stats, width):
+    """
+    Re-bucket rollup rows (ascending) into wider buckets (a multiple of their tier).
+    """
+    groups = np.floor(buckets / width) * width
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.array([], dtype=np.intp)
+    if not len(starts):
+        return groups, frames, stats
+    merged = np.empty((len(starts),) + STATS_SHAPE)
+    merged[:, MIN] = np.fmin.reduceat(stats[:, MIN], starts, axis=0)
+    merged[:, MAX] = np.fmax.reduceat(stats[:, MAX], starts, axis=0)
+    merged[:, SUM:] = np.add.reduceat(stats[:, SUM:], starts, axis=0)
+    return groups[starts], np.add.reduceat(frames, starts), merged
+
+def choose_resolution(duration, frame_count, max_points, tiers=ROLLUP_TIERS):
+    """
+    Coarsest detail that still fits: raw frames (0.0) if they fit in max_points,
+    else the finest tier with at most max_points buckets over `duration` seconds,
+    else a multiple of the widest tier.
+    """
+    if frame_count <= max_points:
+        return 0.0
+    for width in tiers:
+        if math.ceil(duration / width) + 1 <= max_points:
+            return width
+    widest = tiers[-1]
+    return widest * math.ceil(duration / widest / max(1, max_points - 1))
+
+class RollupAccumulator:
+    """
+    Incremental rollups of one session (one per session, on the logger's writer thread).
+
+    The newest bucket of each tier stays in memory and is re-written with every
+    batch, so stored rollups are never more than one batch behind the frames.
+    Any other bucket a batch touches (late frames, or the first batch after a
+    restart) is merged with what is already stored.
+    """
+
+    def __init__(self, tiers=ROLLUP_TIERS):
+        self.tiers = tiers
+        self._open = {width: None for width in tiers} # width -> [bucket, frames, stats]
+
+    def add(self, timestamps, values, load):
+        """
+        Fold a batch of samples into the rollups.
+
+        Args:
+            timestamps, values: frames_to_arrays() output
+            load: load(width, bucket) -> stored (frames, stats) or None
+        Returns:
+            Rows to upsert: [(width, bucket, frames, stats)]
+        """
+        rows = []
+        if not len(timestamps):
+            return rows
+        summary = None
+        for width in self.tiers:
+            # Coarser tiers regroup the finer tier's buckets of this batch instead of the samples
+            summary = bucket_stats(timestamps, values, width) if summary is None else coarsen(*summary, width)
+            current = self._open[width]
+            for bucket, frames, stats in zip(*summary):
+                bucket = float(bucket)
+                frames = int(frames)
+                if current is not None and bucket == current[0]:
+                    current[1] += frames
+                    current[2] = merge_stats(current[2], stats)
+                    entry = current
+                else:
+                    stored = load(width, bucket)
+                    if stored is not None:
+                        frames += stored[0]
+                        stats = merge_stats(stored[1], stats)
+                    entry = [bucket, frames, stats]
+                    if current is None or bucket > current[0]:
+                        current = self._open[width] = entry
+                rows.append((width, entry[0], entry[1], entry[2]))
+        return rows
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("TickScheduler")
+
+class TickScheduler:
+    """
+    Fixed-rate tick loop on the monotonic clock, with the physics step
+    decoupled from the publish rate.
+
+    Tick n is due at start + n / publish_hz, so lateness in one tick doesn't
+    push every later tick back (no drift). Each tick runs however many fixed
+    physics steps are due: (ticks * physics_hz) // publish_hz in total, which
+    depends only on the tick count, never on wall-clock jitter.
+
+    When the loop falls behind, missed ticks are caught up by folding their
+    physics steps into the next tick (published once). If it is more than
+    max_catchup ticks behind, the backlog is dropped instead: the timeline
+    jumps forward and simulated time runs slower than real time.
+    """
+
+    def __init__(self, physics_hz=240, publish_hz=60, max_catchup=4, clock=time.monotonic, sleep=asyncio.sleep,
+                 metrics=None):
+        """
+        Args:
+            physics_hz: Physics steps per simulated second
+            publish_hz: Ticks (published frames) per second
+            max_catchup: Missed ticks caught up in one go before dropping the backlog
+            clock: Monotonic clock (seconds)
+            sleep: Coroutine function used to wait for a deadline
+            metrics: Optional Metrics registry (tick_work / tick_overrun timers)
+        """
+        if physics_hz <= 0 or publish_hz <= 0:
+            raise ValueError("physics_hz and publish_hz must be positive")
+        if physics_hz < publish_hz:
+            raise ValueError("physics_hz must be at least publish_hz")
+        self.physics_hz = int(physics_hz)
+        self.publish_hz = int(publish_hz)
+        self.physics_dt = 1.0 / self.physics_hz
+        self.period = 1.0 / self.publish_hz
+        self.max_catchup = max(0, int(max_catchup))
+        self.clock = clock
+        self.sleep = sleep
+        self._stopped = False
+
+        # Stats
+        self.ticks = 0            # Ticks run (frames published)
+        self.sim_ticks = 0        # Publish periods of simulated time (ticks + caught-up ticks)
+        self.physics_steps = 0
+        self.overruns = 0         # Ticks that started after their deadline
+        self.ticks_caught_up = 0  # Missed ticks folded into a later tick
+        self.ticks_dropped = 0    # Missed ticks whose simulated time was discarded
+        self.max_lateness = 0.0
+        self.work_time_max = 0.0
+        self.work_time_avg = 0.0  # EWMA
+        self._started_at = None
+        self._work_timer = metrics.timer("tick_work") if metrics is not None else None
+        self._overrun_timer = metrics.timer("tick_overrun") if metrics is not None else None
+
+    def stop(self):
+        self._stopped = True
+
+    async def run(self, on_tick):
+        """
+        Run until stop() is called.
+
+        Args:
+            on_tick: Coroutine function on_tick(steps, physics_dt), called once
+                per tick with the number of fixed physics steps to advance.
+        """
+        self._stopped = False
+        start = self._started_at = self.clock()
+        tick = 0 # Index of the tick on the wall-clock timeline
+        while not self._stopped:
+            tick += 1
+            deadline = start + tick * self.period
+            delay = deadline - self.clock()
+            if delay > 0:
+                await self.sleep(delay)
+            else:
+                self.overruns += 1
+                self.max_lateness = max(self.max_lateness, -delay)
+                if self._overrun_timer is not None:
+                    self._overrun_timer.record(-delay)
+                await self.sleep(0) # Still let client senders run
+
+            # Whole periods missed while we were late
+            behind = int((self.clock() - deadline) / self.period)
+            sim_advance = 1
+            if behind > 0:
+                tick += behind
+                if behind <= self.max_catchup:
+                    sim_advance += behind
+                    self.ticks_caught_up += behind
+                else:
+                    self.ticks_dropped += behind
+                    logger.warning(f"Tick loop {behind} ticks behind, dropping backlog")
+
+            self.sim_ticks += sim_advance
+            due = (self.sim_ticks * self.physics_hz) // self.publish_hz
+            steps = due - self.physics_steps
+            self.physics_steps = due
+
+            began = self.clock()
+            await on_tick(steps, self.physics_dt)
+            work = self.clock() - began
+            self.ticks += 1
+            self.work_time_max = max(self.work_time_max, work)
+            self.work_time_avg += (work - self.work_time_avg) * 0.05
+            if self._work_timer is not None:
+                self._work_timer.record(work)
+
+    def stats(self):
+        elapsed = self.clock() - self._started_at if self._started_at is not None else 0.0
+        return {
+            "physics_hz": self.physics_hz,
+            "publish_hz": self.publish_hz,
+            "ticks": self.ticks,
+            "physics_steps": self.physics_steps,
+            "achieved_hz": round(self.ticks / elapsed, 2) if elapsed > 0 else 0.0,
+            "sim_time": round(self.sim_ticks * self.period, 3),
+            "overruns": self.overruns,
+            "ticks_caught_up": self.ticks_caught_up,
+            "ticks_dropped": self.ticks_dropped,
+            "max_lateness_ms": round(self.max_lateness * 1000.0, 2),
+            "work_time_avg_ms": round(self.work_time_avg * 1000.0, 2),
+            "work_time_max_ms": round(self.work_time_max * 1000.0, 2)
+        }
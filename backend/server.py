@@ -3,113 +3,552 @@ import websockets
 import json
 import logging
 import sys
-from telemetry_generator import TelemetryGenerator
-from telemetry_logger import TelemetryLogger
+import argparse
+import functools
+import itertools
+from telemetry_logger import TelemetryLogger, HISTORY_MAX_POINTS
+from streams import StreamHub
+from broadcaster import Broadcaster, OVERFLOW_POLICIES, DROP_OLDEST
+from scheduler import TickScheduler
+from wire_protocol import JSON, ENCODINGS, WIRE_VERSION, describe_layout
+from anomaly_detection import AnomalyMonitor
+from metrics import Metrics, SamplingProfiler, serve_http
+from sim_workers import WorkerPool
+from frame_history import FrameHistory, HISTORY_SECONDS
+from frame_schema import CHANNEL_NAMES
+from ingest import Ingest, INGEST_PATH, serve_udp
+from forecast import Forecaster, FORECAST_WORKERS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TelemetryServer")
 
 # Global state
-CURRENT_MODE = "live"
 CONNECTED_CLIENTS = set()
 
-async def handler(websocket, generator):
+# Storage engine for recorded sessions: "json" (one document per frame), "columnar" (typed channels)
+# or "delta" (keyframes + changed channels only)
+STORAGE_ENGINE = "json"
+
+# Live stream every client starts on (the original single car)
+DEFAULT_STREAM = "car_0"
+
+# Per-client send queue: frames buffered before the overflow policy kicks in (2 s at 60 Hz)
+SEND_QUEUE_SIZE = 120
+OVERFLOW_POLICY = DROP_OLDEST
+
+# Fixed physics step rate and network publish rate
+PHYSICS_HZ = 240
+PUBLISH_HZ = 60
+
+# WebSocket port (on localhost)
+WS_PORT = 8765
+
+# Local UDP ingest endpoint host; off unless --ingest-udp-port is given (WebSocket producers use INGEST_PATH)
+INGEST_HOST = "127.0.0.1"
+
+# Local HTTP metrics endpoint (GET /metrics, /profile); off unless --metrics-port is given
+METRICS_HOST = "127.0.0.1"
+
+# Channels of a backfill burst unless the client names some (every channel but the timestamp)
+BACKFILL_CHANNELS = CHANNEL_NAMES[1:]
+
+# Stream carrying anomaly alerts for every live car (subscribe to it like any stream)
+ALERTS_STREAM = "alerts"
+
+class Client:
+    """
+    A connected viewer and the streams it is subscribed to.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket, outbox):
+        self.websocket = websocket
+        self.outbox = outbox # Bounded send queue, drained by its own task
+        self.client_id = next(self._ids)
+        self.subscriptions = {} # stream_id -> channel tuple (None = all channels)
+        self.live_stream_id = DEFAULT_STREAM # Where start_live returns to
+        self.encoding = JSON # Telemetry frame encoding, negotiated with "hello"
+        self.delta = False   # Keyframe + delta frames instead of full frames
+        self.forecasts = set() # Forecasts this client started (cancelled when it disconnects)
+
+    @property
+    def playback_stream_id(self):
+        # Each client gets its own playback cursor
+        return f"playback_{self.client_id}"
+
+def send_reply(client, reply_type, **payload):
+    """Queues a control reply to one client. "type" comes first so clients can route it cheaply."""
+    message = {"type": reply_type}
+    message.update(payload)
+    client.outbox.enqueue_control(json.dumps(message))
+
+def send_event(client, event):
+    """Queues an event dict (e.g. a forecast chunk) to one client, as JSON text."""
+    client.outbox.enqueue_control(json.dumps(event))
+
+def history_to_json(history):
+    """query_history() result -> JSON-safe lists (NaN becomes null)."""
+    def to_list(array):
+        return [None if value != value else value for value in array.tolist()]
+    return {
+        "resolution": history["resolution"],
+        "timestamp": history["timestamp"].tolist(),
+        "frames": history["frames"].tolist(),
+        "channels": {name: {stat: to_list(values) for stat, values in stats.items()}
+                     for name, stats in history["channels"].items()}
+    }
+
+def queue_depths(db_logger):
+    """Current queue depths: frames waiting for the DB writer and in client send queues.
+    db_dropped: frames the logger has discarded so far (queue overflow or failed writes)."""
+    depths = [client.outbox.queue_depth for client in CONNECTED_CLIENTS]
+    return {
+        "db_pending": db_logger.queue_depth,
+        "db_dropped": db_logger.frames_dropped,
+        "client_max": max(depths, default=0),
+        "client_total": sum(depths)
+    }
+
+def metrics_report(metrics, db_logger):
+    """Reply payload of the metrics command (and the HTTP endpoint)."""
+    return {"metrics": metrics.snapshot() if metrics is not None else None, "queues": queue_depths(db_logger)}
+
+def send_backfill(client, hub, stream_id, data):
+    """If the command asks for it ("backfill": seconds), send a live stream's recent frames from memory
+    as one columnar "backfill" reply, ahead of the stream's next frame."""
+    seconds = data.get("backfill")
+    history = hub.recent(stream_id) if seconds else None
+    if history is None:
+        return
+    try:
+        columns = history.columns(data.get("backfill_channels") or BACKFILL_CHANNELS, float(seconds))
+    except (TypeError, ValueError) as e:
+        send_reply(client, "error", message=f"backfill: {e}")
+        return
+    send_reply(client, "backfill", stream=stream_id, **columns)
+
+def playback_options(client, hub, data):
+    """Speed / decimation for a new playback stream: from the command, else kept from the client's current one."""
+    current = hub.get(client.playback_stream_id)
+    options = {"speed": current.speed, "decimation": current.decimation} if current is not None else {}
+    if "speed" in data:
+        options["speed"] = data["speed"]
+    if "decimation" in data:
+        options["decimation"] = data["decimation"]
+    return options
+
+def switch_to(client, hub, stream_id, channels=None):
+    """Replace all of a client's subscriptions with a single stream (live/playback mode switch).
+    The alerts subscription is a side channel and is kept."""
+    for current in list(client.subscriptions):
+        if current != stream_id and current != ALERTS_STREAM:
+            hub.unsubscribe(client, current)
+    hub.subscribe(client, stream_id, channels)
+
+async def handle_command(client, data, hub, scheduler=None, monitor=None, metrics=None, profiler=None, ingest=None,
+                         forecaster=None):
+    db_logger = hub.db_logger
+    command = data["command"]
+
+    if command == "hello":
+        encoding = data.get("encoding", JSON)
+        if encoding not in ENCODINGS:
+            send_reply(client, "error", message=f"Unknown encoding: {encoding}. Valid: {list(ENCODINGS)}")
+            return
+        client.encoding = encoding
+        client.delta = bool(data.get("delta", False))
+        client.outbox.key_seqs.clear() # Next frame of every stream starts from a keyframe
+        logger.info(f"Client {client.client_id}: {encoding} frames{' (delta)' if client.delta else ''}")
+        # Control replies jump the frame queue, so this arrives before any frame in the new
+        # encoding (frames already queued go out as JSON text messages)
+        send_reply(client, "hello", encoding=encoding, delta=client.delta, wire_version=WIRE_VERSION,
+                   layout=describe_layout())
+        for stream_id in client.subscriptions:
+            send_backfill(client, hub, stream_id, data)
+    elif command == "start_playback":
+        try:
+            stream = hub.open_playback(client.playback_stream_id, **playback_options(client, hub, data))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=str(e))
+            return
+        switch_to(client, hub, stream.stream_id)
+        logger.info(f"Client {client.client_id}: PLAYBACK mode (session {stream.session_id})")
+    elif command == "start_live":
+        switch_to(client, hub, client.live_stream_id)
+        send_backfill(client, hub, client.live_stream_id, data)
+        logger.info(f"Client {client.client_id}: LIVE mode ({client.live_stream_id})")
+    elif command == "rewind":
+        # Replay the last N seconds of a live stream from memory, with the usual playback controls
+        stream_id = data.get("stream", client.live_stream_id)
+        history = hub.recent(stream_id)
+        if history is None or not len(history):
+            send_reply(client, "error", message=f"No history for stream: {stream_id}")
+            return
+        try:
+            snapshot = history.snapshot(float(data.get("seconds", 60.0)))
+            stream = hub.open_playback(client.playback_stream_id, snapshot.session_id, source=snapshot,
+                                       **playback_options(client, hub, data))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=str(e))
+            return
+        switch_to(client, hub, stream.stream_id)
+        logger.info(f"Client {client.client_id}: REWIND {stream_id} ({len(snapshot)} frames)")
+        send_reply(client, "playback", **stream.describe())
+    elif command == "history_stats":
+        stream_id = data.get("stream", client.live_stream_id)
+        history = hub.recent(stream_id)
+        if history is None:
+            send_reply(client, "error", message=f"No history for stream: {stream_id}")
+            return
+        try:
+            seconds = data.get("seconds")
+            stats = history.stats(data.get("channels") or ["speed_kmh"], None if seconds is None else float(seconds))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=f"history_stats: {e}")
+            return
+        send_reply(client, "history_stats", stream=stream_id, **stats)
+    elif command == "list_sessions":
+        # Off the event loop: listing flushes the pending frames so the counts are current
+        sessions = await asyncio.get_running_loop().run_in_executor(None, db_logger.get_all_sessions)
+        send_reply(client, "sessions", sessions=sessions)
+    elif command == "select_session":
+        try:
+            session = db_logger.get_session(int(data.get("session_id")))
+            offset = max(0.0, float(data.get("offset", 0.0)))
+        except (TypeError, ValueError):
+            session = None
+        if session is None:
+            send_reply(client, "error", message=f"Unknown session: {data.get('session_id')}")
+            return
+        try:
+            stream = hub.open_playback(client.playback_stream_id, session["id"], offset,
+                                       **playback_options(client, hub, data))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=str(e))
+            return
+        switch_to(client, hub, stream.stream_id)
+        logger.info(f"Client {client.client_id}: PLAYBACK mode (session {session['id']})")
+        send_reply(client, "session_selected", session=session, stream=stream.stream_id)
+    elif command == "seek":
+        stream = hub.get(data.get("stream", client.playback_stream_id))
+        try:
+            offset = float(data.get("offset", 0.0))
+        except (TypeError, ValueError):
+            send_reply(client, "error", message="seek requires a numeric offset")
+            return
+        if stream is None or not hasattr(stream, "seek"):
+            send_reply(client, "error", message="seek requires an active playback stream")
+            return
+        stream.seek(offset)
+    elif command in ("set_speed", "pause", "resume", "step", "playback_status"):
+        stream = hub.get(data.get("stream", client.playback_stream_id))
+        if stream is None or stream.kind != "playback":
+            send_reply(client, "error", message=f"{command} requires an active playback stream")
+            return
+        try:
+            if command == "set_speed":
+                stream.set_speed(data.get("speed", 1.0), data.get("decimation"))
+            elif command == "pause":
+                stream.pause()
+            elif command == "resume":
+                stream.resume()
+            elif command == "step":
+                stream.step(int(data.get("frames", 1)))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=str(e))
+            return
+        send_reply(client, "playback", **stream.describe())
+    elif command == "query_history":
+        try:
+            session_id = int(data.get("session_id"))
+            start, end = data.get("start"), data.get("end")
+            # Off the event loop: a session without rollups has them built on its first query
+            history = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                db_logger.query_history,
+                session_id, data.get("channels") or ["speed_kmh"],
+                None if start is None else float(start), None if end is None else float(end),
+                int(data.get("max_points", HISTORY_MAX_POINTS))
+            ))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=f"query_history: {e}")
+            return
+        send_reply(client, "history", session_id=session_id, **history_to_json(history))
+    elif command == "list_streams":
+        send_reply(client, "streams", streams=hub.describe())
+    elif command == "subscribe":
+        channels = data.get("channels")
+        if channels is not None and not isinstance(channels, list):
+            send_reply(client, "error", message="channels must be a list of frame keys")
+            return
+        try:
+            stream = hub.subscribe(client, data.get("stream"), channels)
+        except ValueError as e:
+            send_reply(client, "error", message=str(e))
+            return
+        if stream.kind == "live":
+            client.live_stream_id = stream.stream_id
+        send_reply(client, "subscribed", stream=stream.stream_id, channels=channels)
+        send_backfill(client, hub, stream.stream_id, data)
+    elif command == "unsubscribe":
+        hub.unsubscribe(client, data.get("stream"))
+        send_reply(client, "unsubscribed", stream=data.get("stream"))
+    elif command == "add_car":
+        car_id = data.get("car_id") or hub.next_car_id()
+        try:
+            stream = hub.add_live(str(car_id))
+        except ValueError as e:
+            send_reply(client, "error", message=str(e))
+            return
+        send_reply(client, "car_added", stream=stream.describe())
+    elif command == "remove_car":
+        stream = hub.get(data.get("car_id"))
+        if stream is None or stream.kind != "live":
+            send_reply(client, "error", message=f"Unknown car: {data.get('car_id')}")
+            return
+        hub.remove(stream.stream_id)
+        if monitor is not None:
+            monitor.remove(stream.stream_id)
+        send_reply(client, "car_removed", stream=stream.stream_id)
+    elif command == "reset":
+        stream = hub.get(data.get("stream", client.live_stream_id))
+        if stream is None or stream.kind != "live":
+            send_reply(client, "error", message="reset requires a live stream")
+            return
+        stream.reset()
+    elif command == "client_stats":
+        stats = []
+        for other in sorted(CONNECTED_CLIENTS, key=lambda c: c.client_id):
+            entry = {"id": other.client_id, "encoding": other.encoding, "streams": list(other.subscriptions)}
+            entry.update(other.outbox.stats())
+            stats.append(entry)
+        send_reply(client, "client_stats", clients=stats)
+    elif command == "scheduler_stats":
+        send_reply(client, "scheduler_stats", stats=scheduler.stats() if scheduler else None)
+    elif command == "anomaly_stats":
+        send_reply(client, "anomaly_stats", stats=monitor.stats() if monitor else None)
+    elif command == "ingest_stats":
+        send_reply(client, "ingest_stats", stats=ingest.stats() if ingest is not None else None)
+    elif command == "forecast":
+        if forecaster is None:
+            send_reply(client, "error", message="Forecasts not available")
+            return
+        action = data.get("action", "start")
+        if action == "start":
+            options = {key: data[key] for key in ("horizon", "dt", "sample_interval", "lap_length", "baseline", "channels")
+                       if key in data}
+            try:
+                # Events go to this client only, through its (bounded) control queue
+                info = await forecaster.start(data.get("stream", client.live_stream_id), data.get("branches", []),
+                                              publish=functools.partial(send_event, client), **options)
+            except (TypeError, ValueError, TimeoutError) as e:
+                send_reply(client, "error", message=str(e))
+                return
+            client.forecasts.add(info["forecast"])
+            send_reply(client, "forecast_started", **info)
+        elif action == "cancel":
+            if not forecaster.cancel(data.get("forecast")):
+                send_reply(client, "error", message=f"No running forecast: {data.get('forecast')}")
+        elif action == "stats":
+            send_reply(client, "forecast_stats", stats=forecaster.stats())
+        else:
+            send_reply(client, "error", message=f"Unknown forecast action: {action}. Valid: ['start', 'cancel', 'stats']")
+    elif command == "worker_stats":
+        send_reply(client, "worker_stats", workers=hub.workers.stats() if hub.workers is not None else None)
+    elif command == "metrics":
+        send_reply(client, "metrics", **metrics_report(metrics, db_logger))
+        if data.get("reset") and metrics is not None:
+            metrics.reset()
+    elif command == "profiler":
+        if profiler is None:
+            send_reply(client, "error", message="Profiler not available")
+            return
+        action = data.get("action", "report")
+        try:
+            if action == "start":
+                interval_ms = data.get("interval_ms")
+                if interval_ms is not None and float(interval_ms) <= 0:
+                    raise ValueError("interval_ms must be positive")
+                profiler.start(None if interval_ms is None else float(interval_ms) / 1000.0)
+            elif action == "stop":
+                profiler.stop()
+            elif action == "clear":
+                profiler.clear()
+            elif action != "report":
+                raise ValueError(f"Unknown profiler action: {action}. Valid: ['start', 'stop', 'clear', 'report']")
+            report = profiler.report(int(data.get("top", 20)))
+        except (TypeError, ValueError) as e:
+            send_reply(client, "error", message=str(e))
+            return
+        send_reply(client, "profiler", **report)
+
+async def handler(websocket, hub, broadcaster, scheduler=None, monitor=None, metrics=None, profiler=None,
+                  ingest=None, forecaster=None):
     """Handles new WebSocket connections."""
-    global CURRENT_MODE
+    if ingest is not None and websocket.request.path.split("?")[0] == INGEST_PATH:
+        # A car / data logger pushing telemetry, not a viewer
+        await ingest.serve_websocket(websocket)
+        return
     logger.info(f"Client connected: {websocket.remote_address}")
-    
-    # RESET SIMULATION ON CONNECT (User Feedback: "Start from 0")
-    generator.reset()
-    logger.info("Simulation RESET for new client.")
-    
-    CONNECTED_CLIENTS.add(websocket)
+    client = Client(websocket, broadcaster.open_outbox(websocket))
+
+    # Every client starts on the default car with all channels (original behaviour)
+    stream = hub.get(DEFAULT_STREAM)
+    if stream is not None:
+        # RESET SIMULATION ON CONNECT (User Feedback: "Start from 0"), but only for the
+        # first viewer: other clients already watching this car must not be disturbed.
+        if not stream.subscribers:
+            stream.reset()
+        hub.subscribe(client, DEFAULT_STREAM)
+
+    CONNECTED_CLIENTS.add(client)
     try:
         async for message in websocket:
-            logger.info(f"Received: {message}")
+            # Per message: DEBUG only, and formatted only if enabled
+            logger.debug("Received: %s", message)
             try:
                 data = json.loads(message)
                 if "command" in data:
-                    if data["command"] == "start_playback":
-                        CURRENT_MODE = "playback"
-                        logger.info("Switched to PLAYBACK mode")
-                    elif data["command"] == "start_live":
-                        CURRENT_MODE = "live"
-                        logger.info("Switched to LIVE mode")
+                    await handle_command(client, data, hub, scheduler, monitor, metrics, profiler, ingest, forecaster)
             except json.JSONDecodeError:
                 pass
     except websockets.exceptions.ConnectionClosed:
         logger.info("Client disconnected")
     finally:
-        CONNECTED_CLIENTS.discard(websocket)
+        CONNECTED_CLIENTS.discard(client)
+        hub.unsubscribe_all(client)
+        client.outbox.close()
+        if forecaster is not None:
+            # Nobody left to receive them
+            for forecast_id in client.forecasts:
+                forecaster.cancel(forecast_id)
 
-async def broadcast_telemetry():
+async def broadcast_telemetry(cars=1, engine=STORAGE_ENGINE, send_queue=SEND_QUEUE_SIZE, overflow=OVERFLOW_POLICY,
+                              physics_hz=PHYSICS_HZ, publish_hz=PUBLISH_HZ, detect_anomalies=True,
+                              collect_metrics=True, metrics_port=None, workers=0, history_seconds=HISTORY_SECONDS,
+                              port=WS_PORT, ingest_enabled=True, ingest_udp_port=None, forecast_workers=FORECAST_WORKERS):
     """Generates and broadcasts telemetry data to all connected clients."""
     logger.info("Starting telemetry broadcast loop...")
-    
-    generator = TelemetryGenerator()
-    db_logger = TelemetryLogger()
-    
-    # Start the WebSocket server with access to the generator
-    # We use a lambda or partial to pass the generator instance to the handler
-    import functools
-    bound_handler = functools.partial(handler, generator=generator)
-    
-    async with websockets.serve(bound_handler, "localhost", 8765):
-        logger.info("WebSocket server started on ws://localhost:8765")
-        
-        # Pre-load playback data for simplicity (or load on demand)
-        playback_data = []
-        playback_index = 0
-
-        while True:
-            # Reload playback data if we just switched to it
-            if CURRENT_MODE == "playback" and not playback_data:
-                 playback_data = db_logger.get_playback_data()
-                 if not playback_data:
-                     logger.warning("No playback data found, reverting to live")
-                     # CURRENT_MODE = "live" # Optional: force back to live
-
-            if CURRENT_MODE == "live":
-                data = generator.get_next_frame()
-                db_logger.log(data)
-            else:
-                if playback_data:
-                    if playback_index < len(playback_data):
-                        data = playback_data[playback_index]
-                        playback_index += 1
-                    else:
-                        playback_index = 0
-                        data = playback_data[playback_index]
-                else:
-                    # Fallback if no data
-                    data = generator.get_next_frame()
-
-            message = json.dumps(data)
-            
-            if CONNECTED_CLIENTS:
-                websockets_to_remove = set()
-                # Iterate over a copy of the set to avoid "Set changed size during iteration" error
-                for ws in list(CONNECTED_CLIENTS):
-                    try:
-                        await ws.send(message)
-                    except websockets.exceptions.ConnectionClosed:
-                        websockets_to_remove.add(ws)
-                
-                for ws in websockets_to_remove:
-                    CONNECTED_CLIENTS.discard(ws)
-            
-            await asyncio.sleep(1/60)
-
-
-
-async def main():
+
+    # Hot-path histograms (see metrics.py); the profiler only samples once started with the profiler command
+    metrics = Metrics() if collect_metrics else None
+    profiler = SamplingProfiler()
+    db_logger = TelemetryLogger(engine=engine, metrics=metrics)
+    # Live cars simulated in worker processes (sharded by car), or in this process
+    pool = WorkerPool(workers, physics_hz, publish_hz) if workers > 0 else None
+    # Recent frames of every live stream in memory (rewind, backfill, windowed stats)
+    history = FrameHistory(history_seconds, publish_hz) if history_seconds > 0 else None
+    broadcaster = Broadcaster(send_queue, overflow, metrics=metrics)
+    hub = StreamHub(db_logger, metrics, pool, history, broadcaster)
+    scheduler = TickScheduler(physics_hz, publish_hz, metrics=metrics)
+    monitor = AnomalyMonitor() if detect_anomalies else None
+    client_queue = metrics.histogram("client_queue_depth") if metrics is not None else None
+    db_queue = metrics.histogram("db_queue_depth") if metrics is not None else None
+    # External cars / data loggers pushing telemetry (WebSocket INGEST_PATH, optionally UDP)
+    ingest = Ingest(hub, metrics) if ingest_enabled else None
+    alerts = hub.add_alerts(ALERTS_STREAM)
+    # What-if branches forked from the live cars, run ahead in background processes (None: disabled)
+    forecaster = None
+    if forecast_workers is not None:
+        forecaster = Forecaster(hub, workers=forecast_workers, metrics=metrics)
+    for car in range(cars):
+        hub.add_live(f"car_{car}")
+
+    # Start the WebSocket server with access to the stream hub
+    # We use a lambda or partial to pass the hub instance to the handler
+    bound_handler = functools.partial(handler, hub=hub, broadcaster=broadcaster, scheduler=scheduler, monitor=monitor,
+                                      metrics=metrics, profiler=profiler, ingest=ingest, forecaster=forecaster)
+    http_server = None
+    if metrics_port is not None:
+        http_server = await serve_http({
+            "/metrics": lambda: metrics_report(metrics, db_logger),
+            "/profile": profiler.report
+        }, METRICS_HOST, metrics_port)
+        logger.info(f"Metrics endpoint on http://{METRICS_HOST}:{metrics_port}/metrics")
+    udp_transport = None
+    if ingest is not None and ingest_udp_port is not None:
+        udp_transport = await serve_udp(ingest, INGEST_HOST, ingest_udp_port)
+        logger.info(f"UDP ingest on {INGEST_HOST}:{ingest_udp_port}")
+
+    async with websockets.serve(bound_handler, "localhost", port):
+        logger.info(f"WebSocket server started on ws://localhost:{port}"
+                    + (f" (ingest on ws://localhost:{port}{INGEST_PATH})" if ingest is not None else ""))
+
+        async def on_tick(steps, physics_dt):
+            # publish() only queues: slow clients can't hold up the tick
+            for stream, frame in await hub.tick(steps, physics_dt):
+                broadcaster.publish(stream, frame)
+                if monitor is not None and stream.kind == "live":
+                    for alert in monitor.process(stream, frame):
+                        logger.info(f"Alert {alert['rule']} on {alert['stream']}.{alert['channel']}: "
+                                    f"{alert['value']} (score {alert['score']})")
+                        broadcaster.publish_event(alerts, alert)
+            if pool is not None:
+                pool.check()
+            if client_queue is not None:
+                client_queue.record(max((client.outbox.queue_depth for client in CONNECTED_CLIENTS), default=0))
+                db_queue.record(db_logger.queue_depth)
+
+        try:
+            await scheduler.run(on_tick)
+        finally:
+            profiler.stop()
+            if http_server is not None:
+                http_server.close()
+            if udp_transport is not None:
+                udp_transport.close()
+            if forecaster is not None:
+                forecaster.close()
+            hub.close()
+            if pool is not None:
+                pool.close()
+            # Flush any buffered frames before exiting
+            db_logger.close()
+
+
+
+async def main(cars=1, engine=STORAGE_ENGINE, send_queue=SEND_QUEUE_SIZE, overflow=OVERFLOW_POLICY,
+               physics_hz=PHYSICS_HZ, publish_hz=PUBLISH_HZ, detect_anomalies=True, collect_metrics=True,
+               metrics_port=None, workers=0, history_seconds=HISTORY_SECONDS, port=WS_PORT, ingest_enabled=True,
+               ingest_udp_port=None, forecast_workers=FORECAST_WORKERS):
     # Start the telemetry loop (which now owns the server)
-    await broadcast_telemetry()
+    await broadcast_telemetry(cars, engine, send_queue, overflow, physics_hz, publish_hz, detect_anomalies,
+                              collect_metrics, metrics_port, workers, history_seconds, port, ingest_enabled,
+                              ingest_udp_port, forecast_workers)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vehicle Digital Twin telemetry server")
+    parser.add_argument("--port", type=int, default=WS_PORT, help="WebSocket port")
+    parser.add_argument("--cars", type=int, default=1, help="Number of simulated cars (streams car_0..car_N-1)")
+    parser.add_argument("--engine", default=STORAGE_ENGINE, choices=["json", "columnar", "delta"], help="Storage engine")
+    parser.add_argument("--send-queue", type=int, default=SEND_QUEUE_SIZE, help="Frames buffered per client")
+    parser.add_argument("--overflow", default=OVERFLOW_POLICY, choices=list(OVERFLOW_POLICIES),
+                        help="What to do when a client's send queue is full")
+    parser.add_argument("--physics-hz", type=int, default=PHYSICS_HZ, help="Fixed physics step rate")
+    parser.add_argument("--publish-hz", type=int, default=PUBLISH_HZ, help="Frames published per second")
+    parser.add_argument("--anomaly-detection", action=argparse.BooleanOptionalAction, default=True,
+                        help=f"Run the anomaly detectors on live streams (alerts on the '{ALERTS_STREAM}' stream)")
+    parser.add_argument("--metrics", action=argparse.BooleanOptionalAction, default=True,
+                        help="Record hot-path timing histograms (metrics command)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help=f"Serve GET /metrics and /profile as JSON on http://{METRICS_HOST}:<port>")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Simulate the cars in this many worker processes (0: in the server process)")
+    parser.add_argument("--history-seconds", type=float, default=HISTORY_SECONDS,
+                        help="Seconds of recent frames kept in memory per live stream (0 disables rewind/backfill)")
+    parser.add_argument("--ingest", action=argparse.BooleanOptionalAction, default=True,
+                        help=f"Accept telemetry pushed by external cars / data loggers on ws://localhost:<port>{INGEST_PATH}")
+    parser.add_argument("--ingest-udp-port", type=int, default=None,
+                        help=f"Also accept ingest batches as UDP datagrams on {INGEST_HOST}:<port>")
+    parser.add_argument("--forecast", action=argparse.BooleanOptionalAction, default=True,
+                        help="Accept forecast commands (what-if branches run ahead of a live car)")
+    parser.add_argument("--forecast-workers", type=int, default=FORECAST_WORKERS,
+                        help="Low-priority processes running forecast branches (0: threads of the server process)")
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.cars, args.engine, args.send_queue, args.overflow, args.physics_hz, args.publish_hz,
+                         args.anomaly_detection, args.metrics, args.metrics_port, args.workers,
+                         args.history_seconds, args.port, args.ingest, args.ingest_udp_port,
+                         args.forecast_workers if args.forecast else None))
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
-
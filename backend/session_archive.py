@@ -0,0 +1,423 @@
+"""
+Session archives: one recorded session in a compact, chunked columnar file.
+
+Layout (little-endian):
+
+    b"VDTA" | data blocks ... | footer (JSON) | footer length (u64) | b"VDTA"
+
+Frames are split into chunks of up to `chunk_frames` rows. Each chunk holds
+one block per frame_schema channel: the channel's quantized values
+(frame_schema.quantize(), lossless) in the narrowest integer dtype that fits
+the chunk, or float64 for the timestamp. Missing values are stored as the
+dtype's minimum (the block's "null"). Blocks are 64-byte aligned, so an
+uncompressed archive can be memory-mapped and every block read as a NumPy
+view without copying. With compression="zlib" each block is deflated on its
+own and only the blocks that are read get inflated.
+
+The footer describes the session (name, time span, frame count) and every
+block: {"offset", "nbytes", "dtype", "codec", "null"}.
+
+    python session_archive.py export --db telemetry.db --session 3 session_3.vdta --compress
+    python session_archive.py import --db telemetry.db session_3.vdta
+    python session_archive.py info session_3.vdta
+"""
+
+import argparse
+import json
+import struct
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from frame_schema import CHANNELS, CHANNEL_NAMES, TIME, FLOAT, BOOL, COMPOUND, COMPOUND_NAMES, get_channel, \
+    unflatten_frame
+
+MAGIC = b"VDTA"
+ARCHIVE_VERSION = 1
+ALIGNMENT = 64
+_TRAILER = struct.Struct("<Q4s")
+
+# Frames per chunk: ~4.6 h at 60 Hz, so most sessions are one chunk and every column is a single view
+CHUNK_FRAMES = 1 << 20
+
+RAW = "raw"
+ZLIB = "zlib"
+CODECS = (RAW, ZLIB)
+
+_INT_DTYPES = (np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4"), np.dtype("<i8"))
+
+def _int_dtype(values, has_nulls):
+    """
+    Narrowest signed integer dtype holding `values`, keeping its minimum free for nulls.
+    """
+    if not len(values):
+        return _INT_DTYPES[0]
+    lo, hi = values.min(), values.max()
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype)
+        if lo >= info.min + (1 if has_nulls else 0) and hi <= info.max:
+            return dtype
+    return _INT_DTYPES[-1]
+
+class ArchiveWriter:
+    """
+    Streams chunks of quantized frame values into an archive file.
+    """
+
+    def __init__(self, path, compression=None, chunk_frames=CHUNK_FRAMES):
+        """
+        Args:
+            path: Archive file to create (overwritten)
+            compression: None (memory-mappable) or "zlib"
+            chunk_frames: Frames per chunk
+        """
+        if compression not in (None, ZLIB):
+            raise ValueError(f"Invalid compression: {compression}. Valid: [None, '{ZLIB}']")
+        self.path = path
+        self.codec = ZLIB if compression else RAW
+        self.chunk_frames = max(1, int(chunk_frames))
+        self.chunks = []
+        self.frames = 0
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._pending = []
+        self._pending_frames = 0
+
+    def write(self, table):
+        """
+        Append frames.
+
+        Args:
+            table: float64 array (n, len(CHANNELS)) of quantized values (frame_schema
+                   channel order, NaN for missing), timestamps ascending
+        """
+        self._pending.append(table)
+        self._pending_frames += len(table)
+        while self._pending_frames >= self.chunk_frames:
+            self._flush(self.chunk_frames)
+
+    def _flush(self, frames):
+        table = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        chunk, rest = table[:frames], table[frames:]
+        self._pending = [rest] if len(rest) else []
+        self._pending_frames = len(rest)
+
+        columns = {}
+        for i, channel in enumerate(CHANNELS):
+            values = chunk[:, i]
+            nulls = np.isnan(values)
+            has_nulls = bool(nulls.any())
+            if channel.kind == TIME:
+                data, null = values.astype("<f8"), None
+            else:
+                present = values[~nulls]
+                dtype = _int_dtype(present, has_nulls)
+                null = int(np.iinfo(dtype).min) if has_nulls else None
+                data = np.where(nulls, null if has_nulls else 0, values).astype(dtype)
+            columns[channel.name] = self._write_block(data, null)
+        self.chunks.append({"frames": len(chunk), "columns": columns})
+        self.frames += len(chunk)
+
+    def _write_block(self, data, null):
+        payload = data.tobytes()
+        if self.codec == ZLIB:
+            payload = zlib.compress(payload, 6)
+        position = self._file.tell()
+        padding = -position % ALIGNMENT
+        self._file.write(b"\0" * padding)
+        offset = position + padding
+        self._file.write(payload)
+        return {"offset": offset, "nbytes": len(payload), "dtype": data.dtype.str, "codec": self.codec, "null": null}
+
+    def close(self, session=None):
+        """
+        Write the remaining frames and the footer.
+
+        Args:
+            session: Session metadata to keep (name, start_time, end_time, ...)
+        """
+        if self._pending_frames:
+            self._flush(self._pending_frames)
+        footer = {
+            "version": ARCHIVE_VERSION,
+            "session": session or {},
+            "frames": self.frames,
+            "channels": [{"name": c.name, "kind": c.kind, "scale": c.scale} for c in CHANNELS],
+            "chunks": self.chunks
+        }
+        payload = json.dumps(footer).encode()
+        self._file.write(payload)
+        self._file.write(_TRAILER.pack(len(payload), MAGIC))
+        self._file.close()
+
+class SessionArchive:
+    """
+    Read access to an archive. The file is memory-mapped: uncompressed blocks
+    are NumPy views into the mapping (no copy, no read until touched).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Cannot open archive {path}: {e}")
+        if len(self._map) < len(MAGIC) + _TRAILER.size or bytes(self._map[:4]) != MAGIC:
+            raise ValueError(f"Not a session archive: {path}")
+        length, magic = _TRAILER.unpack(bytes(self._map[-_TRAILER.size:]))
+        if magic != MAGIC:
+            raise ValueError(f"Truncated session archive: {path}")
+        end = len(self._map) - _TRAILER.size
+        footer = json.loads(bytes(self._map[end - length:end]))
+        if footer["version"] > ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported archive version {footer['version']} (max {ARCHIVE_VERSION})")
+        names = [c["name"] for c in footer["channels"]]
+        if names != list(CHANNEL_NAMES):
+            raise ValueError(f"Archive channel layout does not match frame_schema: {names}")
+        self.footer = footer
+        self.session = footer["session"]
+        self.frames = footer["frames"]
+        self.chunks = footer["chunks"]
+        self._timestamps = None
+        self._inflated = {} # offset -> inflated block (about one chunk's worth)
+
+    def __len__(self):
+        return self.frames
+
+    def _block(self, block):
+        offset = block["offset"]
+        raw = self._map[offset:offset + block["nbytes"]]
+        if block["codec"] != ZLIB:
+            return raw.view(block["dtype"])
+        values = self._inflated.get(offset)
+        if values is None:
+            if len(self._inflated) >= len(CHANNELS):
+                self._inflated.clear()
+            values = self._inflated[offset] = np.frombuffer(zlib.decompress(raw), dtype=block["dtype"])
+        return values
+
+    def raw_chunks(self, name):
+        """
+        Stored (quantized) blocks of one channel, one per chunk: views when uncompressed.
+        """
+        get_channel(name)
+        return [self._block(chunk["columns"][name]) for chunk in self.chunks]
+
+    def raw_column(self, name):
+        """
+        Stored (quantized) values of one channel for the whole session.
+        A zero-copy view for single-chunk, uncompressed archives.
+        """
+        blocks = self.raw_chunks(name)
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks) if blocks else np.empty(0)
+
+    def column(self, name):
+        """
+        One channel as float64 in reported units (NaN for missing, compounds as codes).
+        """
+        channel = get_channel(name)
+        parts = []
+        for chunk, block in zip(self.chunks, self.raw_chunks(name)):
+            values = block.astype(np.float64)
+            null = chunk["columns"][name]["null"]
+            if null is not None:
+                values[block == null] = np.nan
+            if channel.kind == FLOAT:
+                values /= channel.scale
+            parts.append(values)
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    @property
+    def timestamps(self):
+        if self._timestamps is None:
+            self._timestamps = self.raw_column("timestamp")
+        return self._timestamps
+
+    def to_arrays(self, channels=None):
+        """
+        {channel name: float64 array} (see column()), every channel by default.
+        """
+        return {name: self.column(name) for name in (channels or CHANNEL_NAMES)}
+
+    def quantized_table(self, start=0, stop=None):
+        """
+        Frames [start, stop) as an (n, len(CHANNELS)) float64 array of quantized values, NaN for missing.
+        """
+        stop = self.frames if stop is None else min(stop, self.frames)
+        table = np.empty((max(0, stop - start), len(CHANNELS)))
+        row, first = 0, 0
+        for chunk in self.chunks:
+            last = first + chunk["frames"]
+            lo, hi = max(start, first), min(stop, last)
+            if lo < hi:
+                for i, name in enumerate(CHANNEL_NAMES):
+                    block = self._block(chunk["columns"][name])[lo - first:hi - first]
+                    values = table[row:row + hi - lo, i]
+                    values[:] = block
+                    null = chunk["columns"][name]["null"]
+                    if null is not None:
+                        values[block == null] = np.nan
+                row += hi - lo
+            first = last
+        return table
+
+    def frames_from(self, index, count):
+        """
+        Frame dicts [index, index + count), decoded like the storage engines decode them.
+        """
+        return [_decode_row(row) for row in self.quantized_table(index, index + count)]
+
+    def index_at(self, timestamp):
+        """
+        Index of the first frame at or after `timestamp`.
+        """
+        return int(np.searchsorted(self.timestamps, timestamp, side="left"))
+
+    def close(self):
+        self._map = None
+        self._timestamps = None
+        self._inflated.clear()
+
+_FLOAT_SCALES = tuple((i, c.scale) for i, c in enumerate(CHANNELS) if c.kind == FLOAT)
+_BOOL_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == BOOL)
+_COMPOUND_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == COMPOUND)
+_INTEGER_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind not in (TIME, FLOAT))
+
+def _decode_row(row):
+    values = [None if v != v else v for v in row.tolist()]
+    for i, scale in _FLOAT_SCALES:
+        if values[i] is not None:
+            values[i] = values[i] / scale
+    for i in _INTEGER_INDEXES:
+        if values[i] is not None:
+            values[i] = int(values[i])
+    for i in _BOOL_INDEXES:
+        if values[i] is not None:
+            values[i] = bool(values[i])
+    for i in _COMPOUND_INDEXES:
+        code = values[i]
+        if code is not None:
+            values[i] = COMPOUND_NAMES[code] if 0 <= code < len(COMPOUND_NAMES) else None
+    return unflatten_frame(values)
+
+class ArchivePlaybackReader:
+    """
+    Playback source over an archive, with the PlaybackReader interface
+    (`for` / `async for`, frames_read, close()). Frames are decoded
+    `chunk_size` at a time straight from the memory map.
+    """
+
+    def __init__(self, archive, start_time=None, chunk_size=600):
+        self.archive = archive
+        self.chunk_size = max(1, int(chunk_size))
+        self._index = 0 if start_time is None else archive.index_at(start_time)
+        self._current = deque()
+        self._closed = False
+        self.frames_read = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._current:
+            if self._closed or self._index >= len(self.archive):
+                raise StopIteration
+            self._current.extend(self.archive.frames_from(self._index, self.chunk_size))
+            self._index += self.chunk_size
+        self.frames_read += 1
+        return self._current.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return self.__next__()
+        except StopIteration:
+            raise StopAsyncIteration
+
+    def close(self):
+        self._closed = True
+        self._current.clear()
+
+def export_session(db_logger, session_id, path, compression=None, chunk_frames=CHUNK_FRAMES):
+    """
+    Write one recorded session to an archive.
+    Returns the number of frames exported.
+    """
+    db_logger.flush()
+    session = db_logger.get_session(session_id)
+    if session is None:
+        raise ValueError(f"Unknown session: {session_id}")
+    writer = ArchiveWriter(path, compression, chunk_frames)
+    try:
+        for table in db_logger.iter_quantized(session_id):
+            writer.write(table)
+    finally:
+        writer.close({key: session[key] for key in ("id", "name", "created_at", "start_time", "end_time", "engine")})
+    return writer.frames
+
+def import_session(db_logger, path, name=None, copy=False):
+    """
+    Make an archive playable as a new session.
+
+    By default the session is attached: it stays in the archive file and is
+    read through the memory map (no per-frame work, so import time doesn't
+    depend on the session length). copy=True writes the frames into the
+    logger's database instead (columnar table), so the archive file can go.
+    Returns the new session id.
+    """
+    archive = SessionArchive(path)
+    try:
+        return db_logger.attach_archive(archive, name, copy=copy)
+    finally:
+        archive.close()
+
+def main():
+    from telemetry_logger import TelemetryLogger
+
+    parser = argparse.ArgumentParser(description="Export / import telemetry sessions as archive files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export", help="Write a session to an archive")
+    export_cmd.add_argument("path")
+    export_cmd.add_argument("--db", default="telemetry.db")
+    export_cmd.add_argument("--session", type=int, required=True)
+    export_cmd.add_argument("--compress", action="store_true", help="zlib blocks (smaller, not zero-copy)")
+    export_cmd.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES)
+    import_cmd = commands.add_parser("import", help="Make an archive playable as a new session")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--db", default="telemetry.db")
+    import_cmd.add_argument("--name", default=None)
+    import_cmd.add_argument("--copy", action="store_true", help="Copy the frames into the database")
+    info_cmd = commands.add_parser("info", help="Describe an archive")
+    info_cmd.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        archive = SessionArchive(args.path)
+        codecs = {block["codec"] for chunk in archive.chunks for block in chunk["columns"].values()}
+        print(json.dumps({"session": archive.session, "frames": archive.frames, "chunks": len(archive.chunks),
+                          "codecs": sorted(codecs)}, indent=2))
+        return
+
+    db = TelemetryLogger(args.db)
+    try:
+        began = time.perf_counter()
+        if args.command == "export":
+            frames = export_session(db, args.session, args.path, "zlib" if args.compress else None, args.chunk_frames)
+            print(f"Exported session {args.session}: {frames} frames to {args.path}")
+        else:
+            session_id = import_session(db, args.path, args.name, args.copy)
+            frames = db.get_session(session_id)["frame_count"]
+            print(f"Imported {args.path} as session {session_id}: {frames} frames")
+        elapsed = time.perf_counter() - began
+        print(f"{elapsed:.3f} s ({frames / elapsed:,.0f} frames/s)" if elapsed > 0 else "")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
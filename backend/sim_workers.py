@@ -0,0 +1,521 @@
+"""
+Simulation in worker processes, sharded by car.
+
+Each car's frames travel through its own FrameRing: a single-producer ring
+of fixed-layout float64 rows in multiprocessing.shared_memory. A worker
+process runs the physics of its cars on its own fixed-rate TickScheduler and
+writes one row per frame; the server's WorkerStream reads the rows in place
+(no pickling, no pipes) for broadcast and logging. Only control messages
+(add / remove / reset a car) go through a pipe, and the replies to the rare
+requests that need one (a car's simulation checkpoint, for forecasts).
+
+The server owns every ring, so a worker can crash or be restarted without
+losing the rings or the server's read position. WorkerPool.check() restarts
+workers that exited or stopped sending heartbeats; their cars restart from
+standstill in fresh sessions (the physics state died with the process).
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import signal
+import struct
+import time
+from multiprocessing import shared_memory
+
+from frame_schema import CHANNELS, FLOAT, INT, BOOL, COMPOUND, COMPOUND_CODES, COMPOUND_NAMES, FrameBuffer
+from scheduler import TickScheduler
+from telemetry_generator import TelemetryGenerator
+
+logger = logging.getLogger("SimWorkers")
+
+# Frames kept per car (~4 s at 60 Hz): how far the server may fall behind before losing frames
+RING_SLOTS = 256
+
+# Ring header (int64 fields), then RING_SLOTS rows of [seq, epoch, channel values, seq]
+HEADER_FIELDS = 8
+SEQ = 0   # Frames written so far; row seq % slots holds frame seq
+SLOTS = 1
+HEADER_BYTES = HEADER_FIELDS * 8
+PAYLOAD = struct.Struct(f"<{1 + len(CHANNELS)}d") # [epoch, channel values]
+STAMP = struct.Struct("<q") # The row's frame seq, before and after the payload
+ROW_BYTES = STAMP.size + PAYLOAD.size + STAMP.size
+NAN = float("nan")
+
+# A worker is restarted if its process exits, or if it misses heartbeats for HEARTBEAT_TIMEOUT
+# seconds (STARTUP_TIMEOUT before the first one). Restarts of one worker are RESTART_BACKOFF apart.
+HEARTBEAT_TIMEOUT = 2.0
+STARTUP_TIMEOUT = 30.0
+RESTART_BACKOFF = 1.0
+CHECK_INTERVAL = 0.5
+
+# How long a request to a worker (e.g. a checkpoint) may wait for its reply, and how often the reply is polled for
+REQUEST_TIMEOUT = 2.0
+REPLY_POLL = 0.002
+
+_INT_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == INT)
+_BOOL_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == BOOL)
+_FLOAT_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == FLOAT)
+_COMPOUND_INDEXES = tuple(i for i, c in enumerate(CHANNELS) if c.kind == COMPOUND)
+
+class FrameRing:
+    """
+    One car's frames in shared memory: written by one worker, read by the server.
+
+    The writer fills row seq % slots and only then publishes it by bumping the
+    header's SEQ, so every frame below SEQ is complete. A frame is lost once
+    the writer laps it. Each row is a seqlock: the writer stamps the frame seq
+    before the payload and again after it, and read() checks the trailing
+    stamp before copying the payload and the leading one after. A copy the
+    writer overwrote meanwhile has a stamp from a newer frame and is
+    discarded (None), without relying on the CPU's store ordering.
+
+    Row layout: [seq, epoch, channel values in CHANNELS order, seq]. None is
+    NaN, booleans are 0/1 and compounds their code. Frames carry the epoch
+    they were written in, so a reader can skip frames from before a reset.
+    """
+
+    def __init__(self, name=None, slots=RING_SLOTS):
+        """
+        Args:
+            name: Attach to this existing ring (worker side). None creates a new one (server side).
+            slots: Frames kept, for a new ring
+        """
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + slots * ROW_BYTES)
+            self.owner = True
+        else:
+            # Workers share the server's resource tracker (spawn), so attaching doesn't take ownership
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.header = self.shm.buf[:HEADER_BYTES].cast("q")
+        if self.owner:
+            self.header[SEQ] = 0
+            self.header[SLOTS] = slots
+        self.slots = self.header[SLOTS]
+        self._scratch = [0.0] * (1 + len(CHANNELS))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        """
+        Frames written so far.
+        """
+        return self.header[SEQ]
+
+    def write(self, epoch, values):
+        """
+        Append a frame (channel values, CHANNELS order).
+        """
+        row = self._scratch
+        row[0] = epoch
+        row[1:] = values
+        for i in _COMPOUND_INDEXES:
+            compound = row[i + 1]
+            row[i + 1] = COMPOUND_CODES.get(compound, -1) if compound is not None else None
+        if None in row:
+            row = [NAN if value is None else value for value in row]
+        seq = self.header[SEQ]
+        buf, offset = self.shm.buf, HEADER_BYTES + (seq % self.slots) * ROW_BYTES
+        STAMP.pack_into(buf, offset, seq)
+        PAYLOAD.pack_into(buf, offset + STAMP.size, *row)
+        STAMP.pack_into(buf, offset + STAMP.size + PAYLOAD.size, seq)
+        self.header[SEQ] = seq + 1
+
+    def read(self, seq):
+        """
+        Returns:
+            (epoch, channel values) of frame `seq`, or None if it has been overwritten
+        """
+        written = self.header[SEQ]
+        if seq >= written or written - seq > self.slots - 1:
+            return None # Not published yet, or its row is next in line for reuse
+        buf, offset = self.shm.buf, HEADER_BYTES + (seq % self.slots) * ROW_BYTES
+        # Reverse of the writer's order: its last stamp, the payload, then its first stamp
+        (after,) = STAMP.unpack_from(buf, offset + STAMP.size + PAYLOAD.size)
+        row = PAYLOAD.unpack_from(buf, offset + STAMP.size)
+        (before,) = STAMP.unpack_from(buf, offset)
+        if before != seq or after != seq:
+            return None # The writer has lapped it (possibly mid-copy)
+        values = list(row[1:])
+        for i in _FLOAT_INDEXES:
+            if values[i] != values[i]:
+                values[i] = None
+        for i in _INT_INDEXES:
+            value = values[i]
+            values[i] = None if value != value else int(value)
+        for i in _BOOL_INDEXES:
+            value = values[i]
+            values[i] = None if value != value else value != 0.0
+        for i in _COMPOUND_INDEXES:
+            value = values[i]
+            values[i] = COMPOUND_NAMES[int(value)] if value == value and 0 <= value < len(COMPOUND_NAMES) else None
+        return int(row[0]), values
+
+    def close(self):
+        self.header.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class WorkerStream:
+    """
+    A live car simulated in a worker process (the in-process counterpart is streams.LiveStream).
+
+    next_frame() logs every frame the worker wrote since the last call and
+    returns the newest one in the stream's FrameBuffer.
+    """
+    kind = "live"
+
+    def __init__(self, stream_id, db_logger, pool, worker, ring):
+        self.stream_id = stream_id
+        self.db_logger = db_logger
+        self.pool = pool
+        self.worker = worker # Index of the worker simulating the car
+        self.ring = ring
+        self.epoch = 0
+        self.session_id = db_logger.open_session(stream_id)
+        self.subscribers = set()
+        self.buffer = FrameBuffer()
+        self.latest = None
+        self._read = 0 # Next ring sequence number to read
+        self.frames_read = 0
+        self.frames_lost = 0
+
+    async def next_frame(self, steps=None, physics_dt=None):
+        """
+        Args:
+            steps, physics_dt: Ignored (the worker keeps its own fixed-step clock)
+        Returns:
+            The stream's FrameBuffer holding the newest frame, or None if the worker wrote nothing new
+        """
+        newest = self._drain()
+        if newest is None:
+            return None
+        self.buffer.values[:] = newest
+        self.latest = self.buffer
+        return self.buffer
+
+    def _drain(self):
+        """
+        Log every frame written since the last call. Returns the newest one's values (None if none).
+        """
+        ring = self.ring
+        written = ring.seq
+        if written == self._read:
+            return None
+        start = max(self._read, written - ring.slots + 1)
+        self.frames_lost += start - self._read
+        newest = None
+        for seq in range(start, written):
+            frame = ring.read(seq)
+            if frame is None:
+                self.frames_lost += 1
+                continue
+            epoch, values = frame
+            if epoch != self.epoch:
+                continue # Written before the last reset / restart
+            self.db_logger.log(tuple(values), self.session_id)
+            newest = values
+            self.frames_read += 1
+        self._read = written
+        return newest
+
+    def _new_session(self):
+        self._drain() # Frames still in the ring belong to the old session
+        self.epoch += 1
+        self.db_logger.close_session(self.session_id)
+        self.session_id = self.db_logger.open_session(self.stream_id)
+
+    async def checkpoint(self):
+        """
+        The car's simulation state now (telemetry_generator.Checkpoint), fetched from its worker.
+
+        Raises:
+            TimeoutError: The worker didn't answer within REQUEST_TIMEOUT (e.g. it is restarting)
+        """
+        return await self.pool.request(self.worker, "checkpoint", self.stream_id)
+
+    def reset(self):
+        """
+        Restart the car from standstill in a fresh session.
+        """
+        self._new_session()
+        self.pool.send(self.worker, ("reset", self.stream_id, self.epoch))
+        logger.info(f"Stream {self.stream_id} RESET (session {self.session_id})")
+
+    def close(self):
+        self.db_logger.close_session(self.session_id)
+        self.pool.remove_car(self.stream_id)
+
+    def describe(self):
+        return {
+            "id": self.stream_id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "subscribers": len(self.subscribers),
+            "worker": self.worker
+        }
+
+class _Simulation:
+    """
+    Worker process side: the generators of one shard, stepped on a TickScheduler.
+    """
+
+    def __init__(self, conn, heartbeat, cars, physics_hz, publish_hz):
+        self.conn = conn
+        self.heartbeat = heartbeat
+        self.scheduler = TickScheduler(physics_hz, publish_hz)
+        self.cars = {} # stream_id -> [generator, ring, epoch, buffer]
+        for car in cars:
+            self._add(*car)
+
+    def _add(self, stream_id, ring_name, epoch):
+        self.cars[stream_id] = [TelemetryGenerator(), FrameRing(ring_name), epoch, FrameBuffer()]
+
+    def _control(self):
+        while self.conn.poll():
+            try:
+                message = self.conn.recv()
+            except EOFError:
+                message = ("stop",) # The server is gone
+            command = message[0]
+            if command == "add":
+                self._add(*message[1:])
+            elif command == "remove":
+                car = self.cars.pop(message[1], None)
+                if car is not None:
+                    car[1].close()
+            elif command == "reset":
+                car = self.cars.get(message[1])
+                if car is not None:
+                    car[0].reset()
+                    car[2] = message[2]
+            elif command == "checkpoint":
+                car = self.cars.get(message[1])
+                try:
+                    self.conn.send(("reply", message[2], car[0].checkpoint() if car is not None else None))
+                except (BrokenPipeError, OSError):
+                    pass # The server is gone: the next recv() stops the worker
+            elif command == "stop":
+                self.scheduler.stop()
+                return
+
+    async def on_tick(self, steps, physics_dt):
+        self._control()
+        for car in self.cars.values():
+            generator, ring, epoch, buffer = car
+            first = generator.sim_time == 0.0
+            for _ in range(steps):
+                generator.step(physics_dt)
+            if first:
+                generator.align_clock()
+            ring.write(epoch, generator.snapshot_into(buffer).values)
+        self.heartbeat.value = time.monotonic()
+
+    def run(self):
+        try:
+            asyncio.run(self.scheduler.run(self.on_tick))
+        finally:
+            for car in self.cars.values():
+                car[1].close()
+
+def _worker_main(conn, heartbeat, cars, physics_hz, publish_hz):
+    # Ctrl+C reaches the whole process group: the server stops its workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _Simulation(conn, heartbeat, cars, physics_hz, publish_hz).run()
+
+class _Worker:
+    """
+    Server side bookkeeping of one worker process.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.streams = {} # stream_id -> WorkerStream
+        self.restarts = 0
+        self.last_exit = None
+        self.replies = {} # request id -> reply, received but not yet collected
+
+class WorkerPool:
+    """
+    Worker processes simulating the live cars, with crash detection and restart.
+
+    Cars are assigned to the worker with the fewest cars. Call check()
+    regularly (the server does it every tick; it only looks every
+    CHECK_INTERVAL seconds).
+    """
+
+    def __init__(self, workers, physics_hz=240, publish_hz=60, slots=RING_SLOTS,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT, startup_timeout=STARTUP_TIMEOUT,
+                 restart_backoff=RESTART_BACKOFF, start_method="spawn"):
+        """
+        Args:
+            workers: Number of worker processes
+            physics_hz, publish_hz: Each worker's TickScheduler rates (frames per second = publish_hz)
+            slots: Frames kept per car ring
+            heartbeat_timeout: Seconds without a heartbeat before a worker counts as hung
+            startup_timeout: Seconds a new worker may take to send its first heartbeat
+            restart_backoff: Minimum seconds between two restarts of the same worker
+            start_method: multiprocessing start method ("spawn": the server has threads)
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.physics_hz = physics_hz
+        self.publish_hz = publish_hz
+        self.slots = slots
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.restart_backoff = restart_backoff
+        self._context = multiprocessing.get_context(start_method)
+        self._workers = [_Worker(i) for i in range(workers)]
+        self._next_check = 0.0
+        self._closed = False
+        self._request_ids = itertools.count(1)
+        for worker in self._workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker):
+        # Duplex: control messages one way, request replies the other
+        worker_end, server_end = self._context.Pipe()
+        worker.heartbeat = self._context.Value("d", 0.0, lock=False)
+        cars = [(stream.stream_id, stream.ring.name, stream.epoch) for stream in worker.streams.values()]
+        worker.process = self._context.Process(
+            target=_worker_main, name=f"SimWorker-{worker.index}", daemon=True,
+            args=(worker_end, worker.heartbeat, cars, self.physics_hz, self.publish_hz)
+        )
+        worker.process.start()
+        worker_end.close()
+        worker.conn = server_end
+        worker.started_at = time.monotonic()
+
+    def send(self, index, message):
+        try:
+            self._workers[index].conn.send(message)
+        except (BrokenPipeError, OSError):
+            pass # Worker died: check() restarts it with its current cars
+
+    async def request(self, index, command, stream_id, timeout=REQUEST_TIMEOUT):
+        """
+        Send a request about one car to a worker and wait for its reply, without blocking the event loop.
+
+        Raises:
+            TimeoutError: No reply within `timeout` seconds (a dead or restarted worker never answers)
+        """
+        worker = self._workers[index]
+        request_id = next(self._request_ids)
+        self.send(index, (command, stream_id, request_id))
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                while worker.conn.poll():
+                    _, reply_id, reply = worker.conn.recv()
+                    worker.replies[reply_id] = reply
+            except (EOFError, OSError):
+                pass # Worker died: check() restarts it
+            if request_id in worker.replies:
+                return worker.replies.pop(request_id)
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Worker {index} did not answer {command} for {stream_id}")
+            await asyncio.sleep(REPLY_POLL)
+
+    def add_car(self, stream_id, db_logger):
+        """
+        Start simulating a car on the least loaded worker. Returns its WorkerStream.
+        """
+        worker = min(self._workers, key=lambda w: (len(w.streams), w.index))
+        stream = WorkerStream(stream_id, db_logger, self, worker.index, FrameRing(slots=self.slots))
+        worker.streams[stream_id] = stream
+        self.send(worker.index, ("add", stream_id, stream.ring.name, stream.epoch))
+        return stream
+
+    def remove_car(self, stream_id):
+        for worker in self._workers:
+            stream = worker.streams.pop(stream_id, None)
+            if stream is not None:
+                self.send(worker.index, ("remove", stream_id))
+                # The worker may still have the segment open; unlinking only removes the name
+                stream.ring.close()
+                return
+
+    def check(self, now=None):
+        """
+        Restart workers that exited or stopped sending heartbeats.
+        Returns the indexes of the workers restarted.
+        """
+        now = time.monotonic() if now is None else now
+        if now < self._next_check or self._closed:
+            return []
+        self._next_check = now + CHECK_INTERVAL
+        restarted = []
+        for worker in self._workers:
+            reason = self._failure(worker, now)
+            if reason is None or now - worker.started_at < self.restart_backoff:
+                continue
+            logger.warning(f"Worker {worker.index} {reason}: restarting it "
+                           f"({len(worker.streams)} cars restart from standstill)")
+            self._restart(worker)
+            restarted.append(worker.index)
+        return restarted
+
+    def _failure(self, worker, now):
+        exitcode = worker.process.exitcode
+        if exitcode is not None:
+            return f"exited with code {exitcode}"
+        beat = worker.heartbeat.value
+        if beat == 0.0:
+            if now - worker.started_at > self.startup_timeout:
+                return f"sent no heartbeat within {self.startup_timeout:g} s of starting"
+        elif now - beat > self.heartbeat_timeout:
+            return f"missed heartbeats for {now - beat:.1f} s"
+        return None
+
+    def _restart(self, worker):
+        process = worker.process
+        if process.is_alive():
+            process.kill() # Hung
+        process.join(timeout=5.0)
+        worker.last_exit = process.exitcode
+        worker.conn.close()
+        worker.replies.clear()
+        worker.restarts += 1
+        for stream in worker.streams.values():
+            stream._new_session()
+        self._spawn(worker)
+
+    def stats(self):
+        now = time.monotonic()
+        return [{
+            "worker": worker.index,
+            "pid": worker.process.pid,
+            "alive": worker.process.is_alive(),
+            "cars": sorted(worker.streams),
+            "restarts": worker.restarts,
+            "heartbeat_age_ms": round((now - worker.heartbeat.value) * 1000.0, 1) if worker.heartbeat.value else None,
+            "frames_lost": sum(stream.frames_lost for stream in worker.streams.values())
+        } for worker in self._workers]
+
+    def close(self):
+        """
+        Stop every worker and free every ring.
+        """
+        self._closed = True
+        for worker in self._workers:
+            self.send(worker.index, ("stop",))
+        for worker in self._workers:
+            worker.process.join(timeout=2.0)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+            for stream in worker.streams.values():
+                stream.ring.close()
+            worker.streams.clear()
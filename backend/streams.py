@@ -0,0 +1,524 @@
+import itertools
+import logging
+import time
+from telemetry_generator import TelemetryGenerator
+from frame_schema import FrameBuffer, aggregate_frames
+
+logger = logging.getLogger("TelemetryStreams")
+
+# Keys every filtered frame keeps, whatever channels were requested
+BASE_CHANNELS = ("timestamp", "stream")
+
+# Playback speed limit, and how much recording (seconds) one tick may pass before playback
+# jumps to the cursor instead of reading every frame in between (decimate / aggregate)
+MAX_PLAYBACK_SPEED = 1000.0
+PLAYBACK_SKIP_SECONDS = 1.0
+PLAYBACK_MAX_AGGREGATE_SECONDS = 10.0
+# A frame is due once the cursor is within this of its timestamp (the cursor accumulates float steps)
+PLAYBACK_TOLERANCE = 1e-6
+
+def filter_channels(frame, channels):
+    """
+    Reduce a frame to the requested top-level keys (e.g. ["speed_kmh", "tires"]).
+    channels None means the whole frame.
+    """
+    if channels is None:
+        return frame
+    return {key: frame[key] for key in BASE_CHANNELS + channels if key in frame}
+
+class LiveStream:
+    """
+    One simulated car: its own TelemetryGenerator, recorded into its own session.
+    """
+    kind = "live"
+
+    def __init__(self, stream_id, db_logger, generator=None):
+        self.stream_id = stream_id
+        self.db_logger = db_logger
+        self.generator = generator or TelemetryGenerator()
+        self.session_id = db_logger.open_session(stream_id)
+        self.subscribers = set()
+        # Rewritten in place every frame; `latest` is this buffer once the first frame exists
+        self.buffer = FrameBuffer()
+        self.latest = None
+
+    async def next_frame(self, steps=None, physics_dt=None):
+        """
+        Args:
+            steps: Fixed physics steps to run before the frame. None steps on the wall clock.
+            physics_dt: Length of one physics step (seconds)
+        Returns:
+            The stream's FrameBuffer, valid until the next call (Broadcaster.publish() takes it as is)
+        """
+        if steps is None:
+            self.generator.next_frame_into(self.buffer)
+        else:
+            first = self.generator.sim_time == 0.0
+            for _ in range(steps):
+                self.generator.step(physics_dt)
+            if first:
+                self.generator.align_clock()
+            self.generator.snapshot_into(self.buffer)
+        # The logger's writer thread reads it later: give it a copy
+        self.db_logger.log(self.buffer.snapshot(), self.session_id)
+        self.latest = self.buffer
+        return self.buffer
+
+    async def checkpoint(self):
+        """
+        The car's simulation state now (telemetry_generator.Checkpoint), e.g. to fork forecasts from.
+        """
+        return self.generator.checkpoint()
+
+    def reset(self):
+        """
+        Restart the car from standstill in a fresh session.
+        """
+        self.generator.reset()
+        self.db_logger.close_session(self.session_id)
+        self.session_id = self.db_logger.open_session(self.stream_id)
+        logger.info(f"Stream {self.stream_id} RESET (session {self.session_id})")
+
+    def close(self):
+        self.db_logger.close_session(self.session_id)
+
+    def describe(self):
+        return {
+            "id": self.stream_id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "subscribers": len(self.subscribers)
+        }
+
+class PlaybackStream:
+    """
+    Replays one recorded session from the database, looping at the end.
+
+    Frames are scheduled from their recorded timestamps: every tick moves a
+    play cursor forward by the elapsed time times `speed` and publishes the
+    frames the cursor passed. Recorded jitter and gaps are replayed as they
+    happened. When one tick passes several frames (fast forward), only one
+    frame goes out: the newest one (DECIMATE) or their average (AGGREGATE).
+    Each client has its own stream, so speed, pause and seek are per client.
+    """
+    kind = "playback"
+
+    # What to publish when a tick passes several recorded frames
+    DECIMATE = "decimate"   # The newest frame
+    AGGREGATE = "aggregate" # frame_schema.aggregate_frames() of all of them
+    DECIMATION_MODES = (DECIMATE, AGGREGATE)
+
+    def __init__(self, stream_id, db_logger, session_id=None, offset=0.0, speed=1.0, decimation=DECIMATE,
+                 clock=time.monotonic):
+        """
+        Args:
+            stream_id: Stream id (one per client)
+            db_logger: TelemetryLogger holding the session (or a frame_history.HistorySnapshot)
+            session_id: Session to replay (None: the latest one)
+            offset: Seconds into the session to start from
+            speed: Playback speed multiplier (1.0 is real time)
+            decimation: DECIMATE or AGGREGATE
+            clock: Monotonic clock, used when a tick doesn't say how much time passed
+        """
+        if session_id is None:
+            # No flush: this runs on the event loop, and the writer commits frames within flush_interval
+            session_id = (db_logger.latest_session_id(flush=False)
+                          or db_logger.latest_session_id(include_active=True, flush=False))
+        elif db_logger.get_session(session_id) is None:
+            raise ValueError(f"Unknown session: {session_id}")
+
+        self.stream_id = stream_id
+        self.db_logger = db_logger
+        self.session_id = session_id
+        self.subscribers = set()
+        self.latest = None
+        self.speed = 1.0
+        self.decimation = self.DECIMATE
+        self.set_speed(speed, decimation)
+        self.paused = False
+        self.clock = clock
+        self.frames_played = 0  # Frames read from the recording
+        self.frames_skipped = 0 # Read but merged into / superseded by another published frame
+        self._reader = None
+        self._pending_offset = offset
+        self._empty_warned = False
+        self._session_start = None
+        self._read_frame = None # Bound frame lookup for jumps (resolved on the first one)
+        self._cursor = None     # Recorded timestamp of the play position (None: publish the next frame now)
+        self._lookahead = None  # Next recorded frame, read but not due yet
+        self._read_time = None  # Timestamp of the newest frame read
+        self._ended = False     # Reader reached the end of the recording
+        self._failed = False    # Reading the recording failed (the stream stays idle)
+        self._jumped = False    # The cursor jumped ahead of the reader (reopen it before reading on)
+        self._step_frames = 0   # Frames to advance while paused
+        self._last_tick = None
+
+    def set_speed(self, speed, decimation=None):
+        """
+        Change the playback speed (and optionally the decimation mode) from the next tick on.
+        """
+        speed = float(speed)
+        if not 0.0 < speed <= MAX_PLAYBACK_SPEED:
+            raise ValueError(f"Invalid playback speed: {speed}. Valid: (0, {MAX_PLAYBACK_SPEED}]")
+        if decimation is not None and decimation not in self.DECIMATION_MODES:
+            raise ValueError(f"Invalid decimation: {decimation}. Valid: {list(self.DECIMATION_MODES)}")
+        self.speed = speed
+        if decimation is not None:
+            self.decimation = decimation
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._step_frames = 0
+
+    def step(self, frames=1):
+        """
+        Pause, and advance `frames` recorded frames on the next tick.
+        """
+        self.paused = True
+        self._step_frames += max(1, int(frames))
+
+    def seek(self, offset):
+        """
+        Jump to `offset` seconds into the session (applied on the next frame, also while paused).
+        """
+        self._pending_offset = max(0.0, offset)
+
+    @property
+    def position(self):
+        """
+        Seconds from the start of the session to the play cursor (None before the first frame).
+        """
+        if self._cursor is None or self._session_start is None:
+            return None
+        return self._cursor - self._session_start
+
+    async def _next(self):
+        if self._lookahead is not None:
+            frame, self._lookahead = self._lookahead, None
+            return frame
+        try:
+            frame = await self._reader.__anext__()
+        except StopAsyncIteration:
+            self._ended = True
+            return None
+        except Exception as e:
+            # Unreadable recording: stop this cursor, not the tick loop
+            logger.error(f"Playback of session {self.session_id} stopped: {e}")
+            self._failed = True
+            self._ended = True
+            return None
+        self.frames_played += 1
+        self._read_time = frame["timestamp"]
+        return frame
+
+    def _open(self, offset=0.0):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = self.db_logger.iter_playback(self.session_id, offset=offset, flush=False)
+        self._cursor = None
+        self._lookahead = None
+        self._read_time = None
+        self._ended = False
+        self._jumped = False
+
+    async def next_frame(self, elapsed=None):
+        """
+        Advance the play cursor and return the frame to publish, or None if no
+        recorded frame became due (between frames, paused, or no data).
+
+        Args:
+            elapsed: Seconds since the previous tick (None: measured with `clock`)
+        """
+        if self.session_id is None or self._failed:
+            return None
+
+        now = self.clock()
+        if elapsed is None:
+            elapsed = 0.0 if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+
+        if self._pending_offset is not None:
+            # New seek target: reopen at the offset (index lookup, no scan)
+            if self._session_start is None:
+                session = self.db_logger.get_session(self.session_id)
+                self._session_start = session["start_time"] if session else None
+            self._open(self._pending_offset)
+            self._pending_offset = None
+
+        moving = not self.paused or self._step_frames > 0
+        frames = await self._due_frames(elapsed)
+        if not frames and self._ended and moving and self.frames_played and not self._failed:
+            # End of recording: loop back to the start
+            self._open()
+            frames = await self._due_frames(0.0)
+
+        if not frames:
+            if self._ended and not self.frames_played and not self._empty_warned:
+                logger.warning(f"No playback data in session {self.session_id}")
+                self._empty_warned = True
+            return None
+
+        self.frames_skipped += len(frames) - 1
+        if self.decimation == self.AGGREGATE:
+            frame = aggregate_frames(frames)
+        else:
+            frame = frames[-1]
+        self.latest = frame
+        return frame
+
+    async def _due_frames(self, elapsed):
+        """
+        Recorded frames the cursor passes this tick, oldest first.
+        """
+        if self._cursor is None:
+            # Fresh start (open, seek, loop): the first frame goes out right away, even when paused
+            frame = await self._next()
+            if frame is None:
+                return []
+            self._cursor = frame["timestamp"]
+            return [frame]
+
+        if self._step_frames:
+            count, self._step_frames = self._step_frames, 0
+            frames = []
+            for _ in range(count):
+                frame = await self._next()
+                if frame is None:
+                    break
+                frames.append(frame)
+            if frames:
+                self._cursor = frames[-1]["timestamp"]
+            return frames
+        if self.paused:
+            return []
+
+        self._cursor += elapsed * self.speed
+        limit = PLAYBACK_SKIP_SECONDS if self.decimation == self.DECIMATE else PLAYBACK_MAX_AGGREGATE_SECONDS
+        if not self._ended and self._cursor - self._read_time > limit:
+            # Far ahead of the recording (high speed): look up the frame at the cursor
+            # instead of decoding every frame in between
+            if self._read_frame is None:
+                self._read_frame = self.db_logger.frame_reader(self.session_id, flush=False)
+            frame = self._read_frame(self._cursor - PLAYBACK_TOLERANCE)
+            self._lookahead = None
+            if frame is None:
+                self._ended = True
+                return []
+            self._jumped = True
+            self._read_time = frame["timestamp"]
+            self._cursor = max(self._cursor, frame["timestamp"])
+            self.frames_played += 1
+            return [frame]
+        if self._jumped:
+            # Back to normal speed after a jump: continue reading after the frame it landed on
+            cursor = self._cursor
+            self._open(self._read_time - self._session_start + PLAYBACK_TOLERANCE)
+            self._cursor = cursor
+
+        frames = []
+        while True:
+            frame = await self._next()
+            if frame is None:
+                break
+            if frame["timestamp"] > self._cursor + PLAYBACK_TOLERANCE:
+                self._lookahead = frame
+                break
+            frames.append(frame)
+        return frames
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def describe(self):
+        position = self.position
+        return {
+            "id": self.stream_id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "subscribers": len(self.subscribers),
+            "speed": self.speed,
+            "paused": self.paused,
+            "decimation": self.decimation,
+            "position": None if position is None else round(position, 3)
+        }
+
+class AlertStream:
+    """
+    Alert events raised by the anomaly detectors (anomaly_detection) for every
+    live stream. Produces no frames: events are pushed with Broadcaster.publish_event().
+    """
+    kind = "alerts"
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.session_id = None
+        self.subscribers = set()
+
+    def close(self):
+        pass
+
+    def describe(self):
+        return {
+            "id": self.stream_id,
+            "kind": self.kind,
+            "session_id": None,
+            "subscribers": len(self.subscribers)
+        }
+
+class StreamHub:
+    """
+    Registry of every stream the server hosts, keyed by stream id.
+
+    Live streams always advance (and record) once per tick; playback streams
+    only advance while someone is subscribed and are dropped once the last
+    subscriber leaves.
+    """
+
+    def __init__(self, db_logger, metrics=None, workers=None, history=None, broadcaster=None):
+        """
+        Args:
+            db_logger: TelemetryLogger recording live streams and serving playback
+            metrics: Optional Metrics registry (generate / playback_read timers)
+            workers: Optional sim_workers.WorkerPool simulating the live cars out of process
+            history: Optional frame_history.FrameHistory, fed with every live frame
+            broadcaster: Optional broadcaster.Broadcaster, told when a stream is removed
+        """
+        self.db_logger = db_logger
+        self.workers = workers
+        self.history = history
+        self.broadcaster = broadcaster
+        self.streams = {}
+        self._generate_timer = metrics.timer("generate") if metrics is not None else None
+        self._playback_timer = metrics.timer("playback_read") if metrics is not None else None
+
+    def get(self, stream_id):
+        return self.streams.get(stream_id)
+
+    def recent(self, stream_id):
+        """
+        In-memory history of a live stream (frame_history.StreamHistory), or None.
+        A stream reset since its last frame has an empty history, not the previous session's.
+        """
+        stream = self.streams.get(stream_id)
+        if self.history is None or stream is None or stream.kind != LiveStream.kind:
+            return None
+        return self.history.get(stream_id, stream.session_id)
+
+    def next_car_id(self):
+        """
+        Lowest car_N id not taken by any stream.
+        """
+        return next(car_id for car_id in (f"car_{n}" for n in itertools.count()) if car_id not in self.streams)
+
+    def add_live(self, stream_id, generator=None):
+        if stream_id in self.streams:
+            raise ValueError(f"Stream already exists: {stream_id}")
+        if self.workers is not None and generator is None:
+            stream = self.workers.add_car(stream_id, self.db_logger)
+        else:
+            stream = LiveStream(stream_id, self.db_logger, generator)
+        self.streams[stream_id] = stream
+        logger.info(f"Live stream {stream_id} started (session {stream.session_id})")
+        return stream
+
+    def add(self, stream):
+        """
+        Register a stream built elsewhere (e.g. an ingest.IngestStream).
+        """
+        if stream.stream_id in self.streams:
+            raise ValueError(f"Stream already exists: {stream.stream_id}")
+        self.streams[stream.stream_id] = stream
+        return stream
+
+    def add_alerts(self, stream_id):
+        if stream_id in self.streams:
+            raise ValueError(f"Stream already exists: {stream_id}")
+        stream = AlertStream(stream_id)
+        self.streams[stream_id] = stream
+        return stream
+
+    def open_playback(self, stream_id, session_id=None, offset=0.0, source=None, **options):
+        """
+        (Re)open a playback stream. options: PlaybackStream speed / decimation / clock.
+        source: what to replay instead of the database (a frame_history.HistorySnapshot).
+        """
+        self.remove(stream_id)
+        stream = PlaybackStream(stream_id, source or self.db_logger, session_id, offset, **options)
+        self.streams[stream_id] = stream
+        return stream
+
+    def remove(self, stream_id):
+        stream = self.streams.pop(stream_id, None)
+        if stream is not None and self.history is not None:
+            self.history.remove(stream_id)
+        if stream is not None and self.broadcaster is not None:
+            self.broadcaster.forget(stream_id, stream.subscribers)
+        if stream is not None:
+            for client in list(stream.subscribers):
+                client.subscriptions.pop(stream_id, None)
+            stream.close()
+        return stream
+
+    def subscribe(self, client, stream_id, channels=None):
+        """
+        Subscribe a client to a stream. channels: list of top-level frame keys, or None for all.
+        """
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            raise ValueError(f"Unknown stream: {stream_id}")
+        stream.subscribers.add(client)
+        client.subscriptions[stream_id] = tuple(channels) if channels else None
+        return stream
+
+    def unsubscribe(self, client, stream_id):
+        client.subscriptions.pop(stream_id, None)
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            return
+        stream.subscribers.discard(client)
+        if stream.kind == PlaybackStream.kind and not stream.subscribers:
+            self.remove(stream_id)
+
+    def unsubscribe_all(self, client):
+        for stream_id in list(client.subscriptions):
+            self.unsubscribe(client, stream_id)
+
+    async def tick(self, steps=None, physics_dt=None):
+        """
+        Advance every active stream by one frame.
+        Live streams first run `steps` fixed physics steps of `physics_dt` (None: wall-clock step);
+        playback cursors advance by the same simulated time (None: their own clock).
+        Returns a list of (stream, frame) for the streams that produced one.
+        """
+        elapsed = None if steps is None else steps * physics_dt
+        produced = []
+        for stream in list(self.streams.values()):
+            if stream.kind == LiveStream.kind:
+                timer = self._generate_timer
+                began = time.perf_counter() if timer is not None else 0.0
+                frame = await stream.next_frame(steps, physics_dt)
+            elif stream.kind == PlaybackStream.kind and stream.subscribers:
+                timer = self._playback_timer
+                began = time.perf_counter() if timer is not None else 0.0
+                frame = await stream.next_frame(elapsed)
+            else:
+                continue
+            if timer is not None:
+                timer.record(time.perf_counter() - began)
+            if frame is not None:
+                if self.history is not None and stream.kind == LiveStream.kind:
+                    self.history.record(stream, frame)
+                produced.append((stream, frame))
+        return produced
+
+    def describe(self):
+        return [stream.describe() for stream in self.streams.values()]
+
+    def close(self):
+        for stream_id in list(self.streams):
+            self.remove(stream_id)
@@ -1,18 +1,89 @@
-import time
-import math
-import random
-
 import time
 import math
 import random
 from physics_engine import TireModel, AeroModel
+from frame_schema import FrameBuffer, TIRE_BASE, AERO_BASE
+
+# Random events as rates per second, so they don't depend on the physics step
+CORNER_EXIT_RATE = 0.6 # 1% per frame at 60 Hz
+ANOMALY_RATE = 0.03    # 0.05% per frame at 60 Hz
+
+# Longest physics step; longer steps are split into equal substeps
+MAX_STEP = 0.1
+
+# Longest wall-clock gap one frame catches up on; the rest of a longer gap is skipped
+MAX_CATCHUP = 5.0
+
+class Checkpoint:
+    """
+    The full simulation state of a TelemetryGenerator at one instant (see
+    TelemetryGenerator.checkpoint()): car, tires, aero / DRS and RNG state.
+
+    Shares nothing mutable with the generator it came from and pickles, so
+    it can be restored any number of times, here or in another process.
+    """
+    __slots__ = ("state", "tires", "aero", "rng_state")
+
+    def __init__(self, state, tires, aero, rng_state):
+        """
+        Args:
+            state: {slot: value} of the generator's own state (STATE_SLOTS)
+            tires: TireModel copies (FL, FR, RL, RR)
+            aero: AeroModel copy
+            rng_state: The RNG's getstate()
+        """
+        self.state = state
+        self.tires = tires
+        self.aero = aero
+        self.rng_state = rng_state
+
+    @property
+    def sim_time(self):
+        return self.state["sim_time"]
+
+    @property
+    def timestamp(self):
+        """
+        Timestamp of the frame the generator would report at this state.
+        """
+        return self.state["start_time"] + self.state["sim_time"]
 
 class TelemetryGenerator:
-    def __init__(self):
+    # Fixed attribute set (see reset() for what each holds)
+    __slots__ = ("rng", "clock", "integrator", "max_step", "max_catchup",
+                 "start_time", "state", "speed", "rpm", "gear", "throttle", "brake", "steering",
+                 "engine_temp", "distance", "last_update", "sim_time",
+                 "drag_force", "downforce_n", "anomaly_pending",
+                 "mass", "max_power", "tire_friction", "tires", "aero",
+                 "gear_ratios", "max_rpm", "idle_rpm", "shift_up_rpm", "shift_down_rpm")
+
+    def __init__(self, seed=None, rng=None, clock=time.time, integrator=TireModel.EULER, max_step=MAX_STEP,
+                 max_catchup=MAX_CATCHUP):
+        """
+        Args:
+            seed: Seed for the generator's own RNG (None: seeded from the OS)
+            rng: random.Random-compatible source to use instead (overrides seed)
+            clock: Wall clock (seconds since epoch), read on reset and by wall-clock steps
+            integrator: TireModel.EULER or TireModel.EXACT. EXACT also relaxes rpm and
+                        engine temperature exactly, so it stays stable with a larger max_step.
+            max_step: Longest physics substep (seconds)
+            max_catchup: Longest gap (seconds) a wall-clock step simulates; the rest is skipped
+        """
+        if integrator not in TireModel.INTEGRATORS:
+            raise ValueError(f"Invalid integrator: {integrator}. Valid: {list(TireModel.INTEGRATORS)}")
+        if max_step <= 0:
+            raise ValueError("max_step must be positive")
+        if max_catchup <= 0:
+            raise ValueError("max_catchup must be positive")
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.clock = clock
+        self.integrator = integrator
+        self.max_step = max_step
+        self.max_catchup = max_catchup
         self.reset()
 
     def reset(self):
-        self.start_time = time.time()
+        self.start_time = self.clock()
         self.state = "ACCELERATE"
         self.speed = 0.0 # m/s internally, converted to km/h for output
         self.rpm = 1000.0
@@ -22,7 +93,13 @@ class TelemetryGenerator:
         self.steering = 0.0
         self.engine_temp = 90.0
         self.distance = 0.0
-        self.last_update = time.time()
+        self.last_update = self.start_time
+        self.sim_time = 0.0 # Simulated seconds since reset
+
+        # Outputs of the last step, reported by snapshot()
+        self.drag_force = 0.0
+        self.downforce_n = 0.0
+        self.anomaly_pending = False
         
         # F1 Physics Constants
         self.mass = 798.0 # kg (Min weight)
@@ -34,10 +111,10 @@ class TelemetryGenerator:
         
         # Advanced Physics: Tires (FL, FR, RL, RR)
         self.tires = [
-            TireModel("SOFT"), # FL
-            TireModel("SOFT"), # FR
-            TireModel("SOFT"), # RL
-            TireModel("SOFT")  # RR
+            TireModel("SOFT", self.integrator), # FL
+            TireModel("SOFT", self.integrator), # FR
+            TireModel("SOFT", self.integrator), # RL
+            TireModel("SOFT", self.integrator)  # RR
         ]
         
         # Advanced Physics: Aerodynamics
@@ -59,15 +136,94 @@ class TelemetryGenerator:
         self.shift_up_rpm = 11600.0
         self.shift_down_rpm = 5000.0
 
-    def get_next_frame(self):
-        current_time = time.time()
+    def checkpoint(self):
+        """
+        Capture the full simulation state as a Checkpoint (~35 us, half of it
+        the RNG's getstate(); the models are copied slot by slot).
+        """
+        state = {name: getattr(self, name) for name in STATE_SLOTS}
+        state["gear_ratios"] = dict(self.gear_ratios)
+        return Checkpoint(state, [tire.copy() for tire in self.tires], self.aero.copy(), self.rng.getstate())
+
+    def restore(self, checkpoint):
+        """
+        Return to a checkpointed state, RNG included: from there the generator
+        repeats the original run's random events as long as it takes the same steps.
+        The clock is kept (timestamps continue from the checkpoint's start_time).
+        """
+        for name, value in checkpoint.state.items():
+            setattr(self, name, value)
+        self.gear_ratios = dict(checkpoint.state["gear_ratios"])
+        self.tires = [tire.copy() for tire in checkpoint.tires]
+        self.aero = checkpoint.aero.copy()
+        self.rng.setstate(checkpoint.rng_state)
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint, clock=time.time):
+        """
+        A new generator in a checkpointed state (with its own RNG, set to the checkpoint's state).
+        """
+        generator = cls.__new__(cls)
+        generator.rng = random.Random()
+        generator.clock = clock
+        generator.restore(checkpoint)
+        return generator
+
+    def get_next_frame(self, dt=None):
+        """
+        Advance the simulation and return a telemetry frame.
+
+        Args:
+            dt: Fixed time step (seconds). None takes it from the wall clock.
+        """
+        return self.next_frame_into(FrameBuffer(), dt).to_frame()
+
+    def next_frame_into(self, buffer, dt=None):
+        """
+        get_next_frame(), writing the frame into `buffer` (a FrameBuffer) in place.
+        Returns the buffer.
+        """
+        if dt is not None:
+            self.step(dt)
+            return self.snapshot_into(buffer)
+
+        current_time = self.clock()
         dt = current_time - self.last_update
         self.last_update = current_time
         
-        # Prevent physics explosion on large time steps (e.g. after pause or lag)
-        if dt > 0.1:
-            dt = 0.1
-        
+        # A long gap (pause or lag) is substepped by step(), so no simulated time is lost,
+        # up to max_catchup. Past that the car resumes from where it was, resynced to the clock,
+        # rather than running tens of thousands of substeps in one frame.
+        if dt > self.max_catchup:
+            self.start_time += dt - self.max_catchup
+            dt = self.max_catchup
+        self.step(dt)
+        return self.snapshot_into(buffer, current_time)
+
+    def step(self, dt):
+        """
+        Advance the physics by dt seconds without building a frame.
+        Steps longer than max_step are split into equal substeps.
+        """
+        if dt <= self.max_step:
+            self._advance(dt)
+            return
+        substeps = math.ceil(dt / self.max_step)
+        sub_dt = dt / substeps
+        for _ in range(substeps):
+            self._advance(sub_dt)
+
+    def _relax(self, rate, dt):
+        """
+        Fraction of the way a first-order lag x' = rate * (target - x) moves in dt.
+        """
+        if self.integrator == TireModel.EXACT:
+            return -math.expm1(-rate * dt)
+        return rate * dt
+
+    def _advance(self, dt):
+        self.sim_time += dt
+
         # --- State Machine ---
         if self.state == "ACCELERATE":
             self.throttle = 1.0
@@ -86,7 +242,7 @@ class TelemetryGenerator:
         elif self.state == "CORNER":
             self.throttle = 0.5 # Partial throttle maintenance
             self.brake = 0.0
-            if random.random() < 0.01: # Exit corner
+            if self.rng.random() < CORNER_EXIT_RATE * dt: # Exit corner
                 self.state = "ACCELERATE"
         
         # --- Tire Updates ---
@@ -117,7 +273,7 @@ class TelemetryGenerator:
                     
             elif self.state == "CORNER":
                 slip = 0.08
-                if random.random() > 0.5:
+                if self.rng.random() > 0.5:
                     if i % 2 == 0: load *= 1.5
                     else: load *= 0.5
                 else:
@@ -130,7 +286,7 @@ class TelemetryGenerator:
         # Simulate DRS Zone: On straights (ACCELERATE) and speed > 150
         in_drs_zone = (self.state == "ACCELERATE" and speed_kmh > 150)
         # Simulate Time Gap: Randomly available (50% chance)
-        time_gap = 0.5 if random.random() > 0.5 else 1.5
+        time_gap = 0.5 if self.rng.random() > 0.5 else 1.5
         
         self.aero.update(speed_kmh, in_drs_zone, time_gap)
         
@@ -139,6 +295,8 @@ class TelemetryGenerator:
             self.aero.toggle_drs()
             
         drag_force, downforce_n = self.aero.calculate_forces(speed_kmh)
+        self.drag_force = drag_force
+        self.downforce_n = downforce_n
 
         # --- Physics Calculation (F = ma) ---
         
@@ -175,12 +333,13 @@ class TelemetryGenerator:
         # 6. Update Velocity
         self.speed += acceleration * dt
         self.speed = max(0.0, self.speed)
+        self.distance += self.speed * dt
 
         # --- Gear Logic ---
         current_gear_max = self.gear_ratios[self.gear]
         target_rpm = (self.speed / current_gear_max) * self.max_rpm
         target_rpm = max(self.idle_rpm, min(self.max_rpm, target_rpm))
-        self.rpm += (target_rpm - self.rpm) * 20.0 * dt
+        self.rpm += (target_rpm - self.rpm) * self._relax(20.0, dt)
 
         if self.rpm > self.shift_up_rpm and self.gear < 8:
             self.gear += 1
@@ -191,31 +350,67 @@ class TelemetryGenerator:
 
         # Engine Temp
         target_temp = 90.0 + (self.rpm / 12000.0) * 30.0
-        self.engine_temp += (target_temp - self.engine_temp) * 0.5 * dt
+        self.engine_temp += (target_temp - self.engine_temp) * self._relax(0.5, dt)
         
-        # Anomaly
-        is_anomaly = False
-        if random.random() < 0.0005:
+        # Anomaly (latched until the next snapshot, so it isn't lost between published frames)
+        if self.rng.random() < ANOMALY_RATE * dt:
              self.engine_temp = 135.0
-             is_anomaly = True
+             self.anomaly_pending = True
 
         # DEBUG
         # print(f"State: {self.state} | Speed: {speed_kmh:.1f} km/h | DRS: {self.aero.drs_active}")
 
-        return {
-            "timestamp": current_time,
-            "speed_kmh": round(speed_kmh, 2),
-            "rpm": round(self.rpm, 0),
-            "gear": self.gear,
-            "throttle": round(self.throttle, 2),
-            "brake": round(self.brake, 2),
-            "steering": round(self.steering, 2),
-            "engine_temp": round(self.engine_temp, 1),
-            "is_anomaly": is_anomaly,
-            "tires": [t.get_status() for t in self.tires],
-            "aero": {
-                "drs": self.aero.drs_active,
-                "drag": round(drag_force, 0),
-                "downforce": round(downforce_n, 0)
-            }
-        }
+    def align_clock(self):
+        """
+        Shift start_time so the current simulated time reads as the clock's now.
+        Fixed-step loops call it on the first frame after reset(): their timestamps then
+        follow the wall clock of their ticks, however long after reset() the loop started.
+        """
+        self.start_time = self.clock() - self.sim_time
+
+    def snapshot(self, timestamp=None):
+        """
+        Telemetry frame for the current state.
+
+        Args:
+            timestamp: Frame time. None uses simulated time (start_time + sim_time).
+        """
+        return self.snapshot_into(FrameBuffer(), timestamp).to_frame()
+
+    def snapshot_into(self, buffer, timestamp=None):
+        """
+        Write the current state into `buffer` (a FrameBuffer) in place: the
+        frame_schema channels, at the precision snapshot() reports them.
+        Returns the buffer.
+        """
+        if timestamp is None:
+            timestamp = self.start_time + self.sim_time
+        values = buffer.values
+
+        values[0] = timestamp
+        values[1] = round(self.speed * 3.6, 2)
+        values[2] = round(self.rpm, 0)
+        values[3] = self.gear
+        values[4] = round(self.throttle, 2)
+        values[5] = round(self.brake, 2)
+        values[6] = round(self.steering, 2)
+        values[7] = round(self.engine_temp, 1)
+        values[8] = self.anomaly_pending
+        self.anomaly_pending = False
+
+        # Same fields and rounding as TireModel.get_status()
+        i = TIRE_BASE
+        for tire in self.tires:
+            values[i] = tire.compound_name
+            values[i + 1] = round(tire.temperature, 1)
+            values[i + 2] = round(tire.wear * 100, 1)
+            values[i + 3] = round(tire.grip, 2)
+            i += 4
+
+        values[AERO_BASE] = self.aero.drs_active
+        values[AERO_BASE + 1] = round(self.drag_force, 0)
+        values[AERO_BASE + 2] = round(self.downforce_n, 0)
+        return buffer
+
+# Generator slots a Checkpoint holds as plain values (the RNG, clock and models are captured separately)
+STATE_SLOTS = tuple(name for name in TelemetryGenerator.__slots__ if name not in ("rng", "clock", "tires", "aero"))
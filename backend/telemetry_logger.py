@@ -1,38 +1,1225 @@
 import sqlite3
 import json
+import os
 import time
+import threading
+import queue
+import asyncio
+import logging
+from collections import deque
+
+import numpy as np
+
+from frame_schema import (CHANNELS, CHANNEL_NAMES, TIME, flatten_frame, unflatten_frame, dequantize,
+                          get_channel, quantize_frame, quantize_values, dequantize_values)
+from delta_codec import DeltaEncoder, KEYFRAME, KEYFRAME_INTERVAL
+from wire_protocol import BODY, to_wire, from_wire, pack_delta, unpack_delta
+from session_archive import SessionArchive, ArchivePlaybackReader
+from rollups import (ROLLUP_TIERS, ROLLUP_CHANNELS, ROLLUP_INDEX, STATS_SHAPE, MIN, MAX, SUM, COUNT,
+                     RollupAccumulator, frames_to_arrays, coarsen, choose_resolution)
+
+logger = logging.getLogger("TelemetryLogger")
+
+# Playback defaults: ~10 s of 60 Hz frames per chunk, two chunks read ahead
+PLAYBACK_CHUNK_SIZE = 600
+PLAYBACK_PREFETCH = 2
+
+# History queries: default point budget per channel
+HISTORY_MAX_POINTS = 1000
+
+# Frames per array yielded by iter_quantized() (archive export / copy)
+QUANTIZED_CHUNK_SIZE = 65536
+
+# Engine name of sessions attached from an archive file (session_archive.py)
+ARCHIVE_ENGINE = "archive"
+
+class JsonFrameStore:
+    """
+    Default storage engine: the whole frame as one JSON document per row.
+    """
+    name = "json"
+    table = "telemetry"
+    column_defs = "data TEXT"
+    columns = ("data",)
+    # Whole-table playback (session_id None) of pre-session recordings
+    timestamp_index = True
+
+    def encoder(self):
+        # Stateless: one encoder serves every session
+        return self
+
+    def decoder(self, conn, session_id=None):
+        return self.decode
+
+    def encode(self, data):
+        return (json.dumps(data),)
+
+    def encode_values(self, values):
+        return (json.dumps(unflatten_frame(values)),)
+
+    def decode(self, row):
+        # row = (id, timestamp, data)
+        return json.loads(row[2])
+
+class ColumnarFrameStore:
+    """
+    Columnar storage engine: one typed column per frame_schema channel.
+
+    Channels are stored as fixed-point integers at the precision the generator
+    rounds them to (lossless), compounds as small codes. No key names are
+    repeated per row, and a single channel can be read for a whole session
+    without decoding anything else. Fields outside frame_schema are not kept.
+    """
+    name = "columnar"
+    table = "telemetry_columns"
+    # Always read per session; a second timestamp index would add ~25% to the file
+    timestamp_index = False
+
+    def __init__(self):
+        # Timestamp already has its own column in every store table
+        self._channels = CHANNELS[1:]
+        self.columns = CHANNEL_NAMES[1:]
+        self.column_defs = ", ".join(
+            f"{c.name} {'REAL' if c.kind == TIME else 'INTEGER'}" for c in self._channels
+        )
+
+    def encoder(self):
+        return self
+
+    def decoder(self, conn, session_id=None):
+        return self.decode
+
+    def encode(self, data):
+        return self.encode_values(flatten_frame(data))
+
+    def encode_values(self, values):
+        return tuple(quantize_values(values)[1:])
+
+    def decode(self, row):
+        # row = (id, timestamp, *columns)
+        values = [row[1]]
+        values += [dequantize(c, v) for c, v in zip(self._channels, row[2:])]
+        return unflatten_frame(values)
+
+class DeltaFrameStore:
+    """
+    Delta storage engine: a keyframe every `keyframe_interval` frames and, in
+    between, only the channels that changed since that keyframe (delta_codec),
+    packed in the binary wire layout. Rows point at their keyframe by
+    timestamp within their session (key_time, NULL on keyframes), so playback
+    can start at any row.
+    """
+    name = "delta"
+    table = "telemetry_delta"
+    column_defs = "key_time REAL, data BLOB"
+    columns = ("key_time", "data")
+    timestamp_index = False
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+
+    def encoder(self):
+        # Keyframe state is per session
+        return _DeltaRowEncoder(self.keyframe_interval)
+
+    def decoder(self, conn, session_id=None):
+        return _DeltaRowDecoder(self, conn, session_id).decode
+
+class _DeltaRowEncoder:
+    def __init__(self, keyframe_interval):
+        self._encoder = DeltaEncoder(keyframe_interval)
+        self._key_time = None
+
+    def encode(self, data):
+        return self.encode_values(flatten_frame(data))
+
+    def encode_values(self, values):
+        values = quantize_values(values)
+        kind, _, payload = self._encoder.encode(values)
+        if kind == KEYFRAME:
+            self._key_time = values[0]
+            return (None, BODY.pack(*to_wire(values)))
+        # The timestamp always changes and already has its own column
+        return (self._key_time, pack_delta([(i, v) for i, v in payload if i != 0]))
+
+class _DeltaRowDecoder:
+    def __init__(self, store, conn, session_id):
+        self._store = store
+        self._conn = conn
+        self._session_id = session_id
+        self._key_time = None
+        self._keyframe = None
+
+    def _load_keyframe(self, key_time, row_id):
+        # Playback started between keyframes: one (session_id, timestamp) index lookup
+        if self._session_id is not None:
+            scope, params = 'session_id = ?', [self._session_id]
+        else:
+            # Every session interleaved: key_time alone may match another car's keyframe
+            scope, params = f'session_id = (SELECT session_id FROM {self._store.table} WHERE id = ?)', [row_id]
+        row = self._conn.execute(
+            f'SELECT data FROM {self._store.table} WHERE {scope} AND timestamp = ? AND key_time IS NULL LIMIT 1',
+            params + [key_time]
+        ).fetchone()
+        self._key_time = key_time
+        self._keyframe = from_wire(BODY.unpack(row[0])) if row else [None] * len(CHANNELS)
+
+    def decode(self, row):
+        # row = (id, timestamp, key_time, data)
+        row_id, timestamp, key_time, data = row
+        if key_time is None:
+            self._key_time = timestamp
+            self._keyframe = from_wire(BODY.unpack(data))
+            return dequantize_values(self._keyframe)
+        if key_time != self._key_time or self._session_id is None:
+            # Unscoped: the cached keyframe may belong to another session
+            self._load_keyframe(key_time, row_id)
+        values = list(self._keyframe)
+        values[0] = timestamp
+        for i, value in unpack_delta(data):
+            values[i] = value
+        return dequantize_values(values)
+
+STORAGE_ENGINES = {
+    JsonFrameStore.name: JsonFrameStore(),
+    ColumnarFrameStore.name: ColumnarFrameStore(),
+    DeltaFrameStore.name: DeltaFrameStore(),
+}
 
 class TelemetryLogger:
-    def __init__(self, db_name="telemetry.db"):
-        self.conn = sqlite3.connect(db_name)
+    """
+    Buffered SQLite telemetry logger.
+
+    log() only appends the frame to a bounded in-memory queue. A background
+    writer thread drains the queue in batches (executemany inside a single
+    transaction) whenever `batch_size` frames are pending or `flush_interval`
+    seconds have passed, so the asyncio loop never waits on disk.
+    """
+
+    # Overflow policies for the bounded write queue
+    DROP_OLDEST = "drop_oldest" # Discard the oldest pending frame (keeps the newest data)
+    DROP_NEWEST = "drop_newest" # Reject the incoming frame
+    BLOCK = "block"             # Backpressure: wait for the writer to make room
+
+    OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+    WRITE_RETRIES = 3 # Failed writes a batch is retried for before its frames are dropped
+    SESSION_COLUMNS = "id, name, created_at, closed_at, start_time, end_time, frame_count, engine, archive_path"
+
+    def __init__(self, db_name="telemetry.db", batch_size=120, flush_interval=0.5,
+                 max_queue=6000, overflow_policy=DROP_OLDEST, synchronous="NORMAL",
+                 wal=True, engine="json", rollups=True, metrics=None):
+        """
+        Args:
+            db_name: SQLite database path
+            engine: Storage engine for new sessions ("json", "columnar" or "delta").
+                    Sessions recorded with any engine can always be replayed.
+            batch_size: Pending frames that trigger an immediate flush
+            flush_interval: Max seconds a frame waits in memory before being written
+            max_queue: Bound on pending frames (memory cap if the disk stalls)
+            overflow_policy: One of OVERFLOW_POLICIES, applied when the queue is full
+            synchronous: SQLite synchronous level (OFF, NORMAL, FULL, EXTRA)
+            wal: Enable write-ahead logging (readers don't block the writer)
+            rollups: Maintain the 1 s / 10 s / 1 min rollup tiers as frames are written
+                     (sessions recorded without them are rolled up on their first history query)
+            metrics: Optional Metrics registry (db_write timer, db_batch frames per batch)
+        """
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {overflow_policy}. Valid: {list(self.OVERFLOW_POLICIES)}")
+        synchronous = synchronous.upper()
+        if synchronous not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid synchronous level: {synchronous}. Valid: {list(self.SYNCHRONOUS_LEVELS)}")
+        if engine not in STORAGE_ENGINES:
+            raise ValueError(f"Invalid storage engine: {engine}. Valid: {list(STORAGE_ENGINES.keys())}")
+
+        self.db_name = db_name
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.max_queue = max(self.batch_size, int(max_queue))
+        self.overflow_policy = overflow_policy
+        self.engine = engine
+        self.store = STORAGE_ENGINES[engine]
+        self.rollups = rollups
+        self._write_timer = metrics.timer("db_write") if metrics is not None else None
+        self._batch_sizes = metrics.histogram("db_batch") if metrics is not None else None
+
+        # Read connection (caller thread) and write connection (writer thread).
+        # An in-memory database only exists per connection, so share it.
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        if db_name == ":memory:":
+            self._write_conn = self.conn
+        else:
+            self._write_conn = sqlite3.connect(db_name, check_same_thread=False)
+
+        if wal and db_name != ":memory:":
+            self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._insert_sql = (
+            f"INSERT INTO {self.store.table} (session_id, timestamp, {', '.join(self.store.columns)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in self.store.columns)})"
+        )
+        self.session_id = None # Active recording session (started on first log if not set)
+        self._open_sessions = set() # Every session opened and not yet closed by this logger
+        self._encoders = {} # session_id -> store encoder (writer side, under _write_lock)
+        self._rollups = {} # session_id -> RollupAccumulator (writer side, under _write_lock)
+        self._archives = {} # session_id -> SessionArchive of attached archive sessions (readers)
         self.create_table()
 
+        # Stats
+        self.frames_written = 0
+        self.frames_dropped = 0 # Overflow, or a batch that could not be written
+        self.batches_written = 0
+        self._failed_writes = 0 # Consecutive failed batch writes
+
+        # Write queue
+        self._pending = deque()
+        self._closing = {} # session_id -> closed_at, stored by the writer with the next batch
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock() # Keeps batches in order (writer thread vs flush())
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._writer_loop, name="TelemetryLoggerWriter", daemon=True)
+        self._writer.start()
+
     def create_table(self):
-        cursor = self.conn.cursor()
+        cursor = self._write_conn.cursor()
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS telemetry (
+            CREATE TABLE IF NOT EXISTS sessions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp REAL,
-                data TEXT
+                name TEXT,
+                created_at REAL,
+                closed_at REAL,
+                start_time REAL,
+                end_time REAL,
+                frame_count INTEGER DEFAULT 0,
+                engine TEXT DEFAULT 'json',
+                archive_path TEXT
             )
         ''')
-        self.conn.commit()
+        for store in STORAGE_ENGINES.values():
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {store.table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id INTEGER,
+                    timestamp REAL,
+                    {store.column_defs}
+                )
+            ''')
+        # One row per (session, tier, bucket); data is the bucket's stats (see rollups.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telemetry_rollups (
+                session_id INTEGER,
+                tier REAL,
+                bucket REAL,
+                frames INTEGER,
+                data BLOB,
+                PRIMARY KEY (session_id, tier, bucket)
+            ) WITHOUT ROWID
+        ''')
 
-    def log(self, data):
-        cursor = self.conn.cursor()
-        cursor.execute('INSERT INTO telemetry (timestamp, data) VALUES (?, ?)', 
-                       (data.get('timestamp', time.time()), json.dumps(data)))
-        self.conn.commit()
+        # Migrate databases recorded before sessions / storage engines existed
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(telemetry)')]
+        if 'session_id' not in columns:
+            cursor.execute('ALTER TABLE telemetry ADD COLUMN session_id INTEGER')
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(sessions)')]
+        if 'engine' not in columns:
+            cursor.execute("ALTER TABLE sessions ADD COLUMN engine TEXT DEFAULT 'json'")
+        if 'archive_path' not in columns:
+            cursor.execute('ALTER TABLE sessions ADD COLUMN archive_path TEXT')
+        self._adopt_orphan_frames(cursor)
+
+        # Keyset pagination for playback walks these indexes instead of sorting the table.
+        # (session_id, timestamp) makes seeking inside a session O(log n).
+        for store in STORAGE_ENGINES.values():
+            if store.timestamp_index:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{store.table}_timestamp ON {store.table} (timestamp)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{store.table}_session_ts ON {store.table} (session_id, timestamp)')
+        self._write_conn.commit()
+
+    def _adopt_orphan_frames(self, cursor):
+        """
+        Group frames without a session (legacy recordings) into one "legacy" session.
+        """
+        count, start, end = cursor.execute(
+            'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM telemetry WHERE session_id IS NULL'
+        ).fetchone()
+        if not count:
+            return
+        cursor.execute(
+            'INSERT INTO sessions (name, created_at, closed_at, start_time, end_time, frame_count) VALUES (?, ?, ?, ?, ?, ?)',
+            ("legacy", start, end, start, end, count)
+        )
+        cursor.execute('UPDATE telemetry SET session_id = ? WHERE session_id IS NULL', (cursor.lastrowid,))
+
+    def open_session(self, name=None):
+        """
+        Create a new recording session without touching the active one.
+        Several sessions can be open at once (one per car); pass the id to log().
+        Returns the new session id.
+        """
+        with self._write_lock:
+            with self._write_conn:
+                cursor = self._write_conn.execute(
+                    'INSERT INTO sessions (name, created_at, engine) VALUES (?, ?, ?)', (name, time.time(), self.engine)
+                )
+            self._open_sessions.add(cursor.lastrowid)
+        return cursor.lastrowid
+
+    def close_session(self, session_id):
+        """
+        Close a session opened by this logger. Never touches the disk: the writer
+        thread stores closed_at with the session's last pending frames.
+        """
+        if session_id not in self._open_sessions:
+            return
+        with self._cond:
+            self._closing[session_id] = time.time()
+            self._open_sessions.discard(session_id)
+            self._cond.notify_all()
+        if session_id == self.session_id:
+            self.session_id = None
+
+    def start_session(self, name=None):
+        """
+        Close the active session (if any) and start recording into a new one.
+        Returns the new session id.
+        """
+        self.end_session()
+        self.session_id = self.open_session(name)
+        return self.session_id
+
+    def end_session(self):
+        """
+        Close the active session.
+        """
+        if self.session_id is not None:
+            self.close_session(self.session_id)
+
+    def log(self, data, session_id=None):
+        """
+        Queue a frame for writing. Never touches the disk.
+
+        Args:
+            data: Frame dict, or a tuple of channel values (FrameBuffer.snapshot())
+            session_id: Session to record into (defaults to the active session)
+        Returns:
+            True if the frame was queued, False if it was rejected (DROP_NEWEST
+            policy with a full queue, or logger closed).
+        """
+        if session_id is None:
+            if self.session_id is None:
+                self.start_session()
+            session_id = self.session_id
+
+        with self._cond:
+            if self._closed:
+                return False
+
+            if len(self._pending) >= self.max_queue:
+                if self.overflow_policy == self.DROP_OLDEST:
+                    self._pending.popleft()
+                    self.frames_dropped += 1
+                elif self.overflow_policy == self.DROP_NEWEST:
+                    self.frames_dropped += 1
+                    return False
+                else:
+                    # BLOCK: wait for the writer to drain
+                    self._cond.notify_all()
+                    self._cond.wait_for(lambda: len(self._pending) < self.max_queue or self._closed)
+                    if self._closed:
+                        return False
+
+            self._pending.append((session_id, data))
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def log_many(self, frames, session_id=None):
+        """
+        Queue a batch of frames under one lock (bulk ingest). The overflow
+        policy applies as in log(): DROP_OLDEST makes room by discarding the
+        oldest pending frames, DROP_NEWEST queues what fits, BLOCK waits for the
+        writer until the whole batch is queued.
+
+        Args:
+            frames: Sequence of frame dicts or channel value tuples, oldest first
+            session_id: Session to record into (defaults to the active session)
+        Returns:
+            Number of frames queued
+        """
+        if session_id is None:
+            if self.session_id is None:
+                self.start_session()
+            session_id = self.session_id
+
+        queued = index = 0
+        with self._cond:
+            while index < len(frames):
+                if self._closed:
+                    break
+                room = self.max_queue - len(self._pending)
+                remaining = len(frames) - index
+                if remaining > room:
+                    if self.overflow_policy == self.DROP_OLDEST:
+                        # Older than anything pending: a batch larger than the queue loses its own head
+                        skip = max(0, remaining - self.max_queue)
+                        index += skip
+                        dropped = min(remaining - skip - room, len(self._pending))
+                        for _ in range(dropped):
+                            self._pending.popleft()
+                        self.frames_dropped += skip + dropped
+                        room += dropped
+                    elif self.overflow_policy == self.DROP_NEWEST:
+                        self.frames_dropped += remaining - room
+                    elif room == 0:
+                        # BLOCK: wait for the writer to drain
+                        self._cond.notify_all()
+                        self._cond.wait_for(lambda: len(self._pending) < self.max_queue or self._closed)
+                        continue
+                chunk = frames[index:index + room]
+                self._pending.extend((session_id, data) for data in chunk)
+                index += len(chunk)
+                queued += len(chunk)
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+                if self.overflow_policy == self.DROP_NEWEST:
+                    break
+        return queued
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Synchronously write every pending frame. Safe to call from any thread.
+        """
+        while self._write_batch():
+            pass
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._closing or self._closed,
+                    timeout=self.flush_interval
+                )
+                closed = self._closed
+
+            # Size or deadline reached: write whatever is pending
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Telemetry batch write failed")
+                if not closed:
+                    # The batch was requeued: give the database a moment before retrying it
+                    with self._cond:
+                        self._cond.wait_for(lambda: self._closed, timeout=self.flush_interval)
+                # When closing, retry until every frame is written or dropped
+                continue
+
+            if closed:
+                return
+
+    def _write_batch(self):
+        """
+        Drain every pending frame and session close and write them in one transaction.
+        A batch whose write fails is put back at the front of the queue and
+        retried with the next one, up to WRITE_RETRIES times before it is dropped.
+        Returns the number of frames written.
+        """
+        with self._write_lock:
+            with self._cond:
+                if not self._pending and not self._closing:
+                    return 0
+                batch = list(self._pending)
+                self._pending.clear()
+                closing, self._closing = self._closing, {}
+                # Wake producers blocked by the BLOCK policy
+                self._cond.notify_all()
+            began = time.perf_counter()
+
+            rows = []
+            frames = [] # (session_id, data) as written, with timestamps filled in
+            for session_id, data in batch:
+                encoder = self._encoders.get(session_id)
+                if encoder is None:
+                    encoder = self._encoders[session_id] = self.store.encoder()
+                if type(data) is tuple:
+                    # Flat channel values: encoded without building a frame dict
+                    timestamp = data[0]
+                    if timestamp is None:
+                        timestamp = time.time()
+                        data = (timestamp,) + data[1:]
+                    rows.append((session_id, timestamp) + encoder.encode_values(data))
+                else:
+                    timestamp = data.get('timestamp')
+                    if timestamp is None:
+                        timestamp = time.time()
+                        data = dict(data, timestamp=timestamp)
+                    rows.append((session_id, timestamp) + encoder.encode(data))
+                frames.append((session_id, data))
 
-    def get_all_sessions(self):
-        # In a real app, we would group by session ID
-        pass
+            # Per-session bookkeeping so listing sessions never scans the frames
+            spans = {}
+            for row in rows:
+                session_id, timestamp = row[0], row[1]
+                span = spans.get(session_id)
+                if span is None:
+                    spans[session_id] = [timestamp, timestamp, 1]
+                else:
+                    span[0] = min(span[0], timestamp)
+                    span[1] = max(span[1], timestamp)
+                    span[2] += 1
+
+            try:
+                with self._write_conn:
+                    self._write_conn.executemany(self._insert_sql, rows)
+                    if self.rollups:
+                        self._write_rollups(frames)
+                    self._write_conn.executemany(
+                        'UPDATE sessions SET '
+                        'start_time = MIN(COALESCE(start_time, ?), ?), '
+                        'end_time = MAX(COALESCE(end_time, ?), ?), '
+                        'frame_count = frame_count + ? WHERE id = ?',
+                        [(lo, lo, hi, hi, n, sid) for sid, (lo, hi, n) in spans.items()]
+                    )
+                    self._write_conn.executemany(
+                        'UPDATE sessions SET closed_at = ? WHERE id = ?',
+                        [(closed_at, sid) for sid, closed_at in closing.items()]
+                    )
+            except sqlite3.Error:
+                self._write_failed(frames, spans, closing)
+                raise
+            self._failed_writes = 0
+            for session_id in closing:
+                self._encoders.pop(session_id, None)
+                self._rollups.pop(session_id, None)
+
+            self.frames_written += len(rows)
+            self.batches_written += 1
+            if self._write_timer is not None:
+                self._write_timer.record(time.perf_counter() - began)
+                self._batch_sizes.record(len(rows))
+            return len(rows)
+
+    def _write_failed(self, frames, spans, closing):
+        """
+        Requeue a batch whose transaction rolled back (writer side, under _write_lock).
+        Frames past WRITE_RETRIES attempts, or beyond max_queue, are dropped and counted;
+        session closes are always retried.
+        """
+        # The encoders and rollup accumulators already moved past the lost rows:
+        # restart them from what the database holds (a keyframe, the stored buckets)
+        for session_id in spans:
+            self._encoders.pop(session_id, None)
+            self._rollups.pop(session_id, None)
+        self._failed_writes += 1
+        with self._cond:
+            if self._failed_writes > self.WRITE_RETRIES:
+                keep = 0
+                self._failed_writes = 0
+            else:
+                keep = min(len(frames), self.max_queue - len(self._pending))
+            # Timestamps were filled in: a retried frame keeps its original time
+            self._pending.extendleft(reversed(frames[len(frames) - keep:]))
+            for session_id, closed_at in closing.items():
+                self._closing.setdefault(session_id, closed_at)
+            self.frames_dropped += len(frames) - keep
+
+    def _write_rollups(self, frames):
+        """
+        Fold a written batch into each session's rollup tiers (writer side, inside the batch transaction).
+        """
+        by_session = {}
+        for session_id, data in frames:
+            by_session.setdefault(session_id, []).append(data)
+
+        for session_id, session_frames in by_session.items():
+            accumulator = self._rollups.get(session_id)
+            if accumulator is None:
+                accumulator = self._rollups[session_id] = RollupAccumulator()
+            timestamps, values = frames_to_arrays(session_frames)
+            rows = accumulator.add(timestamps, values,
+                                   lambda width, bucket: self._load_rollup(session_id, width, bucket))
+            self._store_rollups(session_id, rows)
+
+    def _load_rollup(self, session_id, width, bucket):
+        row = self._write_conn.execute(
+            'SELECT frames, data FROM telemetry_rollups WHERE session_id = ? AND tier = ? AND bucket = ?',
+            (session_id, width, bucket)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], np.frombuffer(row[1], dtype=np.float64).reshape(STATS_SHAPE)
+
+    def _store_rollups(self, session_id, rows):
+        self._write_conn.executemany(
+            'INSERT OR REPLACE INTO telemetry_rollups (session_id, tier, bucket, frames, data) VALUES (?, ?, ?, ?, ?)',
+            [(session_id, width, bucket, frames, stats.tobytes()) for width, bucket, frames, stats in rows]
+        )
+
+    def build_rollups(self, session_id):
+        """
+        (Re)compute every rollup tier of a recorded session from its frames.
+        For sessions recorded before rollups existed, or with rollups=False.
+        Returns the number of rollup rows written.
+        """
+        data = self.read_channels(session_id, [c.name for c in ROLLUP_CHANNELS])
+        values = np.column_stack([data[c.name] for c in ROLLUP_CHANNELS]) if len(data["timestamp"]) \
+            else np.empty((0, len(ROLLUP_CHANNELS)))
+        with self._write_lock:
+            rows = RollupAccumulator().add(data["timestamp"], values, lambda width, bucket: None)
+            with self._write_conn:
+                self._write_conn.execute('DELETE FROM telemetry_rollups WHERE session_id = ?', (session_id,))
+                self._store_rollups(session_id, rows)
+        return len(rows)
+
+    def read_rollups(self, session_id, channels, resolution, start=None, end=None):
+        """
+        Rollup buckets of a session at one resolution.
+
+        Args:
+            session_id: Session to read
+            channels: Rolled-up channel names (rollups.ROLLUP_CHANNELS)
+            resolution: A tier width (ROLLUP_TIERS) or a multiple of the widest tier
+            start, end: Optional offsets (seconds from the session start) bounding the window
+        Returns:
+            {"resolution", "timestamp": bucket starts, "frames": frames per bucket,
+             "channels": {name: {"min", "max", "mean"}}} with float64 NumPy arrays
+        """
+        indexes = [self._rollup_index(name) for name in channels]
+        tier = next((width for width in reversed(ROLLUP_TIERS) if resolution % width == 0), None)
+        if tier is None:
+            raise ValueError(f"Invalid resolution: {resolution}. Valid: {list(ROLLUP_TIERS)} or a multiple of {ROLLUP_TIERS[-1]}")
+        _, session_start = self._resolve_session(session_id)
+
+        where, params = 'session_id = ? AND tier = ?', [session_id, tier]
+        if session_start is not None and start is not None:
+            # The bucket holding the window's first frame starts before it
+            where += ' AND bucket >= ?'
+            params.append(np.floor((session_start + start) / resolution) * resolution)
+        if session_start is not None and end is not None:
+            where += ' AND bucket <= ?'
+            params.append(session_start + end)
+        rows = self.conn.execute(
+            f'SELECT bucket, frames, data FROM telemetry_rollups WHERE {where} ORDER BY bucket', params
+        ).fetchall()
+
+        buckets = np.array([row[0] for row in rows], dtype=np.float64)
+        frames = np.array([row[1] for row in rows], dtype=np.int64)
+        stats = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float64).reshape((-1,) + STATS_SHAPE)
+        if resolution != tier:
+            buckets, frames, stats = coarsen(buckets, frames, stats, resolution)
+
+        result = {"resolution": float(resolution), "timestamp": buckets, "frames": frames, "channels": {}}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for name, i in zip(channels, indexes):
+                count = stats[:, COUNT, i]
+                result["channels"][name] = {
+                    "min": stats[:, MIN, i].copy(),
+                    "max": stats[:, MAX, i].copy(),
+                    "mean": np.where(count > 0, stats[:, SUM, i] / count, np.nan)
+                }
+        return result
+
+    def query_history(self, session_id, channels, start=None, end=None, max_points=HISTORY_MAX_POINTS):
+        """
+        Historical view of a session that fits a point budget.
+
+        Picks the resolution from the window and the budget: raw frames if they
+        fit, else the finest rollup tier (1 s, 10 s, 1 min) with at most
+        `max_points` buckets, else wider buckets merged from the 1 min tier.
+        Same result layout as read_rollups(); for raw frames min, max and mean
+        are the frame values and "frames" is all ones.
+
+        Args:
+            session_id: Session to read
+            channels: Rolled-up channel names (rollups.ROLLUP_CHANNELS)
+            start, end: Optional offsets (seconds from the session start); default the whole session
+            max_points: Upper bound on points per channel
+        """
+        for name in channels:
+            self._rollup_index(name)
+        self.flush()
+        session = self.get_session(session_id)
+        if session is None:
+            raise ValueError(f"Unknown session: {session_id}")
+        max_points = max(1, int(max_points))
+        duration = session["duration"]
+        lo = 0.0 if start is None else max(0.0, start)
+        hi = duration if end is None else min(duration, end)
+        window = max(0.0, hi - lo)
+        # Frames in the window, assuming a steady frame rate
+        frame_count = session["frame_count"] * (window / duration) if duration > 0 else session["frame_count"]
+
+        resolution = choose_resolution(window, frame_count, max_points)
+        if resolution == 0.0:
+            data = self.read_channels(session_id, channels, start, end)
+            ones = np.ones(len(data["timestamp"]), dtype=np.int64)
+            return {"resolution": 0.0, "timestamp": data["timestamp"], "frames": ones,
+                    "channels": {name: {"min": data[name], "max": data[name], "mean": data[name]}
+                                 for name in channels}}
+
+        if session["frame_count"] and not self._has_rollups(session_id):
+            self.build_rollups(session_id)
+        return self.read_rollups(session_id, channels, resolution, start, end)
+
+    def _has_rollups(self, session_id):
+        return self.conn.execute(
+            'SELECT 1 FROM telemetry_rollups WHERE session_id = ? LIMIT 1', (session_id,)
+        ).fetchone() is not None
+
+    @staticmethod
+    def _rollup_index(name):
+        try:
+            return ROLLUP_INDEX[name]
+        except KeyError:
+            raise ValueError(f"Channel has no rollups: {name}. Valid: {list(ROLLUP_INDEX)}")
+
+    def get_all_sessions(self, flush=True):
+        """
+        List recorded sessions (oldest first) with their time span and frame count.
+        flush=False lists what is committed, without writing pending frames on the caller's thread.
+        """
+        if flush:
+            self.flush()
+        cursor = self.conn.execute(f'SELECT {self.SESSION_COLUMNS} FROM sessions ORDER BY id ASC')
+        return [self._session_dict(row) for row in cursor.fetchall()]
+
+    def get_session(self, session_id):
+        """
+        One session by id (None if unknown). A single indexed lookup, without flushing:
+        frames still queued are not counted yet (call flush() first when they must be).
+        """
+        row = self.conn.execute(f'SELECT {self.SESSION_COLUMNS} FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        return None if row is None else self._session_dict(row)
+
+    def _session_dict(self, row):
+        sid, name, created_at, closed_at, start_time, end_time, frame_count, engine, archive_path = row
+        return {
+            "id": sid,
+            "name": name,
+            "created_at": created_at,
+            "closed_at": closed_at,
+            "start_time": start_time,
+            "end_time": end_time,
+            "duration": (end_time - start_time) if start_time is not None else 0.0,
+            "frame_count": frame_count,
+            "engine": engine or JsonFrameStore.name,
+            "archive_path": archive_path,
+            "active": sid in self._open_sessions
+        }
+
+    def latest_session_id(self, include_active=False, flush=True):
+        """
+        Most recent session that has frames (the active one only if include_active).
+        """
+        for session in reversed(self.get_all_sessions(flush)):
+            if session["frame_count"] and (include_active or not session["active"]):
+                return session["id"]
+        return None
+
+    def iter_playback(self, session_id=None, offset=0.0, chunk_size=PLAYBACK_CHUNK_SIZE, prefetch=PLAYBACK_PREFETCH,
+                      flush=True):
+        """
+        Stream recorded frames in timestamp order with constant memory.
+
+        Args:
+            session_id: Session to replay (None replays every recorded frame)
+            offset: Seconds from the start of the session to seek to
+            flush: Write pending frames first. The event loop passes False: frames
+                   still queued are picked up once the writer commits them.
+        Returns:
+            A PlaybackReader (usable with both `for` and `async for`).
+        """
+        store, session_start = self._resolve_session(session_id, flush)
+        start_time = None if session_start is None else session_start + max(0.0, offset)
+        if isinstance(store, SessionArchive):
+            return ArchivePlaybackReader(store, start_time, chunk_size)
+        conn, owned = self._open_reader_connection()
+        return PlaybackReader(conn, store, session_id=session_id, start_time=start_time,
+                              chunk_size=chunk_size, prefetch=prefetch, owns_connection=owned)
+
+    def read_frame(self, session_id, timestamp):
+        """
+        First frame of a session at or after `timestamp` (one index lookup), or None past the end.
+        """
+        return self.frame_reader(session_id)(timestamp)
+
+    def frame_reader(self, session_id, flush=True):
+        """
+        read_frame() bound to one session. The session is resolved once, so each
+        call is a single index lookup: no flush and no session query, cheap enough
+        for a playback cursor that jumps ahead on every tick.
+
+        Args:
+            flush: Write pending frames before resolving the session (see iter_playback)
+        Returns:
+            A function timestamp -> first frame at or after it, or None past the end.
+        """
+        store, _ = self._resolve_session(session_id, flush)
+        if isinstance(store, SessionArchive):
+            def read(timestamp):
+                frames = store.frames_from(store.index_at(timestamp), 1)
+                return frames[0] if frames else None
+            return read
+
+        sql = (f'SELECT id, timestamp, {", ".join(store.columns)} FROM {store.table} '
+               f'WHERE session_id = ? AND timestamp >= ? ORDER BY timestamp, id LIMIT 1')
+        decode = store.decoder(self.conn, session_id)
+
+        def read(timestamp):
+            row = self.conn.execute(sql, (session_id, timestamp)).fetchone()
+            return None if row is None else decode(row)
+        return read
+
+    def _resolve_session(self, session_id, flush=True):
+        """
+        Storage engine and first frame timestamp of a session.
+        session_id None means every frame stored by this logger's engine.
+        """
+        if flush:
+            self.flush()
+        if session_id is None:
+            return self.store, None
+        session = self.get_session(session_id)
+        if session is None:
+            raise ValueError(f"Unknown session: {session_id}")
+        if session["engine"] == ARCHIVE_ENGINE:
+            return self._archive(session), session["start_time"]
+        return STORAGE_ENGINES[session["engine"]], session["start_time"]
+
+    def _archive(self, session):
+        # Attached sessions read straight from their (memory-mapped) archive file
+        archive = self._archives.get(session["id"])
+        if archive is None:
+            archive = self._archives[session["id"]] = SessionArchive(session["archive_path"])
+        return archive
+
+    def read_channels(self, session_id, channels, start=None, end=None):
+        """
+        Vectorized read of whole channels across a session.
+
+        Args:
+            session_id: Session to read
+            channels: frame_schema channel names (e.g. ["tire_fl_temp", "tire_fr_temp"])
+            start, end: Optional offsets (seconds from the session start) bounding the window
+        Returns:
+            dict of channel name -> float64 NumPy array (plus "timestamp").
+            Missing values are NaN, compounds are their integer codes.
+        """
+        specs = [get_channel(name) for name in channels]
+        specs = [spec for spec in specs if spec.kind != TIME] # timestamp is always returned
+        store, session_start = self._resolve_session(session_id)
+        if isinstance(store, SessionArchive):
+            timestamps = store.timestamps
+            lo, hi = 0, len(timestamps)
+            if session_start is not None and start is not None:
+                lo = int(np.searchsorted(timestamps, session_start + start, side="left"))
+            if session_start is not None and end is not None:
+                hi = int(np.searchsorted(timestamps, session_start + end, side="right"))
+            result = {"timestamp": np.array(timestamps[lo:hi], dtype=np.float64)}
+            for spec in specs:
+                result[spec.name] = store.column(spec.name)[lo:hi]
+            return result
+
+        where, params = 'session_id = ?', [session_id]
+        if session_start is not None and start is not None:
+            where += ' AND timestamp >= ?'
+            params.append(session_start + start)
+        if session_start is not None and end is not None:
+            where += ' AND timestamp <= ?'
+            params.append(session_start + end)
 
-    def get_playback_data(self):
         cursor = self.conn.cursor()
-        cursor.execute('SELECT data FROM telemetry ORDER BY timestamp ASC')
-        rows = cursor.fetchall()
-        return [json.loads(row[0]) for row in rows]
+        if store.name == ColumnarFrameStore.name:
+            # Only the requested columns are read; no per-row decoding
+            select = ", ".join(["timestamp"] + [spec.name for spec in specs])
+            cursor.execute(f'SELECT {select} FROM {store.table} WHERE {where} ORDER BY timestamp, id', params)
+            rows = cursor.fetchall()
+        else:
+            # Row-oriented sessions: decode and quantize every frame (slow path, same result)
+            indexes = [CHANNEL_NAMES.index(spec.name) for spec in specs]
+            decode = store.decoder(self.conn, session_id)
+            cursor.execute(
+                f'SELECT id, timestamp, {", ".join(store.columns)} FROM {store.table} WHERE {where} ORDER BY timestamp, id',
+                params
+            )
+            rows = []
+            for row in cursor.fetchall():
+                values = quantize_frame(decode(row))
+                rows.append([row[1]] + [values[i] for i in indexes])
+
+        table = np.array(rows, dtype=np.float64).reshape(-1, 1 + len(specs))
+        result = {"timestamp": table[:, 0]}
+        for column, spec in enumerate(specs, start=1):
+            result[spec.name] = table[:, column] / spec.scale
+        return result
+
+    def iter_quantized(self, session_id, chunk_size=QUANTIZED_CHUNK_SIZE):
+        """
+        Every frame of a session as quantized values, in timestamp order, `chunk_size` frames at a time.
+
+        Yields:
+            float64 arrays (n, len(CHANNELS)) in frame_schema order (NaN for missing, compounds as codes)
+        """
+        store, _ = self._resolve_session(session_id)
+        if isinstance(store, SessionArchive):
+            for start in range(0, len(store), chunk_size):
+                yield store.quantized_table(start, start + chunk_size)
+            return
+
+        conn, owned = self._open_reader_connection()
+        try:
+            select = f'id, timestamp, {", ".join(store.columns)}'
+            # Columnar rows are stored quantized already: no per-row decoding
+            decode = None if store.name == ColumnarFrameStore.name else store.decoder(conn, session_id)
+            where, keys = 'session_id = ?', [session_id]
+            while True:
+                rows = conn.execute(
+                    f'SELECT {select} FROM {store.table} WHERE {where} ORDER BY timestamp, id LIMIT ?',
+                    keys + [chunk_size]
+                ).fetchall()
+                if not rows:
+                    return
+                if decode is None:
+                    table = np.array([row[1:] for row in rows], dtype=np.float64)
+                else:
+                    table = np.array([quantize_frame(decode(row)) for row in rows], dtype=np.float64)
+                yield table.reshape(len(rows), len(CHANNELS))
+                if len(rows) < chunk_size:
+                    return
+                last_ts, last_id = rows[-1][1], rows[-1][0]
+                where = 'session_id = ? AND timestamp >= ? AND (timestamp > ? OR id > ?)'
+                keys = [session_id, last_ts, last_ts, last_id]
+        finally:
+            if owned:
+                conn.close()
+
+    def attach_archive(self, archive, name=None, copy=False):
+        """
+        Register a SessionArchive as a new session (see session_archive.import_session()).
+        Returns the new session id.
+        """
+        timestamps = archive.timestamps
+        if len(timestamps) > 1 and not np.all(timestamps[1:] >= timestamps[:-1]):
+            raise ValueError(f"Archive frames are not in timestamp order: {archive.path}")
+        start = float(timestamps[0]) if len(timestamps) else None
+        end = float(timestamps[-1]) if len(timestamps) else None
+        name = name or archive.session.get("name")
+        now = time.time()
+        if not copy:
+            with self._write_lock:
+                with self._write_conn:
+                    cursor = self._write_conn.execute(
+                        'INSERT INTO sessions (name, created_at, closed_at, start_time, end_time, frame_count, '
+                        'engine, archive_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (name, now, now, start, end, len(archive), ARCHIVE_ENGINE, os.path.abspath(archive.path))
+                    )
+            return cursor.lastrowid
+
+        # Copy: straight into the columnar table (archives hold the same quantized values)
+        store = STORAGE_ENGINES[ColumnarFrameStore.name]
+        insert = (f'INSERT INTO {store.table} (session_id, timestamp, {", ".join(store.columns)}) '
+                  f'VALUES (?, ?, {", ".join("?" for _ in store.columns)})')
+        with self._write_lock:
+            with self._write_conn:
+                cursor = self._write_conn.execute(
+                    'INSERT INTO sessions (name, created_at, closed_at, start_time, end_time, frame_count, engine) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (name, now, now, start, end, len(archive), store.name)
+                )
+                session_id = cursor.lastrowid
+                for first in range(0, len(archive), QUANTIZED_CHUNK_SIZE):
+                    table = archive.quantized_table(first, first + QUANTIZED_CHUNK_SIZE)
+                    # Integral floats land as INTEGER (column affinity), NaN as NULL
+                    self._write_conn.executemany(
+                        insert, [(session_id,) + row for row in map(tuple, table.tolist())]
+                    )
+        return session_id
+
+    def read_channel(self, session_id, channel, start=None, end=None):
+        return self.read_channels(session_id, [channel], start, end)[channel]
+
+    def get_playback_data(self, session_id=None):
+        """
+        Load every recorded frame into a list. Prefer iter_playback() for long sessions.
+        """
+        reader = self.iter_playback(session_id)
+        try:
+            return list(reader)
+        finally:
+            reader.close()
+
+    def _open_reader_connection(self):
+        # Each reader gets its own connection so its prefetch thread never
+        # shares a cursor with the caller. In-memory databases can't be reopened.
+        if self.db_name == ":memory:":
+            return self.conn, False
+        return sqlite3.connect(self.db_name, check_same_thread=False), True
 
     def close(self):
+        """
+        Stop the writer thread, flush everything still pending and close the database.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        self._writer.join()
+        for session_id in list(self._open_sessions):
+            self.close_session(session_id)
+        self.flush()
+        for archive in self._archives.values():
+            archive.close()
+        self._archives.clear()
+
+        if self._write_conn is not self.conn:
+            self._write_conn.close()
         self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class PlaybackReader:
+    """
+    Keyset-paginated playback source.
+
+    Frames are read in chunks of `chunk_size` rows (WHERE timestamp > last LIMIT n)
+    by a prefetch thread that keeps up to `prefetch` decoded chunks ready, so
+    memory stays bounded by chunk_size * (prefetch + 1) frames regardless of
+    the size of the recording, and the first frame is available after one chunk.
+    """
+
+    _END = object()
+
+    def __init__(self, conn, store, session_id=None, start_time=None, chunk_size=PLAYBACK_CHUNK_SIZE,
+                 prefetch=PLAYBACK_PREFETCH, owns_connection=True):
+        self._conn = conn
+        self.store = store
+        self.session_id = session_id
+        self.start_time = start_time
+        self._owns_connection = owns_connection
+        self.chunk_size = max(1, int(chunk_size))
+        self._chunks = queue.Queue(maxsize=max(1, int(prefetch)))
+        self._current = deque()
+        self._stop = threading.Event()
+        self._finished = False
+        self._error = None
+        self.frames_read = 0
+
+        self._thread = threading.Thread(target=self._prefetch_loop, name="PlaybackPrefetch", daemon=True)
+        self._thread.start()
+
+    def _fetch_chunk(self, last_ts, last_id):
+        if self.session_id is None:
+            scope, params = '', []
+        else:
+            # Served by the (session_id, timestamp) index
+            scope, params = 'session_id = ? AND ', [self.session_id]
+
+        if last_ts is None:
+            if self.start_time is None:
+                where, keys = scope + '1', []
+            else:
+                # Seek: index lookup to the first frame at/after the offset
+                where, keys = scope + 'timestamp >= ?', [self.start_time]
+        else:
+            # (timestamp, id) keyset: frames sharing a timestamp are neither skipped nor repeated
+            where, keys = scope + 'timestamp >= ? AND (timestamp > ? OR id > ?)', [last_ts, last_ts, last_id]
+
+        cursor = self._conn.cursor()
+        cursor.execute(
+            f'SELECT id, timestamp, {", ".join(self.store.columns)} FROM {self.store.table} '
+            f'WHERE {where} ORDER BY timestamp, id LIMIT ?',
+            params + keys + [self.chunk_size]
+        )
+        return cursor.fetchall()
+
+    def _prefetch_loop(self):
+        last_ts, last_id = None, None
+        try:
+            decode = self.store.decoder(self._conn, self.session_id)
+            while not self._stop.is_set():
+                rows = self._fetch_chunk(last_ts, last_id)
+                if not rows:
+                    break
+                last_id, last_ts = rows[-1][0], rows[-1][1]
+                if not self._put([decode(row) for row in rows]):
+                    return
+                if len(rows) < self.chunk_size:
+                    break
+        except Exception as e:
+            logger.exception("Playback prefetch failed")
+            self._error = e # Raised by the consumer once it reaches the end marker
+        finally:
+            # Only close connections this reader owns (not a shared in-memory one)
+            if self._owns_connection:
+                self._conn.close()
+            # Whatever happened, a waiting consumer gets the end marker
+            self._put(self._END)
+
+    def _put(self, item):
+        # Bounded put that gives up once the reader is closed
+        while not self._stop.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _next_chunk(self, chunk):
+        if chunk is self._END:
+            self._finished = True
+            if self._error is not None:
+                raise self._error
+            raise StopIteration
+        self._current.extend(chunk)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._current:
+            if self._finished:
+                raise StopIteration
+            self._next_chunk(self._chunks.get())
+        self.frames_read += 1
+        return self._current.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._current:
+            if self._finished:
+                raise StopAsyncIteration
+            try:
+                chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                # Prefetch fell behind: wait off the event loop
+                chunk = await asyncio.get_running_loop().run_in_executor(None, self._chunks.get)
+            try:
+                self._next_chunk(chunk)
+            except StopIteration:
+                raise StopAsyncIteration
+        self.frames_read += 1
+        return self._current.popleft()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._finished = True
+        self._current.clear()
+        # Release a consumer still waiting on the chunk queue
+        try:
+            self._chunks.put_nowait(self._END)
+        except queue.Full:
+            pass
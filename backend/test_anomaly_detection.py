@@ -0,0 +1,133 @@
+import math
+import unittest
+from anomaly_detection import (AnomalyMonitor, EwmaZScore, RateOfChange, StreamDetector,
+                               ENGINE_TEMP, TIRE_TEMPS, TIRE_WEARS)
+from frame_schema import FrameBuffer, CHANNEL_NAMES
+from telemetry_generator import TelemetryGenerator
+
+DT = 1 / 60
+
+class FakeStream:
+    def __init__(self, stream_id, session_id="s1"):
+        self.stream_id = stream_id
+        self.session_id = session_id
+
+def run(generator, seconds, detector, on_step=None):
+    """Step a generator at 60 Hz through a detector; returns (alerts, injected anomaly timestamps)."""
+    buffer = FrameBuffer()
+    alerts, injected = [], []
+    for i in range(int(seconds / DT)):
+        if on_step:
+            on_step(generator, i * DT)
+        generator.step(DT)
+        generator.snapshot_into(buffer)
+        if buffer.values[8]:
+            injected.append(buffer.values[0])
+        alerts.extend(detector.process(buffer.values))
+    return alerts, injected
+
+class TestDetectors(unittest.TestCase):
+    def test_zscore_flags_outlier_without_learning_it(self):
+        z = EwmaZScore(tau=1.0, threshold=5.0, min_std=0.1)
+        for i in range(200):
+            z.update(1.0 + (0.05 if i % 2 else -0.05), DT)
+        mean, var = z.mean, z.var
+        self.assertGreater(z.update(50.0, DT), 5.0)
+        # The outlier didn't move the statistics
+        self.assertEqual((z.mean, z.var), (mean, var))
+        self.assertLess(abs(z.update(1.0, DT)), 5.0)
+
+    def test_rate_of_change(self):
+        rate = RateOfChange(tau=0.1)
+        for i in range(120):
+            rate.update(2.0 * i * DT, DT)
+        self.assertAlmostEqual(rate.rate, 2.0, places=6)
+
+class TestStreamDetector(unittest.TestCase):
+    def test_alerts_match_injected_anomalies(self):
+        generator = TelemetryGenerator(seed=3, clock=lambda: 0.0)
+        alerts, injected = run(generator, 600, StreamDetector("car_0"))
+        self.assertGreater(len(injected), 0)
+        self.assertEqual({a["rule"] for a in alerts}, {"engine_temp_spike"})
+        # No false positives; every anomaly is reported unless an alert went out less than a cooldown before
+        alerted = [a["timestamp"] for a in alerts]
+        self.assertTrue(set(alerted) <= set(injected))
+        for ts in injected:
+            if ts not in alerted:
+                self.assertLess(ts - max(t for t in alerted if t < ts), StreamDetector("x").cooldown)
+        self.assertEqual(alerts[0]["channel"], "engine_temp")
+        self.assertEqual(alerts[0]["stream"], "car_0")
+
+    def test_tire_temperature_jump(self):
+        generator = TelemetryGenerator(seed=1, clock=lambda: 0.0)
+        generator.rng.random = lambda: 1.0 # No engine anomalies
+
+        def overheat(gen, t):
+            if abs(t - 20.0) < DT / 2:
+                gen.tires[2].temperature += 40.0
+        alerts, _ = run(generator, 30, StreamDetector("car_0"), overheat)
+        self.assertEqual({(a["rule"], a["channel"]) for a in alerts},
+                         {("tire_temp_rate", CHANNEL_NAMES[TIRE_TEMPS[2]])})
+        self.assertAlmostEqual(alerts[0]["timestamp"], 20.0 + DT, places=6)
+
+    def test_tire_wear_outlier(self):
+        generator = TelemetryGenerator(seed=1, clock=lambda: 0.0)
+        generator.rng.random = lambda: 1.0
+        tire = generator.tires[1]
+        tire.params = dict(tire.params, wear_rate=tire.params["wear_rate"] * 4)
+        alerts, _ = run(generator, 120, StreamDetector("car_0"))
+        self.assertGreater(len(alerts), 0)
+        self.assertEqual({(a["rule"], a["channel"]) for a in alerts},
+                         {("tire_wear_outlier", CHANNEL_NAMES[TIRE_WEARS[1]])})
+        self.assertGreater(alerts[0]["score"], 3.0)
+
+    def test_cooldown_and_warmup(self):
+        detector = StreamDetector("car_0", warmup=1.0, cooldown=2.0)
+        values = FrameBuffer().values
+        for i in range(4):
+            values[i] = 0.0
+        for ts in range(1, 10):
+            values[0] = ts * DT
+            values[ENGINE_TEMP] = 90.0
+            detector.process(values)
+        # Spikes inside the warmup are ignored
+        values[0] += DT
+        values[ENGINE_TEMP] = 140.0
+        self.assertEqual(detector.process(values), ())
+
+        raised = []
+        t = 1.0
+        for _ in range(3 * 60):
+            t += DT
+            values[0] = t
+            values[ENGINE_TEMP] = 140.0 if values[ENGINE_TEMP] == 90.0 else 90.0
+            raised.extend(detector.process(values))
+        times = [a["timestamp"] for a in raised]
+        self.assertEqual(len(times), 2)
+        self.assertGreaterEqual(times[1] - times[0], 2.0)
+
+class TestAnomalyMonitor(unittest.TestCase):
+    def test_session_change_restarts_detector_and_stats(self):
+        monitor = AnomalyMonitor(warmup=0.0)
+        stream = FakeStream("car_0")
+        frame = TelemetryGenerator(seed=0, clock=lambda: 0.0).snapshot()
+        monitor.process(stream, frame)
+        detector = monitor._detectors["car_0"][1]
+        monitor.process(stream, frame) # Same timestamp: ignored
+        self.assertIs(monitor._detectors["car_0"][1], detector)
+
+        stream.session_id = "s2"
+        monitor.process(stream, frame)
+        self.assertIsNot(monitor._detectors["car_0"][1], detector)
+
+        stats = monitor.stats()
+        self.assertEqual(stats["streams"], 1)
+        self.assertEqual(stats["frames_processed"], 3)
+        self.assertEqual(stats["alerts_raised"], 0)
+        self.assertTrue(math.isfinite(stats["process_avg_us"]))
+
+        monitor.remove("car_0")
+        self.assertEqual(monitor.stats()["streams"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import argparse
+import json
+import sys
+import unittest
+from bench_results import compare
+from bench_load import ServerProcess, frame_timestamp, run_level, process_tree_usage
+from bench_micro import measure
+from wire_protocol import encode_values, encode_coded
+from delta_codec import KEYFRAME, DELTA
+from telemetry_generator import TelemetryGenerator
+from frame_schema import FrameBuffer
+
+def document(benchmark, results):
+    return {"benchmark": benchmark, "environment": {}, "config": {}, "results": results}
+
+class TestCompare(unittest.TestCase):
+    def test_flags_metrics_worse_than_the_tolerance(self):
+        baseline = document("load", [
+            {"name": "clients=10", "latency_ms": {"p50": 2.0, "p99": 10.0}, "delivered_fps": {"mean": 60.0},
+             "drop_rate": 0.0},
+            {"name": "clients=100", "latency_ms": {"p99": 40.0}}
+        ])
+        current = document("load", [
+            {"name": "clients=10", "latency_ms": {"p50": 2.5, "p99": 14.0}, "delivered_fps": {"mean": 45.0},
+             "drop_rate": 0.001},
+            {"name": "clients=1000", "latency_ms": {"p99": 400.0}}
+        ])
+        rows = {(row["name"], row["metric"]): row for row in compare(baseline, current, tolerance=0.2)}
+        # Under the 1 ms floor / 0.5% floor: not regressions
+        self.assertFalse(rows["clients=10", "latency_ms.p50"]["regressed"])
+        self.assertFalse(rows["clients=10", "drop_rate"]["regressed"])
+        self.assertTrue(rows["clients=10", "latency_ms.p99"]["regressed"])
+        self.assertTrue(rows["clients=10", "delivered_fps.mean"]["regressed"])
+        self.assertEqual(rows["clients=10", "latency_ms.p99"]["change"], 0.4)
+        # Only results present in both runs are compared
+        self.assertEqual({name for name, _ in rows}, {"clients=10"})
+
+    def test_faster_is_not_a_regression(self):
+        baseline = document("micro", [{"name": "TireModel.update", "ns_per_call": 3000.0}])
+        current = document("micro", [{"name": "TireModel.update", "ns_per_call": 1500.0}])
+        self.assertFalse(compare(baseline, current)[0]["regressed"])
+        with self.assertRaises(ValueError):
+            compare(baseline, document("load", []))
+
+class TestFrameTimestamp(unittest.TestCase):
+    def test_every_encoding(self):
+        buffer = TelemetryGenerator(seed=1, clock=lambda: 1000.0).next_frame_into(FrameBuffer(), 1 / 60)
+        timestamp = buffer.timestamp
+        frame = buffer.to_frame()
+        frame["stream"] = "car_0"
+        self.assertEqual(frame_timestamp(json.dumps(frame)), ("car_0", timestamp))
+        self.assertEqual(frame_timestamp(json.dumps({"stream": "car_1", "delta": 3, "changes": {"timestamp": 5.0}})),
+                         ("car_1", 5.0))
+        self.assertEqual(frame_timestamp(encode_values(buffer.quantized(), "car_0")), ("car_0", timestamp))
+        self.assertEqual(frame_timestamp(encode_coded(KEYFRAME, 1, buffer.quantized(), "car_2")), ("car_2", timestamp))
+        self.assertEqual(frame_timestamp(encode_coded(DELTA, 1, [(0, 7.5), (1, 1200)], "car_0")), ("car_0", 7.5))
+        self.assertIsNone(frame_timestamp('{"type": "alert", "stream": "car_0"}'))
+
+class TestMicro(unittest.TestCase):
+    def test_measure(self):
+        calls = []
+        result = measure(lambda number: calls.append(number), 100, 3)
+        self.assertEqual(calls, [10, 100, 100, 100]) # Warm-up run, then the repeats
+        self.assertLessEqual(result["ns_per_call"], result["ns_median"])
+        self.assertEqual((result["number"], result["repeat"]), (100, 3))
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "server CPU and memory are read from /proc")
+class TestLoad(unittest.TestCase):
+    def test_short_run_against_a_local_server(self):
+        args = argparse.Namespace(processes=None, ramp=0.2, warmup=0.5, duration=1.0, encoding="binary", delta=False,
+                                  spread=True, cars=2, publish_hz=30)
+        server = ServerProcess(8798, args.cars, args.publish_hz, ["--no-anomaly-detection"])
+        server.start()
+        try:
+            self.assertGreater(process_tree_usage(server.pid)["rss_mb"], 0)
+            result = run_level(3, args, "ws://localhost:8798", server.pid)
+        finally:
+            server.stop()
+        self.assertEqual((result["connected"], result["failed"]), (3, 0))
+        self.assertEqual(result["server"]["clients_seen"], 3)
+        self.assertGreater(result["frames_received"], 0)
+        self.assertEqual(result["latency_ms"]["count"], result["frames_received"])
+        self.assertGreater(result["delivered_fps"]["mean"], 0)
+        self.assertIsNotNone(result["server"]["cpu_percent"])
+        self.assertIn("tick_work", result["server"]["histograms"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import unittest
+import websockets
+from broadcaster import Broadcaster, ClientOutbox, DROP_OLDEST, COALESCE, DISCONNECT
+from telemetry_generator import TelemetryGenerator
+from wire_protocol import decode_frame, decode_message, MESSAGE_KINDS, MSG_KEYFRAME
+from delta_codec import DeltaDecoder
+from frame_schema import dequantize_values, FrameBuffer
+
+class FakeWebSocket:
+    """Records sent messages. A closed gate stalls send() like a slow network peer."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.closed_with = None
+        self.remote_address = ("127.0.0.1", 0)
+
+    async def send(self, message):
+        await self.gate.wait()
+        if self.closed_with is not None:
+            raise websockets.exceptions.ConnectionClosed(None, None)
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+class FakeClient:
+    def __init__(self, outbox, encoding="json", delta=False):
+        self.subscriptions = {}
+        self.outbox = outbox
+        self.encoding = encoding
+        self.delta = delta
+
+class FakeStream:
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.subscribers = set()
+
+def frame(ts):
+    return {"timestamp": ts, "speed_kmh": ts * 10.0, "rpm": 5000}
+
+class TestBroadcaster(unittest.TestCase):
+    def test_slow_client_does_not_block_others(self):
+        async def scenario():
+            broadcaster = Broadcaster(max_queue=5, policy=DROP_OLDEST)
+            stream = FakeStream("car_0")
+            fast = FakeClient(broadcaster.open_outbox(FakeWebSocket()))
+            slow_ws = FakeWebSocket()
+            slow_ws.gate.clear() # Stalled
+            slow = FakeClient(broadcaster.open_outbox(slow_ws))
+            for client in (fast, slow):
+                stream.subscribers.add(client)
+                client.subscriptions["car_0"] = None
+
+            for ts in range(20):
+                broadcaster.publish(stream, frame(ts))
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+
+            self.assertEqual(len(fast.outbox.websocket.sent), 20)
+            self.assertEqual(slow_ws.sent, [])
+            self.assertLessEqual(slow.outbox.queue_depth, 5)
+            self.assertGreater(slow.outbox.frames_dropped, 0)
+
+            # Once unstalled, the slow client gets the newest frames only
+            slow_ws.gate.set()
+            await asyncio.sleep(0.01)
+            received = [json.loads(m)["timestamp"] for m in slow_ws.sent]
+            self.assertEqual(received[-1], 19)
+            self.assertEqual(slow.outbox.frames_sent + slow.outbox.frames_dropped, 20)
+
+            fast.outbox.close()
+            slow.outbox.close()
+        asyncio.run(scenario())
+
+    def test_payload_encoded_once_per_channel_selection(self):
+        async def scenario():
+            broadcaster = Broadcaster()
+            stream = FakeStream("car_0")
+            clients = []
+            for i in range(10):
+                client = FakeClient(broadcaster.open_outbox(FakeWebSocket()))
+                client.subscriptions["car_0"] = ("speed_kmh",) if i % 2 else None
+                stream.subscribers.add(client)
+                clients.append(client)
+
+            broadcaster.publish(stream, frame(1))
+            self.assertEqual(broadcaster.payloads_encoded, 2)
+            await asyncio.sleep(0.01)
+
+            full = {c.outbox.websocket.sent[0] for c in clients[0::2]}
+            partial = {c.outbox.websocket.sent[0] for c in clients[1::2]}
+            self.assertEqual(len(full), 1)
+            self.assertEqual(json.loads(partial.pop()), {"timestamp": 1, "speed_kmh": 10.0, "stream": "car_0"})
+            for client in clients:
+                client.outbox.close()
+        asyncio.run(scenario())
+
+    def test_binary_clients_share_one_payload(self):
+        async def scenario():
+            broadcaster = Broadcaster()
+            stream = FakeStream("car_0")
+            clients = []
+            for encoding in ("binary", "binary", "json"):
+                client = FakeClient(broadcaster.open_outbox(FakeWebSocket()), encoding)
+                client.subscriptions["car_0"] = None
+                stream.subscribers.add(client)
+                clients.append(client)
+
+            broadcaster.publish(stream, TelemetryGenerator().get_next_frame(dt=1 / 60))
+            self.assertEqual(broadcaster.payloads_encoded, 2)
+            await asyncio.sleep(0.01)
+            binary = [c.outbox.websocket.sent[0] for c in clients[:2]]
+            self.assertIsInstance(binary[0], bytes)
+            self.assertIs(binary[0], binary[1])
+            self.assertEqual(decode_frame(binary[0])[0], "car_0")
+            self.assertIsInstance(clients[2].outbox.websocket.sent[0], str)
+            for client in clients:
+                client.outbox.close()
+        asyncio.run(scenario())
+
+    def test_delta_clients_get_keyframe_then_deltas(self):
+        async def scenario():
+            broadcaster = Broadcaster(keyframe_interval=10)
+            stream = FakeStream("car_0")
+            gen = TelemetryGenerator()
+            frames = [dict(gen.get_next_frame(dt=1 / 60), stream="car_0") for _ in range(25)]
+
+            early = FakeClient(broadcaster.open_outbox(FakeWebSocket()), "binary", delta=True)
+            early.subscriptions["car_0"] = None
+            stream.subscribers.add(early)
+            for frame in frames[:15]:
+                broadcaster.publish(stream, frame)
+
+            # Late joiner (JSON) mid-way between keyframes
+            late = FakeClient(broadcaster.open_outbox(FakeWebSocket()), "json", delta=True)
+            late.subscriptions["car_0"] = None
+            stream.subscribers.add(late)
+            for frame in frames[15:]:
+                broadcaster.publish(stream, frame)
+            await asyncio.sleep(0.01)
+
+            decoder = DeltaDecoder()
+            decoded = []
+            for message in early.outbox.websocket.sent:
+                msg_type, stream_id, key_seq, payload = decode_message(message)
+                decoded.append(dequantize_values(decoder.decode(MESSAGE_KINDS[msg_type], key_seq, payload)))
+            self.assertEqual([dict(f, stream="car_0") for f in decoded], frames)
+
+            # JSON: the late joiner starts from the current keyframe (frame 10), then deltas
+            messages = [json.loads(m) for m in late.outbox.websocket.sent]
+            self.assertEqual(messages[0]["keyframe"], 2)
+            self.assertEqual(messages[0]["speed_kmh"], frames[10]["speed_kmh"])
+            self.assertEqual(messages[1]["delta"], 2)
+            self.assertEqual(messages[1]["changes"]["timestamp"], frames[15]["timestamp"])
+            self.assertLess(len(late.outbox.websocket.sent[1]), len(json.dumps(frames[15])))
+            self.assertIn("keyframe", messages[6])
+            for client in (early, late):
+                client.outbox.close()
+        asyncio.run(scenario())
+
+    def test_dropped_keyframe_is_resent(self):
+        async def scenario():
+            broadcaster = Broadcaster(max_queue=3, keyframe_interval=100)
+            stream = FakeStream("car_0")
+            ws = FakeWebSocket()
+            ws.gate.clear()
+            client = FakeClient(broadcaster.open_outbox(ws), "binary", delta=True)
+            client.subscriptions["car_0"] = None
+            stream.subscribers.add(client)
+            await asyncio.sleep(0)
+            gen = TelemetryGenerator()
+            for _ in range(10):
+                broadcaster.publish(stream, gen.get_next_frame(dt=1 / 60))
+            ws.gate.set()
+            await asyncio.sleep(0.01)
+
+            # Whatever survived the queue must still decode
+            decoder = DeltaDecoder()
+            kinds = []
+            for message in ws.sent:
+                msg_type, _, key_seq, payload = decode_message(message)
+                kinds.append(msg_type)
+                self.assertIsNotNone(decoder.decode(MESSAGE_KINDS[msg_type], key_seq, payload))
+            self.assertEqual(kinds[0], MSG_KEYFRAME)
+            client.outbox.close()
+        asyncio.run(scenario())
+
+    def test_forgotten_stream_restarts_from_a_keyframe(self):
+        async def scenario():
+            broadcaster = Broadcaster(keyframe_interval=100)
+            stream = FakeStream("playback_1")
+            client = FakeClient(broadcaster.open_outbox(FakeWebSocket()), "binary", delta=True)
+            client.subscriptions["playback_1"] = None
+            stream.subscribers.add(client)
+            gen = TelemetryGenerator()
+            for _ in range(3):
+                broadcaster.publish(stream, gen.get_next_frame(dt=1 / 60))
+            broadcaster.forget("playback_1", stream.subscribers)
+            self.assertEqual((broadcaster._encoders, broadcaster._keyframes), ({}, {}))
+
+            # A new stream reusing the id: its first keyframe has the same sequence number
+            broadcaster.publish(stream, gen.get_next_frame(dt=1 / 60))
+            await asyncio.sleep(0.01)
+            kinds = [decode_message(message)[0] for message in client.outbox.websocket.sent]
+            self.assertEqual(kinds[3], MSG_KEYFRAME)
+            client.outbox.close()
+        asyncio.run(scenario())
+
+    def test_coalesce_keeps_latest_frame_per_stream(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            ws.gate.clear()
+            outbox = ClientOutbox(ws, max_queue=5, policy=COALESCE).start()
+            for ts in range(10):
+                outbox.enqueue_frame("car_0", f"a{ts}")
+                outbox.enqueue_frame("car_1", f"b{ts}")
+            await asyncio.sleep(0)
+            # The sender task already holds the first frame; the rest collapse to one per stream
+            self.assertLessEqual(outbox.queue_depth, 2)
+            ws.gate.set()
+            await asyncio.sleep(0.01)
+            self.assertEqual(ws.sent[-2:], ["a9", "b9"])
+            self.assertGreater(outbox.frames_coalesced, 0)
+            outbox.close()
+        asyncio.run(scenario())
+
+    def test_disconnect_policy_closes_slow_client(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            ws.gate.clear()
+            outbox = ClientOutbox(ws, max_queue=3, policy=DISCONNECT).start()
+            for ts in range(10):
+                outbox.enqueue_frame("car_0", str(ts))
+            await asyncio.sleep(0)
+            self.assertTrue(outbox.closed)
+            self.assertEqual(ws.closed_with, 1008)
+            self.assertFalse(outbox.enqueue_frame("car_0", "late"))
+        asyncio.run(scenario())
+
+    def test_control_replies_jump_the_frame_queue(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            ws.gate.clear()
+            outbox = ClientOutbox(ws, max_queue=2, policy=DROP_OLDEST).start()
+            await asyncio.sleep(0)
+            for ts in range(5):
+                outbox.enqueue_frame("car_0", str(ts))
+            outbox.enqueue_control("reply")
+            ws.gate.set()
+            await asyncio.sleep(0.01)
+            self.assertEqual(ws.sent, ["reply", "3", "4"])
+            stats = outbox.stats()
+            self.assertEqual(stats["frames_sent"], 2)
+            self.assertEqual(stats["frames_dropped"], 3)
+            self.assertGreaterEqual(stats["lag_max_ms"], 0.0)
+            outbox.close()
+        asyncio.run(scenario())
+
+    def test_stalled_client_is_disconnected_on_control_overflow(self):
+        async def scenario():
+            ws = FakeWebSocket()
+            ws.gate.clear()
+            outbox = ClientOutbox(ws, max_control=3).start()
+            await asyncio.sleep(0)
+            results = [outbox.enqueue_control(f"event {i}") for i in range(5)]
+            self.assertEqual(results, [True] * 3 + [False] * 2)
+            self.assertTrue(outbox.closed)
+            await asyncio.sleep(0)
+            self.assertEqual(ws.closed_with, 1008)
+        asyncio.run(scenario())
+
+    def test_frame_buffer_publishes_like_frame_dict(self):
+        async def scenario():
+            payloads = {}
+            for source in ("dict", "buffer"):
+                broadcaster = Broadcaster()
+                stream = FakeStream("car_0")
+                clients = []
+                for encoding, delta, channels in (("json", False, None), ("json", False, ("speed_kmh",)),
+                                                  ("binary", False, None), ("binary", True, None), ("json", True, None)):
+                    client = FakeClient(broadcaster.open_outbox(FakeWebSocket()), encoding, delta)
+                    client.subscriptions["car_0"] = channels
+                    stream.subscribers.add(client)
+                    clients.append(client)
+                gen = TelemetryGenerator(seed=3, clock=lambda: 0.0)
+                buffer = FrameBuffer()
+                for _ in range(5):
+                    gen.step(1 / 60)
+                    broadcaster.publish(stream, gen.snapshot_into(buffer) if source == "buffer" else gen.snapshot())
+                await asyncio.sleep(0.01)
+                payloads[source] = [c.outbox.websocket.sent for c in clients]
+                for client in clients:
+                    client.outbox.close()
+            self.assertEqual(payloads["dict"], payloads["buffer"])
+        asyncio.run(scenario())
+
+    def test_events_reach_subscribers_as_json(self):
+        async def scenario():
+            broadcaster = Broadcaster()
+            alerts = FakeStream("alerts")
+            broadcaster.publish_event(alerts, {"type": "alert"}) # Nobody listening
+            client = FakeClient(broadcaster.open_outbox(FakeWebSocket()), encoding="binary")
+            alerts.subscribers.add(client)
+            broadcaster.publish_event(alerts, {"type": "alert", "rule": "engine_temp_spike"})
+            await asyncio.sleep(0.01)
+            self.assertEqual([json.loads(m) for m in client.outbox.websocket.sent],
+                             [{"type": "alert", "rule": "engine_temp_spike"}])
+            self.assertEqual(broadcaster.events_published, 1)
+            client.outbox.close()
+        asyncio.run(scenario())
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            Broadcaster(policy="block")
+
+if __name__ == "__main__":
+    unittest.main()
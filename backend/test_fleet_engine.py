@@ -0,0 +1,74 @@
+import random
+import unittest
+import numpy as np
+from physics_engine import TireModel, AeroModel
+from fleet_engine import TireFleet, AeroFleet
+
+class TestTireFleet(unittest.TestCase):
+    def test_matches_scalar_model(self):
+        # 8 cars with mixed compounds, 30 s of random driving at 60 Hz
+        rng = random.Random(42)
+        compounds = [rng.choice(list(TireModel.COMPOUNDS.keys())) for _ in range(8 * 4)]
+        names = np.array(compounds, dtype=object).reshape(8, 4)
+
+        fleet = TireFleet(8, names)
+        scalar = [[TireModel(names[c, i]) for i in range(4)] for c in range(8)]
+
+        for _ in range(1800):
+            speed = np.array([rng.uniform(0, 330) for _ in range(8)])
+            slip = np.array([[rng.uniform(0, 0.3) for _ in range(4)] for _ in range(8)])
+            load = np.array([[rng.uniform(1000, 6000) for _ in range(4)] for _ in range(8)])
+
+            fleet.update(1 / 60, speed, slip, load)
+            for c in range(8):
+                for i in range(4):
+                    scalar[c][i].update(1 / 60, speed[c], slip[c, i], load[c, i])
+
+        for c in range(8):
+            for i in range(4):
+                tire = scalar[c][i]
+                self.assertAlmostEqual(fleet.temperature[c, i], tire.temperature, places=9)
+                self.assertAlmostEqual(fleet.wear[c, i], tire.wear, places=12)
+                self.assertAlmostEqual(fleet.grip[c, i], tire.grip, places=12)
+            self.assertEqual(fleet.get_status(c), [t.get_status() for t in scalar[c]])
+
+    def test_grip_branches(self):
+        # Cold, optimal and overheated tires in one batch
+        fleet = TireFleet(1, "SOFT")
+        fleet.temperature[:] = [25.0, 100.0, 150.0, 400.0]
+        fleet._calculate_grip()
+
+        tire = TireModel("SOFT")
+        for i, temp in enumerate([25.0, 100.0, 150.0, 400.0]):
+            tire.temperature = temp
+            tire._calculate_grip()
+            self.assertAlmostEqual(fleet.grip[0, i], tire.grip, places=12)
+
+    def test_scalar_and_per_car_broadcast(self):
+        fleet = TireFleet(3, "MEDIUM")
+        fleet.update(1.0, 200.0, 0.1, 4000.0)
+        self.assertTrue(np.allclose(fleet.temperature, fleet.temperature[0, 0]))
+
+        fleet = TireFleet(3, "MEDIUM")
+        fleet.update(1.0, np.array([0.0, 100.0, 300.0]), 0.1, 4000.0)
+        self.assertLess(fleet.temperature[0, 0], fleet.temperature[2, 0])
+
+    def test_invalid_compound(self):
+        with self.assertRaises(ValueError):
+            TireFleet(2, "WET")
+
+class TestAeroFleet(unittest.TestCase):
+    def test_matches_scalar_model(self):
+        fleet = AeroFleet(2)
+        fleet.drs_active[:] = [False, True]
+        drag, downforce = fleet.calculate_forces(np.array([300.0, 300.0]))
+
+        aero = AeroModel()
+        for car, drs in enumerate([False, True]):
+            aero.drs_active = drs
+            ref_drag, ref_downforce = aero.calculate_forces(300.0)
+            self.assertAlmostEqual(drag[car], ref_drag, places=6)
+            self.assertAlmostEqual(downforce[car], ref_downforce, places=6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import asyncio
+import unittest
+from forecast import Branch, Forecaster, BASELINE, RUNNING, DONE, CANCELLED
+from ingest import IngestStream
+from streams import StreamHub
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+
+DT = 1 / 60
+LAP = 1000.0
+
+def forked(seconds=20.0, seed=3):
+    generator = TelemetryGenerator(seed=seed, clock=lambda: 1000.0)
+    for _ in range(round(seconds / DT)):
+        generator.step(DT)
+    return generator.checkpoint()
+
+class TestBranch(unittest.TestCase):
+    def test_chunks_add_up_to_one_run(self):
+        checkpoint = forked()
+        whole = Branch("a", checkpoint, lap_length=LAP)
+        frames = whole.advance(60.0, DT)
+        split = Branch("a", checkpoint, lap_length=LAP)
+        self.assertEqual(split.advance(25.0, DT) + split.advance(35.0, DT), frames)
+        self.assertEqual(split.summary(), whole.summary())
+
+        # One frame per simulated second, continuing the live car's clock
+        self.assertEqual(len(frames), 60)
+        self.assertAlmostEqual(frames[0]["timestamp"], checkpoint.timestamp + 1.0)
+        self.assertAlmostEqual(frames[-1]["timestamp"] - frames[0]["timestamp"], 59.0)
+        summary = whole.summary()
+        self.assertAlmostEqual(whole.elapsed, 60.0)
+        self.assertGreater(summary["laps"], 2)
+        self.assertEqual(len(summary["lap_times"]), summary["laps"])
+        self.assertIsNone(summary["changed_after"])
+
+    def test_changes_now_or_after_laps(self):
+        checkpoint = forked()
+        baseline = Branch(BASELINE, checkpoint, lap_length=LAP)
+        now = Branch("pit_now", checkpoint, {"compound": "HARD"}, lap_length=LAP)
+        later = Branch("pit_in_2", checkpoint, {"compound": "HARD"}, in_laps=2, lap_length=LAP)
+        frames = {branch.name: branch.advance(90.0, DT) for branch in (baseline, now, later)}
+
+        self.assertEqual(frames["pit_now"][0]["tires"][0]["compound"], "HARD")
+        self.assertEqual(frames["pit_in_2"][0]["tires"][0]["compound"], "SOFT")
+        self.assertEqual(frames["pit_in_2"][-1]["tires"][0]["compound"], "HARD")
+        # Fresh tires at the change, then identical to the baseline up to it (common random numbers)
+        self.assertLess(now.summary()["final_wear"], baseline.summary()["final_wear"])
+        changed = later.summary()["changed_after"]
+        self.assertAlmostEqual(changed, sum(later.summary()["lap_times"][:2]), delta=DT)
+        self.assertEqual(later.summary()["lap_times"][:2], baseline.summary()["lap_times"][:2])
+        before = [f for f in frames["pit_in_2"] if f["timestamp"] < checkpoint.timestamp + changed]
+        self.assertEqual(before, frames[BASELINE][:len(before)])
+
+class TestForecaster(unittest.TestCase):
+    def setUp(self):
+        self.db = TelemetryLogger(":memory:")
+        self.hub = StreamHub(self.db)
+        self.car = self.hub.add_live("car_0", TelemetryGenerator(seed=2))
+        self.events = []
+
+    def tearDown(self):
+        self.hub.close()
+        self.db.close()
+
+    def run_forecast(self, forecaster, *args, cancel=False, **kwargs):
+        async def run():
+            for _ in range(60):
+                await self.hub.tick(4, 1 / 240)
+            info = await forecaster.start(*args, **kwargs)
+            if cancel:
+                await asyncio.sleep(0)
+                forecaster.cancel(info["forecast"])
+            ticks = 0
+            # The live car keeps ticking while the branches run
+            while forecaster.active:
+                await self.hub.tick(4, 1 / 240)
+                ticks += 1
+                await asyncio.sleep(0.001)
+            return info, ticks
+
+        return asyncio.run(run())
+
+    def test_branches_stream_back_in_chunks(self):
+        forecaster = Forecaster(self.hub, self.events.append, workers=1)
+        try:
+            info, ticks = self.run_forecast(forecaster, "car_0", [{"name": "hards", "params": {"compound": "HARD"}}],
+                                            horizon=75.0, lap_length=LAP, channels=["speed_kmh", "tires"])
+        finally:
+            forecaster.close()
+        self.assertEqual(info["branches"], [BASELINE, "hards"])
+        self.assertGreater(ticks, 0)
+
+        for name in info["branches"]:
+            events = [e for e in self.events if e["branch"] == name]
+            # 30 + 30 + 15 simulated seconds
+            self.assertEqual([e["status"] for e in events], [RUNNING, RUNNING, DONE])
+            self.assertEqual([e["progress"] for e in events], [0.4, 0.8, 1.0])
+            frames = [frame for e in events for frame in e["frames"]]
+            self.assertEqual(len(frames), 75)
+            self.assertEqual(set(frames[0]), {"timestamp", "speed_kmh", "tires"})
+            self.assertGreater(frames[0]["timestamp"], info["fork_timestamp"])
+            self.assertIn("summary", events[-1])
+            self.assertEqual(events[-1]["forecast"], info["forecast"])
+
+        hards = [e for e in self.events if e["branch"] == "hards"]
+        self.assertEqual(hards[-1]["frames"][-1]["tires"][0]["compound"], "HARD")
+        self.assertEqual(hards[-1]["summary"]["changed_after"], round(DT, 3))
+        stats = forecaster.stats()
+        self.assertEqual((stats["started"], stats["completed"], stats["active"]), (1, 1, []))
+        self.assertEqual(stats["sim_seconds"], 150.0)
+
+    def test_events_go_to_the_forecast_publish(self):
+        forecaster = Forecaster(self.hub, self.events.append, workers=0)
+        mine = []
+        self.run_forecast(forecaster, "car_0", horizon=30.0, publish=mine.append)
+        self.assertEqual(self.events, [])
+        self.assertEqual([e["status"] for e in mine], [DONE])
+
+    def test_cancel(self):
+        forecaster = Forecaster(self.hub, self.events.append, workers=0)
+        self.run_forecast(forecaster, "car_0", horizon=600.0, cancel=True)
+        self.assertEqual(self.events[-1]["status"], CANCELLED)
+        self.assertLess(sum(e["status"] == RUNNING for e in self.events), 20)
+        self.assertEqual(forecaster.stats()["cancelled"], 1)
+        self.assertFalse(forecaster.cancel("forecast_1"))
+
+    def test_invalid_requests(self):
+        self.hub.add(IngestStream("truck_1", self.db))
+        self.hub.add_alerts("alerts")
+        forecaster = Forecaster(self.hub, self.events.append, workers=0, max_active=0)
+        for stream_id, kwargs in [
+            ("car_9", {}),
+            ("truck_1", {}), # Ingested: no simulation state
+            ("alerts", {}),
+            ("car_0", {"branches": [{"params": {"compound": "SLICK"}}]}),
+            ("car_0", {"branches": [{"params": {"bogus": 1}}]}),
+            ("car_0", {"branches": [{"params": {"max_power": "lots"}}]}),
+            ("car_0", {"branches": [{"name": "a"}, {"name": "a"}]}),
+            ("car_0", {"branches": [{"in_laps": -1}]}),
+            ("car_0", {"branches": [{}] * 8}),
+            ("car_0", {"branches": [], "baseline": False}),
+            ("car_0", {"horizon": 0}),
+            ("car_0", {"dt": 2.0}),
+        ]:
+            with self.assertRaises(ValueError, msg=(stream_id, kwargs)):
+                asyncio.run(Forecaster(self.hub, self.events.append, workers=0).start(stream_id, **kwargs))
+        with self.assertRaises(ValueError): # Too many running
+            asyncio.run(forecaster.start("car_0"))
+        self.assertEqual(self.events, [])
+
+if __name__ == "__main__":
+    unittest.main()
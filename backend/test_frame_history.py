@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+from frame_history import StreamHistory, FrameHistory
+from frame_schema import FrameBuffer, CHANNEL_NAMES, unflatten_frame, flatten_frame
+from streams import StreamHub, PlaybackStream
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+
+def frames(n, start=1000.0):
+    generator = TelemetryGenerator(seed=3, clock=lambda: start)
+    result = []
+    for _ in range(n):
+        generator.step(1 / 60)
+        result.append(list(generator.snapshot_into(FrameBuffer()).values))
+    return result
+
+def quantized(values):
+    return unflatten_frame(flatten_frame(unflatten_frame(values)))
+
+class FakeStream:
+    def __init__(self, stream_id, session_id):
+        self.stream_id = stream_id
+        self.session_id = session_id
+
+class TestStreamHistory(unittest.TestCase):
+    def test_ring_keeps_the_newest_frames_in_order(self):
+        history = StreamHistory(50)
+        values = frames(120)
+        for frame in values:
+            history.append(frame)
+        self.assertEqual(len(history), 50)
+        timestamps, data = history.window()
+        self.assertEqual(timestamps.tolist(), [v[0] for v in values[70:]])
+        self.assertEqual(data.shape, (50, len(CHANNEL_NAMES) - 1))
+        # 0.5 s of recorded time back from the newest frame: 30 intervals
+        self.assertEqual(len(history.window(0.5)[0]), 31)
+
+    def test_missing_values_and_replay_frames(self):
+        history = StreamHistory(10, session_id=7)
+        values = frames(5)
+        values[2][CHANNEL_NAMES.index("brake")] = None
+        for frame in values:
+            history.append(frame)
+        snapshot = history.snapshot()
+        replayed = snapshot.frames_from(0, 10)
+        self.assertEqual(len(replayed), 5)
+        self.assertIsNone(replayed[2]["brake"])
+        for frame, original in zip(replayed, values):
+            self.assertEqual(frame, quantized(original))
+        self.assertEqual(snapshot.get_session(7)["frame_count"], 5)
+        self.assertIsNone(snapshot.get_session(8))
+
+    def test_columns_and_stats(self):
+        history = StreamHistory(1000)
+        values = frames(240)
+        for frame in values:
+            history.append(frame)
+        speed = CHANNEL_NAMES.index("speed_kmh")
+        columns = history.columns(["speed_kmh", "gear", "tire_fl_compound"], seconds=2.0, max_points=50)
+        self.assertEqual(len(columns["timestamp"]), 50)
+        self.assertEqual(columns["timestamp"][-1], values[-1][0])
+        self.assertEqual(columns["channels"]["speed_kmh"][-1], quantized(values[-1])["speed_kmh"])
+        self.assertEqual(columns["channels"]["tire_fl_compound"][-1], quantized(values[-1])["tires"][0]["compound"])
+
+        stats = history.stats(["speed_kmh"], seconds=1.0)
+        self.assertEqual(stats["frames"], 61)
+        window = [quantized(v)["speed_kmh"] for v in values[-61:]]
+        self.assertEqual(stats["channels"]["speed_kmh"]["min"], min(window))
+        self.assertEqual(stats["channels"]["speed_kmh"]["max"], max(window))
+        self.assertEqual(stats["channels"]["speed_kmh"]["last"], round(values[-1][speed], 2))
+        with self.assertRaises(ValueError):
+            history.stats(["tire_fl_compound"])
+
+class TestFrameHistory(unittest.TestCase):
+    def test_new_session_restarts_the_history(self):
+        history = FrameHistory(seconds=1.0, rate=60)
+        stream = FakeStream("car_0", 1)
+        values = frames(90)
+        buffer = FrameBuffer()
+        for frame in values[:80]:
+            buffer.values[:] = frame
+            history.record(stream, buffer)
+        self.assertEqual(len(history.get("car_0")), 60)
+        stream.session_id = 2
+        for frame in values[80:]:
+            history.record(stream, unflatten_frame(frame))
+        self.assertEqual(len(history.get("car_0")), 10)
+        self.assertEqual(history.get("car_0").session_id, 2)
+        history.remove("car_0")
+        self.assertIsNone(history.get("car_0"))
+
+class TestRewind(unittest.TestCase):
+    def setUp(self):
+        self.db = TelemetryLogger(":memory:")
+        self.hub = StreamHub(self.db, history=FrameHistory(seconds=10.0, rate=60))
+
+    def tearDown(self):
+        self.hub.close()
+        self.db.close()
+
+    def test_hub_records_live_frames_and_replays_a_snapshot(self):
+        car = self.hub.add_live("car_0", TelemetryGenerator(seed=1, clock=lambda: 1000.0))
+        published = []
+        for _ in range(120):
+            published += [frame.to_frame() for stream, frame in asyncio.run(self.hub.tick(4, 1 / 240))]
+        history = self.hub.history.get("car_0")
+        self.assertEqual(len(history), 120)
+        self.assertEqual(history.session_id, car.session_id)
+
+        snapshot = history.snapshot(1.0)
+        playback = self.hub.open_playback("playback_1", snapshot.session_id, source=snapshot, speed=2.0)
+        self.assertIsInstance(playback, PlaybackStream)
+        replayed = []
+        for _ in range(40):
+            frame = asyncio.run(playback.next_frame(1 / 60))
+            if frame is not None:
+                replayed.append(frame)
+        # At 2x, every other recorded frame; it loops back to the start after one second of recording
+        self.assertEqual([f["timestamp"] for f in replayed[:5]],
+                         [published[i]["timestamp"] for i in range(59, 69, 2)])
+        self.assertEqual(replayed[1], quantized(flatten_frame(published[61])))
+        self.assertIn(published[59]["timestamp"], [f["timestamp"] for f in replayed[31:]])
+
+        # Playback streams are not recorded; a reset empties the history before the next frame
+        self.assertIsNone(self.hub.recent("playback_1"))
+        self.assertIs(self.hub.recent("car_0"), history)
+        car.reset()
+        self.assertEqual(len(self.hub.recent("car_0")), 0)
+        # Removing a live stream drops its history
+        self.hub.remove("car_0")
+        self.assertIsNone(self.hub.history.get("car_0"))
+
+if __name__ == "__main__":
+    unittest.main()
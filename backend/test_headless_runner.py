@@ -0,0 +1,49 @@
+import unittest
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+from headless_runner import run_headless, DEFAULT_START_TIME
+
+def run(seed, duration=20.0, cars=1, engine="columnar"):
+    db = TelemetryLogger(":memory:", overflow_policy=TelemetryLogger.BLOCK, engine=engine)
+    result = run_headless(db, duration, seed=seed, cars=cars)
+    frames = [db.get_playback_data(sid) for sid in result["sessions"]]
+    db.close()
+    return result, frames
+
+class TestHeadlessRunner(unittest.TestCase):
+    def test_same_seed_same_run(self):
+        first, frames_a = run(seed=3)
+        second, frames_b = run(seed=3)
+        self.assertEqual(first["digest"], second["digest"])
+        self.assertEqual(frames_a, frames_b)
+        self.assertEqual(first["frames"], 20 * 60)
+        self.assertEqual(frames_a[0][0]["timestamp"], DEFAULT_START_TIME + 4 / 240)
+
+    def test_different_seeds_and_cars_diverge(self):
+        result_a, _ = run(seed=1, duration=60.0)
+        result_b, _ = run(seed=2, duration=60.0)
+        self.assertNotEqual(result_a["digest"], result_b["digest"])
+
+        result, frames = run(seed=1, duration=60.0, cars=2)
+        self.assertEqual(len(result["sessions"]), 2)
+        self.assertNotEqual(frames[0], frames[1])
+
+    def test_faster_than_real_time(self):
+        result, _ = run(seed=0, duration=60.0, engine="delta")
+        self.assertGreater(result["speedup"], 10)
+
+    def test_injected_rng_and_clock(self):
+        gen_a = TelemetryGenerator(seed=5, clock=lambda: 100.0)
+        gen_b = TelemetryGenerator(seed=5, clock=lambda: 100.0)
+        frames_a = [gen_a.get_next_frame(dt=0.01) for _ in range(3000)]
+        frames_b = [gen_b.get_next_frame(dt=0.01) for _ in range(3000)]
+        self.assertEqual(frames_a, frames_b)
+        self.assertEqual(frames_a[0]["timestamp"], 100.01)
+
+    def test_invalid_record_rate(self):
+        with TelemetryLogger(":memory:") as db:
+            with self.assertRaises(ValueError):
+                run_headless(db, 1.0, physics_hz=240, record_hz=70)
+
+if __name__ == "__main__":
+    unittest.main()
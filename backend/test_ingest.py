@@ -0,0 +1,210 @@
+import asyncio
+import json
+import unittest
+from collections import Counter
+import websockets
+from ingest import Ingest, IngestStream, parse_frames, parse_batch, in_order, serve_udp, STALE
+from frame_history import FrameHistory
+from frame_schema import FrameBuffer, CHANNEL_NAMES, CHANNEL_INDEX, quantize_values, unflatten_frame
+from streams import StreamHub
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+from wire_protocol import encode_batch, batch_body
+
+def frames(n, seed=1, start=1000.0):
+    generator = TelemetryGenerator(seed=seed, clock=lambda: start)
+    return [generator.next_frame_into(FrameBuffer(), 1 / 100).snapshot() for _ in range(n)]
+
+def parse_binary(rows):
+    _, count, body = batch_body(encode_batch([quantize_values(values) for values in rows]))
+    rejected = Counter()
+    return parse_batch(body, count, rejected), rejected
+
+class TestParsing(unittest.TestCase):
+    def test_nested_flat_and_binary_frames_agree(self):
+        values = frames(300)
+        nested = [unflatten_frame(v) for v in values]
+        flat = [dict(zip(CHANNEL_NAMES, v)) for v in values]
+        rejected = Counter()
+        self.assertEqual(parse_frames(nested, rejected), values)
+        self.assertEqual(parse_frames(flat, rejected), values)
+        self.assertEqual(parse_binary(values), (values, Counter()))
+        self.assertFalse(rejected)
+
+        # Only the timestamp is required; values are rounded to the channel's precision
+        rows = parse_frames([{"timestamp": 5.0, "speed_kmh": 101.234, "tire_fl_compound": "HARD"}], rejected)
+        self.assertEqual(rows[0][:3], (5.0, 101.23, None))
+        self.assertEqual(rows[0][CHANNEL_INDEX["tire_fl_compound"]], "HARD")
+        binary = parse_binary(rows)[0][0]
+        self.assertEqual(binary[:3], rows[0][:3]) # INT / BOOL channels have no missing marker on the wire
+        self.assertEqual(binary[CHANNEL_INDEX["tire_fl_compound"]], "HARD")
+
+    def test_invalid_frames_are_rejected_with_a_reason(self):
+        nested = [unflatten_frame(v) for v in frames(10)]
+        nested[0]["speed_kmh"] = 900.0
+        nested[1]["gear"] = 2.5
+        nested[2]["tires"][0]["compound"] = "SLICK"
+        nested[3]["throttle"] = "full"
+        nested[4]["timestamp"] = None
+        nested[5]["is_anomaly"] = 3
+        nested[6]["rpm"] = float("nan")
+        nested[7] = [1, 2, 3]
+        rejected = Counter()
+        self.assertEqual(len(parse_frames(nested, rejected)), 2)
+        self.assertEqual(rejected, Counter({
+            "speed_kmh: out of range": 1, "gear: not an integer": 1, "tire_fl_compound: unknown compound": 1,
+            "throttle: not a number": 1, "timestamp: missing or invalid": 1, "is_anomaly: not a boolean": 1,
+            "rpm: out of range": 1, "malformed frame": 1
+        }))
+
+        # Shapes and numbers that don't fit the schema at all are rejected too, not raised
+        nested = [unflatten_frame(v) for v in frames(5)]
+        nested[0]["tires"] = {"a": 1}
+        nested[1]["rpm"] = 10 ** 400
+        nested[2]["timestamp"] = -10 ** 400
+        nested[3]["is_anomaly"] = 10 ** 400
+        rejected = Counter()
+        self.assertEqual(len(parse_frames(nested, rejected)), 1)
+        self.assertEqual(rejected, Counter({
+            "malformed frame": 1, "rpm: out of range": 1, "timestamp: missing or invalid": 1,
+            "is_anomaly: not a boolean": 1
+        }))
+
+        values = [list(v) for v in frames(4)]
+        values[1][CHANNEL_INDEX["steering"]] = -3.0
+        values[2][CHANNEL_INDEX["timestamp"]] = float("inf")
+        rows, rejected = parse_binary(values)
+        self.assertEqual(rows, [tuple(values[0]), tuple(values[3])])
+        self.assertEqual(rejected, Counter({"steering: out of range": 1, "timestamp: missing or invalid": 1}))
+
+    def test_order_and_duplicates(self):
+        values = frames(6)
+        rejected = Counter()
+        shuffled = [values[i] for i in (2, 0, 1, 1, 5, 4, 3)]
+        self.assertEqual(in_order(shuffled, None, rejected), values)
+        self.assertEqual(in_order(values, values[3][0], rejected), values[4:])
+        self.assertEqual(rejected[STALE], 5)
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.db = TelemetryLogger(":memory:", batch_size=1000, flush_interval=60.0, max_queue=1000)
+        self.hub = StreamHub(self.db, history=FrameHistory(seconds=10.0, rate=60))
+        self.ingest = Ingest(self.hub)
+
+    def tearDown(self):
+        self.hub.close()
+        self.db.close()
+
+    def test_batches_feed_a_live_stream(self):
+        values = frames(500)
+        nested = [unflatten_frame(v) for v in values[:200]]
+        ack = self.ingest.handle(json.dumps({"vehicle": "truck_7", "seq": 1, "frames": nested}))
+        self.assertEqual(ack, {"type": "ack", "vehicle": "truck_7", "accepted": 200, "rejected": 0, "errors": {},
+                               "queue": 200, "seq": 1})
+        # Binary, with a resent overlap: the frames already recorded are rejected as stale
+        ack = self.ingest.handle(encode_batch([quantize_values(v) for v in values[150:]], "truck_7"))
+        self.assertEqual((ack["accepted"], ack["rejected"], ack["errors"]), (300, 50, {STALE: 50}))
+
+        stream = self.hub.get("truck_7")
+        self.assertIsInstance(stream, IngestStream)
+        self.assertEqual(stream.describe()["source"], "ingest")
+        published = asyncio.run(self.hub.tick(4, 1 / 240))
+        self.assertEqual([(s.stream_id, f.timestamp) for s, f in published], [("truck_7", values[-1][0])])
+        self.assertEqual(asyncio.run(self.hub.tick(4, 1 / 240)), []) # Nothing new since
+        self.assertEqual(len(self.hub.recent("truck_7")), 1)
+
+        self.db.flush()
+        self.assertEqual(self.db.get_session(stream.session_id)["frame_count"], 500)
+        stats = self.ingest.stats()
+        self.assertEqual((stats["vehicles"], stats["frames_accepted"], stats["frames_rejected"]), (1, 500, 50))
+
+        # A reset starts a new session, which accepts the producer's restarted clock
+        stream.reset()
+        self.assertEqual(self.ingest.handle(json.dumps({"vehicle": "truck_7", "frames": nested[:5]}))["accepted"], 5)
+
+    def test_refused_batches(self):
+        self.hub.add_live("car_0", TelemetryGenerator(seed=1))
+        ingest = Ingest(self.hub, max_batch=10)
+        batch = [unflatten_frame(v) for v in frames(5)]
+        for message in [
+            json.dumps({"vehicle": "car_0", "frames": batch}),     # A simulated car
+            json.dumps({"vehicle": "playback_1", "frames": batch}), # Reserved
+            json.dumps({"vehicle": "bad id!", "frames": batch}),
+            json.dumps({"vehicle": "truck_1", "frames": batch * 3}), # Too many frames
+            json.dumps({"vehicle": "truck_1", "frames": "lots"}),
+            json.dumps([1, 2]),
+            "{not json",
+            encode_batch([quantize_values(v) for v in frames(3)], "truck_1")[:-4],
+        ]:
+            reply = ingest.handle(message)
+            self.assertEqual(reply["type"], "error", message)
+        self.assertEqual(ingest.stats()["batches_refused"], 8)
+        self.assertEqual(ingest.stats()["vehicles"], 0)
+
+        # Unparseable frames in an otherwise valid batch are rejected, the batch is acked
+        reply = ingest.handle(json.dumps({"vehicle": "truck_2", "frames": [{"timestamp": 10 ** 400},
+                                                                          {"timestamp": 5.0, "tires": {"a": 1}}]}))
+        self.assertEqual((reply["type"], reply["accepted"], reply["rejected"]), ("ack", 0, 2))
+
+    def test_websocket_backpressure(self):
+        async def run():
+            server = await websockets.serve(self.ingest.serve_websocket, "localhost", 0)
+            port = server.sockets[0].getsockname()[1]
+            values = frames(1200)
+            try:
+                async with websockets.connect(f"ws://localhost:{port}/ingest") as producer:
+                    replies = []
+                    for start in (0, 400, 800):
+                        await producer.send(encode_batch([quantize_values(v) for v in values[start:start + 400]],
+                                                         "truck_1"))
+                    for _ in range(3):
+                        replies.append(json.loads(await producer.recv()))
+                    # The third batch waits until the writer is back under the low watermark
+                    self.db.flush()
+                    for _ in range(2):
+                        replies.append(json.loads(await producer.recv()))
+                    return replies
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        replies = asyncio.run(run())
+        self.assertEqual([r["type"] for r in replies], ["ack", "ack", "backpressure", "backpressure", "ack"])
+        self.assertEqual((replies[1]["queue"], replies[2]["paused"], replies[3]["paused"]), (800, True, False))
+        self.assertEqual(replies[4]["accepted"], 400)
+        self.assertEqual(self.ingest.stats()["pauses"], 1)
+
+    def test_udp_datagrams(self):
+        async def run():
+            transport = await serve_udp(self.ingest, "127.0.0.1", 0)
+            address = transport.get_extra_info("sockname")
+            notices = asyncio.Queue()
+
+            class Producer(asyncio.DatagramProtocol):
+                def datagram_received(self, data, addr):
+                    notices.put_nowait(json.loads(data))
+
+            producer, _ = await asyncio.get_running_loop().create_datagram_endpoint(Producer, remote_addr=address)
+            values = frames(200)
+            try:
+                producer.sendto(encode_batch([quantize_values(v) for v in values[:100]], "truck_2"))
+                for _ in range(100):
+                    if self.ingest.frames_accepted:
+                        break
+                    await asyncio.sleep(0.01)
+                # Saturated: the datagram is dropped and the producer told to back off
+                self.db.log_many([{"timestamp": float(i)} for i in range(800)])
+                producer.sendto(encode_batch([quantize_values(v) for v in values[100:]], "truck_2"))
+                return await asyncio.wait_for(notices.get(), 2.0)
+            finally:
+                producer.close()
+                transport.close()
+
+        notice = asyncio.run(run())
+        self.assertEqual((notice["type"], notice["paused"]), ("backpressure", True))
+        self.assertIn("retry_ms", notice)
+        stats = self.ingest.stats()
+        self.assertEqual((stats["frames_accepted"], stats["datagrams_dropped"]), (100, 1))
+
+if __name__ == "__main__":
+    unittest.main()
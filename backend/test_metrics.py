@@ -0,0 +1,172 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import unittest
+from metrics import Histogram, Metrics, SamplingProfiler, serve_http, SUB_BUCKETS
+from scheduler import TickScheduler
+from broadcaster import Broadcaster
+from test_scheduler import FakeClock, run_ticks
+from test_broadcaster import FakeWebSocket, FakeClient, FakeStream, frame
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles_within_bucket_resolution(self):
+        rng = random.Random(4)
+        samples = sorted(rng.lognormvariate(-7, 1.5) for _ in range(20000))
+        histogram = Histogram("x")
+        for value in samples:
+            histogram.record(value)
+        self.assertEqual(histogram.count, len(samples))
+        self.assertEqual(histogram.max, samples[-1])
+        self.assertAlmostEqual(histogram.total, sum(samples), places=9)
+        for q in (50, 90, 99):
+            exact = samples[int(len(samples) * q / 100) - 1]
+            estimate = histogram.percentile(q)
+            self.assertGreaterEqual(estimate, exact)
+            self.assertLessEqual(estimate, exact * (1 + 1 / SUB_BUCKETS) * 1.001)
+
+    def test_zero_values_and_counts(self):
+        histogram = Histogram("depth")
+        for value in [0] * 90 + [3] * 10:
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(50), 0.0)
+        self.assertEqual(histogram.percentile(99), 3)
+        summary = histogram.snapshot()
+        self.assertEqual((summary["count"], summary["max"], summary["mean"]), (100, 3, 0.3))
+        self.assertNotIn("unit", summary)
+
+    def test_registry_and_reset(self):
+        clock = FakeClock()
+        metrics = Metrics(clock=clock)
+        self.assertIs(metrics.timer("db_write"), metrics.timer("db_write"))
+        metrics.timer("db_write").record(0.002)
+        clock.now += 5.0
+        snapshot = metrics.snapshot(reset=True)
+        self.assertEqual(snapshot["window_s"], 5.0)
+        self.assertEqual(snapshot["histograms"]["db_write"],
+                         {"count": 1, "mean": 2.0, "p50": 2.0, "p90": 2.0, "p99": 2.0, "max": 2.0, "total": 2.0,
+                          "unit": "ms"})
+        self.assertEqual(metrics.snapshot()["histograms"]["db_write"]["count"], 0)
+
+class TestInstrumentation(unittest.TestCase):
+    def test_scheduler_records_work_and_overruns(self):
+        clock = FakeClock()
+        metrics = Metrics(clock=clock)
+        scheduler = TickScheduler(240, 60, clock=clock, sleep=clock.sleep, metrics=metrics)
+        run_ticks(scheduler, 10, work=lambda tick: 0.03 if tick == 5 else 0.001, clock=clock)
+        histograms = metrics.snapshot()["histograms"]
+        self.assertEqual(histograms["tick_work"]["count"], 10)
+        self.assertAlmostEqual(histograms["tick_work"]["max"], 30.0)
+        self.assertEqual(histograms["tick_overrun"]["count"], scheduler.overruns)
+        self.assertGreater(scheduler.overruns, 0)
+
+    def test_broadcaster_records_serialize_and_send(self):
+        async def scenario():
+            metrics = Metrics()
+            broadcaster = Broadcaster(metrics=metrics)
+            stream = FakeStream("car_0")
+            client = FakeClient(broadcaster.open_outbox(FakeWebSocket()))
+            stream.subscribers.add(client)
+            client.subscriptions["car_0"] = None
+            for ts in range(5):
+                broadcaster.publish(stream, frame(ts))
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            client.outbox.close()
+            return metrics.snapshot()["histograms"]
+
+        histograms = asyncio.run(scenario())
+        self.assertEqual(histograms["serialize"]["count"], 5)
+        self.assertEqual(histograms["send"]["count"], 5)
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_the_target_thread(self):
+        done = threading.Event()
+        ready = threading.Event()
+        target = {}
+
+        def busy_loop():
+            target["id"] = threading.get_ident()
+            ready.set()
+            while not done.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_loop)
+        worker.start()
+        ready.wait()
+        profiler = SamplingProfiler(target["id"], interval=0.001)
+        profiler.start()
+        self.assertTrue(profiler.running)
+        time.sleep(0.2)
+        profiler.stop()
+        done.set()
+        worker.join()
+
+        report = profiler.report(top=5)
+        self.assertFalse(report["running"])
+        self.assertGreater(report["samples"], 10)
+        totals = {entry["function"]: entry["total"] for entry in report["functions"]}
+        self.assertTrue(any("busy_loop" in stack["stack"] for stack in report["stacks"]))
+        self.assertEqual(sum(stack["samples"] for stack in profiler.report(top=None)["stacks"]), report["samples"])
+        self.assertLessEqual(max(totals.values()), report["samples"])
+
+        profiler.clear()
+        self.assertEqual(profiler.report()["samples"], 0)
+
+    def test_report_while_sampling(self):
+        done = threading.Event()
+        ready = threading.Event()
+        target = {}
+
+        def recurse(depth):
+            return recurse(depth - 1) if depth else sum(range(100))
+
+        def varied_stacks():
+            # Many distinct stacks: the sampler keeps adding keys while reports are taken
+            target["id"] = threading.get_ident()
+            ready.set()
+            while not done.is_set():
+                recurse(random.randrange(40))
+
+        worker = threading.Thread(target=varied_stacks)
+        worker.start()
+        ready.wait()
+        profiler = SamplingProfiler(target["id"], interval=0.0005)
+        profiler.start()
+        try:
+            for _ in range(2000):
+                report = profiler.report(top=None)
+                self.assertEqual(sum(stack["samples"] for stack in report["stacks"]), report["samples"])
+        finally:
+            profiler.stop()
+            done.set()
+            worker.join()
+        self.assertGreater(profiler.report()["samples"], 0)
+
+class TestHttpEndpoint(unittest.TestCase):
+    def test_get_routes(self):
+        async def get(port, path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            head, _, body = response.partition(b"\r\n\r\n")
+            return head.split(b"\r\n")[0].decode(), json.loads(body)
+
+        async def scenario():
+            server = await serve_http({"/metrics": lambda: {"ok": 1}}, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await get(port, "/metrics"), await get(port, "/nope")
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        (status, body), (missing, error) = asyncio.run(scenario())
+        self.assertEqual((status, body), ("HTTP/1.0 200 OK", {"ok": 1}))
+        self.assertEqual(missing, "HTTP/1.0 404 Not Found")
+        self.assertEqual(error["paths"], ["/metrics"])
+
+if __name__ == "__main__":
+    unittest.main()
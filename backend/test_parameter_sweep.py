@@ -0,0 +1,64 @@
+import unittest
+from parameter_sweep import apply_params, simulate_stint, grid_space, random_space, run_sweep, format_table
+from telemetry_generator import TelemetryGenerator
+from physics_engine import TireModel
+
+# Short stint so the tests stay fast
+STINT = {"laps": 1, "lap_length": 1500.0}
+
+class TestParameterSweep(unittest.TestCase):
+    def test_grid_and_random_spaces(self):
+        grid = grid_space({"compound": ["SOFT", "HARD"], "max_power": [700000, 750000, 800000]})
+        self.assertEqual(len(grid), 6)
+        self.assertIn({"compound": "HARD", "max_power": 750000}, grid)
+
+        space = {"mass": (750.0, 850.0), "compound": ["SOFT", "MEDIUM"]}
+        configs = random_space(space, 20, seed=4)
+        self.assertEqual(configs, random_space(space, 20, seed=4))
+        self.assertTrue(all(750.0 <= c["mass"] <= 850.0 for c in configs))
+
+    def test_apply_params(self):
+        gen = TelemetryGenerator(seed=0)
+        apply_params(gen, {"compound": "HARD", "tire.wear_rate": 0.01, "aero.cd_base": 0.9, "max_power": 500000})
+        self.assertEqual(gen.tires[0].compound_name, "HARD")
+        self.assertEqual(gen.tires[3].params["wear_rate"], 0.01)
+        self.assertNotEqual(TireModel.COMPOUNDS["HARD"]["wear_rate"], 0.01)
+        self.assertEqual(gen.aero.cd_base, 0.9)
+        self.assertEqual(gen.max_power, 500000)
+
+        # Same result with the compound after the tire override
+        gen = TelemetryGenerator(seed=0)
+        apply_params(gen, {"tire.wear_rate": 0.01, "compound": "HARD"})
+        self.assertEqual(gen.tires[0].compound_name, "HARD")
+        self.assertEqual([tire.params["wear_rate"] for tire in gen.tires], [0.01] * 4)
+
+        for bad in ({"tire.nonsense": 1}, {"aero.nonsense": 1}, {"nonsense": 1}):
+            with self.assertRaises(ValueError):
+                apply_params(TelemetryGenerator(seed=0), bad)
+
+    def test_stint_is_deterministic(self):
+        first = simulate_stint({"compound": "SOFT"}, seed=2, **STINT)
+        self.assertEqual(first, simulate_stint({"compound": "SOFT"}, seed=2, **STINT))
+        self.assertGreater(first["stint_time"], 0)
+        self.assertLess(first["stint_time"], float("inf"))
+        self.assertGreater(first["final_wear"], 0)
+
+    def test_sweep_ranked_and_parallel_matches_serial(self):
+        configs = grid_space({"compound": list(TireModel.COMPOUNDS)})
+        serial = run_sweep(configs, workers=1, **STINT)
+        parallel = run_sweep(configs, workers=2, **STINT)
+        self.assertEqual(serial, parallel)
+        self.assertEqual([row["rank"] for row in serial], [1, 2, 3])
+        times = [row["stint_time"] for row in serial]
+        self.assertEqual(times, sorted(times))
+
+        by_wear = run_sweep(configs, rank_by="final_wear", workers=1, **STINT)
+        self.assertEqual(by_wear[0]["params"]["compound"], "HARD")
+        self.assertIn("compound", format_table(by_wear).splitlines()[0])
+
+    def test_bad_params_fail_before_running(self):
+        with self.assertRaises(ValueError):
+            run_sweep([{"compound": "SOFT"}, {"max_pwr": 1}], workers=2, **STINT)
+
+if __name__ == "__main__":
+    unittest.main()
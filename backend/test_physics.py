@@ -1,3 +1,4 @@
+import pickle
 import unittest
 from physics_engine import TireModel
 
@@ -110,5 +111,176 @@ class TestAeroModel(unittest.TestCase):
         self.aero.toggle_drs()
         self.assertTrue(self.aero.drs_active)
 
+class TestTireIntegrators(unittest.TestCase):
+    def run_tire(self, integrator, dt, duration=120.0, heat_coeff=None, temperature=25.0, inputs=(200, 0.5, 6000)):
+        tire = TireModel("SOFT", integrator)
+        tire.temperature = temperature
+        if heat_coeff is not None:
+            tire.params = dict(tire.params, heat_coeff=heat_coeff)
+        for _ in range(round(duration / dt)):
+            tire.update(dt, *inputs)
+        return tire.temperature, tire.wear
+
+    def test_exact_matches_fine_reference_at_any_step(self):
+        # Heating through 100C (wear speeds up mid-step) and cooling through it
+        for kwargs in ({"heat_coeff": 40.0}, {"temperature": 150.0, "inputs": (300, 1.0, 6000)}):
+            ref_temp, ref_wear = self.run_tire(TireModel.EULER, 1 / 6000, **kwargs)
+            for dt in (1 / 60, 1.0, 30.0, 120.0):
+                temp, wear = self.run_tire(TireModel.EXACT, dt, **kwargs)
+                self.assertAlmostEqual(temp, ref_temp, delta=0.01)
+                self.assertAlmostEqual(wear, ref_wear, delta=1e-5)
+
+    def test_euler_drifts_at_large_steps(self):
+        ref_temp, _ = self.run_tire(TireModel.EULER, 1 / 6000, heat_coeff=40.0)
+        temp, _ = self.run_tire(TireModel.EULER, 30.0, heat_coeff=40.0)
+        self.assertGreater(abs(temp - ref_temp), 10.0)
+
+    def test_invalid_integrator(self):
+        with self.assertRaises(ValueError):
+            TireModel("SOFT", "rk4")
+
+class TestGripTable(unittest.TestCase):
+    def tearDown(self):
+        TireModel.reset_grip_maps()
+
+    def test_table_within_error_bound(self):
+        for compound, params in TireModel.COMPOUNDS.items():
+            for temp_step in (0.5, 0.7, 2.3):
+                table = TireModel.build_grip_table(compound, temp_step)
+                error = table.max_error(lambda t, w: TireModel.analytic_grip(params, t, w))
+                self.assertLessEqual(error, TireModel.grip_table_error_bound(compound, temp_step) + 1e-12)
+
+    def test_tires_share_one_table(self):
+        first = TireModel("SOFT", grip_table=True)
+        second = TireModel("SOFT", grip_table=True)
+        self.assertIs(first.grip_table, second.grip_table)
+        self.assertIsNone(TireModel("SOFT").grip_table)
+
+        analytic = TireModel("SOFT")
+        for _ in range(600):
+            for tire in (first, analytic):
+                tire.update(0.1, 250, 0.2, 6000)
+            self.assertAlmostEqual(first.grip, analytic.grip,
+                                   delta=TireModel.grip_table_error_bound("SOFT") + 1e-12)
+
+    def test_measured_map(self):
+        temps = [20.0, 60.0, 100.0, 140.0]
+        wears = [0.0, 1.0]
+        grip = [[0.8, 0.4], [1.1, 0.6], [1.3, 0.7], [1.0, 0.5]]
+        TireModel.register_grip_map("MEDIUM", temps, wears, grip)
+        tire = TireModel("MEDIUM", grip_table=True)
+        lookup = tire.grip_table.lookup
+
+        self.assertAlmostEqual(lookup(60.0, 0.0), 1.1)
+        self.assertAlmostEqual(lookup(80.0, 0.0), 1.2)
+        self.assertAlmostEqual(lookup(80.0, 0.5), (1.1 + 1.3 + 0.6 + 0.7) / 4)
+        self.assertAlmostEqual(lookup(140.0, 1.0), 0.5)
+        # Clamped outside the measured range
+        self.assertAlmostEqual(lookup(-10.0, 0.0), 0.8)
+        self.assertAlmostEqual(lookup(300.0, 2.0), 0.5)
+
+        tire.temperature = 100.0
+        tire._calculate_grip()
+        self.assertAlmostEqual(tire.grip, 1.3)
+        # Other compounds keep the analytic table
+        self.assertAlmostEqual(TireModel.get_grip_table("SOFT").lookup(100.0, 0.0), 1.2)
+
+    def test_invalid_maps(self):
+        with self.assertRaises(ValueError):
+            TireModel.register_grip_map("MEDIUM", [20.0, 50.0, 60.0], [0.0, 1.0], [[1, 1], [1, 1], [1, 1]])
+        with self.assertRaises(ValueError):
+            TireModel.register_grip_map("MEDIUM", [20.0, 60.0], [0.0, 1.0], [[1, 1]])
+        with self.assertRaises(ValueError):
+            TireModel.register_grip_map("WET", [20.0, 60.0], [0.0, 1.0], [[1, 1], [1, 1]])
+
+from telemetry_generator import TelemetryGenerator, MAX_CATCHUP
+from frame_schema import FrameBuffer, flatten_frame, quantize_frame
+
+class TestGeneratorSubstepping(unittest.TestCase):
+    def test_long_step_is_substepped_not_clamped(self):
+        now = [1000.0]
+        gen = TelemetryGenerator(seed=1, clock=lambda: now[0])
+        now[0] += 2.5 # e.g. a stall
+        frame = gen.get_next_frame()
+        self.assertAlmostEqual(gen.sim_time, 2.5)
+        self.assertEqual(frame["timestamp"], 1002.5)
+
+        # Same as stepping the substeps one by one
+        split = TelemetryGenerator(seed=1, clock=lambda: 1000.0)
+        for _ in range(25):
+            split.step(0.1)
+        self.assertEqual(split.speed, gen.speed)
+        self.assertEqual(split.tires[0].temperature, gen.tires[0].temperature)
+
+    def test_catch_up_after_a_long_gap_is_capped(self):
+        now = [1000.0]
+        gen = TelemetryGenerator(seed=1, clock=lambda: now[0])
+        now[0] += 3600.0 # e.g. the machine slept
+        frame = gen.get_next_frame()
+        # Only MAX_CATCHUP is simulated; the frame is still stamped with the clock
+        self.assertAlmostEqual(gen.sim_time, MAX_CATCHUP)
+        self.assertEqual(frame["timestamp"], 4600.0)
+        self.assertAlmostEqual(gen.start_time + gen.sim_time, 4600.0)
+        now[0] += 0.5
+        self.assertEqual(gen.get_next_frame()["timestamp"], 4600.5)
+        self.assertAlmostEqual(gen.sim_time, MAX_CATCHUP + 0.5)
+
+    def test_exact_generator_is_stable_at_coarse_steps(self):
+        gen = TelemetryGenerator(seed=1, clock=lambda: 0.0, integrator=TireModel.EXACT, max_step=0.5)
+        for _ in range(240):
+            gen.step(0.5)
+            self.assertLessEqual(gen.rpm, gen.max_rpm)
+            self.assertGreaterEqual(gen.rpm, gen.idle_rpm)
+        self.assertLess(gen.engine_temp, 136.0)
+        self.assertGreater(gen.distance, 0.0)
+
+class TestFrameBuffer(unittest.TestCase):
+    def test_snapshot_into_matches_snapshot(self):
+        a = TelemetryGenerator(seed=4, clock=lambda: 0.0)
+        b = TelemetryGenerator(seed=4, clock=lambda: 0.0)
+        buffer = FrameBuffer()
+        values = buffer.values
+        for _ in range(300):
+            frame = a.get_next_frame(dt=1 / 60)
+            b.next_frame_into(buffer, dt=1 / 60)
+            self.assertIs(buffer.values, values) # Updated in place
+            self.assertEqual(buffer.to_frame(), frame)
+            self.assertEqual(list(buffer.snapshot()), flatten_frame(frame))
+            self.assertEqual(buffer.quantized(), quantize_frame(frame))
+
+    def test_slotted_state(self):
+        gen = TelemetryGenerator(seed=0)
+        for obj in (gen, gen.tires[0], gen.aero):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+class TestCheckpoint(unittest.TestCase):
+    def test_restored_runs_repeat_the_original(self):
+        gen = TelemetryGenerator(seed=5, clock=lambda: 1000.0)
+        for _ in range(600):
+            gen.step(1 / 60)
+        checkpoint = gen.checkpoint()
+        self.assertAlmostEqual(checkpoint.timestamp, 1010.0)
+
+        def run(generator):
+            return [generator.get_next_frame(dt=1 / 60) for _ in range(900)]
+
+        original = run(gen)
+        # Into a new generator, through pickle (as to a worker process), and back into the original
+        copy = TelemetryGenerator.from_checkpoint(pickle.loads(pickle.dumps(checkpoint)), clock=lambda: 0.0)
+        self.assertEqual(run(copy), original)
+        gen.restore(checkpoint)
+        self.assertEqual(run(gen), original)
+        self.assertTrue(any(frame["aero"]["drs"] for frame in original))
+
+        # The checkpoint shares no state with the generators restored from it
+        gen.restore(checkpoint)
+        gen.tires[0].wear = 0.9
+        gen.aero.drs_active = not checkpoint.aero.drs_active
+        gen.gear_ratios[1] = 1.0
+        restored = TelemetryGenerator.from_checkpoint(checkpoint)
+        self.assertEqual(restored.tires[0].wear, checkpoint.tires[0].wear)
+        self.assertEqual(restored.aero.drs_active, checkpoint.aero.drs_active)
+        self.assertEqual(restored.gear_ratios[1], 80 / 3.6)
+
 if __name__ == '__main__':
     unittest.main()
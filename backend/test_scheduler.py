@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from scheduler import TickScheduler
+from telemetry_generator import TelemetryGenerator
+
+class FakeClock:
+    """Virtual monotonic clock: sleep() advances it instead of waiting."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+def run_ticks(scheduler, n, work=lambda tick: 0.0, clock=None):
+    """Run n ticks; work(tick) is how long (virtual seconds) each tick takes."""
+    calls = []
+
+    async def on_tick(steps, physics_dt):
+        calls.append(steps)
+        if clock is not None:
+            clock.now += work(len(calls))
+        if len(calls) >= n:
+            scheduler.stop()
+
+    asyncio.run(scheduler.run(on_tick))
+    return calls
+
+class TestTickScheduler(unittest.TestCase):
+    def test_fixed_steps_per_tick(self):
+        clock = FakeClock()
+        scheduler = TickScheduler(240, 60, clock=clock, sleep=clock.sleep)
+        calls = run_ticks(scheduler, 60, work=lambda tick: 0.002, clock=clock)
+        self.assertEqual(calls, [4] * 60)
+        self.assertEqual(scheduler.overruns, 0)
+        # No drift: 60 ticks take exactly one second despite the work time
+        self.assertAlmostEqual(clock.now, 101.0 + 0.002, places=9)
+
+    def test_non_integer_ratio_is_deterministic(self):
+        clock = FakeClock()
+        scheduler = TickScheduler(100, 60, clock=clock, sleep=clock.sleep)
+        calls = run_ticks(scheduler, 60)
+        self.assertEqual(sum(calls), 100)
+        self.assertEqual(set(calls), {1, 2})
+
+    def test_catch_up_after_slow_tick(self):
+        clock = FakeClock()
+        scheduler = TickScheduler(240, 60, max_catchup=4, clock=clock, sleep=clock.sleep)
+        # Tick 5 takes 2.5 periods: the next tick runs late and folds in the missed ticks
+        calls = run_ticks(scheduler, 10, work=lambda tick: 2.5 / 60 if tick == 5 else 0.0, clock=clock)
+        self.assertEqual(scheduler.overruns, 1)
+        self.assertEqual(scheduler.ticks_caught_up, 1)
+        self.assertEqual(calls[5], 8)
+        self.assertEqual(scheduler.physics_steps, sum(calls))
+        # Simulated time kept up with the wall clock
+        self.assertEqual(scheduler.sim_ticks, 11)
+
+    def test_drop_backlog_when_far_behind(self):
+        clock = FakeClock()
+        scheduler = TickScheduler(240, 60, max_catchup=2, clock=clock, sleep=clock.sleep)
+        calls = run_ticks(scheduler, 5, work=lambda tick: 1.0 if tick == 2 else 0.0, clock=clock)
+        self.assertGreater(scheduler.ticks_dropped, 0)
+        self.assertEqual(scheduler.ticks_caught_up, 0)
+        self.assertEqual(calls, [4] * 5)
+        stats = scheduler.stats()
+        self.assertGreater(stats["max_lateness_ms"], 900)
+        self.assertEqual(stats["ticks"], 5)
+
+    def test_invalid_rates(self):
+        with self.assertRaises(ValueError):
+            TickScheduler(30, 60)
+        with self.assertRaises(ValueError):
+            TickScheduler(240, 0)
+
+class TestFixedStepGenerator(unittest.TestCase):
+    def test_fixed_dt_timestamps(self):
+        gen = TelemetryGenerator()
+        frames = [gen.get_next_frame(dt=1 / 60) for _ in range(60)]
+        self.assertAlmostEqual(frames[-1]["timestamp"] - gen.start_time, 1.0, places=9)
+        self.assertGreater(frames[-1]["speed_kmh"], 0.0)
+
+    def test_step_then_snapshot(self):
+        gen = TelemetryGenerator()
+        for _ in range(240):
+            gen.step(1 / 240)
+        frame = gen.snapshot()
+        self.assertAlmostEqual(gen.sim_time, 1.0, places=9)
+        self.assertEqual(frame["speed_kmh"], round(gen.speed * 3.6, 2))
+        self.assertEqual(len(frame["tires"]), 4)
+
+if __name__ == "__main__":
+    unittest.main()
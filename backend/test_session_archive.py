@@ -0,0 +1,110 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+from session_archive import ArchiveWriter, SessionArchive, export_session, import_session
+from streams import PlaybackStream
+from frame_schema import flatten_frame, unflatten_frame
+
+class TestSessionArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = TelemetryLogger(os.path.join(self.tmp_dir, "telemetry.db"), engine="json")
+        generator = TelemetryGenerator(seed=2, clock=lambda: 0.0)
+        self.session_id = self.db.start_session("lap")
+        for i in range(1000):
+            generator.step(1 / 60)
+            self.db.log(generator.snapshot(timestamp=5000.0 + i / 60))
+        # A frame with missing fields
+        self.db.log({"timestamp": 5000.0 + 1000 / 60, "speed_kmh": 12.5, "gear": 2})
+        self.db.end_session()
+        # Archives store every channel, like the columnar engines (missing fields come back as None)
+        self.frames = [unflatten_frame(flatten_frame(f)) for f in self.db.get_playback_data(self.session_id)]
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def test_round_trip(self):
+        for compression in (None, "zlib"):
+            for chunk_frames in (1 << 20, 256):
+                path = self.path(f"{compression}_{chunk_frames}.vdta")
+                self.assertEqual(export_session(self.db, self.session_id, path, compression, chunk_frames), 1001)
+                session_id = import_session(self.db, path)
+                session = self.db.get_session(session_id)
+                self.assertEqual(session["engine"], "archive")
+                self.assertEqual(session["name"], "lap")
+                self.assertEqual(session["frame_count"], 1001)
+                self.assertEqual(self.db.get_playback_data(session_id), self.frames, (compression, chunk_frames))
+
+    def test_uncompressed_columns_are_memory_mapped(self):
+        path = self.path("s.vdta")
+        export_session(self.db, self.session_id, path)
+        archive = SessionArchive(path)
+        speed = archive.raw_column("speed_kmh")
+        self.assertIsInstance(speed, np.memmap)
+        self.assertLessEqual(speed.dtype.itemsize, 4)
+        self.assertEqual(archive.column("speed_kmh").tolist(), [f["speed_kmh"] for f in self.frames])
+        # Missing values come back as NaN
+        self.assertTrue(np.isnan(archive.column("tire_fl_temp")[-1]))
+        archive.close()
+
+    def test_reads_match_the_recorded_session(self):
+        path = self.path("s.vdta")
+        export_session(self.db, self.session_id, path, chunk_frames=300)
+        session_id = import_session(self.db, path)
+        channels = ["speed_kmh", "gear", "tire_rr_wear", "aero_drs"]
+        expected = self.db.read_channels(self.session_id, channels, start=4.0, end=9.0)
+        result = self.db.read_channels(session_id, channels, start=4.0, end=9.0)
+        for name in ["timestamp"] + channels:
+            np.testing.assert_array_equal(result[name], expected[name])
+
+        # Seeking and time-accurate playback work on attached sessions
+        reader = self.db.iter_playback(session_id, offset=10.0)
+        self.assertEqual(next(reader), self.frames[600])
+        reader.close()
+        self.assertEqual(self.db.read_frame(session_id, 5010.0), self.frames[600])
+        stream = PlaybackStream("p", self.db, session_id, speed=2.0)
+        frames = [asyncio.run(stream.next_frame(1 / 60)) for _ in range(3)]
+        self.assertEqual([f["timestamp"] for f in frames], [self.frames[i]["timestamp"] for i in (0, 2, 4)])
+        stream.close()
+
+        history = self.db.query_history(session_id, ["speed_kmh"], max_points=10)
+        self.assertEqual(history["frames"].sum(), 1001)
+
+    def test_copy_import(self):
+        path = self.path("s.vdta")
+        export_session(self.db, self.session_id, path, "zlib")
+        session_id = import_session(self.db, path, name="copied", copy=True)
+        os.remove(path)
+        session = self.db.get_session(session_id)
+        self.assertEqual((session["engine"], session["name"]), ("columnar", "copied"))
+        self.assertEqual(self.db.get_playback_data(session_id), self.frames)
+
+    def test_invalid_archives(self):
+        path = self.path("bad.vdta")
+        with open(path, "wb") as f:
+            f.write(b"not an archive at all")
+        with self.assertRaises(ValueError):
+            import_session(self.db, path)
+        with self.assertRaises(ValueError):
+            export_session(self.db, 999, self.path("x.vdta"))
+
+        # Frames out of timestamp order can't be attached (playback seeks by binary search)
+        table = np.zeros((3, 28))
+        table[:, 0] = [3.0, 1.0, 2.0]
+        writer = ArchiveWriter(path)
+        writer.write(table)
+        writer.close()
+        with self.assertRaises(ValueError):
+            import_session(self.db, path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+import unittest
+from sim_workers import FrameRing, WorkerStream, WorkerPool
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+from streams import StreamHub
+from frame_schema import FrameBuffer
+
+def frames(n, seed=1):
+    generator = TelemetryGenerator(seed=seed, clock=lambda: 1000.0)
+    result = []
+    for _ in range(n):
+        generator.step(1 / 60)
+        result.append(list(generator.snapshot_into(FrameBuffer()).values))
+    return result
+
+def write_frames(name, count):
+    # Writer process of the concurrency test: frame seq carries epoch seq
+    ring = FrameRing(name)
+    values = frames(16)
+    for seq in range(count):
+        ring.write(seq, values[seq % len(values)])
+    ring.close()
+
+class FakePool:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, index, message):
+        self.sent.append((index, message))
+
+    def remove_car(self, stream_id):
+        pass
+
+class TestFrameRing(unittest.TestCase):
+    def test_round_trip_and_overwrite(self):
+        ring = FrameRing(slots=8)
+        try:
+            attached = FrameRing(ring.name)
+            values = frames(10)
+            values[0][5] = None # Missing brake
+            for i, frame in enumerate(values):
+                attached.write(i // 5, frame)
+            self.assertEqual(ring.seq, 10)
+            self.assertEqual(ring.read(9), (1, values[9]))
+            self.assertEqual(ring.read(3), (0, values[3]))
+            # Frames 0 and 1 were overwritten; 2 is the oldest kept (the writer is about to reuse its row)
+            self.assertIsNone(ring.read(1))
+            self.assertIsNone(ring.read(2))
+            attached.close()
+        finally:
+            ring.close()
+
+    def test_concurrent_reads_never_see_torn_rows(self):
+        ring = FrameRing(slots=4)
+        try:
+            values = frames(16)
+            writer = multiprocessing.get_context("spawn").Process(target=write_frames, args=(ring.name, 200000))
+            writer.start()
+            read = 0
+            while writer.is_alive() or ring.seq < 200000:
+                written = ring.seq
+                # Trail the writer closely so it often overwrites rows mid-copy
+                for seq in range(max(0, written - 3), written):
+                    frame = ring.read(seq)
+                    if frame is None:
+                        continue # Lapped
+                    self.assertEqual(frame, (seq, values[seq % len(values)]))
+                    read += 1
+                if writer.exitcode not in (None, 0):
+                    break
+            writer.join()
+            self.assertEqual(writer.exitcode, 0)
+            self.assertGreater(read, 0)
+        finally:
+            ring.close()
+
+class TestWorkerStream(unittest.TestCase):
+    def setUp(self):
+        self.db = TelemetryLogger(":memory:")
+        self.ring = FrameRing(slots=16)
+        self.pool = FakePool()
+        self.stream = WorkerStream("car_0", self.db, self.pool, 0, self.ring)
+
+    def tearDown(self):
+        self.ring.close()
+        self.db.close()
+
+    def test_logs_every_frame_and_returns_the_newest(self):
+        values = frames(5)
+        for frame in values:
+            self.ring.write(0, frame)
+        buffer = asyncio.run(self.stream.next_frame())
+        self.assertEqual(buffer.values, values[-1])
+        self.assertIsNone(asyncio.run(self.stream.next_frame()))
+        self.db.flush()
+        logged = self.db.get_playback_data(self.stream.session_id)
+        self.assertEqual([f["timestamp"] for f in logged], [v[0] for v in values])
+
+    def test_reset_skips_frames_of_the_old_epoch(self):
+        values = frames(6)
+        self.ring.write(0, values[0])
+        old_session = self.stream.session_id
+        self.stream.reset()
+        self.assertEqual(self.pool.sent, [(0, ("reset", "car_0", 1))])
+        self.assertNotEqual(self.stream.session_id, old_session)
+        # Written before the worker saw the reset: dropped
+        self.ring.write(0, values[1])
+        self.ring.write(1, values[2])
+        buffer = asyncio.run(self.stream.next_frame())
+        self.assertEqual(buffer.values, values[2])
+        self.db.flush()
+        self.assertEqual(len(self.db.get_playback_data(old_session)), 1)
+        self.assertEqual(len(self.db.get_playback_data(self.stream.session_id)), 1)
+
+    def test_counts_lost_frames(self):
+        for frame in frames(40):
+            self.ring.write(0, frame)
+        asyncio.run(self.stream.next_frame())
+        self.assertEqual(self.stream.frames_lost, 40 - 15)
+        self.assertEqual(self.stream.frames_read, 15)
+
+class TestWorkerPool(unittest.TestCase):
+    def wait_for(self, condition, hub, timeout=30.0):
+        async def loop():
+            deadline = time.monotonic() + timeout
+            while not condition():
+                if time.monotonic() > deadline:
+                    self.fail("timed out")
+                await hub.tick()
+                await asyncio.sleep(0.01)
+        asyncio.run(loop())
+
+    def test_sharding_streaming_and_crash_restart(self):
+        db = TelemetryLogger(":memory:")
+        pool = WorkerPool(2, restart_backoff=0.0)
+        hub = StreamHub(db, workers=pool)
+        try:
+            cars = [hub.add_live(f"car_{i}") for i in range(3)]
+            self.assertEqual([car.worker for car in cars], [0, 1, 0])
+            self.wait_for(lambda: all(car.frames_read >= 10 for car in cars), hub)
+            self.assertEqual(pool.check(time.monotonic() + 1.0), [])
+
+            crashed = pool._workers[0].process
+            os.kill(crashed.pid, signal.SIGKILL)
+            crashed.join()
+            sessions = [car.session_id for car in cars]
+            self.assertEqual(pool.check(time.monotonic() + 1.5), [0])
+            self.assertNotEqual(cars[0].session_id, sessions[0])
+            self.assertNotEqual(cars[2].session_id, sessions[2])
+            self.assertEqual(cars[1].session_id, sessions[1])
+
+            read = cars[0].frames_read
+            self.wait_for(lambda: cars[0].frames_read >= read + 10, hub)
+            stats = pool.stats()
+            self.assertEqual([s["restarts"] for s in stats], [1, 0])
+            self.assertTrue(all(s["alive"] for s in stats))
+
+            # Checkpoints come back from the workers, also from the restarted one
+            for car in cars:
+                checkpoint = asyncio.run(car.checkpoint())
+                self.assertGreater(checkpoint.sim_time, 0.0)
+                self.assertEqual(len(checkpoint.tires), 4)
+
+            hub.remove("car_2")
+            self.assertEqual(pool.stats()[0]["cars"], ["car_0"])
+        finally:
+            hub.close()
+            pool.close()
+            db.close()
+        self.assertFalse(any(w.process.is_alive() for w in pool._workers))
+
+if __name__ == "__main__":
+    unittest.main()
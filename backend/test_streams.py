@@ -0,0 +1,256 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from telemetry_logger import TelemetryLogger
+from streams import StreamHub, PlaybackStream, filter_channels
+
+class FakeClient:
+    def __init__(self):
+        self.subscriptions = {}
+
+class TestStreamHub(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = TelemetryLogger(os.path.join(self.tmp_dir, "telemetry.db"))
+        self.hub = StreamHub(self.db)
+
+    def tearDown(self):
+        self.hub.close()
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def tick(self, n=1):
+        produced = []
+        for _ in range(n):
+            produced = asyncio.run(self.hub.tick())
+        return produced
+
+    def test_live_streams_are_independent(self):
+        car_0 = self.hub.add_live("car_0")
+        car_1 = self.hub.add_live("car_1")
+        self.tick(30)
+        self.assertNotEqual(car_0.session_id, car_1.session_id)
+
+        # Resetting one car leaves the other running
+        speed_before = car_1.generator.speed
+        car_0.reset()
+        self.assertEqual(car_0.generator.speed, 0.0)
+        self.assertEqual(car_1.generator.speed, speed_before)
+
+    def test_next_car_id_is_the_lowest_free_one(self):
+        self.assertEqual(self.hub.next_car_id(), "car_0")
+        self.hub.add_live("car_0")
+        self.hub.add_live("car_2")
+        self.hub.add_alerts("alerts") # Other streams don't shift the numbering
+        self.assertEqual(self.hub.next_car_id(), "car_1")
+        self.hub.add_live("car_1")
+        self.assertEqual(self.hub.next_car_id(), "car_3")
+
+    def test_live_streams_record_their_own_sessions(self):
+        car_0 = self.hub.add_live("car_0")
+        car_1 = self.hub.add_live("car_1")
+        self.tick(10)
+        self.db.flush()
+        self.assertEqual(self.db.get_session(car_0.session_id)["frame_count"], 10)
+        self.assertEqual(self.db.get_session(car_1.session_id)["frame_count"], 10)
+
+    def test_subscriptions(self):
+        self.hub.add_live("car_0")
+        client = FakeClient()
+        stream = self.hub.subscribe(client, "car_0", ["speed_kmh"])
+        self.assertIn(client, stream.subscribers)
+        self.assertEqual(client.subscriptions, {"car_0": ("speed_kmh",)})
+
+        self.hub.unsubscribe(client, "car_0")
+        self.assertNotIn(client, stream.subscribers)
+        # Live streams outlive their subscribers
+        self.assertIsNotNone(self.hub.get("car_0"))
+
+        with self.assertRaises(ValueError):
+            self.hub.subscribe(client, "car_99")
+
+    def test_playback_runs_beside_live(self):
+        car = self.hub.add_live("car_0")
+        self.tick(20)
+        recorded = car.session_id
+        car.reset()
+        self.db.flush() # Playback replays committed frames (the writer's job, within flush_interval)
+
+        client = FakeClient()
+        self.hub.open_playback("playback_1", recorded)
+        self.hub.subscribe(client, "playback_1")
+
+        produced = {stream.stream_id: frame for stream, frame in self.tick()}
+        self.assertEqual(set(produced), {"car_0", "playback_1"})
+
+        # Playback streams go away with their last subscriber
+        self.hub.unsubscribe(client, "playback_1")
+        self.assertIsNone(self.hub.get("playback_1"))
+
+    def test_playback_without_subscribers_is_idle(self):
+        self.hub.add_live("car_0")
+        self.tick(5)
+        self.hub.open_playback("playback_1")
+        produced = [stream.stream_id for stream, _ in self.tick()]
+        self.assertEqual(produced, ["car_0"])
+
+    def test_alert_stream_is_not_ticked(self):
+        self.hub.add_live("car_0")
+        alerts = self.hub.add_alerts("alerts")
+        client = FakeClient()
+        self.hub.subscribe(client, "alerts")
+        self.assertIn(client, alerts.subscribers)
+        produced = [stream.stream_id for stream, _ in self.tick()]
+        self.assertEqual(produced, ["car_0"])
+
+    def test_filter_channels(self):
+        frame = {"timestamp": 1.0, "stream": "car_0", "speed_kmh": 100.0, "rpm": 9000.0, "tires": []}
+        self.assertIs(filter_channels(frame, None), frame)
+        self.assertEqual(filter_channels(frame, ("rpm", "missing")),
+                         {"timestamp": 1.0, "stream": "car_0", "rpm": 9000.0})
+
+class TestPlaybackTiming(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = TelemetryLogger(os.path.join(self.tmp_dir, "telemetry.db"), engine="columnar")
+        self.session_id = self.db.start_session()
+        # 60 Hz for 2 s, a 1 s dropout, then 60 Hz for 2 s
+        self.timestamps = [1000.0 + i / 60 for i in range(120)] + [1003.0 + i / 60 for i in range(120)]
+        for i, ts in enumerate(self.timestamps):
+            self.db.log({"timestamp": ts, "speed_kmh": float(i), "gear": 3, "is_anomaly": i == 201})
+        self.db.end_session()
+        self.db.flush() # Playback doesn't flush: it replays what the writer has committed
+        self.hub = StreamHub(self.db)
+
+    def tearDown(self):
+        self.hub.close()
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def play(self, stream, ticks, dt=1 / 60):
+        frames = []
+        for _ in range(ticks):
+            frames.append(asyncio.run(stream.next_frame(dt)))
+        return frames
+
+    def test_real_time_follows_recorded_timestamps(self):
+        stream = PlaybackStream("p", self.db, self.session_id)
+        frames = self.play(stream, 300)
+        published = [f["timestamp"] for f in frames if f is not None]
+        self.assertEqual(published, self.timestamps[:len(published)])
+        # The dropout is replayed as a pause, not skipped over
+        first_after_gap = next(i for i, f in enumerate(frames) if f and f["timestamp"] >= 1003.0)
+        self.assertAlmostEqual(first_after_gap / 60, 3.0, delta=2 / 60)
+        self.assertEqual(sum(f is None for f in frames[:first_after_gap]), first_after_gap - 120)
+
+    def test_fast_forward_decimates_or_aggregates(self):
+        stream = PlaybackStream("p", self.db, self.session_id, speed=4.0)
+        frames = [f for f in self.play(stream, 30) if f is not None]
+        # One frame per tick, each the newest recorded frame the cursor passed
+        self.assertEqual([f["speed_kmh"] for f in frames[:4]], [0.0, 4.0, 8.0, 12.0])
+        self.assertGreater(stream.frames_skipped, 0)
+
+        stream = PlaybackStream("p", self.db, self.session_id, speed=4.0, decimation=PlaybackStream.AGGREGATE)
+        frames = [f for f in self.play(stream, 30) if f is not None]
+        self.assertEqual(frames[1]["speed_kmh"], 2.5) # Mean of frames 1..4
+        self.assertEqual(frames[1]["gear"], 3)
+
+    def test_aggregate_keeps_rare_flags(self):
+        stream = PlaybackStream("p", self.db, self.session_id, offset=3.0, speed=30.0,
+                                decimation=PlaybackStream.AGGREGATE)
+        frames = [f for f in self.play(stream, 10) if f is not None]
+        self.assertEqual(sum(f["is_anomaly"] for f in frames), 1)
+
+    def test_pause_step_and_seek(self):
+        stream = PlaybackStream("p", self.db, self.session_id)
+        self.play(stream, 10)
+        stream.pause()
+        self.assertEqual(self.play(stream, 20), [None] * 20)
+        stream.step()
+        self.assertEqual(self.play(stream, 1)[0]["timestamp"], self.timestamps[10])
+        stream.step(5)
+        self.assertEqual(self.play(stream, 1)[0]["timestamp"], self.timestamps[15])
+        self.assertAlmostEqual(stream.position, 15 / 60)
+        # Seeking while paused shows the new position once
+        stream.seek(3.5)
+        self.assertEqual(self.play(stream, 3)[0]["timestamp"], self.timestamps[150])
+        stream.resume()
+        self.assertEqual(self.play(stream, 1)[0]["timestamp"], self.timestamps[151])
+
+    def test_very_high_speed_skips_instead_of_reading_everything(self):
+        stream = PlaybackStream("p", self.db, self.session_id, speed=1000.0)
+        frames = self.play(stream, 3)
+        # 16.7 s of recording per tick: every tick jumps past the end and loops
+        self.assertEqual([f["timestamp"] for f in frames], [1000.0] * 3)
+        self.assertLess(stream.frames_played, 10)
+
+        # A jump at 100x lands on the frame at the cursor; back at 1x, playback continues from there
+        stream = PlaybackStream("p", self.db, self.session_id, speed=100.0)
+        frames = self.play(stream, 2)
+        self.assertEqual(frames[1]["timestamp"], self.timestamps[100])
+        stream.set_speed(1.0)
+        frames = self.play(stream, 2)
+        self.assertEqual([f["timestamp"] for f in frames], self.timestamps[101:103])
+
+    def test_jumps_reuse_the_resolved_session(self):
+        stream = PlaybackStream("p", self.db, self.session_id, speed=100.0)
+        self.play(stream, 2)
+        flushes = []
+        flush = self.db.flush
+        self.db.flush = lambda: flushes.append(1) or flush()
+        # Another jump: one index lookup, without flushing or looking the session up again
+        frame = self.play(stream, 1)[0]
+        self.assertEqual(frame["timestamp"], self.timestamps[140])
+        self.assertEqual(flushes, [])
+
+    def test_opening_playback_does_not_flush(self):
+        live = self.db.start_session()
+        self.db.log({"timestamp": 2000.0, "speed_kmh": 1.0})
+        flushed_by = []
+        flush = self.db.flush
+        self.db.flush = lambda: flushed_by.append(threading.current_thread()) or flush()
+        # The tick loop replays committed frames; the writer commits the rest on its own
+        stream = PlaybackStream("p", self.db, speed=100.0)
+        self.play(stream, 2)
+        self.assertEqual(stream.session_id, self.session_id)
+        self.assertNotIn(threading.current_thread(), flushed_by)
+        self.db.close_session(live)
+
+    def test_unreadable_recording_stops_the_stream(self):
+        with self.db.conn:
+            self.db.conn.execute('INSERT INTO telemetry_columns (session_id, timestamp, speed_kmh) VALUES (?, ?, ?)',
+                                 (self.session_id, 1000.5, "garbage"))
+        stream = PlaybackStream("p", self.db, self.session_id)
+        # The reader fails on its first chunk: no frames, no exception out of the tick
+        self.assertEqual(self.play(stream, 30), [None] * 30)
+        self.assertEqual(stream.frames_played, 0)
+
+    def test_loops_at_the_end(self):
+        stream = PlaybackStream("p", self.db, self.session_id, speed=10.0)
+        frames = [f for f in self.play(stream, 60) if f is not None]
+        self.assertEqual(sum(f["timestamp"] == 1000.0 for f in frames), 2)
+
+    def test_clients_have_independent_cursors(self):
+        slow = self.hub.open_playback("playback_1", self.session_id)
+        fast = self.hub.open_playback("playback_2", self.session_id, speed=2.0)
+        for client_id in ("playback_1", "playback_2"):
+            self.hub.subscribe(FakeClient(), client_id)
+        for _ in range(60):
+            asyncio.run(self.hub.tick(4, 1 / 240))
+        self.assertAlmostEqual(slow.position, 59 / 60, places=6)
+        self.assertAlmostEqual(fast.position, 118 / 60, places=6)
+        self.assertEqual(slow.describe()["speed"], 1.0)
+
+    def test_invalid_speed(self):
+        stream = PlaybackStream("p", self.db, self.session_id)
+        for speed in (0.0, -1.0, 5000.0):
+            with self.assertRaises(ValueError):
+                stream.set_speed(speed)
+        with self.assertRaises(ValueError):
+            stream.set_speed(2.0, "interpolate")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,579 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from telemetry_generator import TelemetryGenerator
+from telemetry_logger import TelemetryLogger
+from frame_schema import flatten_frame
+
+def make_frame(ts, speed=100.0):
+    return {"timestamp": ts, "speed_kmh": speed, "gear": 3}
+
+class TestTelemetryLogger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "telemetry.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_log_does_not_write_immediately(self):
+        # Large batch + long deadline: frames stay buffered until flush()
+        db = TelemetryLogger(self.db_path, batch_size=1000, flush_interval=60.0)
+        for i in range(10):
+            db.log(make_frame(float(i)))
+        self.assertEqual(db.frames_written, 0)
+        self.assertEqual(db.queue_depth, 10)
+
+        db.flush()
+        self.assertEqual(db.frames_written, 10)
+        self.assertEqual(db.batches_written, 1)
+        db.close()
+
+    def test_flush_on_batch_size(self):
+        db = TelemetryLogger(self.db_path, batch_size=5, flush_interval=60.0)
+        for i in range(5):
+            db.log(make_frame(float(i)))
+
+        deadline = time.time() + 2.0
+        while db.frames_written < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(db.frames_written, 5)
+        db.close()
+
+    def test_flush_on_deadline(self):
+        db = TelemetryLogger(self.db_path, batch_size=1000, flush_interval=0.05)
+        db.log(make_frame(1.0))
+
+        deadline = time.time() + 2.0
+        while db.frames_written < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(db.frames_written, 1)
+        db.close()
+
+    def test_close_flushes_pending(self):
+        db = TelemetryLogger(self.db_path, batch_size=1000, flush_interval=60.0)
+        for i in range(25):
+            db.log(make_frame(float(i)))
+        db.close()
+
+        reopened = TelemetryLogger(self.db_path)
+        frames = reopened.get_playback_data()
+        reopened.close()
+        self.assertEqual(len(frames), 25)
+        self.assertEqual(frames[0]["timestamp"], 0.0)
+        self.assertEqual(frames[-1]["timestamp"], 24.0)
+
+    def test_drop_oldest_policy(self):
+        db = TelemetryLogger(self.db_path, batch_size=1000, flush_interval=60.0,
+                             max_queue=1000, overflow_policy=TelemetryLogger.DROP_OLDEST)
+        for i in range(1010):
+            self.assertTrue(db.log(make_frame(float(i))))
+        self.assertEqual(db.frames_dropped, 10)
+
+        frames = db.get_playback_data()
+        self.assertEqual(frames[0]["timestamp"], 10.0)
+        self.assertEqual(frames[-1]["timestamp"], 1009.0)
+        db.close()
+
+    def test_drop_newest_policy(self):
+        db = TelemetryLogger(self.db_path, batch_size=1000, flush_interval=60.0,
+                             max_queue=1000, overflow_policy=TelemetryLogger.DROP_NEWEST)
+        accepted = [db.log(make_frame(float(i))) for i in range(1010)]
+        self.assertEqual(accepted.count(False), 10)
+
+        frames = db.get_playback_data()
+        self.assertEqual(frames[-1]["timestamp"], 999.0)
+        db.close()
+
+    def test_log_many_overflow_policies(self):
+        oldest = TelemetryLogger(":memory:", batch_size=1000, flush_interval=60.0, max_queue=1000)
+        oldest.log_many([make_frame(float(i)) for i in range(600)])
+        self.assertEqual(oldest.log_many([make_frame(float(i)) for i in range(600, 2500)]), 1000)
+        self.assertEqual(oldest.frames_dropped, 1500)
+        self.assertEqual([f["timestamp"] for f in oldest.get_playback_data()], [float(i) for i in range(1500, 2500)])
+        oldest.close()
+
+        newest = TelemetryLogger(":memory:", batch_size=1000, flush_interval=60.0, max_queue=1000,
+                                 overflow_policy=TelemetryLogger.DROP_NEWEST)
+        newest.log_many([make_frame(float(i)) for i in range(600)])
+        self.assertEqual(newest.log_many([make_frame(float(i)) for i in range(600, 2500)]), 400)
+        self.assertEqual(newest.frames_dropped, 1500)
+        self.assertEqual(newest.get_playback_data()[-1]["timestamp"], 999.0)
+        newest.close()
+
+        # BLOCK: the writer drains the queue while the batch goes in
+        blocking = TelemetryLogger(self.db_path, batch_size=50, flush_interval=60.0, max_queue=100,
+                                   overflow_policy=TelemetryLogger.BLOCK)
+        self.assertEqual(blocking.log_many([make_frame(float(i)) for i in range(500)]), 500)
+        blocking.flush()
+        self.assertEqual((blocking.frames_written, blocking.frames_dropped), (500, 0))
+        blocking.close()
+
+    def test_failed_write_is_requeued_then_dropped(self):
+        db = TelemetryLogger(self.db_path, batch_size=1000, flush_interval=60.0, engine="delta")
+        fail = "CREATE TRIGGER fail BEFORE INSERT ON telemetry_delta BEGIN SELECT RAISE(ABORT, 'disk full'); END"
+        db.conn.execute(fail)
+        for i in range(5):
+            db.log(make_frame(float(i), speed=float(i)))
+        with self.assertRaises(sqlite3.Error):
+            db.flush()
+        self.assertEqual((db.queue_depth, db.frames_written, db.frames_dropped), (5, 0, 0))
+
+        # Retried with the next batch, from a fresh keyframe
+        db.conn.execute("DROP TRIGGER fail")
+        db.log(make_frame(5.0, speed=5.0))
+        db.flush()
+        self.assertEqual(db.frames_written, 6)
+        self.assertEqual([f["speed_kmh"] for f in db.get_playback_data(db.session_id)], [0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+
+        # A batch that keeps failing is dropped after WRITE_RETRIES retries
+        db.conn.execute(fail)
+        db.log(make_frame(6.0))
+        for _ in range(TelemetryLogger.WRITE_RETRIES + 1):
+            with self.assertRaises(sqlite3.Error):
+                db.flush()
+        self.assertEqual((db.queue_depth, db.frames_dropped), (0, 1))
+        db.conn.execute("DROP TRIGGER fail")
+        db.close()
+
+    def test_wal_and_synchronous(self):
+        db = TelemetryLogger(self.db_path, synchronous="off")
+        mode = db.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+        db.close()
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            TelemetryLogger(self.db_path, overflow_policy="explode")
+        with self.assertRaises(ValueError):
+            TelemetryLogger(self.db_path, synchronous="SOMETIMES")
+
+class TestPlaybackReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = TelemetryLogger(os.path.join(self.tmp_dir, "telemetry.db"))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_streams_in_timestamp_order(self):
+        # Logged out of order; playback must be sorted
+        for ts in [5.0, 1.0, 3.0, 2.0, 4.0]:
+            self.db.log(make_frame(ts))
+
+        reader = self.db.iter_playback(chunk_size=2)
+        timestamps = [f["timestamp"] for f in reader]
+        self.assertEqual(timestamps, [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(reader.frames_read, 5)
+
+    def test_duplicate_timestamps_across_chunks(self):
+        # Keyset pagination must not skip or repeat frames sharing a timestamp
+        for i in range(7):
+            self.db.log(make_frame(1.0, speed=float(i)))
+        self.db.log(make_frame(2.0))
+
+        speeds = [f["speed_kmh"] for f in self.db.iter_playback(chunk_size=3)]
+        self.assertEqual(speeds, [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 100.0])
+
+    def test_async_iteration(self):
+        for i in range(50):
+            self.db.log(make_frame(float(i)))
+
+        async def collect():
+            return [f["timestamp"] async for f in self.db.iter_playback(chunk_size=8)]
+
+        timestamps = asyncio.run(collect())
+        self.assertEqual(len(timestamps), 50)
+        self.assertEqual(timestamps[-1], 49.0)
+
+    def test_close_mid_stream(self):
+        for i in range(100):
+            self.db.log(make_frame(float(i)))
+
+        reader = self.db.iter_playback(chunk_size=5, prefetch=1)
+        self.assertEqual(next(reader)["timestamp"], 0.0)
+        reader.close()
+        self.assertEqual(list(reader), [])
+
+    def test_prefetch_error_reaches_the_consumer(self):
+        for i in range(10):
+            self.db.log(make_frame(float(i)))
+        self.db.flush()
+        with self.db.conn:
+            self.db.conn.execute('INSERT INTO telemetry (timestamp, data) VALUES (?, ?)', (20.0, "{not json"))
+
+        reader = self.db.iter_playback(chunk_size=4)
+        frames = []
+        with self.assertRaises(ValueError):
+            for frame in reader:
+                frames.append(frame)
+        self.assertEqual(len(frames), 8) # The chunk holding the bad row is lost, not hung on
+        self.assertEqual(list(reader), [])
+
+        async def collect():
+            return [f async for f in self.db.iter_playback(chunk_size=4)]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(collect())
+
+    def test_empty_database(self):
+        self.assertEqual(list(self.db.iter_playback()), [])
+        self.assertEqual(self.db.get_playback_data(), [])
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "telemetry.db")
+        self.db = TelemetryLogger(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def record(self, name, start, count, step=1.0):
+        sid = self.db.start_session(name)
+        for i in range(count):
+            self.db.log(make_frame(start + i * step, speed=float(i)))
+        return sid
+
+    def test_sessions_are_listed_with_stats(self):
+        first = self.record("first", 100.0, 10)
+        second = self.record("second", 1000.0, 5)
+        self.db.end_session()
+
+        sessions = self.db.get_all_sessions()
+        self.assertEqual([s["id"] for s in sessions], [first, second])
+        self.assertEqual(sessions[0]["frame_count"], 10)
+        self.assertEqual(sessions[0]["start_time"], 100.0)
+        self.assertEqual(sessions[0]["end_time"], 109.0)
+        self.assertAlmostEqual(sessions[0]["duration"], 9.0)
+        self.assertIsNotNone(sessions[1]["closed_at"])
+        self.assertEqual(self.db.get_session(first), sessions[0])
+        self.assertIsNone(self.db.get_session(999))
+
+    def test_close_session_leaves_the_write_to_the_writer(self):
+        sid = self.record("first", 100.0, 10)
+        flushed_by = []
+        flush = self.db.flush
+        self.db.flush = lambda: flushed_by.append(threading.current_thread()) or flush()
+        self.db.end_session()
+        # The caller (the event loop, in the server) neither flushes nor writes
+        self.assertNotIn(threading.current_thread(), flushed_by)
+        self.assertFalse(self.db.get_session(sid)["active"])
+        self.assertIsNone(self.db.session_id)
+
+        flush()
+        session = self.db.get_session(sid)
+        self.assertEqual(session["frame_count"], 10)
+        self.assertIsNotNone(session["closed_at"])
+
+    def test_playback_is_scoped_to_session(self):
+        first = self.record("first", 100.0, 10)
+        second = self.record("second", 1000.0, 5)
+
+        self.assertEqual(len(self.db.get_playback_data(first)), 10)
+        frames = self.db.get_playback_data(second)
+        self.assertEqual([f["timestamp"] for f in frames], [1000.0, 1001.0, 1002.0, 1003.0, 1004.0])
+
+    def test_seek_to_offset(self):
+        sid = self.record("stint", 500.0, 100, step=0.5)
+
+        reader = self.db.iter_playback(sid, offset=10.0, chunk_size=7)
+        first = next(reader)
+        self.assertEqual(first["timestamp"], 510.0)
+        self.assertEqual(len(list(reader)), 79)
+
+    def test_latest_session(self):
+        first = self.record("first", 100.0, 3)
+        second = self.record("second", 200.0, 3)
+        # `second` is still active
+        self.assertEqual(self.db.latest_session_id(), first)
+        self.assertEqual(self.db.latest_session_id(include_active=True), second)
+
+    def test_unknown_session(self):
+        with self.assertRaises(ValueError):
+            self.db.iter_playback(999)
+
+    def test_legacy_frames_are_migrated(self):
+        self.db.close()
+        os.remove(self.db_path)
+
+        # Old schema: no session_id column
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE telemetry (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp REAL, data TEXT)')
+        conn.executemany('INSERT INTO telemetry (timestamp, data) VALUES (?, ?)',
+                         [(float(i), '{"timestamp": %d.0}' % i) for i in range(4)])
+        conn.commit()
+        conn.close()
+
+        self.db = TelemetryLogger(self.db_path)
+        sessions = self.db.get_all_sessions()
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]["name"], "legacy")
+        self.assertEqual(sessions[0]["frame_count"], 4)
+        self.assertEqual(len(self.db.get_playback_data(sessions[0]["id"])), 4)
+
+class TestColumnarEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        generator = TelemetryGenerator()
+        self.frames = []
+        for i in range(600):
+            frame = generator.get_next_frame()
+            frame["timestamp"] = 1000.0 + i / 60.0
+            self.frames.append(frame)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def record(self, engine):
+        path = os.path.join(self.tmp_dir, f"{engine}.db")
+        db = TelemetryLogger(path, engine=engine)
+        sid = db.start_session(engine)
+        for frame in self.frames:
+            db.log(frame)
+        db.flush()
+        return db, sid, path
+
+    def test_round_trip_matches_generator_frames(self):
+        db, sid, _ = self.record("columnar")
+        frames = db.get_playback_data(sid)
+        db.close()
+        self.assertEqual(frames, self.frames)
+
+    def test_read_channel_matches_frames(self):
+        db, sid, _ = self.record("columnar")
+        temps = db.read_channel(sid, "tire_rl_temp")
+        db.close()
+        expected = [f["tires"][2]["temp"] for f in self.frames]
+        self.assertEqual(temps.tolist(), expected)
+
+    def test_read_channels_window_and_engines_agree(self):
+        results = {}
+        for engine in ("json", "columnar"):
+            db, sid, _ = self.record(engine)
+            results[engine] = db.read_channels(sid, ["speed_kmh", "gear", "aero_drs"], start=2.0, end=4.0)
+            db.close()
+
+        columnar, json_result = results["columnar"], results["json"]
+        self.assertEqual(len(columnar["timestamp"]), 121)
+        for name in ("timestamp", "speed_kmh", "gear", "aero_drs"):
+            self.assertEqual(columnar[name].tolist(), json_result[name].tolist())
+
+    def test_columnar_is_smaller(self):
+        sizes = {}
+        for engine in ("json", "columnar"):
+            db, _, path = self.record(engine)
+            db.close()
+            conn = sqlite3.connect(path)
+            conn.execute("VACUUM")
+            sizes[engine] = conn.execute("PRAGMA page_count").fetchone()[0]
+            conn.close()
+        print(f"\nDB pages: json={sizes['json']} columnar={sizes['columnar']}")
+        self.assertGreater(sizes["json"] / sizes["columnar"], 3.0)
+
+    def test_mixed_engines_in_one_database(self):
+        path = os.path.join(self.tmp_dir, "mixed.db")
+        db = TelemetryLogger(path, engine="json")
+        json_sid = db.start_session()
+        db.log(self.frames[0])
+        db.close()
+
+        db = TelemetryLogger(path, engine="columnar")
+        col_sid = db.start_session()
+        db.log(self.frames[1])
+        engines = {s["id"]: s["engine"] for s in db.get_all_sessions()}
+        self.assertEqual(engines, {json_sid: "json", col_sid: "columnar"})
+        # Each session replays through the engine it was recorded with
+        self.assertEqual(db.get_playback_data(json_sid), [self.frames[0]])
+        self.assertEqual(db.get_playback_data(col_sid), [self.frames[1]])
+        db.close()
+
+    def test_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            TelemetryLogger(os.path.join(self.tmp_dir, "x.db"), engine="parquet")
+
+class TestFlatFrames(unittest.TestCase):
+    setUp = TestColumnarEngine.setUp
+    tearDown = TestColumnarEngine.tearDown
+
+    def test_every_engine_records_flat_values(self):
+        # FrameBuffer.snapshot() tuples store exactly like the frame dicts
+        for engine in ("json", "columnar", "delta"):
+            db = TelemetryLogger(os.path.join(self.tmp_dir, f"{engine}.db"), engine=engine)
+            sid = db.start_session(engine)
+            for frame in self.frames:
+                db.log(tuple(flatten_frame(frame)))
+            db.flush()
+            self.assertEqual(db.get_playback_data(sid), self.frames, engine)
+            db.close()
+
+class TestDeltaEngine(unittest.TestCase):
+    setUp = TestColumnarEngine.setUp
+    tearDown = TestColumnarEngine.tearDown
+    record = TestColumnarEngine.record
+
+    def test_round_trip_matches_generator_frames(self):
+        db, sid, _ = self.record("delta")
+        frames = db.get_playback_data(sid)
+        db.close()
+        self.assertEqual(frames, self.frames)
+
+    def test_seek_between_keyframes(self):
+        db, sid, _ = self.record("delta")
+        # 151 frames in: not on a keyframe, so the reader has to look one up
+        reader = db.iter_playback(sid, offset=151 / 60.0 - 1e-6)
+        frames = [next(reader) for _ in range(30)]
+        reader.close()
+        db.close()
+        self.assertEqual(frames, self.frames[151:181])
+
+    def test_sessions_sharing_timestamps_replay_together(self):
+        # Two cars logging at the same wall-clock times: keyframes must not be mixed up
+        db = TelemetryLogger(":memory:", engine="delta")
+        cars = [TelemetryGenerator(seed=seed, clock=lambda: 1000.0) for seed in (1, 2)]
+        for _ in range(600):
+            cars[1].step(1 / 60) # 10 s ahead: a different state
+        sessions = [db.open_session(f"car_{i}") for i in range(2)]
+        expected = []
+        for i in range(100):
+            for generator, sid in zip(cars, sessions):
+                frame = dict(generator.get_next_frame(1 / 60), timestamp=1000.0 + i / 60)
+                db.log(frame, session_id=sid)
+                expected.append(frame)
+        frames = db.get_playback_data(None)
+        db.close()
+        key = lambda frame: (frame["timestamp"], frame["speed_kmh"], frame["rpm"])
+        self.assertEqual(sorted(map(key, frames)), sorted(map(key, expected)))
+        self.assertEqual(sorted(frames, key=key), sorted(expected, key=key))
+
+    def test_read_channels_agree_with_columnar(self):
+        results = {}
+        for engine in ("delta", "columnar"):
+            db, sid, _ = self.record(engine)
+            results[engine] = db.read_channels(sid, ["speed_kmh", "tire_fl_wear", "aero_drs"], start=1.5)
+            db.close()
+        for name in ("timestamp", "speed_kmh", "tire_fl_wear", "aero_drs"):
+            self.assertEqual(results["delta"][name].tolist(), results["columnar"][name].tolist())
+
+    def test_delta_is_smaller(self):
+        sizes = {}
+        for engine in ("json", "delta"):
+            db, _, path = self.record(engine)
+            db.close()
+            conn = sqlite3.connect(path)
+            conn.execute("VACUUM")
+            sizes[engine] = conn.execute("PRAGMA page_count").fetchone()[0]
+            conn.close()
+        print(f"\nDB pages: json={sizes['json']} delta={sizes['delta']}")
+        self.assertGreater(sizes["json"] / sizes["delta"], 3.0)
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # 10 minutes of frames at 2 Hz, starting mid-bucket
+        generator = TelemetryGenerator(seed=4, clock=lambda: 0.0)
+        self.frames = []
+        for i in range(1200):
+            generator.step(0.5)
+            frame = generator.snapshot(timestamp=1003.25 + i * 0.5)
+            self.frames.append(frame)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def record(self, rollups=True, batch_size=7):
+        db = TelemetryLogger(os.path.join(self.tmp_dir, "telemetry.db"), engine="columnar",
+                             batch_size=batch_size, rollups=rollups)
+        sid = db.start_session()
+        for frame in self.frames:
+            db.log(frame)
+        db.flush()
+        return db, sid
+
+    def expected(self, channel, width):
+        timestamps = np.array([f["timestamp"] for f in self.frames])
+        values = np.array([f["speed_kmh"] if channel == "speed_kmh" else f["tires"][0]["temp"] for f in self.frames])
+        buckets = np.floor(timestamps / width) * width
+        keys = np.unique(buckets)
+        return keys, [values[buckets == k] for k in keys]
+
+    def test_incremental_rollups_match_frames(self):
+        db, sid = self.record()
+        for width in (1.0, 10.0, 60.0, 120.0):
+            result = db.read_rollups(sid, ["speed_kmh", "tire_fl_temp"], width)
+            for channel in ("speed_kmh", "tire_fl_temp"):
+                keys, groups = self.expected(channel, width)
+                stats = result["channels"][channel]
+                self.assertEqual(result["timestamp"].tolist(), keys.tolist())
+                self.assertEqual(result["frames"].tolist(), [len(g) for g in groups])
+                self.assertEqual(stats["min"].tolist(), [g.min() for g in groups])
+                self.assertEqual(stats["max"].tolist(), [g.max() for g in groups])
+                np.testing.assert_allclose(stats["mean"], [g.mean() for g in groups])
+        db.close()
+
+    def test_resolution_follows_point_budget(self):
+        db, sid = self.record()
+        channels = ["speed_kmh"]
+        self.assertEqual(db.query_history(sid, channels, max_points=5000)["resolution"], 0.0)
+        self.assertEqual(len(db.query_history(sid, channels, max_points=5000)["timestamp"]), 1200)
+        self.assertEqual(db.query_history(sid, channels, max_points=1000)["resolution"], 1.0)
+        self.assertEqual(db.query_history(sid, channels, max_points=100)["resolution"], 10.0)
+        self.assertEqual(db.query_history(sid, channels, max_points=20)["resolution"], 60.0)
+        coarse = db.query_history(sid, channels, max_points=5)
+        self.assertEqual(coarse["resolution"], 180.0)
+        self.assertLessEqual(len(coarse["timestamp"]), 5)
+        self.assertEqual(coarse["frames"].sum(), 1200)
+        # A narrow window gets finer detail for the same budget
+        window = db.query_history(sid, channels, start=60.0, end=120.0, max_points=100)
+        self.assertEqual(window["resolution"], 1.0)
+        self.assertEqual(window["timestamp"][0], 1063.0)
+        self.assertEqual(window["timestamp"][-1], 1123.0)
+        db.close()
+
+    def test_sessions_without_rollups_are_built_on_query(self):
+        db, sid = self.record(rollups=False)
+        self.assertEqual(len(db.read_rollups(sid, ["speed_kmh"], 10.0)["timestamp"]), 0)
+        result = db.query_history(sid, ["speed_kmh"], max_points=100)
+        keys, groups = self.expected("speed_kmh", 10.0)
+        self.assertEqual(result["timestamp"].tolist(), keys.tolist())
+        self.assertEqual(result["channels"]["speed_kmh"]["max"].tolist(), [g.max() for g in groups])
+        db.close()
+
+    def test_rollups_survive_a_restart_mid_bucket(self):
+        path = os.path.join(self.tmp_dir, "telemetry.db")
+        db = TelemetryLogger(path, engine="columnar", batch_size=5)
+        sid = db.open_session()
+        for frame in self.frames[:301]:
+            db.log(frame, sid)
+        db.close()
+        # A second logger appends to the same session, into buckets the first one started
+        db = TelemetryLogger(path, engine="columnar", batch_size=5)
+        for frame in self.frames[301:]:
+            db.log(frame, sid)
+        db.flush()
+        result = db.read_rollups(sid, ["speed_kmh"], 60.0)
+        _, groups = self.expected("speed_kmh", 60.0)
+        self.assertEqual(result["frames"].tolist(), [len(g) for g in groups])
+        np.testing.assert_allclose(result["channels"]["speed_kmh"]["mean"], [g.mean() for g in groups])
+        db.close()
+
+    def test_invalid_queries(self):
+        db, sid = self.record()
+        with self.assertRaises(ValueError):
+            db.query_history(sid, ["tire_fl_compound"])
+        with self.assertRaises(ValueError):
+            db.query_history(sid + 1, ["speed_kmh"])
+        with self.assertRaises(ValueError):
+            db.read_rollups(sid, ["speed_kmh"], 0.5)
+        db.close()
+
+if __name__ == '__main__':
+    unittest.main()
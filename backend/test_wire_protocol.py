@@ -0,0 +1,97 @@
+import json
+import unittest
+from telemetry_generator import TelemetryGenerator
+from wire_protocol import (HEADER, BODY, MSG_FRAME, MSG_DELTA, MSG_BATCH, MESSAGE_KINDS, encode_frame, decode_frame,
+                           encode_coded, encode_batch, batch_body, decode_message, describe_layout)
+from frame_schema import CHANNELS, CHANNEL_INDEX, quantize_frame, dequantize_values
+from delta_codec import DeltaEncoder, DeltaDecoder, KEYFRAME, DELTA
+
+class TestWireProtocol(unittest.TestCase):
+    def setUp(self):
+        self.gen = TelemetryGenerator()
+
+    def test_round_trip(self):
+        for _ in range(600):
+            frame = self.gen.get_next_frame(dt=1 / 60)
+            stream_id, decoded = decode_frame(encode_frame(frame, "car_7"))
+            self.assertEqual(stream_id, "car_7")
+            self.assertEqual(decoded, dict(frame, stream="car_7"))
+
+    def test_smaller_than_json(self):
+        frame = dict(self.gen.get_next_frame(dt=1 / 60), stream="car_0")
+        binary = encode_frame(frame, "car_0")
+        self.assertEqual(len(binary), HEADER.size + len("car_0") + BODY.size)
+        self.assertLess(len(binary) * 4, len(json.dumps(frame)))
+
+    def test_missing_values(self):
+        frame = {"timestamp": 12.5, "speed_kmh": 101.25, "gear": 3}
+        _, decoded = decode_frame(encode_frame(frame))
+        self.assertEqual(decoded["speed_kmh"], 101.25)
+        self.assertEqual(decoded["gear"], 3)
+        self.assertIsNone(decoded["rpm"])
+        self.assertIsNone(decoded["tires"][0]["temp"])
+        self.assertIsNone(decoded["tires"][0]["compound"])
+        self.assertFalse(decoded["is_anomaly"])
+
+    def test_rejects_unknown_version(self):
+        message = bytearray(encode_frame(self.gen.get_next_frame(dt=1 / 60)))
+        message[1] = 99
+        with self.assertRaises(ValueError):
+            decode_frame(bytes(message))
+        self.assertEqual(message[0], MSG_FRAME)
+
+    def test_batch_round_trip(self):
+        rows = [quantize_frame(self.gen.get_next_frame(dt=1 / 60)) for _ in range(50)]
+        rows[3][CHANNEL_INDEX["rpm"]] = None
+        message = encode_batch(rows, "truck_7")
+        msg_type, stream_id, key_seq, payload = decode_message(message)
+        self.assertEqual((msg_type, stream_id, key_seq), (MSG_BATCH, "truck_7", None))
+        self.assertEqual(payload, rows)
+        self.assertEqual(batch_body(message)[1], 50)
+        with self.assertRaises(ValueError):
+            batch_body(message[:-1])
+        with self.assertRaises(ValueError):
+            decode_frame(message)
+
+    def test_layout_matches_schema(self):
+        layout = describe_layout()
+        self.assertEqual([f["name"] for f in layout], [c.name for c in CHANNELS])
+        self.assertEqual("<" + "".join(f["format"] for f in layout), BODY.format)
+
+class TestDeltaCodec(unittest.TestCase):
+    def test_quantization_aware_comparison(self):
+        frame = TelemetryGenerator().get_next_frame(dt=1 / 60)
+        encoder = DeltaEncoder()
+        self.assertEqual(encoder.encode(quantize_frame(frame))[0], KEYFRAME)
+
+        # Moves below the reported precision are not changes
+        jittered = dict(frame, speed_kmh=frame["speed_kmh"] + 0.001, timestamp=frame["timestamp"] + 1)
+        kind, key_seq, changes = encoder.encode(quantize_frame(jittered))
+        self.assertEqual(kind, DELTA)
+        self.assertEqual([i for i, _ in changes], [CHANNEL_INDEX["timestamp"]])
+
+    def test_binary_round_trip_and_size(self):
+        gen = TelemetryGenerator()
+        encoder, decoder = DeltaEncoder(keyframe_interval=30), DeltaDecoder()
+        delta_bytes = full_bytes = 0
+        for _ in range(600):
+            frame = gen.get_next_frame(dt=1 / 60)
+            message = encode_coded(*encoder.encode(quantize_frame(frame)), "car_0")
+            msg_type, stream_id, key_seq, payload = decode_message(message)
+            values = decoder.decode(MESSAGE_KINDS[msg_type], key_seq, payload)
+            self.assertEqual(dequantize_values(values), frame)
+            full_bytes += len(encode_frame(frame, "car_0"))
+            delta_bytes += len(message)
+            if msg_type == MSG_DELTA:
+                self.assertLess(len(message), BODY.size)
+        self.assertLess(delta_bytes, full_bytes * 0.75)
+
+    def test_delta_without_keyframe_is_skipped(self):
+        gen = TelemetryGenerator()
+        encoder, decoder = DeltaEncoder(), DeltaDecoder()
+        encoder.encode(quantize_frame(gen.get_next_frame(dt=1 / 60)))
+        kind, key_seq, payload = encoder.encode(quantize_frame(gen.get_next_frame(dt=1 / 60)))
+        self.assertIsNone(decoder.decode(kind, key_seq, payload))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Binary wire encoding for telemetry frames.
+
+A client opts in per connection with {"command": "hello", "encoding": "binary"};
+JSON text stays the default. Control replies are always JSON text, telemetry
+frames for a binary client are binary WebSocket messages:
+
+    header  <BBB   message type, wire version, stream id length
+            ...    stream id (UTF-8)
+    MSG_FRAME      body
+    MSG_KEYFRAME   <H key_seq, body
+    MSG_DELTA      <H key_seq, <I channel bitmask, then the set channels' fields
+    MSG_BATCH      <H frame count, then that many bodies (producer -> server, see ingest.py)
+
+Body: one field per frame_schema channel, in CHANNELS order. Field types by
+channel kind: TIME float64, FLOAT int32 (value * scale, see frame_schema),
+INT int16, BOOL uint8, COMPOUND int8 (compound code). Missing FLOAT values
+are sent as MISSING. The layout is fixed, so a binary frame always carries
+every channel (channel subscriptions only filter JSON).
+
+Keyframe / delta messages are only sent to clients that asked for them
+(see delta_codec). The UE decoder (UWebSocketClient::DecodeBinaryFrame)
+mirrors the MSG_FRAME layout. MSG_BATCH only travels the other way: data
+loggers push batches of frames to the ingest endpoint, the stream id being
+the vehicle id.
+"""
+
+import struct
+from frame_schema import CHANNELS, TIME, FLOAT, INT, BOOL, COMPOUND, quantize_frame, dequantize_values
+from delta_codec import KEYFRAME, DELTA
+
+# Encodings a client can negotiate
+JSON = "json"
+BINARY = "binary"
+ENCODINGS = (JSON, BINARY)
+
+WIRE_VERSION = 1
+
+# Message types (first header byte)
+MSG_FRAME = 0x01
+MSG_KEYFRAME = 0x02
+MSG_DELTA = 0x03
+MSG_BATCH = 0x04
+
+# Sentinel for a missing FLOAT channel
+MISSING = -2 ** 31
+
+_KIND_FORMATS = {TIME: "d", FLOAT: "i", INT: "h", BOOL: "B", COMPOUND: "b"}
+_FORMATS = tuple(_KIND_FORMATS[c.kind] for c in CHANNELS)
+
+HEADER = struct.Struct("<BBB")
+KEY_SEQ = struct.Struct("<H")
+COUNT = struct.Struct("<H")
+MASK = struct.Struct("<I")
+BODY = struct.Struct("<" + "".join(_FORMATS))
+
+# Wire value of a missing (None) quantized value, per channel
+_WIRE_MISSING = tuple(MISSING if c.kind == FLOAT else -1 if c.kind == COMPOUND else 0 for c in CHANNELS)
+
+# Delta field layouts, built on first use per channel bitmask (masks repeat frame after frame)
+_delta_structs = {}
+
+def describe_layout():
+    """
+    Field list of the binary body, sent in the hello reply so clients can check it.
+    """
+    return [{"name": c.name, "format": _KIND_FORMATS[c.kind], "scale": c.scale} for c in CHANNELS]
+
+def to_wire(values):
+    """
+    Quantized values -> struct-packable values (None becomes the channel's missing marker).
+    """
+    return [missing if v is None else v for v, missing in zip(values, _WIRE_MISSING)]
+
+def from_wire(values):
+    return [None if v == missing and missing else v for v, missing in zip(values, _WIRE_MISSING)]
+
+def _delta_struct(mask):
+    layout = _delta_structs.get(mask)
+    if layout is None:
+        fmt = "".join(f for i, f in enumerate(_FORMATS) if mask >> i & 1)
+        layout = _delta_structs[mask] = struct.Struct("<" + fmt)
+    return layout
+
+def pack_delta(changes):
+    """
+    [(channel_index, quantized value), ...] -> bitmask + packed fields.
+    """
+    mask = 0
+    for i, _ in changes:
+        mask |= 1 << i
+    values = [_WIRE_MISSING[i] if v is None else v for i, v in sorted(changes)]
+    return MASK.pack(mask) + _delta_struct(mask).pack(*values)
+
+def unpack_delta(data, offset=0):
+    mask, = MASK.unpack_from(data, offset)
+    indexes = [i for i in range(len(CHANNELS)) if mask >> i & 1]
+    values = _delta_struct(mask).unpack_from(data, offset + MASK.size)
+    return [(i, None if v == _WIRE_MISSING[i] and _WIRE_MISSING[i] else v) for i, v in zip(indexes, values)]
+
+def _header(msg_type, stream_id):
+    stream = stream_id.encode("utf-8")
+    return HEADER.pack(msg_type, WIRE_VERSION, len(stream)) + stream
+
+def encode_frame(frame, stream_id=""):
+    """
+    Frame dict -> binary MSG_FRAME message (bytes).
+    """
+    return encode_values(quantize_frame(frame), stream_id)
+
+def encode_values(values, stream_id=""):
+    """
+    Quantized channel values (e.g. FrameBuffer.quantized()) -> binary MSG_FRAME message (bytes).
+    """
+    return _header(MSG_FRAME, stream_id) + BODY.pack(*to_wire(values))
+
+def encode_coded(kind, key_seq, payload, stream_id=""):
+    """
+    DeltaEncoder output -> binary MSG_KEYFRAME / MSG_DELTA message (bytes).
+    """
+    if kind == KEYFRAME:
+        return _header(MSG_KEYFRAME, stream_id) + KEY_SEQ.pack(key_seq) + BODY.pack(*to_wire(payload))
+    return _header(MSG_DELTA, stream_id) + KEY_SEQ.pack(key_seq) + pack_delta(payload)
+
+def encode_batch(rows, stream_id=""):
+    """
+    Quantized channel values of several frames -> binary MSG_BATCH message (bytes).
+    """
+    if len(rows) > 0xFFFF:
+        raise ValueError(f"Batch too large: {len(rows)} frames (max {0xFFFF})")
+    return (_header(MSG_BATCH, stream_id) + COUNT.pack(len(rows))
+            + b"".join(BODY.pack(*to_wire(values)) for values in rows))
+
+def _unpack_header(message):
+    msg_type, version, stream_len = HEADER.unpack_from(message, 0)
+    if msg_type not in (MSG_FRAME, MSG_KEYFRAME, MSG_DELTA, MSG_BATCH) or version != WIRE_VERSION:
+        raise ValueError(f"Unsupported message: type {msg_type}, version {version}")
+    offset = HEADER.size
+    stream_id = bytes(message[offset:offset + stream_len]).decode("utf-8")
+    return msg_type, stream_id, offset + stream_len
+
+def batch_body(message):
+    """
+    Binary MSG_BATCH message -> (stream_id, frame count, memoryview of the packed bodies),
+    for decoders that read the bodies in bulk (ingest.py uses numpy).
+    """
+    msg_type, stream_id, offset = _unpack_header(message)
+    if msg_type != MSG_BATCH:
+        raise ValueError(f"Not a batch message: type {msg_type}")
+    count, = COUNT.unpack_from(message, offset)
+    offset += COUNT.size
+    if len(message) - offset != count * BODY.size:
+        raise ValueError(f"Batch of {count} frames has {len(message) - offset} body bytes")
+    return stream_id, count, memoryview(message)[offset:]
+
+def decode_message(message):
+    """
+    Binary message -> (msg_type, stream_id, key_seq, payload).
+    payload: quantized values for MSG_FRAME / MSG_KEYFRAME, [(channel_index, value)] for MSG_DELTA,
+    a list of quantized values per frame for MSG_BATCH. key_seq is None for MSG_FRAME / MSG_BATCH.
+    """
+    msg_type, stream_id, offset = _unpack_header(message)
+    if msg_type == MSG_BATCH:
+        stream_id, _, body = batch_body(message)
+        return msg_type, stream_id, None, [from_wire(values) for values in BODY.iter_unpack(body)]
+
+    key_seq = None
+    if msg_type != MSG_FRAME:
+        key_seq, = KEY_SEQ.unpack_from(message, offset)
+        offset += KEY_SEQ.size
+    if msg_type == MSG_DELTA:
+        return msg_type, stream_id, key_seq, unpack_delta(message, offset)
+    return msg_type, stream_id, key_seq, from_wire(BODY.unpack_from(message, offset))
+
+def decode_frame(message):
+    """
+    Binary MSG_FRAME (or MSG_KEYFRAME) message -> (stream_id, frame dict). Inverse of encode_frame().
+    """
+    msg_type, stream_id, _, values = decode_message(message)
+    if msg_type == MSG_DELTA:
+        raise ValueError("Delta messages need a DeltaDecoder")
+    if msg_type == MSG_BATCH:
+        raise ValueError("Batch messages hold several frames (decode_message)")
+    frame = dequantize_values(values)
+    frame["stream"] = stream_id
+    return stream_id, frame
+
+# Message type <-> delta_codec kind
+MESSAGE_KINDS = {MSG_KEYFRAME: KEYFRAME, MSG_DELTA: DELTA}